@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Empresas, Planes
+from .models import Empresas, Planes, ConsumoPlan
 
 from unfold.admin import ModelAdmin
 
@@ -15,3 +15,11 @@ class EmpresasAdmin(ModelAdmin):
 @admin.register(Planes)
 class PlanesAdmin(ModelAdmin):
     pass
+
+
+@admin.register(ConsumoPlan)
+class ConsumoPlanAdmin(ModelAdmin):
+    list_display = ("empresa", "recurso", "periodo", "usado", "fecha_actualizacion")
+    list_filter = ("recurso", "periodo")
+    search_fields = ("empresa__nombre",)
+    list_select_related = ("empresa",)
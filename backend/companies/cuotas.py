@@ -0,0 +1,163 @@
+"""
+Cuotas de los planes: cuánto de cada límite de Planes lleva consumido una empresa.
+
+consumir() se llama dentro de la misma transacción que crea el documento o el usuario y hace
+un UPDATE condicional con F(): el incremento y la comprobación del límite son una sola sentencia,
+así dos peticiones concurrentes no pueden pasarse del límite. La lectura para la interfaz
+(cuota_empresa) se cachea y se invalida al confirmar cada consumo.
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.metricas import contar_cache
+from .models import ConsumoPlan, Empresas
+
+
+class CuotaExcedida(Exception):
+    def __init__(self, recurso, limite):
+        self.recurso = recurso
+        self.limite = limite
+        super().__init__(f"Se alcanzó el límite del plan para {recurso} ({limite})")
+
+
+def periodo_de(recurso, momento=None):
+    if recurso in ConsumoPlan.RECURSOS_ACUMULADOS:
+        return ConsumoPlan.PERIODO_TOTAL
+    return timezone.localdate(momento or timezone.now()).replace(day=1)
+
+
+def recurso_documento(nombre_tipo):
+    """Recurso del plan que consume un documento generado según el tipo de su plantilla"""
+    nombre = (nombre_tipo or '').lower()
+    if 'demanda' in nombre:
+        return ConsumoPlan.DEMANDAS
+    if 'contrato' in nombre:
+        return ConsumoPlan.CONTRATOS
+    return ConsumoPlan.ESCRITOS
+
+
+def _clave_cache(empresa_id):
+    return f'cuota:{empresa_id}:{periodo_de(ConsumoPlan.ESCRITOS):%Y-%m}'
+
+
+def invalidar_cuota(empresa_id):
+    transaction.on_commit(lambda: cache.delete(_clave_cache(empresa_id)))
+
+
+def consumir(empresa_id, recurso, cantidad=1):
+    """
+    Suma `cantidad` al consumo del periodo actual. Con CUOTAS_ACTIVAS lanza CuotaExcedida
+    si el plan no lo permite. Debe llamarse dentro de la transacción de la operación que consume.
+    """
+    periodo = periodo_de(recurso)
+    limite = Empresas.objects.filter(pk=empresa_id).values_list(
+        f'plan__{ConsumoPlan.CAMPOS_LIMITE[recurso]}', flat=True
+    ).first()
+    ConsumoPlan.objects.bulk_create(
+        [ConsumoPlan(empresa_id=empresa_id, recurso=recurso, periodo=periodo)],
+        ignore_conflicts=True,
+    )
+    filas = ConsumoPlan.objects.filter(empresa_id=empresa_id, recurso=recurso, periodo=periodo)
+    if getattr(settings, 'CUOTAS_ACTIVAS', True) and limite is not None:
+        filas = filas.filter(usado__lte=limite - cantidad)
+    if not filas.update(usado=F('usado') + cantidad):
+        raise CuotaExcedida(recurso, limite)
+    invalidar_cuota(empresa_id)
+
+
+def liberar(empresa_id, recurso, cantidad=1):
+    """Descuenta consumo (p. ej. al eliminar un usuario) sin bajar de cero"""
+    ConsumoPlan.objects.filter(
+        empresa_id=empresa_id, recurso=recurso, periodo=periodo_de(recurso)
+    ).update(usado=Greatest(F('usado') - cantidad, 0))
+    invalidar_cuota(empresa_id)
+
+
+def cuota_empresa(empresa_id):
+    """{recurso: {limite, usado, restante}} del periodo actual, cacheado CUOTAS_CACHE_TIMEOUT segundos"""
+    clave = _clave_cache(empresa_id)
+    cuota = cache.get(clave)
+    contar_cache('cuotas', cuota is not None, cuota is None)
+    if cuota is not None:
+        return cuota
+
+    campos = ConsumoPlan.CAMPOS_LIMITE
+    limites = Empresas.objects.filter(pk=empresa_id).values(
+        *[f'plan__{campo}' for campo in campos.values()]
+    ).first() or {}
+    usados = {
+        (recurso, periodo): usado
+        for recurso, periodo, usado in ConsumoPlan.objects.filter(
+            empresa_id=empresa_id,
+            periodo__in={periodo_de(recurso) for recurso in campos},
+        ).values_list('recurso', 'periodo', 'usado')
+    }
+    cuota = {}
+    for recurso, campo in campos.items():
+        limite = limites.get(f'plan__{campo}')
+        usado = usados.get((recurso, periodo_de(recurso)), 0)
+        cuota[recurso] = {
+            'limite': limite,
+            'usado': usado,
+            'restante': max(limite - usado, 0) if limite is not None else None,
+        }
+    cache.set(clave, cuota, settings.CUOTAS_CACHE_TIMEOUT)
+    return cuota
+
+
+def reconciliar(periodo=None, tamano_lote=500, empresa_ids=None):
+    """
+    Recalcula los contadores desde el historial (DocumentoGenerado y usuarios activos) por lotes
+    de empresas (todas, o solo `empresa_ids`). Corrige desvíos por eliminaciones, cargas masivas o
+    cambios de tipo de plantilla. Retorna la cantidad de empresas procesadas.
+    """
+    DocumentoGenerado = apps.get_model('documents', 'DocumentoGenerado')
+    Usuarios = apps.get_model('users', 'Usuarios')
+    periodo = (periodo or periodo_de(ConsumoPlan.ESCRITOS)).replace(day=1)
+    siguiente = (periodo.replace(day=28) + timedelta(days=4)).replace(day=1)
+    recursos_mensuales = [r for r in ConsumoPlan.CAMPOS_LIMITE if r not in ConsumoPlan.RECURSOS_ACUMULADOS]
+
+    if empresa_ids is None:
+        empresa_ids = list(Empresas.objects.order_by('id').values_list('id', flat=True))
+    for inicio in range(0, len(empresa_ids), tamano_lote):
+        lote = empresa_ids[inicio:inicio + tamano_lote]
+        conteos = {}
+        for empresa_id in lote:
+            conteos[(empresa_id, ConsumoPlan.USUARIOS, ConsumoPlan.PERIODO_TOTAL)] = 0
+            for recurso in recursos_mensuales:
+                conteos[(empresa_id, recurso, periodo)] = 0
+
+        documentos = DocumentoGenerado.objects.filter(
+            usuario__empresa_id__in=lote,
+            fecha_generacion__date__gte=periodo,
+            fecha_generacion__date__lt=siguiente,
+        ).values_list('usuario__empresa_id', 'plantilla__tipo__nombre').annotate(total=Count('id'))
+        for empresa_id, nombre_tipo, total in documentos:
+            conteos[(empresa_id, recurso_documento(nombre_tipo), periodo)] += total
+
+        usuarios = Usuarios.objects.filter(empresa_id__in=lote, is_active=True).values_list(
+            'empresa_id'
+        ).annotate(total=Count('id'))
+        for empresa_id, total in usuarios:
+            conteos[(empresa_id, ConsumoPlan.USUARIOS, ConsumoPlan.PERIODO_TOTAL)] = total
+
+        with transaction.atomic():
+            ConsumoPlan.objects.bulk_create(
+                [
+                    ConsumoPlan(empresa_id=empresa_id, recurso=recurso, periodo=periodo_conteo, usado=usado)
+                    for (empresa_id, recurso, periodo_conteo), usado in conteos.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['empresa', 'recurso', 'periodo'],
+                update_fields=['usado', 'fecha_actualizacion'],
+                batch_size=1000,
+            )
+        cache.delete_many([_clave_cache(empresa_id) for empresa_id in lote])
+    return len(empresa_ids)
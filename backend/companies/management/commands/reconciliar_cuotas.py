@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from companies.cuotas import reconciliar
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los contadores de consumo de los planes desde el historial de documentos "
+        "generados y usuarios activos, por lotes de empresas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodo', help="Mes a reconciliar en formato AAAA-MM (por defecto el actual)")
+        parser.add_argument('--lote', type=int, default=500, help="Empresas por lote (por defecto 500)")
+
+    def handle(self, *args, **options):
+        periodo = None
+        if options['periodo']:
+            try:
+                periodo = datetime.strptime(options['periodo'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--periodo debe tener el formato AAAA-MM")
+        total = reconciliar(periodo=periodo, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Cuotas reconciliadas para {total} empresas"))
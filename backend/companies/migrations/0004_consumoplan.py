@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_rename_cantidadconsultas_planes_cantidad_consultas_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumoPlan',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('recurso', models.CharField(choices=[('usuarios', 'Usuarios'), ('escritos', 'Escritos'), ('demandas', 'Demandas'), ('contratos', 'Contratos'), ('consultas', 'Consultas')], max_length=20)),
+                ('periodo', models.DateField()),
+                ('usado', models.IntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumos', to='companies.empresas')),
+            ],
+            options={
+                'verbose_name_plural': 'Consumos de Planes',
+                'db_table': 'consumos_planes',
+                'managed': True,
+                'unique_together': {('empresa', 'recurso', 'periodo')},
+            },
+        ),
+    ]
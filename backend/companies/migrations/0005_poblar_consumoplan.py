@@ -0,0 +1,57 @@
+from datetime import date
+
+from django.db import migrations
+from django.db.models import Count
+from django.utils import timezone
+
+from companies.cuotas import recurso_documento
+
+
+def poblar_consumos(apps, schema_editor):
+    """
+    Consumo inicial desde el historial (como reconciliar_cuotas): usuarios activos y documentos
+    generados del mes en curso. Sin esto las empresas existentes empezarían con el consumo en 0.
+    """
+    ConsumoPlan = apps.get_model('companies', 'ConsumoPlan')
+    Usuarios = apps.get_model('users', 'Usuarios')
+    DocumentoGenerado = apps.get_model('documents', 'DocumentoGenerado')
+    periodo = timezone.localdate().replace(day=1)
+    periodo_total = date(1970, 1, 1)  # ConsumoPlan.PERIODO_TOTAL
+
+    conteos = {}
+    usuarios = Usuarios.objects.filter(empresa__isnull=False, is_active=True).values_list(
+        'empresa_id'
+    ).annotate(total=Count('id'))
+    for empresa_id, total in usuarios:
+        conteos[(empresa_id, 'usuarios', periodo_total)] = total
+
+    documentos = DocumentoGenerado.objects.filter(
+        usuario__empresa__isnull=False, fecha_generacion__date__gte=periodo
+    ).values_list('usuario__empresa_id', 'plantilla__tipo__nombre').annotate(total=Count('id'))
+    for empresa_id, nombre_tipo, total in documentos:
+        clave = (empresa_id, recurso_documento(nombre_tipo), periodo)
+        conteos[clave] = conteos.get(clave, 0) + total
+
+    ConsumoPlan.objects.bulk_create(
+        [
+            ConsumoPlan(empresa_id=empresa_id, recurso=recurso, periodo=periodo_conteo, usado=usado)
+            for (empresa_id, recurso, periodo_conteo), usado in conteos.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['empresa', 'recurso', 'periodo'],
+        update_fields=['usado'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0004_consumoplan'),
+        ('users', '0004_remove_usuarios_abogado_dos_and_more'),
+        ('documents', '0008_revision_y_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_consumos, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+from datetime import date
+
 from django.db import models
 
 
@@ -53,4 +55,49 @@ class Empresas(models.Model):
         verbose_name_plural = 'Empresas'
 
     def __str__(self):
-        return self.nombre
\ No newline at end of file
+        return self.nombre
+
+class ConsumoPlan(models.Model):
+    """
+    Consumo de los límites del plan por empresa y periodo (ver companies/cuotas.py).
+    Los documentos se cuentan por mes; los usuarios son un total acumulado que usa PERIODO_TOTAL.
+    """
+    USUARIOS = 'usuarios'
+    ESCRITOS = 'escritos'
+    DEMANDAS = 'demandas'
+    CONTRATOS = 'contratos'
+    CONSULTAS = 'consultas'
+    RECURSO_CHOICES = [
+        (USUARIOS, 'Usuarios'),
+        (ESCRITOS, 'Escritos'),
+        (DEMANDAS, 'Demandas'),
+        (CONTRATOS, 'Contratos'),
+        (CONSULTAS, 'Consultas'),
+    ]
+    # Campo de Planes con el límite de cada recurso
+    CAMPOS_LIMITE = {
+        USUARIOS: 'cantidad_users',
+        ESCRITOS: 'cantidad_escritos',
+        DEMANDAS: 'cantidad_demandas',
+        CONTRATOS: 'cantidad_contratos',
+        CONSULTAS: 'cantidad_consultas',
+    }
+    RECURSOS_ACUMULADOS = (USUARIOS,)
+    PERIODO_TOTAL = date(1970, 1, 1)
+
+    id = models.BigAutoField(primary_key=True)
+    empresa = models.ForeignKey(Empresas, on_delete=models.CASCADE, related_name='consumos')
+    recurso = models.CharField(max_length=20, choices=RECURSO_CHOICES)
+    # Primer día del mes, o PERIODO_TOTAL para los recursos acumulados
+    periodo = models.DateField()
+    usado = models.IntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        managed = True
+        db_table = 'consumos_planes'
+        verbose_name_plural = 'Consumos de Planes'
+        unique_together = ('empresa', 'recurso', 'periodo')
+
+    def __str__(self):
+        return f"{self.empresa_id} {self.recurso} {self.periodo:%Y-%m}: {self.usado}"
@@ -1,12 +1,13 @@
 from rest_framework import serializers
+from core.serializers import CamposDinamicosSerializerMixin
 from .models import Empresas, Planes, Tribunales
 
-class PlanesSerializer(serializers.ModelSerializer):
+class PlanesSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Planes
         fields = '__all__'
 
-class EmpresasSerializer(serializers.ModelSerializer):
+class EmpresasSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     plan_nombre = serializers.CharField(source='plan.nombre', read_only=True)
     plan_precio = serializers.DecimalField(
         max_digits=10, decimal_places=0, source='plan.precio', read_only=True
@@ -19,7 +20,7 @@ class EmpresasSerializer(serializers.ModelSerializer):
         )
 
 
-class TribunalesSerializer(serializers.ModelSerializer):
+class TribunalesSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tribunales
         fields = '__all__'
\ No newline at end of file
@@ -0,0 +1,65 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from core.cache import invalidar_catalogo, TRIBUNALES, PLANES
+from users.models import Usuarios
+from .cuotas import consumir, liberar, invalidar_cuota
+from .models import Tribunales, Planes, Empresas, ConsumoPlan
+
+
+NO_CONSULTADA = object()
+
+
+@receiver([post_save, post_delete], sender=Tribunales)
+def invalidar_tribunales(sender, **kwargs):
+    invalidar_catalogo(TRIBUNALES)
+
+
+@receiver([post_save, post_delete], sender=Planes)
+def invalidar_planes(sender, **kwargs):
+    invalidar_catalogo(PLANES)
+
+
+@receiver(post_save, sender=Empresas)
+def invalidar_cuota_empresa(sender, instance, created, **kwargs):
+    # Cambiar de plan cambia los límites cacheados
+    if not created:
+        invalidar_cuota(instance.pk)
+
+
+@receiver(pre_save, sender=Usuarios)
+def recordar_cuota_usuario(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Empresa cuyo cupo ocupa el usuario antes de guardar (None si no ocupaba ninguno)
+    instance._empresa_cuota_anterior = NO_CONSULTADA
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not {'empresa', 'empresa_id', 'is_active'} & set(update_fields):
+        return
+    anterior = Usuarios.objects.filter(pk=instance.pk).values_list('empresa_id', 'is_active').first()
+    if anterior is not None:
+        instance._empresa_cuota_anterior = anterior[0] if anterior[1] else None
+
+
+@receiver(post_save, sender=Usuarios)
+def mover_cuota_usuario(sender, instance, created, raw=False, **kwargs):
+    """
+    Desactivar, reactivar o cambiar de empresa a un usuario mueve su cupo (la creación la descuenta
+    la vista). Ocupar un cupo nuevo respeta el límite: lanza CuotaExcedida dentro del guardado.
+    """
+    anterior = getattr(instance, '_empresa_cuota_anterior', NO_CONSULTADA)
+    if created or raw or anterior is NO_CONSULTADA:
+        return
+    actual = instance.empresa_id if instance.is_active else None
+    if anterior == actual:
+        return
+    if anterior:
+        liberar(anterior, ConsumoPlan.USUARIOS)
+    if actual:
+        consumir(actual, ConsumoPlan.USUARIOS)
+
+
+@receiver(post_delete, sender=Usuarios)
+def liberar_cuota_usuario(sender, instance, **kwargs):
+    # Los usuarios inactivos no ocupan cupo (igual que en reconciliar)
+    if instance.empresa_id and instance.is_active:
+        liberar(instance.empresa_id, ConsumoPlan.USUARIOS)
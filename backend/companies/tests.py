@@ -1,8 +1,19 @@
-from django.test import TestCase
+import io
+from datetime import date
+from importlib import import_module
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
-from companies.models import Empresas, Planes
+from companies.cuotas import CuotaExcedida, consumir, cuota_empresa
+from companies.models import Empresas, Planes, ConsumoPlan
 from users.models import Usuarios
+from documents.models import DocumentoGenerado, PlantillaDocumento, TipoPlantillaDocumento, buffer_usos_plantillas
 
 class EmpresasTestCase(TestCase):
     def setUp(self):
@@ -44,4 +55,143 @@ class PlanesTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 201) # type: ignore
         response = self.client.get(reverse('planes-list')) # type: ignore
-        self.assertTrue(any(p['nombre'] == "Plan Test" for p in response.data['results'])) # type: ignore
\ No newline at end of file
+        self.assertTrue(any(p['nombre'] == "Plan Test" for p in response.data['results'])) # type: ignore
+
+
+@override_settings(ESCRITURA_DIFERIDA_INTERVALO=0)
+class CuotasTestCase(TestCase):
+    def tearDown(self):
+        # Los usos pendientes de generar_documento se escriben dentro de la transacción del test
+        buffer_usos_plantillas.vaciar()
+
+    def setUp(self):
+        cache.clear()
+        self.plan = Planes.objects.create(
+            tipo_plan="mensual", nombre="Plan", precio=1, cantidad_users=2, cantidad_escritos=2, cantidad_contratos=1
+        )
+        self.empresa = Empresas.objects.create(plan=self.plan, rut="1-9", nombre="Empresa", correo="e@e.cl")
+        self.admin = Usuarios.objects.create_superuser(username="admin", password="adminpass")
+        self.user = Usuarios.objects.create_user(username="user", password="pass", empresa=self.empresa)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.plantilla = PlantillaDocumento.objects.create(nombre="P", html_con_campos="", usuario=self.user) # type: ignore
+
+    def generar(self):
+        url = reverse('plantilladocumento-generar-documento', args=[self.plantilla.id])
+        return self.client.post(url, {'plantilla_id': self.plantilla.id, 'datos': {}, 'nombre': 'doc'}, format='json')
+
+    def test_generation_is_blocked_at_plan_limit(self):
+        self.assertEqual(self.generar().status_code, 200)
+        self.assertEqual(self.generar().status_code, 200)
+        response = self.generar()
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['code'], 'plan_quota_exceeded')
+        # El documento rechazado no quedó guardado
+        self.assertEqual(DocumentoGenerado.objects.count(), 2) # type: ignore
+
+    def test_conditional_update_never_exceeds_limit(self):
+        with transaction.atomic():
+            consumir(self.empresa.id, ConsumoPlan.CONTRATOS)
+        with self.assertRaises(CuotaExcedida):
+            consumir(self.empresa.id, ConsumoPlan.CONTRATOS)
+        with override_settings(CUOTAS_ACTIVAS=False):
+            consumir(self.empresa.id, ConsumoPlan.CONTRATOS)
+        self.assertEqual(ConsumoPlan.objects.get(recurso=ConsumoPlan.CONTRATOS).usado, 2) # type: ignore
+
+    def test_remaining_quota_is_cached_and_invalidated_on_commit(self):
+        url = reverse('cuota')
+        self.assertEqual(self.client.get(url).json()['data']['escritos']['restante'], 2)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                consumir(self.empresa.id, ConsumoPlan.ESCRITOS)
+        self.assertEqual(self.client.get(url).json()['data']['escritos']['restante'], 1)
+
+    def test_user_creation_consumes_quota(self):
+        self.client.force_authenticate(user=self.admin)
+        for username, esperado in (("nuevo1", 201), ("nuevo2", 201), ("nuevo3", 403)):
+            response = self.client.post('/users/v1/usuarios/', {
+                'username': username, 'password': 'Secreta123!', 'empresa': self.empresa.id
+            }, format='json')
+            self.assertEqual(response.status_code, esperado)
+        self.assertFalse(Usuarios.objects.filter(username="nuevo3").exists())
+
+    def test_reconcile_recomputes_from_history(self):
+        contrato = TipoPlantillaDocumento.objects.create(nombre="Contrato de arriendo") # type: ignore
+        plantilla_contrato = PlantillaDocumento.objects.create( # type: ignore
+            nombre="C", html_con_campos="", usuario=self.user, tipo=contrato
+        )
+        for plantilla in (self.plantilla, self.plantilla, plantilla_contrato):
+            DocumentoGenerado.objects.create( # type: ignore
+                plantilla=plantilla, usuario=self.user, datos_rellenados={}, html_resultante="", nombre="d"
+            )
+        call_command('reconciliar_cuotas', lote=1, stdout=io.StringIO())
+        cuota = cuota_empresa(self.empresa.id)
+        self.assertEqual(cuota['escritos']['usado'], 2)
+        self.assertEqual(cuota['contratos']['usado'], 1)
+        self.assertEqual(cuota['usuarios']['usado'], 1)
+        self.assertEqual(ConsumoPlan.objects.get(recurso=ConsumoPlan.USUARIOS).periodo, date(1970, 1, 1)) # type: ignore
+
+    def usuarios_usados(self, empresa):
+        return ConsumoPlan.objects.filter(empresa=empresa, recurso=ConsumoPlan.USUARIOS).values_list('usado', flat=True).first() # type: ignore
+
+    def test_deactivating_or_moving_users_moves_quota(self):
+        otra = Empresas.objects.create(plan=self.plan, rut="2-7", nombre="Otra", correo="o@o.cl")
+        call_command('reconciliar_cuotas', stdout=io.StringIO())
+        self.assertEqual(self.usuarios_usados(self.empresa), 1)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.usuarios_usados(self.empresa), 0)
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.usuarios_usados(self.empresa), 1)
+        self.user.empresa = otra
+        self.user.save()
+        self.assertEqual((self.usuarios_usados(self.empresa), self.usuarios_usados(otra)), (0, 1))
+        # Guardados que no tocan empresa ni is_active no consultan nada extra
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        contadores = (self.usuarios_usados(self.empresa), self.usuarios_usados(otra))
+        call_command('reconciliar_cuotas', stdout=io.StringIO())
+        self.assertEqual((self.usuarios_usados(self.empresa), self.usuarios_usados(otra)), contadores)
+
+    def test_reactivation_respects_plan_limit(self):
+        consumir(self.empresa.id, ConsumoPlan.USUARIOS)
+        inactivo = Usuarios.objects.create_user(username="inactivo", password="pass", empresa=self.empresa, is_active=False)
+        consumir(self.empresa.id, ConsumoPlan.USUARIOS)
+        inactivo.is_active = True
+        with self.assertRaises(CuotaExcedida), transaction.atomic():
+            inactivo.save()
+        inactivo.refresh_from_db()
+        self.assertFalse(inactivo.is_active)
+        self.assertEqual(self.usuarios_usados(self.empresa), 2)
+
+    def test_moving_user_to_full_empresa_is_rejected(self):
+        llena = Empresas.objects.create(plan=self.plan, rut="2-7", nombre="Llena", correo="l@l.cl")
+        for _ in range(2):
+            consumir(llena.id, ConsumoPlan.USUARIOS)
+        consumir(self.empresa.id, ConsumoPlan.USUARIOS)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.put(f'/users/v1/usuarios/{self.user.id}/', {
+            'username': 'user', 'email': 'user@e.cl', 'empresa': llena.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['code'], 'plan_quota_exceeded')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.empresa_id, self.empresa.id)
+        self.assertEqual((self.usuarios_usados(self.empresa), self.usuarios_usados(llena)), (1, 2))
+
+    def test_migration_backfills_existing_usage(self):
+        DocumentoGenerado.objects.create( # type: ignore
+            plantilla=self.plantilla, usuario=self.user, datos_rellenados={}, html_resultante="", nombre="d"
+        )
+        ConsumoPlan.objects.all().delete() # type: ignore
+        import_module('companies.migrations.0005_poblar_consumoplan').poblar_consumos(apps, None)
+        cuota = cuota_empresa(self.empresa.id)
+        self.assertEqual(cuota['usuarios']['usado'], 1)
+        self.assertEqual(cuota['escritos']['usado'], 1)
@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import EmpresasViewSet, EmpresasListAPIView, PlanesListAPIView, TribunalesListAPIView #TribunalesViewset #TribunalesListAPIView, TribunalesDetailAPIView,
+from .views import EmpresasViewSet, EmpresasListAPIView, PlanesListAPIView, TribunalesListAPIView, CuotaAPIView #TribunalesViewset #TribunalesListAPIView, TribunalesDetailAPIView,
 
 from rest_framework.routers import DefaultRouter
 
@@ -10,6 +10,7 @@ urlpatterns = [
     path('empresas/', EmpresasListAPIView.as_view(), name='empresas-list'),
     path('planes/', PlanesListAPIView.as_view(), name='planes-list'),
     path('tribunales/', TribunalesListAPIView.as_view(), name='tribunales-list'),
+    path('cuota/', CuotaAPIView.as_view(), name='cuota'),
 
     # generics
     #path('tribunales/', TribunalesListAPIView.as_view(), name='tribunales-list'),
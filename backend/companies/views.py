@@ -1,16 +1,19 @@
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, mixins, viewsets, status
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.views import APIView
 
 from .filters import TribunalesFilter
 from .models import Empresas, Planes, Tribunales
 from .serializers import EmpresasSerializer, PlanesSerializer, TribunalesSerializer
 from rest_framework.response import Response
 from .paginations import CustomPagination
-from core.mixins import StandardResponseMixin
+from core.mixins import StandardResponseMixin, CatalogoCacheMixin
+from core.cache import PLANES, TRIBUNALES
+from .cuotas import cuota_empresa
 
 class EmpresasViewSet(StandardResponseMixin, viewsets.ModelViewSet):
-    queryset = Empresas.objects.all() # type: ignore
+    queryset = Empresas.objects.select_related('plan') # type: ignore
     serializer_class = EmpresasSerializer
     filter_backends = [SearchFilter, OrderingFilter]
     #^quecomience
@@ -75,7 +78,7 @@ class EmpresasViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         return self.error_response({'detail': 'Método no permitido.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 class EmpresasListAPIView(StandardResponseMixin, generics.ListAPIView):
-    queryset = Empresas.objects.all() # type: ignore
+    queryset = Empresas.objects.select_related('plan') # type: ignore
     serializer_class = EmpresasSerializer
 
     def list(self, request, *args, **kwargs):
@@ -90,13 +93,14 @@ class EmpresasListAPIView(StandardResponseMixin, generics.ListAPIView):
             error_code="empresas_list_error"
         )
 
-class PlanesListAPIView(StandardResponseMixin, generics.ListAPIView):
+class PlanesListAPIView(CatalogoCacheMixin, StandardResponseMixin, generics.ListAPIView):
     queryset = Planes.objects.all() # type: ignore
     serializer_class = PlanesSerializer
+    catalogo = PLANES
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        return self.paginated_list_response(
+        return self.catalogo_response(request, lambda: self.paginated_list_response(
             request,
             queryset,
             self.get_serializer_class(),
@@ -104,7 +108,7 @@ class PlanesListAPIView(StandardResponseMixin, generics.ListAPIView):
             unpaginated_message="Listado de planes obtenido correctamente",
             code="planes_list",
             error_code="planes_list_error"
-        )
+        ))
 
     def create(self, request, *args, **kwargs):
         return self.standard_create_response(
@@ -118,13 +122,40 @@ class PlanesListAPIView(StandardResponseMixin, generics.ListAPIView):
             **kwargs
         )
 
-class TribunalesListAPIView(StandardResponseMixin, generics.ListAPIView):
+class CuotaAPIView(StandardResponseMixin, APIView):
+    """Consumo y cuota restante del plan de la empresa del usuario (staff puede indicar ?empresa_id=)"""
+
+    def get(self, request):
+        try:
+            empresa_id = request.user.empresa_id
+            if request.user.is_staff and request.query_params.get('empresa_id'):
+                empresa_id = int(request.query_params['empresa_id'])
+            if not empresa_id:
+                return self.error_response(
+                    message="El usuario no pertenece a una empresa",
+                    code="empresa_required"
+                )
+            return self.success_response(
+                data=cuota_empresa(empresa_id),
+                message="Cuota del plan obtenida correctamente",
+                code="cuota_retrieved"
+            )
+        except Exception as e:
+            return self.error_response(
+                errors=str(e),
+                message="Error al obtener la cuota del plan",
+                code="cuota_error"
+            )
+
+
+class TribunalesListAPIView(CatalogoCacheMixin, StandardResponseMixin, generics.ListAPIView):
     queryset = Tribunales.objects.all() # type: ignore
     serializer_class = TribunalesSerializer
+    catalogo = TRIBUNALES
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        return self.paginated_list_response(
+        return self.catalogo_response(request, lambda: self.paginated_list_response(
             request,
             queryset,
             self.get_serializer_class(),
@@ -132,7 +163,7 @@ class TribunalesListAPIView(StandardResponseMixin, generics.ListAPIView):
             unpaginated_message="Listado de tribunales obtenido correctamente",
             code="tribunales_list",
             error_code="tribunales_list_error"
-        )
+        ))
 
 """
 # mixins
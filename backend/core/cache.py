@@ -0,0 +1,102 @@
+import time
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import quote_etag
+
+from core.metricas import contar_cache
+
+
+# Catálogos casi estáticos que se sirven desde caché
+TIPOS_PLANTILLA = 'tipos_plantilla'
+CATEGORIAS_PLANTILLA = 'categorias_plantilla'
+CLASIFICACIONES_PLANTILLA = 'clasificaciones_plantilla'
+TRIBUNALES = 'tribunales'
+PLANES = 'planes'
+CAMPOS_DISPONIBLES = 'campos_disponibles'
+
+
+def _clave_version(catalogo):
+    return f'catalogo:{catalogo}:version'
+
+
+def obtener_version_catalogo(catalogo):
+    """Retorna la versión vigente de un catálogo, inicializándola si no existe"""
+    return obtener_versiones_catalogos([catalogo])[catalogo]
+
+
+def obtener_versiones_catalogos(catalogos):
+    """Retorna un dict {catalogo: version} con una sola lectura a la caché"""
+    claves = {_clave_version(catalogo): catalogo for catalogo in catalogos}
+    encontradas = cache.get_many(list(claves))
+    versiones = {}
+    for clave, catalogo in claves.items():
+        version = encontradas.get(clave)
+        if version is None:
+            # Si la clave fue expulsada se parte desde un valor basado en el reloj
+            # para no reutilizar nunca una versión anterior con datos obsoletos
+            cache.add(clave, time.time_ns(), timeout=None)
+            version = cache.get(clave)
+        versiones[catalogo] = version
+    return versiones
+
+
+def _incrementar_version(catalogo):
+    clave = _clave_version(catalogo)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), timeout=None)
+
+
+def invalidar_catalogo(catalogo):
+    """Incrementa la versión del catálogo una vez confirmada la transacción actual"""
+    transaction.on_commit(lambda: _incrementar_version(catalogo))
+
+
+def firma_peticion(request):
+    """Firma corta de la URL completa (host, ruta y parámetros) de la petición"""
+    return hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()[:16]
+
+
+def etag_catalogo(catalogo, version, firma):
+    return quote_etag(f'{catalogo}-{version}-{firma}')
+
+
+def obtener_respuesta_catalogo(catalogo, version, firma):
+    """Retorna los bytes serializados de la respuesta cacheada, o None"""
+    contenido = cache.get(f'catalogo:{catalogo}:{version}:{firma}')
+    contar_cache('catalogo', contenido is not None, contenido is None)
+    return contenido
+
+
+def guardar_respuesta_catalogo(catalogo, version, firma, contenido):
+    cache.set(f'catalogo:{catalogo}:{version}:{firma}', contenido, settings.CATALOGO_CACHE_TIMEOUT)
+
+
+def obtener_o_construir(clave, construir, timeout=None):
+    """Retorna el valor cacheado en `clave` o lo construye y lo guarda"""
+    valor = cache.get(clave)
+    contar_cache(clave.split(':')[0], valor is not None, valor is None)
+    if valor is None:
+        valor = construir()
+        cache.set(clave, valor, timeout or settings.CATALOGO_CACHE_TIMEOUT)
+    return valor
+
+
+def obtener_fragmentos(claves, construir):
+    """
+    Multi-get de fragmentos ya serializados (bytes).
+    `claves` es {id: clave}; `construir(ids)` recibe los ids que faltan y retorna {id: bytes}.
+    """
+    encontrados = cache.get_many(list(claves.values()))
+    fragmentos = {id_: encontrados[clave] for id_, clave in claves.items() if clave in encontrados}
+    faltantes = [id_ for id_ in claves if id_ not in fragmentos]
+    contar_cache('fragmentos', len(fragmentos), len(faltantes))
+    if faltantes:
+        nuevos = construir(faltantes)
+        cache.set_many({claves[id_]: contenido for id_, contenido in nuevos.items()}, settings.FRAGMENTOS_CACHE_TIMEOUT)
+        fragmentos.update(nuevos)
+    return fragmentos
@@ -0,0 +1,161 @@
+"""
+Registro de consultas lentas con la pila de la aplicación que las emitió.
+
+vigilar_consulta es un execute_wrapper (lo instala ConsultasLentasMiddleware si
+CONSULTAS_LENTAS_ACTIVA está encendido) que toma las consultas que superan
+CONSULTAS_LENTAS_UMBRAL_MS junto con la pila recortada a los archivos del proyecto y el endpoint, usuario y empresa de la petición en curso. Las ocurrencias se
+agrupan por huella de SQL normalizado y cada CONSULTAS_LENTAS_INTERVALO segundos se escribe
+una línea JSON por huella (cantidad, percentiles y el ejemplo más lento) en el logger
+core.consultas_lentas, que settings.LOGGING envía a stderr o a CONSULTAS_LENTAS_ARCHIVO.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, empty
+
+from core.escritura_diferida import _BufferDiferido
+
+
+logger = logging.getLogger(__name__)
+
+# Petición en curso (la asigna ConsultasLentasMiddleware)
+peticion_actual = contextvars.ContextVar('peticion_actual', default=None)
+
+_re_cadenas = re.compile(r"'(?:[^']|'')*'")
+_re_numeros = re.compile(r'\b\d+(?:\.\d+)?\b')
+_re_listas = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_re_filas = re.compile(r'(\([^()]*\))(?:\s*,\s*\([^()]*\))+')
+_re_espacios = re.compile(r'\s+')
+
+# Marcos que no aportan: este módulo y el middleware que lo instala
+_ARCHIVOS_IGNORADOS = ('consultas_lentas.py', os.path.join('core', 'middleware.py'))
+
+
+def normalizar_sql(sql):
+    """SQL sin valores: literales y parámetros pasan a ?, y las listas IN / filas VALUES se colapsan"""
+    sql = sql.replace('%s', '?')
+    sql = _re_cadenas.sub('?', sql)
+    sql = _re_numeros.sub('?', sql)
+    sql = _re_listas.sub('(?, ...)', sql)
+    sql = _re_filas.sub(r'\1, ...', sql)
+    return _re_espacios.sub(' ', sql).strip()
+
+
+def huella_sql(sql):
+    normalizada = normalizar_sql(sql)
+    return hashlib.sha1(normalizada.encode('utf-8')).hexdigest()[:16], normalizada
+
+
+def _pila():
+    """Marcos del proyecto (sin librerías) más cercanos a la consulta, del más externo al más interno"""
+    raiz = str(settings.BASE_DIR)
+    marcos = [
+        f"{os.path.relpath(marco.filename, raiz)}:{marco.lineno} {marco.name}"
+        for marco in traceback.extract_stack()
+        if marco.filename.startswith(raiz)
+        and 'site-packages' not in marco.filename
+        and not marco.filename.endswith(_ARCHIVOS_IGNORADOS)
+    ]
+    return marcos[-getattr(settings, 'CONSULTAS_LENTAS_PROFUNDIDAD', 8):]
+
+
+def _contexto():
+    request = peticion_actual.get()
+    if request is None:
+        return {'endpoint': None, 'usuario_id': None, 'empresa_id': None}
+    match = getattr(request, 'resolver_match', None)
+    # DRF deja el usuario autenticado en la petición de Django; si sigue siendo el objeto
+    # perezoso de AuthenticationMiddleware sin evaluar no se evalúa (haría otra consulta)
+    usuario = request.__dict__.get('user')
+    if isinstance(usuario, SimpleLazyObject):
+        usuario = None if usuario._wrapped is empty else usuario._wrapped
+    autenticado = usuario is not None and usuario.is_authenticated
+    return {
+        'endpoint': match.view_name if match else None,
+        'usuario_id': usuario.pk if autenticado else None,
+        'empresa_id': getattr(usuario, 'empresa_id', None) if autenticado else None,
+    }
+
+
+def _percentil(ordenados, fraccion):
+    return ordenados[min(int(fraccion * len(ordenados)), len(ordenados) - 1)]
+
+
+class AgregadorConsultasLentas(_BufferDiferido):
+    """Agrupa las consultas lentas por huella y escribe un resumen por huella en cada vaciado"""
+
+    # Duraciones que se conservan por huella y ventana para calcular percentiles
+    MAX_MUESTRAS = 1000
+
+    def __repr__(self):
+        return "<AgregadorConsultasLentas>"
+
+    @property
+    def etiqueta(self):
+        return 'consultas_lentas'
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'CONSULTAS_LENTAS_INTERVALO', 60)
+
+    def registrar(self, sql, ms, pila, contexto):
+        huella, normalizada = huella_sql(sql)
+        ahora = timezone.now()
+        with self._lock:
+            datos = self._pendientes.get(huella)
+            if datos is None:
+                datos = self._pendientes[huella] = {
+                    'sql': normalizada, 'veces': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'duraciones': [], 'endpoints': {}, 'desde': ahora,
+                }
+            datos['veces'] += 1
+            datos['total_ms'] += ms
+            datos['hasta'] = ahora
+            if len(datos['duraciones']) < self.MAX_MUESTRAS:
+                datos['duraciones'].append(ms)
+            endpoint = contexto['endpoint'] or '<sin petición>'
+            datos['endpoints'][endpoint] = datos['endpoints'].get(endpoint, 0) + 1
+            if ms >= datos['max_ms']:
+                datos['max_ms'] = ms
+                datos['ejemplo'] = {'sql': sql[:2000], 'ms': round(ms, 2), 'pila': pila, **contexto}
+            self._programar()
+
+    def _escribir(self, pendientes):
+        for huella, datos in sorted(pendientes.items(), key=lambda par: par[1]['total_ms'], reverse=True):
+            duraciones = sorted(datos['duraciones'])
+            logger.info(json.dumps({
+                'huella': huella,
+                'sql': datos['sql'],
+                'veces': datos['veces'],
+                'total_ms': round(datos['total_ms'], 2),
+                'max_ms': round(datos['max_ms'], 2),
+                'p50_ms': round(_percentil(duraciones, 0.5), 2),
+                'p95_ms': round(_percentil(duraciones, 0.95), 2),
+                'p99_ms': round(_percentil(duraciones, 0.99), 2),
+                'endpoints': datos['endpoints'],
+                'desde': datos['desde'].isoformat(),
+                'hasta': datos['hasta'].isoformat(),
+                'ejemplo': datos['ejemplo'],
+            }, ensure_ascii=False))
+
+
+agregador = AgregadorConsultasLentas()
+
+
+def vigilar_consulta(execute, sql, params, many, context):
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - inicio) * 1000
+        umbral = getattr(settings, 'CONSULTAS_LENTAS_UMBRAL_MS', 0)
+        if umbral and ms >= umbral:
+            agregador.registrar(sql, ms, _pila(), _contexto())
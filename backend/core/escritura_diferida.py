@@ -0,0 +1,165 @@
+"""
+Escritura diferida (write-behind) de columnas de seguimiento como fecha_ultimo_acceso.
+
+Cada worker acumula en memoria el último valor (o los incrementos) por fila y cada
+ESCRITURA_DIFERIDA_INTERVALO segundos escribe todo en bloque, de modo que una fila
+recibe como máximo un UPDATE por intervalo aunque se toque miles de veces.
+Al terminar el proceso se vacía lo pendiente (atexit).
+"""
+import atexit
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+
+from core.metricas import fijar_pendientes
+
+
+logger = logging.getLogger(__name__)
+
+
+class _BufferDiferido(ABC):
+    """
+    Acumula cambios por clave y los escribe juntos cada ESCRITURA_DIFERIDA_INTERVALO segundos.
+    Las subclases definen etiqueta y _escribir; si falta alguno no se pueden instanciar.
+    """
+
+    def __init__(self):
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self._temporizador = None
+        atexit.register(self._vaciar_al_salir)
+
+    @property
+    def intervalo(self):
+        return getattr(settings, 'ESCRITURA_DIFERIDA_INTERVALO', 5)
+
+    @property
+    @abstractmethod
+    def etiqueta(self):
+        """Nombre del buffer en las métricas"""
+
+    def pendientes(self):
+        with self._lock:
+            return dict(self._pendientes)
+
+    def _programar(self):
+        # Se llama en cada registro (con el lock tomado): mantiene al día la métrica de pendientes
+        fijar_pendientes(self.etiqueta, len(self._pendientes))
+        # Con intervalo <= 0 no hay hilo: se vacía solo con vaciar() o al salir del proceso
+        if self._temporizador is not None or self.intervalo <= 0:
+            return
+        self._temporizador = threading.Timer(self.intervalo, self._vaciar_programado)
+        self._temporizador.daemon = True
+        self._temporizador.start()
+
+    def _vaciar_programado(self):
+        try:
+            self.vaciar()
+        except Exception:
+            logger.exception("Error al vaciar el buffer de escritura diferida %r", self)
+        finally:
+            # El hilo del temporizador abrió su propia conexión
+            connection.close()
+
+    def _vaciar_al_salir(self):
+        try:
+            self.vaciar()
+        except Exception:
+            logger.exception("No se pudo vaciar el buffer de escritura diferida %r al salir", self)
+
+    def vaciar(self):
+        """Escribe lo pendiente. Retorna la cantidad de claves enviadas"""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+        fijar_pendientes(self.etiqueta, 0)
+        if not pendientes:
+            return 0
+        self._escribir(pendientes)
+        return len(pendientes)
+
+    @abstractmethod
+    def _escribir(self, pendientes):
+        """Escribe en bloque las claves pendientes (dict clave -> valor acumulado)"""
+
+
+class BufferEscritura(_BufferDiferido):
+    """Último valor de una columna por fila (p. ej. fecha_ultimo_acceso)"""
+
+    def __init__(self, modelo, campo, tamano_lote=500):
+        # modelo como 'app_label.Modelo' para poder declarar el buffer junto al modelo
+        super().__init__()
+        self.modelo = modelo
+        self.campo = campo
+        self.tamano_lote = tamano_lote
+
+    def __repr__(self):
+        return f"<BufferEscritura {self.modelo}.{self.campo}>"
+
+    @property
+    def etiqueta(self):
+        return f"{self.modelo}.{self.campo}"
+
+    def registrar(self, pk, valor):
+        """Anota el valor para la fila; si ya había uno pendiente se conserva el mayor"""
+        with self._lock:
+            actual = self._pendientes.get(pk)
+            if actual is None or valor > actual:
+                self._pendientes[pk] = valor
+            self._programar()
+
+    def _escribir(self, pendientes):
+        Modelo = apps.get_model(self.modelo)
+        objetos = []
+        for pk, valor in pendientes.items():
+            objeto = Modelo(pk=pk)
+            setattr(objeto, self.campo, valor)
+            objetos.append(objeto)
+        # bulk_update no emite señales: el guardado no dispara reconstrucciones de índices
+        Modelo.objects.bulk_update(objetos, [self.campo], batch_size=self.tamano_lote)
+
+
+class BufferContadores(_BufferDiferido):
+    """
+    Incrementos por clave que se suman en memoria y se aplican juntos.
+    `escribir` recibe {clave: {campo: total}}; los valores numéricos se suman y
+    los demás (fechas) conservan el mayor. `combinar` reemplaza la suma de algún
+    campo por otra función (actual, nuevo) -> acumulado.
+    """
+
+    def __init__(self, escribir, nombre='', combinar=None):
+        super().__init__()
+        self._escribir_pendientes = escribir
+        self.nombre = nombre
+        self._combinar = combinar or {}
+
+    def __repr__(self):
+        return f"<BufferContadores {self.nombre}>"
+
+    @property
+    def etiqueta(self):
+        return self.nombre
+
+    def registrar(self, clave, **valores):
+        with self._lock:
+            acumulado = self._pendientes.setdefault(clave, {})
+            for campo, valor in valores.items():
+                actual = acumulado.get(campo)
+                if actual is None:
+                    acumulado[campo] = valor
+                elif campo in self._combinar:
+                    acumulado[campo] = self._combinar[campo](actual, valor)
+                elif isinstance(valor, (int, float)):
+                    acumulado[campo] = actual + valor
+                elif valor > actual:
+                    acumulado[campo] = valor
+            self._programar()
+
+    def _escribir(self, pendientes):
+        self._escribir_pendientes(pendientes)
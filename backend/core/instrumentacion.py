@@ -0,0 +1,191 @@
+"""
+Estadísticas por endpoint (nombre de URL resuelto) que alimenta InstrumentacionMiddleware:
+peticiones, consultas SQL, tiempo SQL, tiempo de serialización (render de la respuesta) y
+tiempo total, con histogramas.
+
+Cada worker acumula en memoria y cada INSTRUMENTACION_PUBLICAR_CADA segundos deja una copia en
+su propio archivo de INSTRUMENTACION_DIRECTORIO (con gunicorn, un subdirectorio del directorio
+multiproceso de Prometheus); obtener_estadisticas() combina los archivos de todos los workers.
+Cada worker escribe solo su archivo, así no hay lectura-modificación-escritura compartida. Sin
+directorio (runserver, tests) solo se ven las estadísticas del proceso que responde.
+"""
+import glob
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+
+# Límites superiores de cada cubeta; la última cubeta (sin límite) cuenta el resto
+CUBETAS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+CUBETAS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_lock = threading.Lock()
+_estadisticas = {}
+_ultima_publicacion = 0.0
+_worker = f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _cubeta(valor, cubetas):
+    for indice, limite in enumerate(cubetas):
+        if valor <= limite:
+            return indice
+    return len(cubetas)
+
+
+def _nuevo_endpoint():
+    return {
+        'peticiones': 0,
+        'errores': 0,
+        'consultas': 0,
+        'consultas_max': 0,
+        'sql_ms': 0.0,
+        'serializacion_ms': 0.0,
+        'total_ms': 0.0,
+        'total_ms_max': 0.0,
+        'histograma_ms': [0] * (len(CUBETAS_MS) + 1),
+        'histograma_consultas': [0] * (len(CUBETAS_CONSULTAS) + 1),
+    }
+
+
+def registrar_peticion(endpoint, status_code, consultas, sql_ms, serializacion_ms, total_ms):
+    global _ultima_publicacion
+    with _lock:
+        datos = _estadisticas.get(endpoint)
+        if datos is None:
+            datos = _estadisticas[endpoint] = _nuevo_endpoint()
+        datos['peticiones'] += 1
+        if status_code >= 500:
+            datos['errores'] += 1
+        datos['consultas'] += consultas
+        datos['consultas_max'] = max(datos['consultas_max'], consultas)
+        datos['sql_ms'] += sql_ms
+        datos['serializacion_ms'] += serializacion_ms
+        datos['total_ms'] += total_ms
+        datos['total_ms_max'] = max(datos['total_ms_max'], total_ms)
+        datos['histograma_ms'][_cubeta(total_ms, CUBETAS_MS)] += 1
+        datos['histograma_consultas'][_cubeta(consultas, CUBETAS_CONSULTAS)] += 1
+
+        ahora = time.monotonic()
+        publicar = ahora - _ultima_publicacion >= getattr(settings, 'INSTRUMENTACION_PUBLICAR_CADA', 10)
+        if publicar:
+            _ultima_publicacion = ahora
+            copia = _copiar()
+    if publicar:
+        publicar_copia(copia)
+
+
+def _copiar():
+    return {
+        endpoint: {**datos, 'histograma_ms': list(datos['histograma_ms']),
+                   'histograma_consultas': list(datos['histograma_consultas'])}
+        for endpoint, datos in _estadisticas.items()
+    }
+
+
+def _directorio():
+    return getattr(settings, 'INSTRUMENTACION_DIRECTORIO', '')
+
+
+def publicar_copia(copia=None):
+    """Deja las estadísticas de este worker en su archivo del directorio compartido"""
+    directorio = _directorio()
+    if not directorio:
+        return
+    if copia is None:
+        with _lock:
+            copia = _copiar()
+    os.makedirs(directorio, exist_ok=True)
+    # Se escribe a un temporal y se renombra: quien lee nunca ve un archivo a medias
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as archivo:
+        json.dump(copia, archivo)
+    os.replace(temporal, os.path.join(directorio, f'{_worker}.json'))
+
+
+def _copias():
+    """Copias de todos los workers (la del proceso actual siempre al día)"""
+    directorio = _directorio()
+    if not directorio:
+        with _lock:
+            return [_copiar()]
+    publicar_copia()
+    copias = []
+    for ruta in glob.glob(os.path.join(directorio, '*.json')):
+        try:
+            with open(ruta) as archivo:
+                copias.append(json.load(archivo))
+        except (OSError, ValueError):
+            continue
+    return copias
+
+
+def _percentil(histograma, cubetas, fraccion):
+    """Límite superior de la cubeta que contiene el percentil (None si cae en la última)"""
+    total = sum(histograma)
+    if not total:
+        return None
+    objetivo = fraccion * total
+    acumulado = 0
+    for indice, cantidad in enumerate(histograma):
+        acumulado += cantidad
+        if acumulado >= objetivo:
+            return cubetas[indice] if indice < len(cubetas) else None
+    return None
+
+
+def obtener_estadisticas(orden='total_ms'):
+    """
+    Estadísticas combinadas de todos los workers, con promedios y percentiles aproximados.
+    `endpoints` es una lista ordenada de mayor a menor por `orden` (por defecto total_ms).
+    """
+    copias = _copias()
+
+    combinadas = {}
+    for copia in copias:
+        for endpoint, datos in copia.items():
+            total = combinadas.setdefault(endpoint, _nuevo_endpoint())
+            for campo, valor in datos.items():
+                if campo.endswith('_max'):
+                    total[campo] = max(total[campo], valor)
+                elif campo.startswith('histograma'):
+                    total[campo] = [a + b for a, b in zip(total[campo], valor)]
+                else:
+                    total[campo] += valor
+
+    for datos in combinadas.values():
+        peticiones = datos['peticiones'] or 1
+        datos['consultas_promedio'] = round(datos['consultas'] / peticiones, 2)
+        datos['sql_ms_promedio'] = round(datos['sql_ms'] / peticiones, 2)
+        datos['serializacion_ms_promedio'] = round(datos['serializacion_ms'] / peticiones, 2)
+        datos['total_ms_promedio'] = round(datos['total_ms'] / peticiones, 2)
+        for nombre, fraccion in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            datos[f'total_ms_{nombre}'] = _percentil(datos['histograma_ms'], CUBETAS_MS, fraccion)
+        datos['consultas_p95'] = _percentil(datos['histograma_consultas'], CUBETAS_CONSULTAS, 0.95)
+    return {
+        'workers': len(copias),
+        # False: sin directorio compartido solo se ve el worker que respondió
+        'compartido': bool(_directorio()),
+        'cubetas_ms': CUBETAS_MS,
+        'cubetas_consultas': CUBETAS_CONSULTAS,
+        'endpoints': [
+            {'endpoint': endpoint, **datos}
+            for endpoint, datos in sorted(combinadas.items(), key=lambda par: par[1].get(orden) or 0, reverse=True)
+        ],
+    }
+
+
+def reiniciar_estadisticas():
+    with _lock:
+        _estadisticas.clear()
+    directorio = _directorio()
+    if directorio:
+        for ruta in glob.glob(os.path.join(directorio, '*.json')):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,177 @@
+"""
+Memoria por petición y reciclaje de workers.
+
+MemoriaMiddleware mide en los endpoints de MEMORIA_ENDPOINTS (subida, generación y listados) el
+RSS del proceso antes y después de la vista y el pico de tracemalloc durante ella, junto con el
+tamaño y formato de los archivos subidos y la cantidad de filas de la respuesta. Las peticiones
+cuyo pico o crecimiento de RSS superan MEMORIA_UMBRAL_MB se escriben como una línea JSON en el
+logger core.memoria (stderr o MEMORIA_ARCHIVO, ver settings.LOGGING).
+
+El hook post_request de gunicorn.conf.py llama a debe_reciclar() después de cada petición:
+si el RSS del worker superó MEMORIA_RECICLAR_MB, el worker termina la petición en curso y sale
+de forma ordenada (gunicorn levanta otro), y se registran las últimas peticiones medidas para
+saber cuáles lo llevaron hasta ahí.
+"""
+import json
+import logging
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.metricas import contar_reciclaje, observar_memoria
+
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+try:
+    _TAMANO_PAGINA = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):  # pragma: no cover - sin sysconf
+    _TAMANO_PAGINA = 4096
+
+# Últimas peticiones medidas en este proceso, para el registro del reciclaje
+recientes = deque(maxlen=20)
+
+# tracemalloc es global al proceso: con workers de varios hilos solo se traza una petición a la vez
+_traza_en_curso = threading.Lock()
+
+
+def rss_actual():
+    """RSS actual del proceso en bytes (/proc en Linux; en otros sistemas, el máximo alcanzado)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * _TAMANO_PAGINA
+    except (OSError, ValueError, IndexError):
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss viene en KB en Linux y en bytes en macOS
+        return maximo if os.uname().sysname == 'Darwin' else maximo * 1024
+
+
+def endpoints_medidos():
+    return {nombre.strip() for nombre in getattr(settings, 'MEMORIA_ENDPOINTS', '').split(',') if nombre.strip()}
+
+
+def etiquetas_peticion(request):
+    """Tamaño y formato de los archivos subidos, o el tamaño del cuerpo si no hay archivos"""
+    # Solo si la vista ya los leyó (DRF los copia a la petición de Django): leerlos aquí volvería a parsear el cuerpo
+    subidos = request.__dict__.get('_files')
+    archivos = [
+        {'nombre': archivo.name, 'formato': os.path.splitext(archivo.name)[1].lstrip('.').lower(), 'bytes': archivo.size}
+        for archivo in subidos.values()
+    ] if subidos else []
+    if archivos:
+        return {'archivos': archivos}
+    return {'bytes_peticion': int(request.META.get('CONTENT_LENGTH') or 0)}
+
+
+def filas_respuesta(response):
+    """Filas devueltas por un listado: `data` de las respuestas estándar (lista o paginada)"""
+    filas = getattr(response, 'filas', None)  # fragmentos_response la deja sin pasar por response.data
+    if filas is not None:
+        return filas
+    datos = getattr(response, 'data', None)
+    datos = datos.get('data') if isinstance(datos, dict) else datos
+    if isinstance(datos, dict) and isinstance(datos.get('results'), list):
+        return len(datos['results'])
+    return len(datos) if isinstance(datos, list) else None
+
+
+class MedicionMemoria:
+    """RSS antes y después y pico de tracemalloc de un bloque (el de la vista en el middleware)"""
+
+    def __init__(self):
+        self.trazando = False
+        self.propia = False
+
+    def __enter__(self):
+        self.rss_antes = rss_actual()
+        self.trazando = _traza_en_curso.acquire(blocking=False)
+        if self.trazando:
+            # Si ya se estaba trazando (bench, tests) se reutiliza la traza sin detenerla al salir
+            self.propia = not tracemalloc.is_tracing()
+            if self.propia:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.base = tracemalloc.get_traced_memory()[0]
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self.inicio) * 1000
+        self.pico = None
+        if self.trazando:
+            self.pico = max(0, tracemalloc.get_traced_memory()[1] - self.base)
+            if self.propia:
+                tracemalloc.stop()
+            _traza_en_curso.release()
+        self.rss_despues = rss_actual()
+        return False
+
+    def resultado(self):
+        return {
+            'rss_antes_mb': round(self.rss_antes / MB, 1),
+            'rss_despues_mb': round(self.rss_despues / MB, 1),
+            'rss_delta_mb': round((self.rss_despues - self.rss_antes) / MB, 1),
+            'pico_tracemalloc_mb': round(self.pico / MB, 1) if self.pico is not None else None,
+            'duracion_ms': round(self.ms, 1),
+        }
+
+
+def registrar(request, response, medicion):
+    """Guarda la medición entre las recientes y la escribe en el log si supera MEMORIA_UMBRAL_MB"""
+    match = getattr(request, 'resolver_match', None)
+    endpoint = match.view_name if match else '<sin resolver>'
+    usuario = getattr(request, 'user', None)
+    registro = {
+        'fecha': timezone.now().isoformat(),
+        'pid': os.getpid(),
+        'endpoint': endpoint,
+        'metodo': request.method,
+        'status': response.status_code,
+        'usuario_id': usuario.pk if usuario is not None and usuario.is_authenticated else None,
+        **medicion.resultado(),
+        **etiquetas_peticion(request),
+        'filas': filas_respuesta(response),
+    }
+    recientes.append(registro)
+    observar_memoria(endpoint, medicion.pico, medicion.rss_despues)
+
+    umbral = getattr(settings, 'MEMORIA_UMBRAL_MB', 50)
+    if umbral and max(medicion.rss_despues - medicion.rss_antes, medicion.pico or 0) >= umbral * MB:
+        logger.warning(json.dumps({'evento': 'peticion', **registro}, ensure_ascii=False))
+    return registro
+
+
+def debe_reciclar(rss=None):
+    """
+    Motivo para reciclar el worker (su RSS superó MEMORIA_RECICLAR_MB) o None. Al decidir que sí,
+    escribe el RSS y las últimas peticiones medidas del proceso.
+    """
+    limite = getattr(settings, 'MEMORIA_RECICLAR_MB', 0)
+    if not limite:
+        return None
+    rss = rss_actual() if rss is None else rss
+    if rss < limite * MB:
+        return None
+    motivo = f"RSS {rss / MB:.0f} MB >= MEMORIA_RECICLAR_MB={limite}"
+    # Si el registro falla el worker se recicla igual
+    try:
+        logger.warning(json.dumps({
+            'evento': 'reciclaje',
+            'fecha': timezone.now().isoformat(),
+            'pid': os.getpid(),
+            'rss_mb': round(rss / MB, 1),
+            'motivo': motivo,
+            'ultimas_peticiones': list(recientes),
+        }, ensure_ascii=False))
+        contar_reciclaje()
+    except Exception:
+        logger.exception("No se pudo registrar el reciclaje del worker")
+    return motivo
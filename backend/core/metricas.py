@@ -0,0 +1,171 @@
+"""
+Métricas en formato Prometheus (ver MetricasView en /metricas).
+
+prometheus_client es opcional: sin la librería todas las funciones de registro no hacen nada.
+Con gunicorn, gunicorn.conf.py define PROMETHEUS_MULTIPROC_DIR antes de cargar la aplicación;
+cada worker escribe sus valores en archivos de ese directorio y la exposición los suma, así
+cualquier worker que atienda el scrape devuelve el total. Los valores que salen de la base de
+datos (colas pendientes, conexiones del servidor) se calculan en el momento del scrape.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import connection, connections
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # pragma: no cover - dependencia opcional
+    prometheus_client = None
+
+
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST if prometheus_client else 'text/plain'
+
+# Formatos de conversión de subir_documento
+FORMATOS_CONVERSION = {'word': 'docx', 'pdf': 'pdf', 'imagen': 'ocr', 'texto': 'texto'}
+
+if prometheus_client is not None:
+    PETICION_DURACION = Histogram(
+        'ialegal_peticion_duracion_segundos', 'Duración de las peticiones por vista',
+        ['endpoint', 'metodo', 'status'],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    )
+    PETICION_CONSULTAS = Histogram(
+        'ialegal_peticion_consultas_sql', 'Consultas SQL por petición y vista', ['endpoint'],
+        buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    )
+    CONVERSION_DURACION = Histogram(
+        'ialegal_conversion_duracion_segundos', 'Duración de la extracción de texto por formato', ['formato'],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+    )
+    CONVERSION_PAGINAS = Histogram(
+        'ialegal_conversion_paginas', 'Páginas por documento convertido y formato', ['formato'],
+        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+    )
+    RENDER_PLANTILLA = Histogram(
+        'ialegal_render_plantilla_segundos', 'Tiempo de reemplazo de campos al generar un documento',
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+    )
+    CACHE_CONSULTAS = Counter(
+        'ialegal_cache_consultas', 'Lecturas de caché por uso y resultado (hit/miss)', ['cache', 'resultado'],
+    )
+    BUFFER_PENDIENTES = Gauge(
+        'ialegal_buffer_pendientes', 'Claves pendientes en los buffers de escritura diferida', ['buffer'],
+        multiprocess_mode='livesum',
+    )
+    DB_CONEXIONES = Gauge(
+        'ialegal_db_conexiones_abiertas', 'Conexiones a la base de datos abiertas por los workers',
+        multiprocess_mode='livesum',
+    )
+    PETICION_MEMORIA_PICO = Histogram(
+        'ialegal_peticion_memoria_pico_bytes', 'Pico de tracemalloc por petición en las vistas medidas', ['endpoint'],
+        buckets=tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000)),
+    )
+    WORKER_RSS = Gauge(
+        'ialegal_worker_rss_bytes', 'RSS de cada worker después de su última petición medida',
+        multiprocess_mode='liveall',
+    )
+    WORKERS_RECICLADOS = Counter(
+        'ialegal_workers_reciclados', 'Workers reciclados por superar MEMORIA_RECICLAR_MB',
+    )
+
+
+def observar_peticion(endpoint, metodo, status_code, segundos, consultas):
+    if prometheus_client is None:
+        return
+    PETICION_DURACION.labels(endpoint, metodo, str(status_code)).observe(segundos)
+    PETICION_CONSULTAS.labels(endpoint).observe(consultas)
+    DB_CONEXIONES.set(sum(1 for conexion in connections.all() if conexion.connection is not None))
+
+
+def observar_memoria(endpoint, pico_bytes, rss_bytes):
+    if prometheus_client is None:
+        return
+    if pico_bytes is not None:
+        PETICION_MEMORIA_PICO.labels(endpoint).observe(pico_bytes)
+    WORKER_RSS.set(rss_bytes)
+
+
+def contar_reciclaje():
+    if prometheus_client is not None:
+        WORKERS_RECICLADOS.inc()
+
+
+@contextmanager
+def medir_conversion(tipo):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if prometheus_client is not None:
+            CONVERSION_DURACION.labels(FORMATOS_CONVERSION.get(tipo, tipo)).observe(time.perf_counter() - inicio)
+
+
+def observar_paginas(tipo, paginas):
+    if prometheus_client is not None:
+        CONVERSION_PAGINAS.labels(FORMATOS_CONVERSION.get(tipo, tipo)).observe(paginas)
+
+
+@contextmanager
+def medir_render_plantilla():
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if prometheus_client is not None:
+            RENDER_PLANTILLA.observe(time.perf_counter() - inicio)
+
+
+def contar_cache(cache, aciertos, fallos=0):
+    if prometheus_client is None:
+        return
+    if aciertos:
+        CACHE_CONSULTAS.labels(cache, 'hit').inc(aciertos)
+    if fallos:
+        CACHE_CONSULTAS.labels(cache, 'miss').inc(fallos)
+
+
+def fijar_pendientes(buffer, cantidad):
+    if prometheus_client is not None:
+        BUFFER_PENDIENTES.labels(buffer).set(cantidad)
+
+
+class _ColectorBaseDatos:
+    """Valores que se leen de la base de datos en cada scrape"""
+
+    def collect(self):
+        EventoAnalitica = apps.get_model('documents', 'EventoAnalitica')
+        PlantillaGeneralCompartida = apps.get_model('documents', 'PlantillaGeneralCompartida')
+        yield GaugeMetricFamily(
+            'ialegal_cola_analitica_pendientes', 'Eventos de analítica sin agregar (agregar_analitica)',
+            value=EventoAnalitica.objects.count(),
+        )
+        yield GaugeMetricFamily(
+            'ialegal_cola_asignaciones_expiradas', 'Asignaciones expiradas aún activas (desactivar_asignaciones_expiradas)',
+            value=PlantillaGeneralCompartida.objects.expiradas().count(),
+        )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*), current_setting('max_connections')::int "
+                    "FROM pg_stat_activity WHERE datname = current_database()"
+                )
+                activas, maximas = cursor.fetchone()
+            yield GaugeMetricFamily('ialegal_db_conexiones_servidor', 'Conexiones a la base de datos según el servidor', value=activas)
+            yield GaugeMetricFamily('ialegal_db_conexiones_maximas', 'max_connections del servidor', value=maximas)
+
+
+def exposicion():
+    """Texto de exposición de Prometheus con las métricas de todos los workers"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        salida = prometheus_client.generate_latest(registro)
+    else:
+        salida = prometheus_client.generate_latest()
+    registro_base_datos = CollectorRegistry(auto_describe=False)
+    registro_base_datos.register(_ColectorBaseDatos())
+    return salida + prometheus_client.generate_latest(registro_base_datos)
@@ -0,0 +1,443 @@
+import logging
+import time
+import zlib
+import threading
+from contextlib import ExitStack
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from core.consultas_lentas import peticion_actual, vigilar_consulta
+from core.instrumentacion import registrar_peticion
+from core.memoria import MedicionMemoria, endpoints_medidos, registrar as registrar_memoria
+from core.metricas import observar_peticion
+from core.perfilador import MuestreadorPila
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+GZIP = 'gzip'
+BROTLI = 'br'
+ZSTD = 'zstd'
+
+# Orden de preferencia del servidor cuando el cliente acepta varias con igual q
+CODIFICACIONES_DISPONIBLES = [
+    codificacion for codificacion, disponible in (
+        (ZSTD, zstandard is not None),
+        (BROTLI, brotli is not None),
+        (GZIP, True),
+    ) if disponible
+]
+
+# Niveles por tipo de contenido. El JSON con HTML embebido comprime muy bien,
+# por lo que se usan niveles algo más altos que para el resto del texto.
+NIVELES_POR_DEFECTO = {
+    'application/json': {GZIP: 6, BROTLI: 5, ZSTD: 6},
+    'text/html': {GZIP: 6, BROTLI: 5, ZSTD: 6},
+    'text/': {GZIP: 5, BROTLI: 4, ZSTD: 3},
+    'application/javascript': {GZIP: 5, BROTLI: 4, ZSTD: 3},
+    'application/xml': {GZIP: 5, BROTLI: 4, ZSTD: 3},
+    'image/svg+xml': {GZIP: 5, BROTLI: 4, ZSTD: 3},
+}
+
+# En streaming se comprime mientras se envía: se prioriza la latencia sobre el ratio
+NIVELES_STREAMING = {GZIP: 4, BROTLI: 3, ZSTD: 3}
+
+re_accept_encoding = _lazy_re_compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+# Estadísticas del proceso: bytes ahorrados y tiempo de CPU por codificación
+_estadisticas_lock = threading.Lock()
+_estadisticas = {}
+
+
+def _registrar(codificacion, bytes_originales, bytes_comprimidos, segundos_cpu):
+    with _estadisticas_lock:
+        datos = _estadisticas.setdefault(codificacion, {
+            'respuestas': 0, 'bytes_originales': 0, 'bytes_comprimidos': 0, 'segundos_cpu': 0.0,
+        })
+        datos['respuestas'] += 1
+        datos['bytes_originales'] += bytes_originales
+        datos['bytes_comprimidos'] += bytes_comprimidos
+        datos['segundos_cpu'] += segundos_cpu
+
+
+def obtener_estadisticas_compresion():
+    """Retorna las estadísticas acumuladas del proceso con los bytes ahorrados y el ratio"""
+    with _estadisticas_lock:
+        resultado = {codificacion: dict(datos) for codificacion, datos in _estadisticas.items()}
+    for datos in resultado.values():
+        datos['bytes_ahorrados'] = datos['bytes_originales'] - datos['bytes_comprimidos']
+        datos['ratio'] = round(datos['bytes_comprimidos'] / datos['bytes_originales'], 4) if datos['bytes_originales'] else None
+    return resultado
+
+
+def reiniciar_estadisticas_compresion():
+    with _estadisticas_lock:
+        _estadisticas.clear()
+
+
+def elegir_codificacion(accept_encoding):
+    """Negocia la codificación según Accept-Encoding (con valores q) y las librerías instaladas"""
+    aceptadas = {}
+    for nombre, q in re_accept_encoding.findall(accept_encoding or ''):
+        try:
+            aceptadas[nombre.lower()] = float(q) if q else 1.0
+        except ValueError:
+            continue
+    comodin = aceptadas.get('*', 0.0)
+    mejor, mejor_q = None, 0.0
+    for codificacion in CODIFICACIONES_DISPONIBLES:
+        q = aceptadas.get(codificacion, comodin)
+        if q > mejor_q:
+            mejor, mejor_q = codificacion, q
+    return mejor
+
+
+def _comprimir(codificacion, contenido, nivel):
+    if codificacion == ZSTD:
+        return zstandard.ZstdCompressor(level=nivel).compress(contenido)
+    if codificacion == BROTLI:
+        return brotli.compress(contenido, quality=nivel)
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compresor.compress(contenido) + compresor.flush()
+
+
+class _CompresorStreaming:
+    """Interfaz común compress()/flush()/finish() para las tres codificaciones"""
+
+    def __init__(self, codificacion, nivel):
+        self.codificacion = codificacion
+        if codificacion == ZSTD:
+            self._compresor = zstandard.ZstdCompressor(level=nivel).compressobj()
+        elif codificacion == BROTLI:
+            self._compresor = brotli.Compressor(quality=nivel)
+        else:
+            self._compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, datos):
+        if self.codificacion == BROTLI:
+            return self._compresor.process(datos) + self._compresor.flush()
+        if self.codificacion == ZSTD:
+            return self._compresor.compress(datos) + self._compresor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compresor.compress(datos) + self._compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.codificacion == BROTLI:
+            return self._compresor.finish()
+        return self._compresor.flush()
+
+
+class CompresionMiddleware:
+    """
+    Comprime las respuestas de texto (JSON con HTML embebido, HTML, etc.) con zstd, brotli o gzip
+    según lo que acepte el cliente. Las respuestas streaming se comprimen por bloques y los
+    archivos ya comprimidos (PDF, imágenes, docx) se envían tal cual.
+
+    No se comprimen las respuestas con secretos: las vistas de COMPRESION_EXCLUIR_VISTAS (login,
+    tokens JWT, cambio de contraseña) y las que fijan cookies (CSRF de los formularios, sesión).
+    Comprimir un secreto junto a datos que controla el cliente permite deducirlo por el tamaño
+    de la respuesta (BREACH).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COMPRESION_ACTIVA', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.tamano_minimo = getattr(settings, 'COMPRESION_TAMANO_MINIMO', 1024)
+        self.niveles = {**NIVELES_POR_DEFECTO, **getattr(settings, 'COMPRESION_NIVELES', {})}
+        self.vistas_excluidas = set(getattr(settings, 'COMPRESION_EXCLUIR_VISTAS', ()))
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def _niveles_para(self, content_type):
+        tipo = content_type.split(';')[0].strip().lower()
+        if tipo in self.niveles:
+            return self.niveles[tipo]
+        for prefijo, niveles in self.niveles.items():
+            if prefijo.endswith('/') and tipo.startswith(prefijo):
+                return niveles
+        return None
+
+    def _contiene_secretos(self, request, response):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name in self.vistas_excluidas:
+            return True
+        # get_token() (token CSRF en la página) y la sesión se reflejan en cookies de la respuesta
+        return bool(response.cookies)
+
+    def process_response(self, request, response):
+        # Vary se agrega siempre: la respuesta depende de Accept-Encoding aunque no se comprima
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.has_header('Content-Encoding') or response.status_code == 206:
+            return response
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return response
+        if self._contiene_secretos(request, response):
+            return response
+
+        niveles = self._niveles_para(response.get('Content-Type', ''))
+        if niveles is None:
+            # PDF, imágenes, docx/zip y otros binarios ya vienen comprimidos
+            return response
+
+        codificacion = elegir_codificacion(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if codificacion is None:
+            return response
+
+        if response.streaming:
+            if getattr(response, 'is_async', False):
+                return response
+            response.streaming_content = self._comprimir_streaming(response.streaming_content, codificacion)
+            del response['Content-Length']
+        else:
+            if len(response.content) < self.tamano_minimo:
+                return response
+            inicio = time.thread_time()
+            comprimido = _comprimir(codificacion, response.content, niveles[codificacion])
+            segundos = time.thread_time() - inicio
+            if len(comprimido) >= len(response.content):
+                return response
+            _registrar(codificacion, len(response.content), len(comprimido), segundos)
+            response.content = comprimido
+            response['Content-Length'] = str(len(comprimido))
+
+        # El contenido cambió de bytes: el ETag fuerte pasa a débil (RFC 9110 8.8.1)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = codificacion
+        return response
+
+    def _comprimir_streaming(self, contenido, codificacion):
+        compresor = _CompresorStreaming(codificacion, NIVELES_STREAMING[codificacion])
+        bytes_originales = bytes_comprimidos = 0
+        segundos = 0.0
+        for bloque in contenido:
+            inicio = time.thread_time()
+            salida = compresor.compress(bloque)
+            segundos += time.thread_time() - inicio
+            bytes_originales += len(bloque)
+            bytes_comprimidos += len(salida)
+            if salida:
+                yield salida
+        inicio = time.thread_time()
+        salida = compresor.finish()
+        segundos += time.thread_time() - inicio
+        bytes_comprimidos += len(salida)
+        _registrar(codificacion, bytes_originales, bytes_comprimidos, segundos)
+        yield salida
+
+
+class _MedicionSQL:
+    """execute_wrapper que cuenta y cronometra las consultas de una petición"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide por petición la cantidad y el tiempo de las consultas SQL, el tiempo de serialización
+    (render de la respuesta de DRF o de la plantilla) y el tiempo total, y los acumula por
+    nombre de URL resuelto (ver core/instrumentacion.py) y en las métricas de Prometheus
+    (core/metricas.py). Con INSTRUMENTACION_SERVER_TIMING
+    agrega la cabecera Server-Timing. Va primero en MIDDLEWARE para medir todo lo demás.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTACION_ACTIVA', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'INSTRUMENTACION_SERVER_TIMING', False)
+
+    def __call__(self, request):
+        medicion = _MedicionSQL()
+        request._serializacion_segundos = 0.0
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(medicion))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - inicio) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.view_name if match else None) or '<sin resolver>'
+        sql_ms = medicion.segundos * 1000
+        serializacion_ms = request._serializacion_segundos * 1000
+        registrar_peticion(endpoint, response.status_code, medicion.consultas, sql_ms, serializacion_ms, total_ms)
+        observar_peticion(endpoint, request.method, response.status_code, total_ms / 1000, medicion.consultas)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'sql;dur={sql_ms:.1f};desc="{medicion.consultas} consultas", '
+                f'serializacion;dur={serializacion_ms:.1f}, total;dur={total_ms:.1f}'
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # Al ser el middleware más externo, este gancho corre justo antes de response.render()
+        inicio = time.perf_counter()
+
+        def medir_render(respuesta):
+            request._serializacion_segundos += time.perf_counter() - inicio
+
+        response.add_post_render_callback(medir_render)
+        return response
+
+
+class MemoriaMiddleware:
+    """
+    Mide RSS y pico de tracemalloc de las vistas de MEMORIA_ENDPOINTS (ver core/memoria.py).
+    El endpoint se conoce recién al resolver la URL, por eso la medición empieza en process_view
+    y termina cuando vuelve la respuesta, incluida la compresión de los middlewares internos.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MEMORIA_ACTIVA', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.endpoints = endpoints_medidos()
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            medicion = request.__dict__.pop('_medicion_memoria', None)
+            if medicion is not None:
+                medicion.__exit__(None, None, None)
+        if medicion is not None:
+            # La medición nunca hace fallar la petición que mide
+            try:
+                registrar_memoria(request, response, medicion)
+            except Exception:
+                logger.exception("No se pudo registrar la memoria de la petición")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match.view_name in self.endpoints:
+            request._medicion_memoria = MedicionMemoria().__enter__()
+        return None
+
+
+class ConsultasLentasMiddleware:
+    """
+    Instala el registro de consultas lentas (core/consultas_lentas.py) durante la petición y deja
+    la petición en un contextvar para atribuir cada consulta a su endpoint, usuario y empresa.
+    """
+
+    def __init__(self, get_response):
+        if not (getattr(settings, 'CONSULTAS_LENTAS_ACTIVA', False)
+                and getattr(settings, 'CONSULTAS_LENTAS_UMBRAL_MS', 0)):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = peticion_actual.set(request)
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(vigilar_consulta))
+                return self.get_response(request)
+        finally:
+            peticion_actual.reset(token)
+
+
+# Un solo perfil a la vez por proceso: acota el costo si varios staff lo piden juntos
+_perfil_en_curso = threading.Lock()
+
+
+class PerfiladorMiddleware:
+    """
+    Perfila por muestreo la petición cuando trae la cabecera X-Perfilar: 1 o ?perfilar=1 y quien
+    la hace es staff, y guarda el perfil (documents.PerfilPeticion, descargable desde el admin).
+    Va antes de SessionMiddleware y AuthenticationMiddleware para medirlos también, así que no hay
+    request.user: el middleware valida el token JWT de la API por su cuenta antes de tomar el
+    cerrojo o arrancar el muestreador, y una petición de alguien sin permisos no ocupa el
+    perfilador. La respuesta trae X-Perfil-Id.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILADOR_ACTIVO', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def _solicitado(self, request):
+        return request.headers.get('X-Perfilar') == '1' or request.GET.get('perfilar') == '1'
+
+    def _usuario_staff(self, request):
+        """Usuario staff del token JWT de la petición; None si no hay token válido o no es staff"""
+        try:
+            autenticado = JWTAuthentication().authenticate(request)
+        except (AuthenticationFailed, InvalidToken):
+            return None
+        usuario = autenticado[0] if autenticado else None
+        if usuario is None or not (usuario.is_staff or usuario.is_superuser):
+            return None
+        return usuario
+
+    def __call__(self, request):
+        if not self._solicitado(request):
+            return self.get_response(request)
+        usuario = self._usuario_staff(request)
+        if usuario is None or not _perfil_en_curso.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            muestreador = MuestreadorPila(threading.get_ident(), settings.PERFILADOR_INTERVALO_MS)
+            inicio = time.perf_counter()
+            muestreador.iniciar()
+            try:
+                response = self.get_response(request)
+            finally:
+                muestreador.detener()
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+        finally:
+            _perfil_en_curso.release()
+
+        if not muestreador.total_muestras:
+            return response
+        match = getattr(request, 'resolver_match', None)
+        PerfilPeticion = apps.get_model('documents', 'PerfilPeticion')
+        perfil = PerfilPeticion.objects.create(
+            usuario=usuario,
+            metodo=request.method,
+            ruta=request.get_full_path()[:500],
+            endpoint=(match.view_name if match else '') or '',
+            status_code=response.status_code,
+            duracion_ms=round(duracion_ms, 2),
+            muestras=muestreador.total_muestras,
+            intervalo_ms=settings.PERFILADOR_INTERVALO_MS,
+            perfil=muestreador.plegado(),
+        )
+        PerfilPeticion.aplicar_retencion()
+        response['X-Perfil-Id'] = str(perfil.pk)
+        return response
@@ -1,6 +1,31 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag, http_date, parse_http_date_safe
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from rest_framework import status
 
+from core.serializers import CamposDinamicosSerializerMixin, seleccion_campos, optimizar_queryset
+from core.cache import (
+    obtener_version_catalogo,
+    firma_peticion,
+    etag_catalogo,
+    obtener_respuesta_catalogo,
+    guardar_respuesta_catalogo,
+)
+
+
+def etag_coincide(etag, cabecera):
+    """Comparación débil de un ETag contra una cabecera If-None-Match / If-Match"""
+    if not cabecera:
+        return False
+    etags = parse_etags(cabecera)
+    if '*' in etags:
+        return True
+    limpio = etag.removeprefix('W/')
+    return any(candidato.removeprefix('W/') == limpio for candidato in etags)
+
 class StandardResponseMixin:
     """
     Mixin para estandarizar respuestas de éxito y error en views DRF.
@@ -18,6 +43,23 @@ class StandardResponseMixin:
             "errors": errors
         }, status=http_status)
 
+    def fragmentos_response(self, fragmentos, message="Operación exitosa", code="success", http_status=status.HTTP_200_OK):
+        """
+        Igual que success_response, pero `data` es una lista armada concatenando
+        fragmentos JSON ya serializados (bytes), sin volver a pasar por el serializer.
+        """
+        resto = JSONRenderer().render({
+            "message": message,
+            "status": "success",
+            "code": code,
+            "http_status": http_status,
+            "errors": None
+        })
+        contenido = b'{"data":[' + b','.join(fragmentos) + b'],' + resto[1:]
+        response = HttpResponse(contenido, content_type='application/json', status=http_status)
+        response.filas = len(fragmentos)  # Filas del listado para la medición de memoria (core/memoria.py)
+        return response
+
     def error_response(self, errors=None, message="Ocurrió un error", code="error", http_status=status.HTTP_400_BAD_REQUEST, data=None):
         """
         Devuelve una respuesta estándar para errores.
@@ -71,11 +113,26 @@ class StandardResponseMixin:
         )
 
 
+    def optimizar_campos_queryset(self, queryset, serializer_class=None):
+        """Aplica ?fields= / ?exclude= / ?expand= al queryset en las lecturas"""
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET' or seleccion_campos(request) is None:
+            return queryset
+        serializer_class = serializer_class or self.get_serializer_class()
+        if not issubclass(serializer_class, CamposDinamicosSerializerMixin):
+            return queryset
+        return optimizar_queryset(queryset, serializer_class(context=self.get_serializer_context()))
+
+    def filter_queryset(self, queryset):
+        return self.optimizar_campos_queryset(super().filter_queryset(queryset))
+
     def paginated_list_response(self, request, queryset, serializer_class, paginated_message, unpaginated_message, code, error_code):
         try:
+            queryset = self.optimizar_campos_queryset(queryset, serializer_class)
+            context = self.get_serializer_context()
             page = self.paginate_queryset(queryset)
             if page is not None:
-                serializer = serializer_class(page, many=True)
+                serializer = serializer_class(page, many=True, context=context)
                 paginated = self.get_paginated_response(serializer.data).data
                 return self.success_response(
                     data=paginated,
@@ -83,7 +140,7 @@ class StandardResponseMixin:
                     code=code,
                     http_status=status.HTTP_200_OK
                 )
-            serializer = serializer_class(queryset, many=True)
+            serializer = serializer_class(queryset, many=True, context=context)
             return self.success_response(
                 data=serializer.data,
                 message=unpaginated_message,
@@ -113,4 +170,82 @@ class StandardResponseMixin:
                 message=error_message,
                 code=error_code,
                 http_status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+
+class CatalogoCacheMixin:
+    """
+    Mixin para listados de catálogos casi estáticos.
+    Guarda en caché los bytes ya serializados de la respuesta, versionados por catálogo,
+    y agrega ETag / Cache-Control para que el navegador pueda revalidar sin recalcular.
+    """
+    catalogo = None
+
+    def catalogo_response(self, request, construir_respuesta):
+        version = obtener_version_catalogo(self.catalogo)
+        firma = firma_peticion(request)
+        etag = etag_catalogo(self.catalogo, version, firma)
+
+        if etag_coincide(etag, request.META.get('HTTP_IF_NONE_MATCH')):
+            response = HttpResponseNotModified()
+        else:
+            contenido = obtener_respuesta_catalogo(self.catalogo, version, firma)
+            if contenido is None:
+                respuesta = construir_respuesta()
+                # Los errores no se guardan en caché
+                if respuesta.status_code != status.HTTP_200_OK:
+                    return respuesta
+                contenido = JSONRenderer().render(respuesta.data)
+                guardar_respuesta_catalogo(self.catalogo, version, firma, contenido)
+            response = HttpResponse(contenido, content_type='application/json')
+
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=settings.CATALOGO_CACHE_MAX_AGE)
+        return response
+
+
+class PeticionCondicionalMixin:
+    """
+    Mixin para GET condicionales (ETag / Last-Modified) y actualizaciones con If-Match
+    sobre modelos que tienen `revision` y `fecha_actualizacion`.
+    """
+
+    def get_etag(self, instance):
+        return quote_etag(f'{instance._meta.model_name}-{instance.pk}-{instance.revision}')
+
+    def agregar_cabeceras_validacion(self, response, instance):
+        response['ETag'] = self.get_etag(instance)
+        response['Last-Modified'] = http_date(instance.fecha_actualizacion.timestamp())
+        return response
+
+    def respuesta_no_modificada(self, request, instance):
+        """Retorna un 304 si el cliente ya tiene la versión actual, sin ejecutar el serializer"""
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            no_modificado = etag_coincide(self.get_etag(instance), if_none_match)
+        else:
+            desde = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+            no_modificado = desde is not None and int(instance.fecha_actualizacion.timestamp()) <= desde
+        if no_modificado:
+            return self.agregar_cabeceras_validacion(HttpResponseNotModified(), instance)
+        return None
+
+    def precondicion_fallida(self, request, instance):
+        """
+        Retorna un 412 si el If-Match enviado no corresponde a la revisión actual.
+        Debe llamarse dentro de transaction.atomic() para bloquear la fila hasta guardar.
+        """
+        if_match = request.META.get('HTTP_IF_MATCH')
+        if not if_match:
+            return None
+        instance.revision = type(instance).objects.select_for_update().filter(
+            pk=instance.pk
+        ).values_list('revision', flat=True).first()
+        # Comparación débil: la compresión de respuestas convierte los ETag en W/"..."
+        if etag_coincide(self.get_etag(instance), if_match):
+            return None
+        return self.agregar_cabeceras_validacion(self.error_response(
+            errors="El recurso fue modificado por otra petición",
+            message="Precondición fallida",
+            code="precondition_failed",
+            http_status=status.HTTP_412_PRECONDITION_FAILED
+        ), instance)
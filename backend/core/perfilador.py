@@ -0,0 +1,64 @@
+"""
+Perfilador por muestreo para una sola petición (ver PerfiladorMiddleware).
+
+Un hilo aparte toma cada PERFILADOR_INTERVALO_MS la pila del hilo que atiende la petición
+(sys._current_frames) y cuenta cuántas veces aparece cada pila. El resultado se guarda en
+formato "folded" (una línea "raíz;...;hoja cantidad" por pila), que leen directamente
+flamegraph.pl, speedscope e inferno. El hilo que atiende la petición no se instrumenta,
+así el costo no depende de cuántas funciones llame.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+
+class MuestreadorPila:
+    def __init__(self, hilo_id, intervalo_ms):
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo_ms / 1000
+        self.muestras = Counter()
+        self._etiquetas = {}
+        self._raiz = str(settings.BASE_DIR)
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='perfilador', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+    def _etiqueta(self, codigo):
+        etiqueta = self._etiquetas.get(codigo)
+        if etiqueta is None:
+            archivo = codigo.co_filename
+            if archivo.startswith(self._raiz):
+                archivo = os.path.relpath(archivo, self._raiz)
+            else:
+                # Librerías: desde site-packages (o el nombre del archivo) para que sea legible
+                archivo = archivo.rpartition('site-packages' + os.sep)[2]
+            etiqueta = f"{codigo.co_name} ({archivo}:{codigo.co_firstlineno})".replace(';', ',')
+            self._etiquetas[codigo] = etiqueta
+        return etiqueta
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            marco = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while marco is not None:
+                pila.append(self._etiqueta(marco.f_code))
+                marco = marco.f_back
+            if pila:
+                self.muestras[';'.join(reversed(pila))] += 1
+
+    @property
+    def total_muestras(self):
+        return sum(self.muestras.values())
+
+    def plegado(self):
+        """Perfil en formato folded, de la pila más frecuente a la menos frecuente"""
+        return '\n'.join(f'{pila} {cantidad}' for pila, cantidad in self.muestras.most_common())
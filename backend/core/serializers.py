@@ -0,0 +1,121 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+# Campos que las vistas condicionales usan para ETag / Last-Modified
+CAMPOS_VALIDACION = ('revision', 'fecha_actualizacion')
+
+
+def _lista_parametro(request, nombre):
+    valor = request.query_params.get(nombre) if request is not None and hasattr(request, 'query_params') else None
+    if not valor:
+        return None
+    return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+
+def seleccion_campos(request):
+    """
+    Lee ?fields=, ?exclude= y ?expand= de la petición.
+    Retorna None si no se envió ninguno (salida completa, sin cambios).
+    """
+    fields = _lista_parametro(request, 'fields')
+    exclude = _lista_parametro(request, 'exclude')
+    expand = _lista_parametro(request, 'expand')
+    if fields is None and exclude is None and expand is None:
+        return None
+    return {'fields': fields, 'exclude': exclude or set(), 'expand': expand or set()}
+
+
+class CamposDinamicosSerializerMixin:
+    """
+    Permite al cliente pedir solo las columnas que usa:
+    ?fields=id,nombre  ?exclude=html_con_campos  ?expand=tipo,campos_asociados
+
+    Sin estos parámetros la salida es la de siempre. Con cualquiera de ellos, las relaciones
+    declaradas en Meta.expandable_fields se devuelven como ids salvo que se pidan en expand.
+    `expandable_fields` es un dict {campo: [lookups adicionales para prefetch_related]}.
+    Solo aplica al serializer raíz; los anidados se serializan completos.
+    """
+
+    def _es_raiz(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        seleccion = seleccion_campos(self.context.get('request'))
+        if seleccion is None or not self._es_raiz():
+            return fields
+
+        for nombre in getattr(self.Meta, 'expandable_fields', {}):
+            if nombre in fields and nombre not in seleccion['expand']:
+                anidado = fields[nombre]
+                many = isinstance(anidado, serializers.ListSerializer)
+                fields[nombre] = serializers.PrimaryKeyRelatedField(
+                    source=anidado.source,
+                    many=many,
+                    read_only=True,
+                )
+
+        if seleccion['fields'] is not None:
+            fields = {nombre: campo for nombre, campo in fields.items() if nombre in seleccion['fields']}
+        for nombre in seleccion['exclude']:
+            fields.pop(nombre, None)
+        return fields
+
+
+def optimizar_queryset(queryset, serializer):
+    """
+    Ajusta el queryset a los campos que realmente va a leer el serializer:
+    .only() con las columnas usadas, select_related para FKs expandidas y
+    prefetch_related para relaciones múltiples.
+    """
+    model = queryset.model
+    expandibles = getattr(getattr(serializer, 'Meta', None), 'expandable_fields', {})
+    columnas = {model._meta.pk.name}
+    select, prefetch = [], []
+
+    for nombre, campo in serializer.fields.items():
+        source = campo.source
+        if source == '*' or not source:
+            # SerializerMethodField y similares pueden leer cualquier atributo
+            columnas = None
+            continue
+        partes = source.split('.')
+        try:
+            model_field = model._meta.get_field(partes[0])
+        except FieldDoesNotExist:
+            # Propiedades o métodos del modelo: no se sabe qué columnas leen
+            columnas = None
+            continue
+
+        es_anidado = isinstance(campo, serializers.BaseSerializer)
+        if es_anidado:
+            prefetch.extend(expandibles.get(nombre, []))
+        if model_field.many_to_many or model_field.one_to_many:
+            prefetch.append(partes[0])
+        elif model_field.is_relation:
+            if es_anidado or len(partes) > 1:
+                select.append(partes[0])
+            if columnas is not None:
+                # Un FK recorrido con select_related no puede quedar diferido
+                columnas.add(model_field.name)
+        elif columnas is not None:
+            columnas.add(model_field.name)
+
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if columnas is not None:
+        existentes = {field.name for field in model._meta.concrete_fields}
+        columnas.update(campo for campo in CAMPOS_VALIDACION if campo in existentes)
+        # Los FKs que la vista ya carga con select_related / prefetch_related tampoco pueden quedar diferidos
+        if isinstance(queryset.query.select_related, dict):
+            columnas.update(queryset.query.select_related)
+        for lookup in queryset._prefetch_related_lookups:
+            nombre = getattr(lookup, 'prefetch_through', lookup).split('__')[0]
+            if nombre in existentes:
+                columnas.add(nombre)
+        queryset = queryset.only(*columnas)
+    return queryset
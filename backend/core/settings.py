@@ -3,6 +3,7 @@ from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
 
+from django.core.exceptions import ImproperlyConfigured
 from django.templatetags.static import static
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
@@ -48,7 +49,12 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentacionMiddleware',
+    'core.middleware.MemoriaMiddleware',
+    'core.middleware.ConsultasLentasMiddleware',
+    'core.middleware.PerfiladorMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompresionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -290,6 +296,145 @@ DATABASES = {
     }
 }
 
+# Caché
+# En producción con varios workers usar un backend compartido (Redis, Memcached o DatabaseCache)
+# para que las versiones de los catálogos se invaliden en todos los procesos.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', 'ailegal')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    }
+}
+
+# Catálogos (tipos, categorías, clasificaciones, tribunales, planes y campos)
+CATALOGO_CACHE_TIMEOUT = int(os.getenv('CATALOGO_CACHE_TIMEOUT', '86400'))
+CATALOGO_CACHE_MAX_AGE = int(os.getenv('CATALOGO_CACHE_MAX_AGE', '60'))
+
+# Fragmentos JSON pre-serializados (resúmenes de plantillas), versionados por revisión
+FRAGMENTOS_CACHE_TIMEOUT = int(os.getenv('FRAGMENTOS_CACHE_TIMEOUT', '86400'))
+
+# Sincronización incremental: máximo de registros de cambio por respuesta
+SINCRONIZACION_LIMITE = int(os.getenv('SINCRONIZACION_LIMITE', '500'))
+# Segundos que se espera antes de avanzar el cursor sobre un cambio (transacciones aún sin confirmar)
+SINCRONIZACION_MARGEN_SEGUNDOS = int(os.getenv('SINCRONIZACION_MARGEN_SEGUNDOS', '5'))
+# Días que se conserva el registro de cambios; un cursor más antiguo recibe el estado completo
+SINCRONIZACION_RETENCION_DIAS = int(os.getenv('SINCRONIZACION_RETENCION_DIAS', '30'))
+
+# Máximo de operaciones por llamada a /batch/
+BATCH_MAX_OPERACIONES = int(os.getenv('BATCH_MAX_OPERACIONES', '25'))
+
+# Compresión de respuestas (zstd y brotli se usan solo si están instalados)
+COMPRESION_ACTIVA = os.getenv('COMPRESION_ACTIVA', 'True') == 'True'
+COMPRESION_TAMANO_MINIMO = int(os.getenv('COMPRESION_TAMANO_MINIMO', '1024'))
+# Vistas (url_name) cuyas respuestas llevan tokens o contraseñas y no se comprimen (BREACH)
+COMPRESION_EXCLUIR_VISTAS = [
+    vista.strip() for vista in os.getenv(
+        'COMPRESION_EXCLUIR_VISTAS', 'rest_login,rest_logout,rest_password_change,token_refresh,token_verify'
+    ).split(',') if vista.strip()
+]
+
+# Segundos entre vaciados del buffer de escritura diferida (fecha_ultimo_acceso). 0 = solo al salir
+ESCRITURA_DIFERIDA_INTERVALO = int(os.getenv('ESCRITURA_DIFERIDA_INTERVALO', '5'))
+
+# Vida media (días) del puntaje de popularidad de UsoPlantilla
+USO_PLANTILLAS_VIDA_MEDIA_DIAS = float(os.getenv('USO_PLANTILLAS_VIDA_MEDIA_DIAS', '14'))
+if USO_PLANTILLAS_VIDA_MEDIA_DIAS <= 0:
+    raise ImproperlyConfigured("USO_PLANTILLAS_VIDA_MEDIA_DIAS debe ser mayor que 0")
+
+# Cuotas de los planes: con CUOTAS_ACTIVAS=False se cuenta el consumo pero no se bloquea
+CUOTAS_ACTIVAS = os.getenv('CUOTAS_ACTIVAS', 'True') == 'True'
+CUOTAS_CACHE_TIMEOUT = int(os.getenv('CUOTAS_CACHE_TIMEOUT', '60'))
+
+# Métricas por endpoint (consultas, tiempos) en /instrumentacion/; Server-Timing es opcional
+INSTRUMENTACION_ACTIVA = os.getenv('INSTRUMENTACION_ACTIVA', 'True') == 'True'
+INSTRUMENTACION_SERVER_TIMING = os.getenv('INSTRUMENTACION_SERVER_TIMING', 'False') == 'True'
+INSTRUMENTACION_PUBLICAR_CADA = int(os.getenv('INSTRUMENTACION_PUBLICAR_CADA', '10'))
+# Directorio donde cada worker publica sus métricas; con gunicorn.conf.py, dentro del de Prometheus
+INSTRUMENTACION_DIRECTORIO = os.getenv('INSTRUMENTACION_DIRECTORIO') or (
+    os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], 'instrumentacion')
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR') else ''
+)
+
+# Con CONSULTAS_LENTAS_ACTIVA, las consultas que superan el umbral (ms) se agrupan por huella y se
+# escriben cada CONSULTAS_LENTAS_INTERVALO segundos como JSON por línea en CONSULTAS_LENTAS_ARCHIVO
+# (vacío = stderr)
+CONSULTAS_LENTAS_ACTIVA = os.getenv('CONSULTAS_LENTAS_ACTIVA', 'False') == 'True'
+CONSULTAS_LENTAS_UMBRAL_MS = float(os.getenv('CONSULTAS_LENTAS_UMBRAL_MS', '200'))
+CONSULTAS_LENTAS_INTERVALO = int(os.getenv('CONSULTAS_LENTAS_INTERVALO', '60'))
+CONSULTAS_LENTAS_PROFUNDIDAD = int(os.getenv('CONSULTAS_LENTAS_PROFUNDIDAD', '8'))
+CONSULTAS_LENTAS_ARCHIVO = os.getenv('CONSULTAS_LENTAS_ARCHIVO', '')
+
+# Token (Bearer) que debe enviar Prometheus a /metricas; vacío = endpoint desactivado
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+
+# Perfilador por muestreo a pedido (staff, X-Perfilar: 1 o ?perfilar=1); se guardan los últimos PERFILADOR_RETENCION
+PERFILADOR_ACTIVO = os.getenv('PERFILADOR_ACTIVO', 'False') == 'True'
+PERFILADOR_INTERVALO_MS = float(os.getenv('PERFILADOR_INTERVALO_MS', '5'))
+PERFILADOR_RETENCION = int(os.getenv('PERFILADOR_RETENCION', '50'))
+
+# Memoria por petición (RSS y pico de tracemalloc) en subidas, generación y listados; las que
+# superan MEMORIA_UMBRAL_MB se escriben en MEMORIA_ARCHIVO (vacío = stderr). Con MEMORIA_RECICLAR_MB (0 = nunca)
+# el hook post_request de gunicorn.conf.py recicla el worker que supere ese RSS
+MEMORIA_ACTIVA = os.getenv('MEMORIA_ACTIVA', 'False') == 'True'
+MEMORIA_ENDPOINTS = os.getenv('MEMORIA_ENDPOINTS', ','.join([
+    'documentosubido-subir-documento', 'plantilladocumento-generar-documento', 'plantilladocumento-list',
+    'plantilladocumento-disponibles', 'documentogenerado-list', 'documentosubido-list', 'plantillageneral-list',
+    'usuarios-list',
+]))
+MEMORIA_UMBRAL_MB = float(os.getenv('MEMORIA_UMBRAL_MB', '50'))
+MEMORIA_RECICLAR_MB = float(os.getenv('MEMORIA_RECICLAR_MB', '0'))
+MEMORIA_ARCHIVO = os.getenv('MEMORIA_ARCHIVO', '')
+
+
+
+def _manejador_registro(archivo):
+    """
+    Handler de un registro JSON por línea: stderr por defecto, o el archivo indicado con
+    WatchedFileHandler, que reabre el archivo cuando un logrotate externo lo mueve. No se rota
+    desde Python porque cada worker de gunicorn rotaría el mismo archivo por su cuenta.
+    El handler no crea carpetas: la del archivo se crea aquí, una vez al cargar la configuración.
+    """
+    if not archivo:
+        return {'class': 'logging.StreamHandler', 'formatter': 'mensaje'}
+    carpeta = os.path.dirname(archivo)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    return {
+        'class': 'logging.handlers.WatchedFileHandler',
+        'filename': archivo,
+        'encoding': 'utf-8',
+        # El archivo se crea recién al escribir la primera línea
+        'delay': True,
+        'formatter': 'mensaje',
+    }
+
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'mensaje': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'consultas_lentas': _manejador_registro(CONSULTAS_LENTAS_ARCHIVO),
+        'memoria': _manejador_registro(MEMORIA_ARCHIVO),
+    },
+    'loggers': {
+        'core.consultas_lentas': {
+            'handlers': ['consultas_lentas'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.memoria': {
+            'handlers': ['memoria'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,132 @@
+"""
+Ayudas compartidas por las pruebas de varias apps (no contiene pruebas).
+
+Sembrado crea un conjunto de datos proporcional a una escala con los tres roles principales;
+lo usan el presupuesto de consultas (core/tests_presupuestos.py) y el bench de documents.
+"""
+from django.contrib.auth.models import Group
+
+from companies.models import Empresas, Planes
+from documents import analitica
+from documents.models import (
+    CampoDisponible,
+    CampoPlantilla,
+    CategoriaPlantillaDocumento,
+    ClasificacionPlantillaGeneral,
+    DocumentoGenerado,
+    DocumentoSubido,
+    PlantillaCompartida,
+    PlantillaDocumento,
+    PlantillaFavorita,
+    PlantillaGeneral,
+    TipoPlantillaDocumento,
+    UsoPlantilla,
+    buffer_accesos_asignaciones,
+    buffer_usos_plantillas,
+)
+from users.models import Perfil, Usuarios
+
+
+class Sembrado:
+    """
+    Datos de prueba proporcionales a `escala`: cada rol tiene escala plantillas propias con campos,
+    compartidas, favoritas, documentos generados y subidos, y paquetes asignados. Llamarlo de nuevo
+    agrega otro lote (con otros nombres) sobre los datos existentes.
+    """
+
+    def __init__(self, escala, lote):
+        self.escala = escala
+        self.lote = lote
+
+    def nombre(self, texto):
+        return f"{texto} {self.lote}"
+
+    def sembrar(self):
+        escala = self.escala
+        plan = Planes.objects.create(
+            nombre=self.nombre("Plan"), tipo_plan="Premium", precio=0, cantidad_users=10000,
+            cantidad_escritos=10000, cantidad_demandas=10000, cantidad_contratos=10000,
+        )
+        self.empresa = Empresas.objects.create(
+            nombre=self.nombre("Empresa"), rut=f"{self.lote}-K", correo=f"e{self.lote}@e.com", plan=plan
+        )
+        grupo_admin, _ = Group.objects.get_or_create(name='Admin')
+        self.usuarios = {
+            'superusuario': Usuarios.objects.create_superuser(
+                username=f"super{self.lote}", password="x", empresa=self.empresa
+            ),
+            'admin': Usuarios.objects.create_user(username=f"admin{self.lote}", password="x", empresa=self.empresa),
+            'usuario': Usuarios.objects.create_user(username=f"usuario{self.lote}", password="x", empresa=self.empresa),
+        }
+        self.usuarios['admin'].groups.add(grupo_admin)
+        colegas = [
+            Usuarios.objects.create_user(username=f"colega{self.lote}-{i}", password="x", empresa=self.empresa)
+            for i in range(escala)
+        ]
+        for usuario in [*self.usuarios.values(), *colegas]:
+            Perfil.objects.get_or_create(usuario=usuario)
+
+        tipo = TipoPlantillaDocumento.objects.create(nombre=self.nombre("Escrito"))
+        categoria = CategoriaPlantillaDocumento.objects.create(nombre=self.nombre("Civil"))
+        clasificacion = ClasificacionPlantillaGeneral.objects.create(
+            nombre=self.nombre("Clasificación"), creado_por=self.usuarios['superusuario']
+        )
+        campos = [
+            CampoDisponible.objects.create(nombre=self.nombre(f"campo {i}"), tipo_dato='texto')
+            for i in range(escala)
+        ]
+
+        self.objetos = {}
+        for rol, usuario in self.usuarios.items():
+            plantillas = []
+            for i in range(escala):
+                plantilla = PlantillaDocumento.objects.create(
+                    nombre=self.nombre(f"Plantilla {rol} {i}"), usuario=usuario, tipo=tipo, categoria=categoria,
+                    clasificacion=clasificacion, html_con_campos="<p>{{campo_a}} {{campo_b}}</p>" * 20,
+                )
+                CampoPlantilla.objects.create(plantilla=plantilla, campo=campos[i], nombre_variable='campo_a')
+                CampoPlantilla.objects.create(plantilla=plantilla, campo=campos[-1 - i], nombre_variable='campo_b')
+                plantillas.append(plantilla)
+                PlantillaFavorita.objects.create(usuario=usuario, plantilla=plantilla)
+                DocumentoGenerado.objects.create(
+                    nombre=self.nombre(f"Documento {rol} {i}"), plantilla=plantilla, usuario=usuario,
+                    datos_rellenados={'campo_a': 'a', 'campo_b': 'b'}, html_resultante="<p>a b</p>" * 20,
+                )
+                UsoPlantilla.registrar(usuario, plantilla.id)
+            compartidas = [
+                PlantillaCompartida.objects.create(plantilla=plantilla, usuario=colega)
+                for plantilla, colega in zip(plantillas, colegas)
+            ]
+            for colega in colegas:
+                ajena = PlantillaDocumento.objects.create(
+                    nombre=self.nombre(f"Ajena {colega.username} {rol}"), usuario=colega, tipo=tipo,
+                    html_con_campos="<p>{{campo_a}}</p>",
+                )
+                PlantillaCompartida.objects.create(plantilla=ajena, usuario=usuario)
+            subidos = [
+                DocumentoSubido.objects.create(
+                    usuario=usuario, nombre_original=f"{rol}-{i}.docx", tipo="word", archivo_url="", html="<p>x</p>" * 20
+                )
+                for i in range(escala)
+            ]
+            paquete = PlantillaGeneral.objects.create(
+                clasificacion=clasificacion, nombre=self.nombre(f"Paquete {rol}"),
+                creado_por_admin=self.usuarios['superusuario'],
+            )
+            paquete.plantillas_incluidas.set(plantillas)
+            paquete.asignar_a_usuarios([usuario.id, *[colega.id for colega in colegas]], self.usuarios['superusuario'])
+            self.objetos[rol] = {
+                'plantilla': plantillas[0],
+                'documento_generado': DocumentoGenerado.objects.filter(usuario=usuario).first(),
+                'documento_subido': subidos[0],
+                'compartida': compartidas[0],
+                'paquete': paquete,
+                'asignacion': paquete.asignaciones.get(usuario=usuario),
+                'campo': campos[0],
+                'usuario': colegas[0],
+                'perfil': Perfil.objects.get(usuario=usuario),
+            }
+        buffer_usos_plantillas.vaciar()
+        buffer_accesos_asignaciones.vaciar()
+        analitica.agregar_eventos()
+        return self
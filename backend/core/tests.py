@@ -0,0 +1,658 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import docx
+from docx.enum.text import WD_BREAK
+from datetime import timedelta
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from companies.models import Planes, Tribunales
+from users.models import Usuarios
+from documents.models import TipoPlantillaDocumento, PlantillaDocumento, CampoDisponible, CampoPlantilla, DocumentoSubido
+from core import memoria, metricas
+from core import settings as core_settings
+from core.consultas_lentas import agregador, normalizar_sql
+from core.perfilador import MuestreadorPila
+from core.escritura_diferida import BufferEscritura, _BufferDiferido
+from core import instrumentacion
+from core.instrumentacion import reiniciar_estadisticas
+from documents.models import PerfilPeticion
+from core.middleware import (
+    CompresionMiddleware,
+    ConsultasLentasMiddleware,
+    PerfiladorMiddleware,
+    elegir_codificacion,
+    obtener_estadisticas_compresion,
+    reiniciar_estadisticas_compresion,
+)
+
+
+class CatalogoCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        TipoPlantillaDocumento.objects.create(nombre="Contrato") # type: ignore
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get(reverse('tipos-plantilla-list'))
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+        self.assertIn('max-age', first['Cache-Control'])
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('tipos-plantilla-list'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_not_modified(self):
+        first = self.client.get(reverse('planes-list'))
+        response = self.client.get(reverse('planes-list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_bumps_catalog_version(self):
+        first = self.client.get(reverse('tribunales-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Tribunales.objects.create(nombre="Tribunal 1") # type: ignore
+        second = self.client.get(reverse('tribunales-list'))
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertIn("Tribunal 1", second.content.decode())
+
+    def test_delete_bumps_catalog_version(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            plan = Planes.objects.create(nombre="Plan Test", tipo_plan="Premium", precio=100.0) # type: ignore
+        first = self.client.get(reverse('planes-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            plan.delete()
+        second = self.client.get(reverse('planes-list'))
+        self.assertNotIn("Plan Test", second.content.decode())
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+
+class PeticionCondicionalTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.plantilla = PlantillaDocumento.objects.create( # type: ignore
+            nombre="Plantilla 1", html_con_campos="<p>{{rut}}</p>", usuario=self.user
+        )
+        self.url = reverse('plantilladocumento-detail', args=[self.plantilla.id])
+
+    def test_if_none_match_returns_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.client.get(self.url)['ETag']
+        updated = self.client.patch(self.url, {"nombre": "Cambio 1"}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(updated.status_code, 200)
+        self.assertNotEqual(updated['ETag'], etag)
+        response = self.client.patch(self.url, {"nombre": "Cambio 2"}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.plantilla.refresh_from_db()
+        self.assertEqual(self.plantilla.nombre, "Cambio 1")
+
+    def test_field_change_bumps_revision(self):
+        revision = self.plantilla.revision
+        campo = CampoDisponible.objects.create(nombre="RUT", tipo_dato="texto") # type: ignore
+        CampoPlantilla.objects.create(plantilla=self.plantilla, campo=campo, nombre_variable="rut") # type: ignore
+        self.plantilla.refresh_from_db()
+        self.assertEqual(self.plantilla.revision, revision + 1)
+
+
+class BootstrapTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        TipoPlantillaDocumento.objects.create(nombre="Contrato") # type: ignore
+
+    def crear_plantillas(self, cantidad):
+        campo, _ = CampoDisponible.objects.get_or_create(nombre="RUT", tipo_dato="texto") # type: ignore
+        for i in range(cantidad):
+            plantilla = PlantillaDocumento.objects.create( # type: ignore
+                nombre=f"Plantilla {i}", html_con_campos="<p>{{rut}}</p>", usuario=self.user
+            )
+            CampoPlantilla.objects.create(plantilla=plantilla, campo=campo, nombre_variable="rut") # type: ignore
+
+    def bootstrap(self, **params):
+        # Usuario recién cargado, como en cada petición autenticada por JWT
+        self.client.force_authenticate(user=Usuarios.objects.get(pk=self.user.pk))
+        response = self.client.get(reverse('bootstrap'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_returns_all_sections(self):
+        self.crear_plantillas(2)
+        data = self.bootstrap()
+        self.assertEqual(
+            set(data),
+            {'me', 'perfil', 'tipos_plantilla', 'categorias_plantilla', 'clasificaciones', 'plantillas', 'favoritos'}
+        )
+        self.assertEqual(len(data['plantillas']['data']), 2)
+        self.assertEqual(data['me']['data']['user_info']['username'], "user1")
+
+    def test_query_count_does_not_grow_with_templates(self):
+        self.crear_plantillas(1)
+        with CaptureQueriesContext(connection) as pocas:
+            self.bootstrap()
+        cache.clear()
+        self.crear_plantillas(10)
+        with CaptureQueriesContext(connection) as muchas:
+            self.bootstrap()
+        self.assertEqual(len(pocas), len(muchas))
+
+    def test_known_versions_are_skipped(self):
+        data = self.bootstrap()
+        versiones = ','.join(f"{seccion}:{valor['version']}" for seccion, valor in data.items())
+        data = self.bootstrap(versiones=versiones)
+        self.assertTrue(all(valor['sin_cambios'] for valor in data.values()))
+        with self.captureOnCommitCallbacks(execute=True):
+            TipoPlantillaDocumento.objects.create(nombre="Escrito") # type: ignore
+        data = self.bootstrap(versiones=versiones)
+        self.assertFalse(data['tipos_plantilla']['sin_cambios'])
+        self.assertTrue(data['categorias_plantilla']['sin_cambios'])
+
+
+class BatchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.plantilla = PlantillaDocumento.objects.create( # type: ignore
+            nombre="Plantilla 1", html_con_campos="<p></p>", usuario=self.user
+        )
+        self.url = f"/documents/v1/plantillas-documentos/{self.plantilla.id}/"
+
+    def test_operations_run_in_order(self):
+        response = self.client.post(reverse('batch'), {
+            "operaciones": [
+                {"id": "a", "method": "PATCH", "path": self.url, "body": {"nombre": "Nuevo"}},
+                {"id": "b", "method": "GET", "path": self.url},
+                {"id": "c", "method": "POST", "path": "/documents/v1/plantillas-favoritas/agregar_favorito/",
+                 "body": {"plantilla_id": self.plantilla.id}},
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        resultados = response.data['data']['resultados']
+        self.assertEqual([r['id'] for r in resultados], ["a", "b", "c"])
+        self.assertEqual(resultados[1]['body']['data']['nombre'], "Nuevo")
+        self.assertIn('ETag', resultados[1]['headers'])
+        self.assertLess(resultados[2]['status'], 300)
+
+    def test_atomic_batch_rolls_back_on_error(self):
+        response = self.client.post(reverse('batch'), {
+            "atomico": True,
+            "operaciones": [
+                {"method": "PATCH", "path": self.url, "body": {"nombre": "Nuevo"}},
+                {"method": "PATCH", "path": self.url, "body": {"nombre": "Otro"}, "headers": {"If-Match": '"viejo"'}},
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['data']['resultados'][1]['status'], 412)
+        self.plantilla.refresh_from_db()
+        self.assertEqual(self.plantilla.nombre, "Plantilla 1")
+
+    def test_paths_outside_the_api_are_rejected(self):
+        response = self.client.post(reverse('batch'), {
+            "operaciones": [{"method": "GET", "path": "/adminailegal/"}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CompresionTestCase(TestCase):
+    def setUp(self):
+        reiniciar_estadisticas_compresion()
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.plantilla = PlantillaDocumento.objects.create( # type: ignore
+            nombre="Plantilla 1", html_con_campos="<p>{{rut}}</p>" * 500, usuario=self.user
+        )
+        self.url = reverse('plantilladocumento-detail', args=[self.plantilla.id])
+
+    def test_negotiates_encoding(self):
+        self.assertEqual(elegir_codificacion('gzip, deflate'), 'gzip')
+        self.assertIsNone(elegir_codificacion('identity'))
+        self.assertIsNone(elegir_codificacion('gzip;q=0'))
+
+    def test_large_json_is_gzipped_with_weak_etag(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        contenido = json.loads(gzip.decompress(response.content))
+        self.assertEqual(contenido['data']['id'], self.plantilla.id)
+        self.assertGreater(obtener_estadisticas_compresion()['gzip']['bytes_ahorrados'], 0)
+        # El ETag débil sigue sirviendo para revalidar
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_small_or_binary_responses_are_not_compressed(self):
+        middleware = CompresionMiddleware(lambda request: HttpResponse(b'%PDF' * 1000, content_type='application/pdf'))
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(middleware(request).has_header('Content-Encoding'))
+        middleware = CompresionMiddleware(lambda request: HttpResponse(b'{}', content_type='application/json'))
+        self.assertFalse(middleware(request).has_header('Content-Encoding'))
+
+    @override_settings(COMPRESION_TAMANO_MINIMO=0)
+    def test_auth_and_cookie_responses_are_not_compressed(self):
+        self.user.email = "user1@example.com"
+        self.user.save()
+        cliente = APIClient()
+        response = cliente.post(reverse('rest_login'), {'email': 'user1@example.com', 'password': 'pass1'},
+                                format='json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        refresh = response.data['data']['refresh']
+        response = cliente.post(reverse('token_refresh'), {'refresh': refresh}, format='json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        def con_cookie(request):
+            response = HttpResponse(b'<input name="csrfmiddlewaretoken">' * 100, content_type='text/html')
+            response.set_cookie('csrftoken', 'secreto')
+            return response
+        response = CompresionMiddleware(con_cookie)(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_responses_are_compressed(self):
+        middleware = CompresionMiddleware(
+            lambda request: StreamingHttpResponse((b'linea %d\n' % i for i in range(1000)), content_type='text/plain')
+        )
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        contenido = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(contenido.count(b'\n'), 1000)
+
+
+class CamposDinamicosTestCase(TestCase):
+    def setUp(self):
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.tipo = TipoPlantillaDocumento.objects.create(nombre="Contrato") # type: ignore
+        self.plantilla = PlantillaDocumento.objects.create( # type: ignore
+            nombre="Plantilla 1", html_con_campos="<p>{{rut}}</p>", usuario=self.user, tipo=self.tipo
+        )
+        self.url = reverse('plantilladocumento-detail', args=[self.plantilla.id])
+
+    def test_default_output_is_unchanged(self):
+        data = self.client.get(self.url).data['data']
+        self.assertIn('html_con_campos', data)
+        self.assertEqual(data['tipo']['nombre'], "Contrato")
+
+    def test_fields_trims_output_and_columns(self):
+        with CaptureQueriesContext(connection) as consultas:
+            data = self.client.get(self.url, {'fields': 'id,nombre'}).data['data']
+        self.assertEqual(set(data), {'id', 'nombre'})
+        sql = ' '.join(consulta['sql'] for consulta in consultas)
+        self.assertNotIn('html_con_campos', sql)
+
+    def test_relations_collapse_unless_expanded(self):
+        data = self.client.get(self.url, {'exclude': 'html_con_campos'}).data['data']
+        self.assertNotIn('html_con_campos', data)
+        self.assertEqual(data['tipo'], self.tipo.id)
+        data = self.client.get(self.url, {'fields': 'id,tipo', 'expand': 'tipo'}).data['data']
+        self.assertEqual(data['tipo']['nombre'], "Contrato")
+
+    def test_list_endpoints_accept_fields(self):
+        documento = DocumentoSubido.objects.create( # type: ignore
+            usuario=self.user, nombre_original="a.pdf", tipo="pdf", archivo_url="a.pdf", html="<p>largo</p>"
+        )
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('documentosubido-list'), {'fields': 'id,nombre_original'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], [{'id': documento.id, 'nombre_original': "a.pdf"}])
+        self.assertNotIn('"html"', ' '.join(consulta['sql'] for consulta in consultas))
+
+
+@override_settings(ESCRITURA_DIFERIDA_INTERVALO=0)
+class EscrituraDiferidaTestCase(TestCase):
+    def test_coalesces_touches_into_one_bulk_update(self):
+        a = Usuarios.objects.create_user(username="a", password="x")
+        b = Usuarios.objects.create_user(username="b", password="x")
+        buffer = BufferEscritura('users.Usuarios', 'last_login')
+        antes = timezone.now()
+        for segundos in (1, 3, 2):
+            buffer.registrar(a.pk, antes + timedelta(seconds=segundos))
+        buffer.registrar(b.pk, antes)
+        self.assertEqual(len(buffer.pendientes()), 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(buffer.vaciar(), 2)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+        a.refresh_from_db()
+        self.assertEqual(a.last_login, antes + timedelta(seconds=3))
+        self.assertEqual(buffer.vaciar(), 0)
+
+    def test_buffer_without_writer_cannot_be_instantiated(self):
+        class SinEscritura(_BufferDiferido):
+            etiqueta = 'sin_escritura'
+
+        with self.assertRaises(TypeError):
+            SinEscritura()
+
+
+@override_settings(INSTRUMENTACION_SERVER_TIMING=True)
+class InstrumentacionTestCase(TestCase):
+    def setUp(self):
+        reiniciar_estadisticas()
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.staff = Usuarios.objects.create_user(username="staff", password="pass1", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.plantilla = PlantillaDocumento.objects.create( # type: ignore
+            nombre="Plantilla 1", html_con_campos="<p>{{rut}}</p>", usuario=self.user
+        )
+
+    def test_records_queries_and_times_per_url_name(self):
+        url = reverse('plantilladocumento-detail', args=[self.plantilla.id])
+        for _ in range(3):
+            response = self.client.get(url)
+        self.assertRegex(response['Server-Timing'], r'^sql;dur=[\d.]+;desc="\d+ consultas", serializacion;dur=[\d.]+, total;dur=[\d.]+$')
+
+        self.client.force_authenticate(user=self.staff)
+        data = self.client.get(reverse('instrumentacion')).data['data']
+        datos = {fila['endpoint']: fila for fila in data['endpoints']}['plantilladocumento-detail']
+        self.assertEqual(datos['peticiones'], 3)
+        self.assertGreater(datos['consultas'], 0)
+        self.assertGreater(datos['serializacion_ms'], 0)
+        self.assertEqual(sum(datos['histograma_ms']), 3)
+        self.assertIsNotNone(datos['total_ms_p95'])
+
+        ordenados = self.client.get(reverse('instrumentacion'), {'orden': 'peticiones'}).data['data']['endpoints']
+        self.assertEqual(ordenados[0]['endpoint'], 'plantilladocumento-detail')
+
+    def test_staff_only_and_reset(self):
+        self.assertEqual(self.client.get(reverse('instrumentacion')).status_code, 403)
+        self.client.force_authenticate(user=self.staff)
+        self.client.get(reverse('instrumentacion'))
+        self.assertEqual(self.client.delete(reverse('instrumentacion')).status_code, 200)
+        endpoints = self.client.get(reverse('instrumentacion')).data['data']['endpoints']
+        self.assertNotIn('plantilladocumento-detail', [fila['endpoint'] for fila in endpoints])
+
+    def test_combines_workers_from_shared_directory(self):
+        self.client.get(reverse('plantilladocumento-detail', args=[self.plantilla.id]))
+        self.client.force_authenticate(user=self.staff)
+        with tempfile.TemporaryDirectory() as directorio, override_settings(INSTRUMENTACION_DIRECTORIO=directorio):
+            self.assertEqual(self.client.get(reverse('instrumentacion')).data['data']['workers'], 1)
+            # Otro worker publicó su copia en el mismo directorio
+            with open(Path(directorio) / 'otro-host:999.json', 'w') as archivo:
+                json.dump({'plantilladocumento-detail': {
+                    **instrumentacion._nuevo_endpoint(), 'peticiones': 4, 'total_ms': 40.0, 'histograma_ms': [4] + [0] * len(instrumentacion.CUBETAS_MS),
+                }}, archivo)
+            data = self.client.get(reverse('instrumentacion')).data['data']
+            self.assertEqual(data['workers'], 2)
+            self.assertTrue(data['compartido'])
+            datos = {fila['endpoint']: fila for fila in data['endpoints']}['plantilladocumento-detail']
+            self.assertEqual(datos['peticiones'], 5)
+            totales = [fila['total_ms'] for fila in data['endpoints']]
+            self.assertEqual(totales, sorted(totales, reverse=True))
+
+            self.client.delete(reverse('instrumentacion'))
+            self.assertEqual(list(Path(directorio).glob('*.json')), [])
+
+
+@override_settings(CONSULTAS_LENTAS_ACTIVA=True, CONSULTAS_LENTAS_UMBRAL_MS=0.000001, CONSULTAS_LENTAS_INTERVALO=0)
+class ConsultasLentasTestCase(TestCase):
+    def setUp(self):
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.plantilla = PlantillaDocumento.objects.create( # type: ignore
+            nombre="Plantilla 1", html_con_campos="<p>{{rut}}</p>", usuario=self.user
+        )
+
+    def test_normalizes_values_lists_and_rows(self):
+        self.assertEqual(
+            normalizar_sql("SELECT * FROM t WHERE a = 'x' AND b IN (%s, %s, %s) AND c = 10"),
+            "SELECT * FROM t WHERE a = ? AND b IN (?, ...) AND c = ?"
+        )
+        self.assertEqual(
+            normalizar_sql("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)"),
+            "INSERT INTO t (a, b) VALUES (?, ...), ..."
+        )
+
+    def test_groups_by_fingerprint_with_request_context_and_stack(self):
+        url = reverse('plantilladocumento-detail', args=[self.plantilla.id])
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        with self.assertLogs('core.consultas_lentas') as registro:
+            agregador.vaciar()
+        lineas = [json.loads(r.getMessage()) for r in registro.records]
+        self.assertEqual(len({linea['huella'] for linea in lineas}), len(lineas))
+        plantilla = next(
+            linea for linea in lineas
+            if 'FROM "plantillas_documentos"' in linea['sql'] and 'plantilladocumento-detail' in linea['endpoints']
+        )
+        self.assertEqual(plantilla['veces'] % 2, 0)
+        self.assertLessEqual(plantilla['p50_ms'], plantilla['max_ms'])
+        self.assertEqual(plantilla['ejemplo']['usuario_id'], self.user.id)
+        self.assertTrue(any(marco.startswith('documents/') for marco in plantilla['ejemplo']['pila']))
+
+    def test_flush_with_bare_file_name(self):
+        agregador.registrar("SELECT 1", 5.0, [], {'endpoint': None, 'usuario_id': None, 'empresa_id': None})
+        with override_settings(CONSULTAS_LENTAS_ARCHIVO='lentas.jsonl'):
+            with self.assertLogs('core.consultas_lentas'):
+                self.assertGreaterEqual(agregador.vaciar(), 1)
+
+    def test_log_file_folder_is_created_with_the_handler(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = os.path.join(directorio, 'registros', 'lentas.jsonl')
+            self.assertEqual(core_settings._manejador_registro(archivo)['filename'], archivo)
+            self.assertTrue(os.path.isdir(os.path.dirname(archivo)))
+        self.assertEqual(core_settings._manejador_registro('lentas.jsonl')['filename'], 'lentas.jsonl')
+        self.assertEqual(core_settings._manejador_registro('')['class'], 'logging.StreamHandler')
+
+    def test_disabled_unless_opted_in(self):
+        with override_settings(CONSULTAS_LENTAS_ACTIVA=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ConsultasLentasMiddleware(lambda request: HttpResponse())
+
+
+@override_settings(PERFILADOR_ACTIVO=True, PERFILADOR_INTERVALO_MS=1, PERFILADOR_RETENCION=2)
+class PerfiladorTestCase(TestCase):
+    def setUp(self):
+        self.staff = Usuarios.objects.create_user(username="staff", password="pass1", is_staff=True)
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+
+    def vista_lenta(self, request):
+        time.sleep(0.05)
+        return HttpResponse("ok")
+
+    def peticion(self, usuario, **kwargs):
+        if usuario is not None:
+            kwargs.setdefault('HTTP_AUTHORIZATION', f'Bearer {RefreshToken.for_user(usuario).access_token}')
+        request = RequestFactory().get('/documents/v1/lenta/', **kwargs)
+        return PerfiladorMiddleware(self.vista_lenta)(request)
+
+    def test_staff_request_stores_folded_profile(self):
+        response = self.peticion(self.staff, QUERY_STRING='perfilar=1')
+        perfil = PerfilPeticion.objects.get(pk=response['X-Perfil-Id'])
+        self.assertGreater(perfil.muestras, 0)
+        self.assertEqual(perfil.usuario, self.staff)
+        self.assertRegex(perfil.perfil.splitlines()[0], r'^\S.* \d+$')
+        self.assertIn('vista_lenta (core/tests.py:', perfil.perfil)
+
+        admin = Usuarios.objects.create_superuser(username="admin", password="pass1")
+        self.client.force_login(admin)
+        descarga = self.client.get(reverse('admin:documents_perfilpeticion_descargar', args=[perfil.pk]))
+        self.assertEqual(descarga.status_code, 200)
+        self.assertIn('attachment', descarga['Content-Disposition'])
+        self.assertEqual(descarga.content.decode(), perfil.perfil)
+
+    def test_only_requested_staff_profiles_are_kept_with_retention(self):
+        self.assertFalse(self.peticion(self.staff).has_header('X-Perfil-Id'))
+        self.assertFalse(self.peticion(self.user, HTTP_X_PERFILAR='1').has_header('X-Perfil-Id'))
+        ids = [self.peticion(self.staff, HTTP_X_PERFILAR='1')['X-Perfil-Id'] for _ in range(3)]
+        self.assertEqual(sorted(PerfilPeticion.objects.values_list('id', flat=True)), sorted(map(int, ids[1:])))
+
+    def test_staff_is_checked_from_jwt_before_sampling(self):
+        with mock.patch('core.middleware.MuestreadorPila', wraps=MuestreadorPila) as muestreador:
+            self.assertFalse(self.peticion(self.user, HTTP_X_PERFILAR='1').has_header('X-Perfil-Id'))
+            self.assertFalse(self.peticion(None, HTTP_X_PERFILAR='1', HTTP_AUTHORIZATION='Bearer invalido').has_header('X-Perfil-Id'))
+            self.assertFalse(self.peticion(None, HTTP_X_PERFILAR='1').has_header('X-Perfil-Id'))
+            muestreador.assert_not_called()
+
+            response = self.peticion(self.staff, HTTP_X_PERFILAR='1')
+            muestreador.assert_called_once()
+        self.assertEqual(PerfilPeticion.objects.get(pk=response['X-Perfil-Id']).usuario, self.staff)
+
+    def test_download_requires_view_permission(self):
+        perfil = PerfilPeticion.objects.create(
+            usuario=self.staff, metodo='GET', ruta='/', endpoint='', status_code=200,
+            duracion_ms=1, muestras=1, intervalo_ms=1, perfil='a;b 1',
+        )
+        url = reverse('admin:documents_perfilpeticion_descargar', args=[perfil.pk])
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.staff.user_permissions.add(Permission.objects.get(codename='view_perfilpeticion'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@skipUnless(metricas.prometheus_client, "prometheus_client no está instalado")
+@override_settings(METRICAS_TOKEN='secreto')
+class MetricasTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def valor(self, nombre, **etiquetas):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(nombre, etiquetas) or 0
+
+    def exposicion(self):
+        response = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 401)
+        with override_settings(METRICAS_TOKEN=''):
+            self.assertEqual(self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer ').status_code, 404)
+
+    def test_exposes_request_latency_cache_and_queues(self):
+        aciertos = self.valor('ialegal_cache_consultas_total', cache='catalogo', resultado='hit')
+        self.client.get(reverse('tipos-plantilla-list'))
+        self.client.get(reverse('tipos-plantilla-list'))
+        self.assertEqual(self.valor('ialegal_cache_consultas_total', cache='catalogo', resultado='hit'), aciertos + 1)
+
+        texto = self.exposicion()
+        self.assertIn('ialegal_peticion_duracion_segundos_count{endpoint="tipos-plantilla-list",metodo="GET",status="200"}', texto)
+        self.assertIn('ialegal_cola_analitica_pendientes', texto)
+        self.assertIn('ialegal_cola_asignaciones_expiradas', texto)
+
+    def test_docx_conversion_records_duration_and_pages(self):
+        documento = docx.Document()
+        for pagina in range(3):
+            parrafo = documento.add_paragraph(f"Página {pagina + 1}")
+            if pagina < 2:
+                parrafo.add_run().add_break(WD_BREAK.PAGE)
+        contenido = io.BytesIO()
+        documento.save(contenido)
+        archivo = io.BytesIO(contenido.getvalue())
+        archivo.name = 'escrito.docx'
+
+        conversiones = self.valor('ialegal_conversion_duracion_segundos_count', formato='docx')
+        paginas = self.valor('ialegal_conversion_paginas_sum', formato='docx')
+        response = self.client.post(reverse('documentosubido-subir-documento'), {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.valor('ialegal_conversion_duracion_segundos_count', formato='docx'), conversiones + 1)
+        self.assertEqual(self.valor('ialegal_conversion_paginas_sum', formato='docx'), paginas + 3)
+
+
+@override_settings(MEMORIA_ACTIVA=True, MEMORIA_UMBRAL_MB=0.000001, MEMORIA_RECICLAR_MB=0)
+class MemoriaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        memoria.recientes.clear()
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def registros(self, logs):
+        return [json.loads(linea.split(':', 2)[2]) for linea in logs.output]
+
+    def test_upload_logs_file_size_format_and_memory(self):
+        contenido = io.BytesIO()
+        documento = docx.Document()
+        documento.add_paragraph("Escrito de prueba")
+        documento.save(contenido)
+        archivo = io.BytesIO(contenido.getvalue())
+        archivo.name = 'escrito.docx'
+
+        with self.assertLogs('core.memoria', level='WARNING') as logs:
+            response = self.client.post(reverse('documentosubido-subir-documento'), {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        registro, = self.registros(logs)
+        self.assertEqual(registro['evento'], 'peticion')
+        self.assertEqual(registro['endpoint'], 'documentosubido-subir-documento')
+        self.assertEqual(registro['usuario_id'], self.user.pk)
+        self.assertEqual(registro['archivos'], [{'nombre': 'escrito.docx', 'formato': 'docx', 'bytes': len(contenido.getvalue())}])
+        self.assertIsNotNone(registro['pico_tracemalloc_mb'])
+        self.assertGreater(registro['rss_antes_mb'], 0)
+
+    def test_listing_records_row_count(self):
+        for i in range(3):
+            PlantillaDocumento.objects.create(nombre=f"Plantilla {i}", html_con_campos="<p></p>", usuario=self.user) # type: ignore
+        with self.assertLogs('core.memoria', level='WARNING'):
+            response = self.client.get(reverse('plantilladocumento-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(memoria.recientes[-1]['endpoint'], 'plantilladocumento-list')
+        self.assertEqual(memoria.recientes[-1]['filas'], 3)
+
+    def test_other_endpoints_are_not_measured(self):
+        self.assertEqual(self.client.get(reverse('bootstrap')).status_code, 200)
+        self.assertEqual(len(memoria.recientes), 0)
+
+    def test_recycle_logs_recent_requests(self):
+        self.client.get(reverse('plantilladocumento-list'))
+        self.assertIsNone(memoria.debe_reciclar())
+
+        with override_settings(MEMORIA_RECICLAR_MB=1):
+            self.assertIsNone(memoria.debe_reciclar(rss=memoria.MB // 2))
+            with self.assertLogs('core.memoria', level='WARNING') as logs:
+                motivo = memoria.debe_reciclar()
+        self.assertIn('MEMORIA_RECICLAR_MB=1', motivo)
+        registro, = self.registros(logs)
+        self.assertEqual(registro['evento'], 'reciclaje')
+        self.assertEqual([p['endpoint'] for p in registro['ultimas_peticiones']], ['plantilladocumento-list'])
+
+    def test_logging_failures_do_not_break_requests_or_recycling(self):
+        with override_settings(MEMORIA_ARCHIVO='memoria.jsonl'), self.assertLogs('core.memoria', level='WARNING'):
+            self.assertEqual(self.client.get(reverse('plantilladocumento-list')).status_code, 200)
+
+        with mock.patch.object(memoria.logger, 'warning', side_effect=OSError("disco lleno")):
+            with self.assertLogs('core.middleware', level='ERROR'):
+                self.assertEqual(self.client.get(reverse('plantilladocumento-list')).status_code, 200)
+            with override_settings(MEMORIA_RECICLAR_MB=1), self.assertLogs('core.memoria', level='ERROR'):
+                self.assertIn('MEMORIA_RECICLAR_MB=1', memoria.debe_reciclar())
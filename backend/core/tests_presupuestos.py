@@ -0,0 +1,220 @@
+"""
+Presupuesto de consultas SQL y de tamaño de respuesta por endpoint.
+
+Recorre las rutas GET registradas en core/urls.py, las llama con los tres roles principales
+(superusuario, grupo Admin y usuario normal) sobre un conjunto de datos chico y otro varias veces
+más grande, y exige que cada endpoint respete el presupuesto declarado en PRESUPUESTOS y que la
+cantidad de consultas no crezca con los datos (un N+1 la haría crecer). Al fallar se muestra el SQL.
+En los listados paginados tampoco puede crecer el tamaño por fila: la página está acotada, así que
+si crece es porque cada fila arrastra una lista anidada sin límite.
+
+Una ruta GET nueva sin presupuesto (ni motivo en EXCLUIDAS) hace fallar test_every_route_has_a_budget.
+"""
+from django.contrib.admindocs.views import simplify_regex
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver
+from rest_framework.test import APIClient
+
+from core.testing import Sembrado
+
+
+PREFIJOS_API = ('/documents/v1/', '/users/v1/', '/companies/v1/', '/bootstrap/', '/instrumentacion/', '/metricas/')
+
+# Multiplicador de filas por usuario del conjunto chico y del grande
+ESCALA_CHICA = 2
+ESCALA_GRANDE = 8
+
+ROLES = ('superusuario', 'admin', 'usuario')
+
+# ruta: (consultas máximas, bytes máximos) para el peor de los roles con el conjunto grande.
+# Se fijan con lo medido más un margen chico; si un cambio los supera, revisar el SQL antes de subirlos.
+PRESUPUESTOS = {
+    '/bootstrap/': (17, 24_000),
+    '/companies/v1/cuota/': (4, 1_000),
+    '/companies/v1/empresas/': (4, 1_000),
+    '/companies/v1/planes/': (4, 1_000),
+    '/companies/v1/tribunales/': (3, 1_000),
+    '/documents/v1/': (0, 1_000),
+    '/documents/v1/analitica/': (8, 1_000),
+    '/documents/v1/campos-disponibles/': (4, 1_000),
+    '/documents/v1/campos-disponibles/<pk>/': (3, 1_000),
+    '/documents/v1/categorias-plantilla/': (4, 1_000),
+    '/documents/v1/clasificacion-plantillas-generales/': (4, 1_000),
+    '/documents/v1/documentos-generados/': (4, 6_000),
+    '/documents/v1/documentos-generados/<pk>/': (3, 1_000),
+    '/documents/v1/documentos-subidos/': (4, 15_000),
+    '/documents/v1/documentos-subidos/<pk>/': (3, 1_000),
+    '/documents/v1/plantilla-generales/': (10, 66_000),
+    '/documents/v1/plantilla-generales/<pk>/': (9, 18_000),
+    '/documents/v1/plantilla-generales/<pk>/plantillas_por_clasificacion/': (7, 2_000),
+    '/documents/v1/plantilla-generales/<pk>/usuarios_con_acceso/': (4, 3_000),
+    '/documents/v1/plantillas-compartidas/': (4, 3_000),
+    '/documents/v1/plantillas-compartidas/<pk>/': (3, 1_000),
+    '/documents/v1/plantillas-compartidas/compartidas_conmigo/': (3, 3_000),
+    '/documents/v1/plantillas-compartidas/usuarios_compartidos/': (4, 1_000),
+    '/documents/v1/plantillas-documentos/': (7, 13_000),
+    '/documents/v1/plantillas-documentos/<pk>/': (13, 2_000),
+    '/documents/v1/plantillas-documentos/disponibles/': (7, 13_000),
+    '/documents/v1/plantillas-documentos/mas_usadas/': (3, 2_000),
+    '/documents/v1/plantillas-favoritas/mis_favoritos/': (3, 3_000),
+    '/documents/v1/plantillas-generales-compartidas/': (5, 11_000),
+    '/documents/v1/plantillas-generales-compartidas/<pk>/': (4, 2_000),
+    '/documents/v1/plantillas-generales-compartidas/mis_plantillas_compartidas/': (4, 2_000),
+    '/documents/v1/plantillas-generales-compartidas/plantillas_vigentes/': (4, 2_000),
+    '/documents/v1/sincronizacion/': (13, 38_000),
+    '/documents/v1/tipos-plantilla/': (4, 1_000),
+    '/documents/v1/usuarios/': (4, 6_000),
+    '/documents/v1/usuarios/<pk>/': (4, 1_000),
+    '/users/v1/': (0, 1_000),
+    '/users/v1/groups/': (5, 1_000),
+    '/users/v1/perfiles/': (6, 7_000),
+    '/users/v1/perfiles/<pk>/': (6, 1_000),
+    '/users/v1/perfiles/me/': (7, 1_000),
+    '/users/v1/usuarios/': (6, 4_000),
+    '/users/v1/usuarios/<pk>/': (5, 1_000),
+    '/users/v1/usuarios/<pk>/permissions/': (10, 1_000),
+    '/users/v1/usuarios/me/': (4, 8_000),
+}
+
+# Crecimiento tolerado de los bytes por fila de un listado paginado entre el conjunto chico y el grande
+# (los ids y nombres más largos y el sobre de la respuesta repartido entre más filas)
+MARGEN_BYTES_POR_FILA = 1.25
+
+# Listados paginados cuyas filas crecen con los datos a propósito: ruta -> motivo
+FILAS_CRECIENTES = {
+    '/documents/v1/plantilla-generales/': "Cada paquete trae sus plantillas y usuarios con acceso completos "
+                                          "(sin ?fields/?expand); lo acota el presupuesto de bytes",
+    '/documents/v1/plantillas-generales-compartidas/': "Cada asignación lista las plantillas de su paquete "
+                                                       "(plantillas_disponibles); lo acota el presupuesto de bytes",
+}
+
+# Rutas GET que no se miden aquí
+EXCLUIDAS = {
+    '/instrumentacion/': "Estadísticas en memoria del proceso; su tamaño depende de las peticiones atendidas, no de los datos",
+    '/metricas/': "Requiere METRICAS_TOKEN; las consultas del scrape son conteos fijos (_ColectorBaseDatos)",
+}
+
+# Parámetros obligatorios: ruta -> (parámetro, objeto del sembrado)
+PARAMETROS = {
+    '/documents/v1/plantillas-compartidas/usuarios_compartidos/': ('plantilla_id', 'plantilla'),
+}
+
+
+def filas_pagina(response):
+    """Cantidad de filas de una respuesta paginada (con o sin el sobre data/message); None si no lo es"""
+    try:
+        datos = response.json()
+    except (TypeError, ValueError):
+        return None
+    if isinstance(datos, dict) and isinstance(datos.get('data'), dict):
+        datos = datos['data']
+    if isinstance(datos, dict) and isinstance(datos.get('results'), list) and 'count' in datos:
+        return len(datos['results'])
+    return None
+
+
+def rutas_get():
+    """{ruta: callback} de las rutas de la API que aceptan GET (sin las variantes .<format>)"""
+    rutas = {}
+
+    def recorrer(patrones, prefijo):
+        for patron in patrones:
+            if isinstance(patron, URLResolver):
+                recorrer(patron.url_patterns, prefijo + str(patron.pattern))
+                continue
+            ruta = simplify_regex(prefijo + str(patron.pattern))
+            if 'format>' in ruta or not ruta.startswith(PREFIJOS_API):
+                continue
+            callback = patron.callback
+            acciones = getattr(callback, 'actions', None)
+            vista = getattr(callback, 'view_class', None) or getattr(callback, 'cls', None)
+            if (acciones is not None and 'get' in acciones) or (acciones is None and hasattr(vista, 'get')):
+                rutas[ruta] = callback
+
+    recorrer(get_resolver().url_patterns, '')
+    return rutas
+
+
+class SembradoPresupuesto(Sembrado):
+    """Sembrado que sabe armar la URL medida de cada ruta para un rol"""
+
+    def url(self, ruta, rol):
+        """Reemplaza <pk> por un objeto que el rol puede ver y agrega los parámetros obligatorios"""
+        objetos = self.objetos[rol]
+        if ruta in PARAMETROS:
+            parametro, clave = PARAMETROS[ruta]
+            return f"{ruta}?{parametro}={objetos[clave].pk}"
+        if '<pk>' not in ruta:
+            return ruta
+        clave = {
+            '/documents/v1/plantillas-documentos/': 'plantilla',
+            '/documents/v1/documentos-generados/': 'documento_generado',
+            '/documents/v1/documentos-subidos/': 'documento_subido',
+            '/documents/v1/plantillas-compartidas/': 'compartida',
+            '/documents/v1/plantilla-generales/': 'paquete',
+            '/documents/v1/plantillas-generales-compartidas/': 'asignacion',
+            '/documents/v1/campos-disponibles/': 'campo',
+            '/documents/v1/usuarios/': 'usuario',
+            '/users/v1/usuarios/': 'usuario',
+            '/users/v1/perfiles/': 'perfil',
+        }[ruta.split('<pk>')[0]]
+        return ruta.replace('<pk>', str(objetos[clave].pk))
+
+
+@override_settings(ESCRITURA_DIFERIDA_INTERVALO=0)
+class PresupuestoConsultasTestCase(TestCase):
+    maxDiff = None
+
+    def medir(self, sembrado):
+        """{(ruta, rol): (consultas, bytes, filas de la página o None, sql, status)}"""
+        mediciones = {}
+        client = APIClient()
+        for rol in ROLES:
+            client.force_authenticate(user=sembrado.usuarios[rol])
+            for ruta in sorted(PRESUPUESTOS):
+                cache.clear()
+                with CaptureQueriesContext(connection) as consultas:
+                    response = client.get(sembrado.url(ruta, rol))
+                mediciones[(ruta, rol)] = (
+                    len(consultas), len(response.content), filas_pagina(response),
+                    [consulta['sql'] for consulta in consultas], response.status_code,
+                )
+        return mediciones
+
+    def test_every_route_has_a_budget(self):
+        rutas = set(rutas_get())
+        self.assertEqual(sorted(rutas - set(PRESUPUESTOS) - set(EXCLUIDAS)), [], "Rutas GET sin presupuesto")
+        self.assertEqual(sorted((set(PRESUPUESTOS) | set(EXCLUIDAS)) - rutas), [], "Presupuestos de rutas inexistentes")
+        self.assertEqual(sorted(set(FILAS_CRECIENTES) - set(PRESUPUESTOS)), [], "Filas crecientes sin presupuesto")
+
+    def test_queries_and_size_stay_within_budget_and_do_not_grow(self):
+        chico = self.medir(SembradoPresupuesto(ESCALA_CHICA, 'a').sembrar())
+        grande_sembrado = SembradoPresupuesto(ESCALA_GRANDE, 'b').sembrar()
+        grande = self.medir(grande_sembrado)
+        for (ruta, rol), (consultas, tamano, filas, sql, status_code) in sorted(grande.items()):
+            maximo_consultas, maximo_bytes = PRESUPUESTOS[ruta]
+            with self.subTest(ruta=ruta, rol=rol):
+                self.assertLess(status_code, 500, f"{ruta} ({rol}) respondió {status_code}")
+                detalle = '\n'.join(sql)
+                self.assertLessEqual(
+                    consultas, maximo_consultas,
+                    f"{ruta} ({rol}): {consultas} consultas, presupuesto {maximo_consultas}\n{detalle}"
+                )
+                self.assertLessEqual(
+                    consultas, chico[(ruta, rol)][0],
+                    f"{ruta} ({rol}): las consultas crecen con los datos "
+                    f"({chico[(ruta, rol)][0]} → {consultas})\n{detalle}"
+                )
+                self.assertLessEqual(tamano, maximo_bytes, f"{ruta} ({rol}): {tamano} bytes, presupuesto {maximo_bytes}")
+                if filas is None or ruta in FILAS_CRECIENTES:
+                    continue
+                _, tamano_chico, filas_chico, _, _ = chico[(ruta, rol)]
+                por_fila, por_fila_chico = tamano / max(filas, 1), tamano_chico / max(filas_chico, 1)
+                self.assertLessEqual(
+                    por_fila, por_fila_chico * MARGEN_BYTES_POR_FILA,
+                    f"{ruta} ({rol}): los bytes por fila crecen con los datos "
+                    f"({por_fila_chico:.0f} → {por_fila:.0f}, {filas_chico} → {filas} filas)"
+                )
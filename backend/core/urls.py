@@ -8,6 +8,7 @@ from rest_framework import permissions
 
 from dj_rest_auth.app_settings import api_settings
 from users.views import CustomLoginView, CustomTokenRefreshView, CustomTokenVerifyView, CustomPasswordChangeView, CustomLogoutView
+from core.views import BootstrapAPIView, BatchAPIView, InstrumentacionAPIView, MetricasView
 
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -39,6 +40,10 @@ urlpatterns = [
     re_path(r'login/?$', CustomLoginView.as_view(), name='rest_login'),
     re_path(r'logout/?$', CustomLogoutView.as_view(), name='rest_logout'),
     re_path(r'password/change/?$', CustomPasswordChangeView.as_view(), name='rest_password_change'),
+    re_path(r'^bootstrap/?$', BootstrapAPIView.as_view(), name='bootstrap'),
+    re_path(r'^batch/?$', BatchAPIView.as_view(), name='batch'),
+    re_path(r'^instrumentacion/?$', InstrumentacionAPIView.as_view(), name='instrumentacion'),
+    re_path(r'^metricas/?$', MetricasView.as_view(), name='metricas'),
     re_path("docs<format>/", schema_view.without_ui(cache_timeout=0), name="schema-json"),
     re_path("docs/", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
     re_path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
@@ -0,0 +1,336 @@
+import io
+import hashlib
+import hmac
+import json
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import Http404, HttpResponse
+from django.urls import resolve, Resolver404
+from django.views import View
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.cache import (
+    obtener_versiones_catalogos,
+    obtener_o_construir,
+    TIPOS_PLANTILLA,
+    CATEGORIAS_PLANTILLA,
+    CLASIFICACIONES_PLANTILLA,
+    CAMPOS_DISPONIBLES,
+)
+from core import metricas
+from core.instrumentacion import obtener_estadisticas, reiniciar_estadisticas
+from core.mixins import StandardResponseMixin
+from documents.models import (
+    TipoPlantillaDocumento,
+    CategoriaPlantillaDocumento,
+    ClasificacionPlantillaGeneral,
+    PlantillaDocumento,
+    PlantillaFavorita,
+    RegistroCambio,
+)
+from documents.serializers import (
+    TipoPlantillaDocumentoSerializer,
+    CategoriaPlantillaDocumentoSerializer,
+    ClasificacionPlantillaGeneralSerializer,
+)
+from users.models import Perfil
+from users.serializers import PerfilSerializer
+
+
+class BootstrapAPIView(StandardResponseMixin, APIView):
+    """
+    Datos iniciales del frontend en una sola llamada: usuario, perfil, catálogos,
+    favoritos y plantillas. Cada sección trae su versión; el cliente envía las que ya tiene
+    en `?versiones=seccion:version,...` y esas secciones se omiten.
+    """
+    permission_classes = [IsAuthenticated]
+
+    CATALOGOS = {
+        'tipos_plantilla': (TIPOS_PLANTILLA, TipoPlantillaDocumento.objects.all, TipoPlantillaDocumentoSerializer),
+        'categorias_plantilla': (CATEGORIAS_PLANTILLA, CategoriaPlantillaDocumento.objects.all, CategoriaPlantillaDocumentoSerializer),
+        'clasificaciones': (
+            CLASIFICACIONES_PLANTILLA,
+            lambda: ClasificacionPlantillaGeneral.objects.select_related('creado_por').con_conteos(),
+            ClasificacionPlantillaGeneralSerializer,
+        ),
+    }
+
+    def _versiones_cliente(self, request):
+        versiones = {}
+        for par in request.query_params.get('versiones', '').split(','):
+            seccion, _, version = par.partition(':')
+            if seccion and version:
+                versiones[seccion] = version
+        return versiones
+
+    def _huella(self, datos):
+        contenido = json.dumps(datos, cls=DjangoJSONEncoder, sort_keys=True)
+        return hashlib.md5(contenido.encode('utf-8')).hexdigest()[:16]
+
+    def _seccion_catalogo(self, catalogo, version, queryset, serializer_class):
+        return obtener_o_construir(
+            f'bootstrap:{catalogo}:{version}',
+            lambda: list(serializer_class(queryset(), many=True).data)
+        )
+
+    def _plantillas(self, user):
+        favoritos = set(PlantillaFavorita.objects.filter(usuario=user).values_list('plantilla_id', flat=True))
+        plantillas = []
+        for plantilla in PlantillaDocumento.objects.accesibles_para(user).distinct().select_related('tipo').prefetch_related('campos_asociados__campo'):
+            plantilla_data = plantilla.get_resumen()
+            plantilla_data['es_favorito'] = plantilla.id in favoritos
+            plantillas.append(plantilla_data)
+        return plantillas
+
+    def _favoritos(self, user):
+        return [favorito.get_resumen() for favorito in PlantillaFavorita.objects.filter(usuario=user).select_related('plantilla')]
+
+    def _perfil(self, user):
+        perfil = Perfil.objects.filter(usuario=user).select_related('usuario__empresa__plan').prefetch_related('usuario__groups').first()
+        return PerfilSerializer(perfil).data if perfil else None
+
+    def get(self, request, *args, **kwargs):
+        """Obtener los datos iniciales de la sesión"""
+        try:
+            user = request.user
+            conocidas = self._versiones_cliente(request)
+            versiones_catalogos = obtener_versiones_catalogos([
+                TIPOS_PLANTILLA, CATEGORIAS_PLANTILLA, CLASIFICACIONES_PLANTILLA, CAMPOS_DISPONIBLES
+            ])
+            secciones = {}
+
+            def agregar(seccion, version, construir):
+                version = str(version)
+                if conocidas.get(seccion) == version:
+                    secciones[seccion] = {'version': version, 'sin_cambios': True}
+                else:
+                    secciones[seccion] = {'version': version, 'sin_cambios': False, 'data': construir()}
+
+            for seccion, (catalogo, queryset, serializer_class) in self.CATALOGOS.items():
+                version = versiones_catalogos[catalogo]
+                agregar(seccion, version, lambda: self._seccion_catalogo(catalogo, version, queryset, serializer_class))
+
+            # Las secciones del usuario se versionan con su cursor del registro de cambios
+            # y, para las plantillas, con los catálogos que anidan (tipo y campos)
+            cursor = RegistroCambio.ultimo_cursor(user)
+            version_plantillas = f'{cursor}.{versiones_catalogos[TIPOS_PLANTILLA]}.{versiones_catalogos[CAMPOS_DISPONIBLES]}'
+            agregar('plantillas', version_plantillas, lambda: obtener_o_construir(
+                f'bootstrap:{user.id}:plantillas:{version_plantillas}', lambda: self._plantillas(user)
+            ))
+            agregar('favoritos', cursor, lambda: obtener_o_construir(
+                f'bootstrap:{user.id}:favoritos:{cursor}', lambda: self._favoritos(user)
+            ))
+
+            # Usuario y perfil son baratos de construir; su versión es una huella del contenido
+            for seccion, datos in (('me', user.get_informacion_completa()), ('perfil', self._perfil(user))):
+                agregar(seccion, self._huella(datos), lambda: datos)
+
+            return self.success_response(
+                data=secciones,
+                message="Datos iniciales obtenidos exitosamente",
+                code="bootstrap_retrieved"
+            )
+        except Exception as e:
+            return self.error_response(
+                errors=str(e),
+                message="Error al obtener los datos iniciales",
+                code="bootstrap_error",
+                http_status=500
+            )
+
+
+class BatchAPIView(StandardResponseMixin, APIView):
+    """
+    Ejecuta en orden una lista de operaciones sobre las rutas existentes de la API,
+    autenticando una sola vez. Con `atomico: true` todas corren en una transacción
+    y la primera operación con error revierte el lote completo.
+
+    Cuerpo: {"atomico": bool, "operaciones": [{"id", "method", "path", "body", "headers"}]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    PREFIJOS_PERMITIDOS = ('/documents/v1/', '/users/v1/', '/companies/v1/')
+    METODOS_PERMITIDOS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+    # Cabeceras de la respuesta que se devuelven al cliente por operación
+    CABECERAS_RESPUESTA = ('ETag', 'Last-Modified', 'Location')
+
+    def _validar_operacion(self, operacion):
+        if not isinstance(operacion, dict):
+            return "Cada operación debe ser un objeto"
+        if str(operacion.get('method', '')).upper() not in self.METODOS_PERMITIDOS:
+            return f"Método no permitido: {operacion.get('method')}"
+        path = str(operacion.get('path', ''))
+        if not path.startswith(self.PREFIJOS_PERMITIDOS):
+            return f"Ruta no permitida: {path}"
+        return None
+
+    def _construir_peticion(self, request, operacion):
+        """Crea la sub-petición reutilizando el entorno de la petición original"""
+        path, _, query_string = operacion['path'].partition('?')
+        cuerpo = b''
+        if operacion.get('body') is not None:
+            cuerpo = json.dumps(operacion['body'], cls=DjangoJSONEncoder).encode('utf-8')
+
+        environ = {
+            clave: valor for clave, valor in request.META.items()
+            if not clave.startswith('HTTP_') and clave not in ('CONTENT_TYPE', 'CONTENT_LENGTH')
+        }
+        for clave in ('HTTP_HOST', 'HTTP_USER_AGENT', 'HTTP_ACCEPT_LANGUAGE'):
+            if clave in request.META:
+                environ[clave] = request.META[clave]
+        for nombre, valor in (operacion.get('headers') or {}).items():
+            environ['HTTP_' + nombre.upper().replace('-', '_')] = str(valor)
+        environ.update({
+            'REQUEST_METHOD': operacion['method'].upper(),
+            'PATH_INFO': path,
+            'QUERY_STRING': query_string,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(cuerpo)),
+            'wsgi.input': io.BytesIO(cuerpo),
+        })
+        sub_request = WSGIRequest(environ)
+        # DRF usa ForcedAuthentication con este usuario: no se vuelve a validar el token
+        sub_request._force_auth_user = request.user
+        return sub_request
+
+    def _ejecutar(self, request, operacion):
+        sub_request = self._construir_peticion(request, operacion)
+        try:
+            match = resolve(sub_request.path_info)
+        except Resolver404:
+            return {'status': 404, 'body': None, 'headers': {}}
+
+        response = match.func(sub_request, *match.args, **match.kwargs)
+        if hasattr(response, 'data'):
+            body = response.data
+        elif response.get('Content-Type', '').startswith('application/json') and response.content:
+            body = json.loads(response.content)
+        else:
+            body = None
+        headers = {nombre: response[nombre] for nombre in self.CABECERAS_RESPUESTA if response.has_header(nombre)}
+        return {'status': response.status_code, 'body': body, 'headers': headers}
+
+    def post(self, request, *args, **kwargs):
+        """Ejecutar un lote de operaciones"""
+        try:
+            operaciones = request.data.get('operaciones')
+            atomico = bool(request.data.get('atomico', False))
+            if not isinstance(operaciones, list) or not operaciones:
+                return self.error_response(
+                    errors="operaciones debe ser una lista no vacía",
+                    message="Datos incompletos",
+                    code="missing_data"
+                )
+            if len(operaciones) > settings.BATCH_MAX_OPERACIONES:
+                return self.error_response(
+                    errors=f"Se permiten como máximo {settings.BATCH_MAX_OPERACIONES} operaciones por lote",
+                    message="Demasiadas operaciones",
+                    code="batch_too_large"
+                )
+            for operacion in operaciones:
+                error = self._validar_operacion(operacion)
+                if error:
+                    return self.error_response(errors=error, message="Operación inválida", code="invalid_operation")
+
+            resultados = []
+            revertido = False
+            with transaction.atomic() if atomico else nullcontext():
+                for operacion in operaciones:
+                    resultado = self._ejecutar(request, operacion)
+                    resultado['id'] = operacion.get('id')
+                    resultados.append(resultado)
+                    if atomico and resultado['status'] >= 400:
+                        transaction.set_rollback(True)
+                        revertido = True
+                        break
+
+            if revertido:
+                return self.error_response(
+                    errors=f"La operación {len(resultados)} falló; el lote fue revertido",
+                    message="Lote revertido",
+                    code="batch_rolled_back",
+                    data={'resultados': resultados}
+                )
+            return self.success_response(
+                data={'resultados': resultados},
+                message="Lote ejecutado exitosamente",
+                code="batch_executed"
+            )
+        except Exception as e:
+            return self.error_response(
+                errors=str(e),
+                message="Error al ejecutar el lote",
+                code="batch_error",
+                http_status=500
+            )
+
+
+class InstrumentacionAPIView(StandardResponseMixin, APIView):
+    """
+    Métricas por endpoint de InstrumentacionMiddleware combinadas de todos los workers (solo staff).
+    `endpoints` es una lista ordenada de mayor a menor por ?orden=campo (p. ej. consultas_promedio;
+    por defecto total_ms).
+    DELETE reinicia los contadores.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _denegado(self):
+        return self.error_response(
+            message="No tienes permisos para acceder a esta funcionalidad",
+            code="permission_denied",
+            http_status=status.HTTP_403_FORBIDDEN
+        )
+
+    def get(self, request):
+        try:
+            if not (request.user.is_staff or request.user.is_superuser):
+                return self._denegado()
+            data = obtener_estadisticas(orden=request.query_params.get('orden') or 'total_ms')
+            return self.success_response(
+                data=data,
+                message="Métricas obtenidas exitosamente",
+                code="metrics_retrieved"
+            )
+        except Exception as e:
+            return self.error_response(
+                errors=str(e),
+                message="Error al obtener las métricas",
+                code="metrics_error",
+                http_status=500
+            )
+
+    def delete(self, request):
+        try:
+            if not (request.user.is_staff or request.user.is_superuser):
+                return self._denegado()
+            reiniciar_estadisticas()
+            return self.success_response(message="Métricas reiniciadas", code="metrics_reset")
+        except Exception as e:
+            return self.error_response(
+                errors=str(e),
+                message="Error al reiniciar las métricas",
+                code="metrics_error",
+                http_status=500
+            )
+
+
+class MetricasView(View):
+    """
+    Métricas en formato de exposición de Prometheus (ver core/metricas.py).
+    Requiere Authorization: Bearer <METRICAS_TOKEN>; sin token configurado la ruta no existe.
+    """
+
+    def get(self, request):
+        if not settings.METRICAS_TOKEN:
+            raise Http404
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {settings.METRICAS_TOKEN}'):
+            return HttpResponse('Token inválido', status=401, content_type='text/plain; charset=utf-8')
+        if metricas.prometheus_client is None:
+            return HttpResponse('prometheus_client no está instalado', status=501, content_type='text/plain; charset=utf-8')
+        return HttpResponse(metricas.exposicion(), content_type=metricas.CONTENT_TYPE)
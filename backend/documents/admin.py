@@ -1,4 +1,9 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 from .models import (
     Tribunales,
     DocumentoSubido,
@@ -13,6 +18,12 @@ from .models import (
     ClasificacionPlantillaGeneral,
     PlantillaGeneral,
     PlantillaGeneralCompartida,
+    RegistroCambio,
+    AccesoPlantilla,
+    AsignacionPaqueteEmpresa,
+    UsoPlantilla,
+    ResumenDiarioDocumentos,
+    PerfilPeticion,
 )
 
 from unfold.admin import ModelAdmin
@@ -170,3 +181,69 @@ class PlantillaGeneralCompartidaAdmin(ModelAdmin):
         queryset = queryset.select_related('plantilla_general', 'usuario', 'asignado_por', 'plantilla_general__clasificacion')
         return queryset
 
+@admin.register(RegistroCambio)
+class RegistroCambioAdmin(ModelAdmin):
+    list_display = ('id', 'usuario', 'entidad', 'objeto_id', 'operacion', 'fecha')
+    list_filter = ('entidad', 'operacion')
+    search_fields = ('usuario__username',)
+    readonly_fields = ('fecha',)
+    ordering = ('-id',)
+
+@admin.register(AccesoPlantilla)
+class AccesoPlantillaAdmin(ModelAdmin):
+    list_display = ('usuario', 'plantilla', 'origen', 'permiso', 'fecha_expiracion')
+    list_filter = ('origen', 'permiso')
+    search_fields = ('usuario__username', 'plantilla__nombre')
+    list_select_related = ('usuario', 'plantilla')
+
+@admin.register(AsignacionPaqueteEmpresa)
+class AsignacionPaqueteEmpresaAdmin(ModelAdmin):
+    list_display = ('plantilla_general', 'empresa', 'asignado_por', 'activo', 'fecha_expiracion', 'fecha_creacion')
+    list_filter = ('activo',)
+    search_fields = ('plantilla_general__nombre', 'empresa__nombre')
+    list_select_related = ('plantilla_general', 'empresa', 'asignado_por')
+
+@admin.register(UsoPlantilla)
+class UsoPlantillaAdmin(ModelAdmin):
+    list_display = ('ambito', 'referencia_id', 'plantilla', 'usos', 'fecha_ultimo_uso')
+    list_filter = ('ambito',)
+    search_fields = ('plantilla__nombre',)
+    list_select_related = ('plantilla',)
+    ordering = ('-fecha_ultimo_uso',)
+
+@admin.register(ResumenDiarioDocumentos)
+class ResumenDiarioDocumentosAdmin(ModelAdmin):
+    list_display = ('fecha', 'empresa_id', 'usuario_id', 'metrica', 'dimension', 'cantidad')
+    list_filter = ('metrica',)
+    ordering = ('-fecha',)
+
+@admin.register(PerfilPeticion)
+class PerfilPeticionAdmin(ModelAdmin):
+    list_display = ('fecha', 'metodo', 'ruta', 'endpoint', 'usuario', 'status_code', 'duracion_ms', 'muestras', 'descargar')
+    list_filter = ('endpoint', 'metodo')
+    search_fields = ('ruta', 'endpoint')
+    list_select_related = ('usuario',)
+    exclude = ('perfil',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/descargar/', self.admin_site.admin_view(self.descargar_perfil), name='documents_perfilpeticion_descargar'),
+        ] + super().get_urls()
+
+    @admin.display(description='Perfil')
+    def descargar(self, obj):
+        return format_html('<a href="{}">Descargar (.folded)</a>', reverse('admin:documents_perfilpeticion_descargar', args=[obj.pk]))
+
+    def descargar_perfil(self, request, pk):
+        perfil = get_object_or_404(PerfilPeticion, pk=pk)
+        if not self.has_view_permission(request, perfil):
+            raise PermissionDenied
+        response = HttpResponse(perfil.perfil, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="perfil-{perfil.pk}-{perfil.fecha:%Y%m%d%H%M%S}.folded"'
+        return response
@@ -0,0 +1,171 @@
+"""
+Analítica de uso precalculada: resúmenes diarios por empresa, usuario y tipo de plantilla
+(documentos generados) o formato (documentos subidos).
+
+Las señales dejan un EventoAnalitica por documento y agregar_eventos() los consume por lotes
+sumándolos a ResumenDiarioDocumentos; el tablero de 12 meses se responde con unas pocas
+consultas agrupadas sobre el índice (empresa_id, metrica, fecha) en vez de recorrer las tablas
+de documentos.
+"""
+from collections import Counter
+from datetime import date
+
+from django.db import models, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DocumentoGenerado, DocumentoSubido, EventoAnalitica, ResumenDiarioDocumentos
+
+
+def registrar_evento(metrica, usuario, momento, dimension=''):
+    EventoAnalitica.objects.create(
+        metrica=metrica,
+        fecha=timezone.localdate(momento),
+        empresa_id=usuario.empresa_id or 0,
+        usuario_id=usuario.pk,
+        dimension=str(dimension) if dimension else '',
+    )
+
+
+def _sumar(conteos):
+    """Suma {(fecha, empresa_id, usuario_id, metrica, dimension): cantidad} a los resúmenes"""
+    ResumenDiarioDocumentos.objects.bulk_create(
+        [
+            ResumenDiarioDocumentos(fecha=fecha, empresa_id=empresa_id, usuario_id=usuario_id,
+                                    metrica=metrica, dimension=dimension)
+            for fecha, empresa_id, usuario_id, metrica, dimension in conteos
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    filas = ResumenDiarioDocumentos.objects.filter(
+        fecha__in={clave[0] for clave in conteos},
+        usuario_id__in={clave[2] for clave in conteos},
+    ).values_list('id', 'fecha', 'empresa_id', 'usuario_id', 'metrica', 'dimension')
+    ids = {tuple(fila[1:]): fila[0] for fila in filas}
+    claves = list(conteos)
+    for inicio in range(0, len(claves), 500):
+        lote = [(ids[clave], conteos[clave]) for clave in claves[inicio:inicio + 500]]
+        ResumenDiarioDocumentos.objects.filter(id__in=[fila_id for fila_id, _ in lote]).update(
+            cantidad=models.F('cantidad') + models.Case(
+                *[models.When(id=fila_id, then=models.Value(cantidad)) for fila_id, cantidad in lote],
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
+
+def agregar_eventos(tamano_lote=5000):
+    """
+    Consume la bitácora por lotes. Cada lote suma y borra sus eventos en la misma transacción,
+    así cada evento se cuenta exactamente una vez; con PostgreSQL, SKIP LOCKED permite
+    varios agregadores en paralelo. Retorna la cantidad de eventos procesados.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            eventos = list(
+                EventoAnalitica.objects.select_for_update(skip_locked=True).order_by('id').values_list(
+                    'id', 'fecha', 'empresa_id', 'usuario_id', 'metrica', 'dimension'
+                )[:tamano_lote]
+            )
+            if not eventos:
+                return total
+            _sumar(Counter(tuple(evento[1:]) for evento in eventos))
+            EventoAnalitica.objects.filter(id__in=[evento[0] for evento in eventos]).delete()
+        total += len(eventos)
+
+
+def reconstruir():
+    """Recalcula todos los resúmenes desde el historial completo con agregaciones en SQL"""
+    generados = DocumentoGenerado.objects.annotate(dia=TruncDate('fecha_generacion')).values_list(
+        'dia', 'usuario__empresa_id', 'usuario_id', 'plantilla__tipo_id'
+    ).annotate(cantidad=models.Count('id')).order_by()
+    subidos = DocumentoSubido.objects.annotate(dia=TruncDate('fecha_subida')).values_list(
+        'dia', 'usuario__empresa_id', 'usuario_id', 'tipo'
+    ).annotate(cantidad=models.Count('id')).order_by()
+
+    conteos = Counter()
+    for metrica, filas in ((EventoAnalitica.GENERADOS, generados), (EventoAnalitica.SUBIDOS, subidos)):
+        for dia, empresa_id, usuario_id, dimension, cantidad in filas:
+            conteos[(dia, empresa_id or 0, usuario_id, metrica, str(dimension or ''))] += cantidad
+
+    with transaction.atomic():
+        # Los eventos pendientes ya están incluidos en el historial
+        EventoAnalitica.objects.all().delete()
+        ResumenDiarioDocumentos.objects.all().delete()
+        ResumenDiarioDocumentos.objects.bulk_create(
+            [
+                ResumenDiarioDocumentos(fecha=fecha, empresa_id=empresa_id, usuario_id=usuario_id,
+                                        metrica=metrica, dimension=dimension, cantidad=cantidad)
+                for (fecha, empresa_id, usuario_id, metrica, dimension), cantidad in conteos.items()
+            ],
+            batch_size=1000,
+        )
+    return len(conteos)
+
+
+def reconstruir_empresas(empresa_ids, tamano_lote=1000):
+    """
+    Recalcula los resúmenes solo de las empresas indicadas, de a una y sin tocar los del resto.
+    Las filas salen ya agrupadas del SQL y se insertan por lotes, así en memoria nunca hay más que
+    un lote. Retorna la cantidad de resúmenes creados.
+    """
+    total = 0
+    for empresa_id in empresa_ids:
+        generados = DocumentoGenerado.objects.filter(usuario__empresa_id=empresa_id).annotate(
+            dia=TruncDate('fecha_generacion')
+        ).values_list('dia', 'usuario_id', 'plantilla__tipo_id').annotate(cantidad=models.Count('id')).order_by()
+        subidos = DocumentoSubido.objects.filter(usuario__empresa_id=empresa_id).annotate(
+            dia=TruncDate('fecha_subida')
+        ).values_list('dia', 'usuario_id', 'tipo').annotate(cantidad=models.Count('id')).order_by()
+
+        with transaction.atomic():
+            # Los eventos pendientes de la empresa ya están incluidos en el historial
+            EventoAnalitica.objects.filter(empresa_id=empresa_id).delete()
+            ResumenDiarioDocumentos.objects.filter(empresa_id=empresa_id).delete()
+            lote = []
+            for metrica, filas in ((EventoAnalitica.GENERADOS, generados), (EventoAnalitica.SUBIDOS, subidos)):
+                for dia, usuario_id, dimension, cantidad in filas.iterator(chunk_size=tamano_lote):
+                    lote.append(ResumenDiarioDocumentos(
+                        fecha=dia, empresa_id=empresa_id, usuario_id=usuario_id, metrica=metrica,
+                        dimension=str(dimension or ''), cantidad=cantidad,
+                    ))
+                    if len(lote) >= tamano_lote:
+                        ResumenDiarioDocumentos.objects.bulk_create(lote)
+                        total += len(lote)
+                        lote = []
+            ResumenDiarioDocumentos.objects.bulk_create(lote)
+            total += len(lote)
+    return total
+
+
+def inicio_ventana(hasta, meses):
+    """Primer día de la ventana de `meses` meses calendario que termina en el mes de `hasta`"""
+    anio, mes = divmod(hasta.year * 12 + hasta.month - 1 - (meses - 1), 12)
+    return date(anio, mes + 1, 1)
+
+
+def tablero(empresa_id, meses=12, hasta=None):
+    """Series del tablero de la empresa para los últimos `meses` meses, solo desde los resúmenes"""
+    hasta = hasta or timezone.localdate()
+    desde = inicio_ventana(hasta, meses)
+    resumenes = ResumenDiarioDocumentos.objects.filter(empresa_id=empresa_id, fecha__gte=desde, fecha__lte=hasta)
+
+    por_dia = {EventoAnalitica.GENERADOS: [], EventoAnalitica.SUBIDOS: []}
+    for metrica, fecha, cantidad in resumenes.values_list('metrica', 'fecha').annotate(
+        total=models.Sum('cantidad')
+    ).order_by('metrica', 'fecha'):
+        por_dia[metrica].append({'fecha': fecha, 'cantidad': cantidad})
+
+    por_dimension = {EventoAnalitica.GENERADOS: {}, EventoAnalitica.SUBIDOS: {}}
+    for metrica, dimension, cantidad in resumenes.values_list('metrica', 'dimension').annotate(
+        total=models.Sum('cantidad')
+    ).order_by():
+        por_dimension[metrica][dimension] = cantidad
+
+    por_usuario = list(
+        resumenes.filter(metrica=EventoAnalitica.GENERADOS).values('usuario_id').annotate(
+            cantidad=models.Sum('cantidad')
+        ).order_by('-cantidad')
+    )
+    return desde, hasta, por_dia, por_dimension, por_usuario
@@ -0,0 +1,418 @@
+"""
+Prueba de carga del comando `prueba_carga`: reproduce contra un servidor en marcha (runserver o
+gunicorn) los recorridos del frontend — login y bootstrap, navegar plantillas, generar
+documentos, subir DOCX, compartir plantillas y administrar usuarios — con la biblioteca estándar,
+sin servicios externos.
+
+Con una tasa de llegada (recorridos por segundo, llegadas de Poisson) la carga es abierta: si los
+workers no dan abasto los recorridos esperan en cola, y los que no empezaron al terminar la etapa
+se descartan. Con tasa 0 cada worker encadena recorridos sin pausa (carga cerrada). Varias tasas
+forman etapas sucesivas; la primera que no logra el throughput ofrecido o supera el umbral de
+errores marca el punto de saturación.
+"""
+import gzip
+import http.client
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.db.models import Prefetch
+
+from users.models import Usuarios
+from .models import PlantillaDocumento
+
+
+VIAJES = ('navegar', 'generar', 'subir', 'compartir', 'administrar')
+MEZCLA_POR_DEFECTO = {'navegar': 50, 'generar': 25, 'subir': 10, 'compartir': 10, 'administrar': 5}
+
+TIPO_DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+class PasoFallido(Exception):
+    """Un paso respondió con error: el resto del recorrido depende de él y se abandona"""
+
+
+def _percentil(ordenados, fraccion):
+    return ordenados[min(int(fraccion * len(ordenados)), len(ordenados) - 1)]
+
+
+def leer_mezcla(texto):
+    """'navegar=50,generar=25' → {'navegar': 50, 'generar': 25}"""
+    if not texto:
+        return dict(MEZCLA_POR_DEFECTO)
+    mezcla = {}
+    for par in texto.split(','):
+        nombre, _, peso = par.partition('=')
+        nombre = nombre.strip()
+        if nombre not in VIAJES:
+            raise ValueError(f"Recorrido desconocido: {nombre}. Opciones: {', '.join(VIAJES)}")
+        try:
+            mezcla[nombre] = float(peso) if peso else 1.0
+        except ValueError:
+            raise ValueError(f"Peso inválido para {nombre}: {peso}")
+    if not any(mezcla.values()):
+        raise ValueError("La mezcla debe tener al menos un recorrido con peso mayor que 0")
+    return mezcla
+
+
+# Usuarios ------------------------------------------------------------------------------------
+
+def usuarios_de_prueba(prefijo=None, limite=500):
+    """
+    Usuarios activos con empresa (los que tengan el prefijo, si se indica) con lo que necesitan
+    los recorridos: si pertenecen al grupo Admin, sus plantillas propias y hasta 20 colegas de empresa.
+    """
+    usuarios = Usuarios.objects.filter(is_active=True, empresa__isnull=False, is_superuser=False).exclude(email='')
+    if prefijo:
+        usuarios = usuarios.filter(username__startswith=prefijo)
+    usuarios = list(
+        usuarios.order_by('id').prefetch_related(
+            'groups', Prefetch('plantilladocumento_set', queryset=PlantillaDocumento.objects.only('id', 'usuario_id'))
+        )[:limite]
+    )
+    por_empresa = defaultdict(list)
+    for usuario in Usuarios.objects.filter(
+        is_active=True, empresa_id__in={u.empresa_id for u in usuarios}
+    ).values_list('empresa_id', 'id'):
+        por_empresa[usuario[0]].append(usuario[1])
+    return [
+        {
+            'username': usuario.username,
+            'email': usuario.email,
+            'id': usuario.pk,
+            'empresa_id': usuario.empresa_id,
+            'admin': any(grupo.name == 'Admin' for grupo in usuario.groups.all()),
+            'plantillas': [plantilla.pk for plantilla in usuario.plantilladocumento_set.all()],
+            'colegas': [i for i in por_empresa[usuario.empresa_id] if i != usuario.pk][:20],
+        }
+        for usuario in usuarios
+    ]
+
+
+# Cliente HTTP --------------------------------------------------------------------------------
+
+class Cliente:
+    """Conexión keep-alive de un worker (como la de un navegador) con el token JWT de la sesión"""
+
+    def __init__(self, url_base, timeout):
+        partes = urlsplit(url_base)
+        self.clase = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        self.host = partes.netloc
+        self.prefijo = partes.path.rstrip('/')
+        self.timeout = timeout
+        self.conexion = None
+        self.token = None
+
+    def pedir(self, metodo, ruta, datos=None, archivo=None):
+        """Retorna (estado HTTP, cuerpo JSON o None)"""
+        cabeceras = {'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
+        if self.token:
+            cabeceras['Authorization'] = f'Bearer {self.token}'
+        cuerpo = None
+        if archivo is not None:
+            nombre, tipo, contenido = archivo
+            limite = uuid.uuid4().hex
+            cuerpo = (
+                f'--{limite}\r\nContent-Disposition: form-data; name="archivo"; filename="{nombre}"\r\n'
+                f'Content-Type: {tipo}\r\n\r\n'
+            ).encode() + contenido + f'\r\n--{limite}--\r\n'.encode()
+            cabeceras['Content-Type'] = f'multipart/form-data; boundary={limite}'
+        elif datos is not None:
+            cuerpo = json.dumps(datos).encode()
+            cabeceras['Content-Type'] = 'application/json'
+
+        for intento in range(2):
+            if self.conexion is None:
+                self.conexion = self.clase(self.host, timeout=self.timeout)
+            try:
+                self.conexion.request(metodo, self.prefijo + ruta, body=cuerpo, headers=cabeceras)
+                respuesta = self.conexion.getresponse()
+                contenido = respuesta.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # El servidor cerró la conexión keep-alive (p. ej. reciclaje de workers): se reabre una vez
+                self.cerrar()
+                if intento:
+                    raise
+        if respuesta.getheader('Content-Encoding') == 'gzip':
+            contenido = gzip.decompress(contenido)
+        try:
+            return respuesta.status, json.loads(contenido) if contenido else None
+        except ValueError:
+            return respuesta.status, None
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+            self.conexion = None
+
+
+class Registro:
+    """Latencias y estados por paso, compartido entre los workers de una etapa"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pasos = defaultdict(list)
+        self.estados = defaultdict(Counter)
+        self.viajes = Counter()
+        self.espera_cola = []
+
+    def paso(self, nombre, ms, estado):
+        with self.lock:
+            self.pasos[nombre].append((ms, estado))
+            self.estados[nombre][str(estado)] += 1
+
+    def viaje(self, nombre, resultado, espera_ms=None):
+        with self.lock:
+            self.viajes[resultado] += 1
+            self.viajes[f'{nombre}:{resultado}'] += 1
+            if espera_ms is not None:
+                self.espera_cola.append(espera_ms)
+
+
+# Recorridos ----------------------------------------------------------------------------------
+
+class Recorrido:
+    """Una sesión del frontend: login, bootstrap y los pasos del recorrido elegido"""
+
+    def __init__(self, cliente, registro, rng, usuario, password, pausa, docx):
+        self.cliente = cliente
+        self.registro = registro
+        self.rng = rng
+        self.usuario = usuario
+        self.password = password
+        self.pausa = pausa
+        self.docx = docx
+
+    def paso(self, nombre, metodo, ruta, datos=None, archivo=None):
+        inicio = time.perf_counter()
+        try:
+            estado, cuerpo = self.cliente.pedir(metodo, ruta, datos, archivo)
+        except (OSError, http.client.HTTPException):
+            self.cliente.cerrar()
+            estado, cuerpo = 0, None  # 0 = sin respuesta (conexión rechazada, timeout)
+        self.registro.paso(nombre, (time.perf_counter() - inicio) * 1000, estado)
+        if not 200 <= estado < 400:
+            raise PasoFallido(f'{nombre}: {estado}')
+        if self.pausa:
+            time.sleep(self.rng.expovariate(1 / self.pausa))
+        return (cuerpo or {}).get('data') if isinstance(cuerpo, dict) else cuerpo
+
+    def iniciar_sesion(self):
+        self.cliente.token = None
+        # El login es por email (ACCOUNT_LOGIN_METHODS)
+        datos = self.paso('login', 'POST', '/login/', {'email': self.usuario['email'], 'password': self.password})
+        self.cliente.token = (datos or {}).get('access')
+        self.paso('bootstrap', 'GET', '/bootstrap/')
+        self.paso('usuario_me', 'GET', '/users/v1/usuarios/me/')
+
+    def _plantilla_disponible(self):
+        disponibles = self.paso('plantillas_disponibles', 'GET', '/documents/v1/plantillas-documentos/disponibles/') or []
+        if not disponibles:
+            return None
+        plantilla_id = self.rng.choice(disponibles)['id']
+        return self.paso('plantilla_detalle', 'GET', f'/documents/v1/plantillas-documentos/{plantilla_id}/')
+
+    def navegar(self):
+        self.iniciar_sesion()
+        self.paso('plantillas_listado', 'GET', '/documents/v1/plantillas-documentos/')
+        self._plantilla_disponible()
+        self.paso('plantillas_mas_usadas', 'GET', '/documents/v1/plantillas-documentos/mas_usadas/')
+        self.paso('favoritos', 'GET', '/documents/v1/plantillas-favoritas/mis_favoritos/')
+        self.paso('documentos_generados', 'GET', '/documents/v1/documentos-generados/')
+
+    def generar(self):
+        self.iniciar_sesion()
+        plantilla = self._plantilla_disponible()
+        if plantilla:
+            variables = [campo['nombre_variable'] for campo in plantilla.get('campos_asociados', [])]
+            self.paso(
+                'generar_documento', 'POST', f"/documents/v1/plantillas-documentos/{plantilla['id']}/generar_documento/",
+                {'plantilla_id': plantilla['id'], 'nombre': f'carga_{self.rng.randrange(10 ** 6)}',
+                 'datos': {variable: f'valor {self.rng.randrange(1000)}' for variable in variables}},
+            )
+        self.paso('documentos_generados', 'GET', '/documents/v1/documentos-generados/')
+
+    def subir(self):
+        self.iniciar_sesion()
+        self.paso('subir_docx', 'POST', '/documents/v1/documentos-subidos/subir_documento/',
+                  archivo=(f'carga_{self.rng.randrange(10 ** 6)}.docx', TIPO_DOCX, self.docx))
+        self.paso('documentos_subidos', 'GET', '/documents/v1/documentos-subidos/')
+
+    def compartir(self):
+        self.iniciar_sesion()
+        self.paso('usuarios_compartir', 'GET', '/documents/v1/usuarios/?fields=id,username,first_name,last_name')
+        if self.usuario['plantillas'] and self.usuario['colegas']:
+            colegas = self.rng.sample(self.usuario['colegas'], min(3, len(self.usuario['colegas'])))
+            self.paso('compartir_plantilla', 'POST', '/documents/v1/plantillas-compartidas/compartir/',
+                      {'plantilla_id': self.rng.choice(self.usuario['plantillas']), 'usuario_ids': colegas})
+        self.paso('compartidas_conmigo', 'GET', '/documents/v1/plantillas-compartidas/compartidas_conmigo/')
+
+    def administrar(self):
+        self.iniciar_sesion()
+        self.paso('usuarios_listado', 'GET', '/users/v1/usuarios/')
+        nombre = f'carga-{uuid.uuid4().hex[:12]}'
+        creado = self.paso('usuario_crear', 'POST', '/users/v1/usuarios/', {
+            'username': nombre, 'email': f'{nombre}@carga.example.cl', 'password': uuid.uuid4().hex,
+            'first_name': 'Carga', 'last_name': 'Temporal',
+        })
+        # PATCH es solo para staff: el frontend edita con PUT
+        self.paso('usuario_editar', 'PUT', f"/users/v1/usuarios/{creado['id']}/", {
+            'username': nombre, 'email': f'{nombre}@carga.example.cl', 'first_name': 'Editado', 'last_name': 'Temporal',
+        })
+        self.paso('usuario_eliminar', 'DELETE', f"/users/v1/usuarios/{creado['id']}/")
+
+
+# Ejecución -----------------------------------------------------------------------------------
+
+class Generador:
+    """
+    Lanza recorridos contra `url` según `mezcla`. Uso:
+    Generador(url, usuarios, password).etapa(tasa=5, concurrencia=20, duracion=60) → dict
+    """
+
+    def __init__(self, url, usuarios, password, mezcla=None, pausa=0.0, timeout=30.0, semilla=1, docx=b''):
+        self.url = url
+        self.password = password
+        self.pausa = pausa
+        self.timeout = timeout
+        self.semilla = semilla
+        self.docx = docx
+        self.admins = [u for u in usuarios if u['admin']]
+        self.usuarios = usuarios
+        mezcla = mezcla or dict(MEZCLA_POR_DEFECTO)
+        if not self.admins:
+            mezcla.pop('administrar', None)
+        self.mezcla = {nombre: peso for nombre, peso in mezcla.items() if peso > 0}
+        if not self.usuarios or not self.mezcla:
+            raise ValueError("No hay usuarios activos con empresa para los recorridos (siembra datos con seed_scale)")
+        self.locales = threading.local()
+        self.contador = 0
+        self.lock = threading.Lock()
+
+    def verificar(self):
+        """Un login de prueba para fallar rápido si el servidor no responde o la contraseña no sirve"""
+        cliente = Cliente(self.url, self.timeout)
+        try:
+            estado, _ = cliente.pedir('POST', '/login/', {'email': self.usuarios[0]['email'], 'password': self.password})
+        except (OSError, http.client.HTTPException) as e:
+            raise ValueError(f"No se pudo conectar con {self.url}: {e}")
+        finally:
+            cliente.cerrar()
+        if estado != 200:
+            raise ValueError(f"El login de {self.usuarios[0]['username']} respondió {estado}: revisa --password")
+
+    def _cliente(self):
+        if not hasattr(self.locales, 'cliente'):
+            self.locales.cliente = Cliente(self.url, self.timeout)
+        return self.locales.cliente
+
+    def _recorrido(self, registro, llegada=None):
+        with self.lock:
+            self.contador += 1
+            rng = random.Random(f'{self.semilla}-{self.contador}')
+        espera = (time.perf_counter() - llegada) * 1000 if llegada is not None else None
+        nombre = rng.choices(list(self.mezcla), weights=list(self.mezcla.values()))[0]
+        usuario = rng.choice(self.admins if nombre == 'administrar' else self.usuarios)
+        recorrido = Recorrido(self._cliente(), registro, rng, usuario, self.password, self.pausa, self.docx)
+        try:
+            getattr(recorrido, nombre)()
+            registro.viaje(nombre, 'completados', espera)
+        except (PasoFallido, OSError, http.client.HTTPException):
+            # Un paso con error o la conexión caída se cuentan y la etapa sigue; cualquier otra
+            # excepción es un error del propio generador y sale por etapa()
+            registro.viaje(nombre, 'abortados', espera)
+
+    def etapa(self, tasa, concurrencia, duracion):
+        registro = Registro()
+        rng = random.Random(f'{self.semilla}-llegadas-{tasa}')
+        inicio = time.perf_counter()
+        fin = inicio + duracion
+        pool = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='carga')
+        if tasa > 0:
+            # Carga abierta: las llegadas no esperan a que terminen los recorridos anteriores
+            llegada, pendientes = inicio, []
+            while True:
+                llegada += rng.expovariate(tasa)
+                if llegada >= fin:
+                    break
+                time.sleep(max(0.0, llegada - time.perf_counter()))
+                pendientes.append(pool.submit(self._recorrido, registro, llegada))
+            # cancel() solo tiene éxito con las llegadas que siguen en cola sin empezar
+            descartados = sum(futuro.cancel() for futuro in pendientes)
+            pool.shutdown(wait=True)
+        else:
+            def encadenar():
+                while time.perf_counter() < fin:
+                    self._recorrido(registro)
+            pendientes = [pool.submit(encadenar) for _ in range(concurrencia)]
+            descartados = 0
+            pool.shutdown(wait=True)
+        # result() vuelve a lanzar en este hilo lo que haya fallado dentro de un recorrido
+        for futuro in pendientes:
+            if not futuro.cancelled():
+                futuro.result()
+        transcurrido = time.perf_counter() - inicio
+        return self._resumen(registro, tasa, concurrencia, transcurrido, descartados)
+
+    def _resumen(self, registro, tasa, concurrencia, transcurrido, descartados):
+        pasos = {}
+        total = errores = 0
+        for nombre, mediciones in sorted(registro.pasos.items()):
+            ordenadas = sorted(ms for ms, _ in mediciones)
+            fallidas = sum(1 for _, estado in mediciones if not 200 <= estado < 400)
+            total += len(mediciones)
+            errores += fallidas
+            pasos[nombre] = {
+                'peticiones': len(mediciones),
+                'errores': fallidas,
+                'tasa_error': round(fallidas / len(mediciones), 4),
+                'latencia_p50_ms': round(_percentil(ordenadas, 0.5), 1),
+                'latencia_p90_ms': round(_percentil(ordenadas, 0.9), 1),
+                'latencia_p95_ms': round(_percentil(ordenadas, 0.95), 1),
+                'latencia_p99_ms': round(_percentil(ordenadas, 0.99), 1),
+                'latencia_max_ms': round(ordenadas[-1], 1),
+                'estados': dict(registro.estados[nombre]),
+            }
+        espera = sorted(registro.espera_cola)
+        return {
+            'tasa_ofrecida': tasa or None,
+            'concurrencia': concurrencia,
+            'duracion_s': round(transcurrido, 2),
+            'recorridos': dict(registro.viajes, descartados=descartados),
+            'recorridos_por_segundo': round(registro.viajes['completados'] / transcurrido, 2),
+            'peticiones_por_segundo': round(total / transcurrido, 2),
+            'tasa_error': round(errores / total, 4) if total else None,
+            'espera_cola_ms': {
+                'p50': round(_percentil(espera, 0.5), 1),
+                'p95': round(_percentil(espera, 0.95), 1),
+                'max': round(espera[-1], 1),
+            } if espera else None,
+            'pasos': pasos,
+        }
+
+
+def saturacion(etapas, umbral_errores=0.01, fraccion_throughput=0.9):
+    """
+    Primera etapa que supera `umbral_errores` o, con carga abierta, no sostiene la tasa ofrecida
+    (completa menos de `fraccion_throughput` de los recorridos por segundo ofrecidos).
+    """
+    estable = None
+    for etapa in etapas:
+        motivos = []
+        if etapa['tasa_error'] is not None and etapa['tasa_error'] > umbral_errores:
+            motivos.append(f"tasa de error {etapa['tasa_error']:.2%}")
+        if etapa['tasa_ofrecida'] and etapa['recorridos_por_segundo'] < fraccion_throughput * etapa['tasa_ofrecida']:
+            motivos.append(
+                f"{etapa['recorridos_por_segundo']} recorridos/s de {etapa['tasa_ofrecida']} ofrecidos "
+                f"({etapa['recorridos']['descartados']} descartados)"
+            )
+        if motivos:
+            return {'tasa': etapa['tasa_ofrecida'], 'ultima_estable': estable, 'motivos': motivos}
+        estable = etapa['tasa_ofrecida']
+    return {'tasa': None, 'ultima_estable': estable, 'motivos': []}
@@ -0,0 +1,488 @@
+"""
+Datos sintéticos a escala para el comando `seed_scale`: planes, empresas, usuarios con grupos y
+perfiles, plantillas con campos, compartidas, favoritas, paquetes con asignaciones, documentos
+subidos y millones de documentos generados.
+
+Todo sale de un random.Random con la semilla indicada y de una fecha de referencia, así dos
+corridas con los mismos parámetros producen el mismo contenido (los ids dependen de la base).
+Las filas se insertan con bulk_create por lotes. Como eso no dispara señales, al final se
+sincronizan los accesos y se recalculan analítica, rankings de uso y consumo de los planes desde
+el historial, solo de las empresas sembradas y de a lotes. RegistroCambio no se rellena: los clientes sin
+cursor de sincronización reciben el estado completo.
+"""
+import io
+import random
+import re
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from companies import cuotas
+from companies.models import Empresas, Planes
+from core import cache as cache_catalogos
+from users.models import Perfil, Usuarios
+from . import analitica
+from .models import (
+    AccesoPlantilla, CampoDisponible, CampoPlantilla, CategoriaPlantillaDocumento, ClasificacionPlantillaGeneral,
+    DocumentoGenerado, DocumentoSubido, PlantillaCompartida, PlantillaDocumento, PlantillaFavorita,
+    PlantillaGeneral, PlantillaGeneralCompartida, TipoPlantillaDocumento,
+)
+
+
+TAMANOS = {
+    'chico': {'empresas': 5, 'usuarios_por_empresa': 8, 'plantillas_por_usuario': 3, 'paquetes': 5, 'documentos': 20_000},
+    'mediano': {'empresas': 50, 'usuarios_por_empresa': 20, 'plantillas_por_usuario': 4, 'paquetes': 20, 'documentos': 500_000},
+    'grande': {'empresas': 300, 'usuarios_por_empresa': 40, 'plantillas_por_usuario': 5, 'paquetes': 60, 'documentos': 3_000_000},
+    'enorme': {'empresas': 1000, 'usuarios_por_empresa': 50, 'plantillas_por_usuario': 5, 'paquetes': 150, 'documentos': 10_000_000},
+}
+
+TAMANO_LOTE = 1000
+TAMANO_LOTE_DOCUMENTOS = 20_000
+DIAS_HISTORIAL = 365
+
+# (tipo_plan, nombre, precio, usuarios, peso en el sorteo de empresas, múltiplo del consumo mensual promedio)
+PLANES = (
+    ('basico', 'Plan Básico', 29990.0, 5, 5, 2),
+    ('profesional', 'Plan Profesional', 79990.0, 25, 3, 5),
+    ('corporativo', 'Plan Corporativo', 199990.0, 200, 1, 20),
+)
+
+TIPOS = ('Escrito', 'Demanda', 'Contrato')
+CATEGORIAS = ('Civil', 'Laboral', 'Comercial', 'Familia', 'Penal', 'Tributario')
+CLASIFICACIONES = ('Contratos Comerciales', 'Documentos Laborales', 'Societario', 'Litigios')
+
+CAMPOS = (
+    ('nombre_cliente', 'texto'), ('rut_cliente', 'texto'), ('domicilio_cliente', 'texto'),
+    ('nombre_contraparte', 'texto'), ('rut_contraparte', 'texto'), ('domicilio_contraparte', 'texto'),
+    ('nombre_abogado', 'texto'), ('rut_abogado', 'texto'), ('tribunal', 'texto'), ('rol_causa', 'texto'),
+    ('comuna', 'texto'), ('ciudad', 'texto'), ('nacionalidad', 'texto'), ('estado_civil', 'texto'),
+    ('profesion', 'texto'), ('fecha_contrato', 'fecha'), ('fecha_inicio', 'fecha'), ('fecha_termino', 'fecha'),
+    ('fecha_audiencia', 'fecha'), ('monto', 'numero'), ('renta_mensual', 'numero'), ('plazo_meses', 'numero'),
+    ('porcentaje_multa', 'numero'), ('numero_cuotas', 'numero'),
+)
+
+NOMBRES = (
+    'Camila', 'Valentina', 'Francisca', 'Javiera', 'Constanza', 'Catalina', 'Fernanda', 'Daniela', 'Carolina',
+    'María José', 'Sebastián', 'Matías', 'Nicolás', 'Felipe', 'Diego', 'Benjamín', 'Tomás', 'Cristóbal',
+    'Joaquín', 'Ignacio', 'Rodrigo', 'Andrés', 'Pablo', 'Gonzalo',
+)
+APELLIDOS = (
+    'González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda',
+    'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya', 'Flores', 'Espinoza',
+    'Valenzuela', 'Castillo', 'Tapia', 'Reyes', 'Gutiérrez', 'Castro', 'Pizarro', 'Álvarez', 'Vásquez',
+)
+PREFIJOS_EMPRESA = ('Estudio Jurídico', 'Abogados', 'Consultora Legal', 'Bufete', 'Asesorías Jurídicas')
+CALLES = ('Av. Providencia', 'Huérfanos', 'Av. Apoquindo', 'Agustinas', 'Moneda', 'Av. Libertad', 'Prat', 'Colón')
+COMUNAS = ('Santiago', 'Providencia', 'Las Condes', 'Ñuñoa', 'Viña del Mar', 'Concepción', 'Temuco', 'Antofagasta')
+TRIBUNALES = (
+    '1° Juzgado Civil de Santiago', '2° Juzgado de Letras del Trabajo de Santiago',
+    'Juzgado de Familia de Pudahuel', 'Corte de Apelaciones de Valparaíso', '3° Juzgado Civil de Concepción',
+)
+TEXTOS = {
+    'nacionalidad': ('chilena', 'peruana', 'argentina', 'venezolana', 'colombiana'),
+    'estado_civil': ('soltero', 'casado', 'divorciado', 'viudo', 'conviviente civil'),
+    'profesion': ('ingeniero', 'profesora', 'contador', 'médica', 'comerciante', 'abogado', 'técnico'),
+}
+
+PARRAFOS = (
+    'En {comuna}, a {fecha_contrato}, comparecen don(ña) {nombre_cliente}, cédula de identidad N° {rut_cliente}, '
+    'domiciliado en {domicilio_cliente}, y don(ña) {nombre_contraparte}, RUT {rut_contraparte}.',
+    'PRIMERO: Las partes acuerdan que el precio total asciende a la suma de ${monto}, pagadero en {numero_cuotas} '
+    'cuotas mensuales, iguales y sucesivas.',
+    'SEGUNDO: El presente contrato comenzará a regir el {fecha_inicio} y terminará el {fecha_termino}, '
+    'renovándose tácitamente por períodos de {plazo_meses} meses.',
+    'TERCERO: La renta mensual será de ${renta_mensual}, reajustable anualmente según la variación del IPC.',
+    'CUARTO: En caso de incumplimiento se aplicará una multa equivalente al {porcentaje_multa}% del monto adeudado.',
+    'S.J.L. en lo {tribunal}: {nombre_abogado}, abogado, RUT {rut_abogado}, en representación de {nombre_cliente}, '
+    'en causa rol {rol_causa}, a US. respetuosamente digo:',
+    'Que vengo en solicitar se fije audiencia para el día {fecha_audiencia}, atendido el mérito de los antecedentes.',
+    'Las partes fijan domicilio en la ciudad de {ciudad} y se someten a la competencia de sus tribunales.',
+    'Comparece además don(ña) {nombre_contraparte}, de nacionalidad {nacionalidad}, {estado_civil}, {profesion}.',
+    'Para constancia firman las partes en dos ejemplares de igual tenor y fecha.',
+    'Se deja constancia de que el presente instrumento no constituye novación de las obligaciones anteriores.',
+)
+VARIABLE = re.compile(r'\{\{(\w+)\}\}')
+
+
+def _dv_rut(cuerpo):
+    suma, factor = 0, 2
+    for digito in reversed(str(cuerpo)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    resto = 11 - suma % 11
+    return {10: 'K', 11: '0'}.get(resto, str(resto))
+
+
+def rut(rng, minimo=5_000_000, maximo=25_000_000):
+    """RUT chileno con dígito verificador válido"""
+    cuerpo = rng.randint(minimo, maximo)
+    return f'{cuerpo:,}'.replace(',', '.') + f'-{_dv_rut(cuerpo)}'
+
+
+def resolver_tamano(tamano, **ajustes):
+    """Parámetros del tamaño indicado con los ajustes que no sean None"""
+    if tamano not in TAMANOS:
+        raise ValueError(f"Tamaño desconocido: {tamano}. Opciones: {', '.join(TAMANOS)}")
+    parametros = dict(TAMANOS[tamano])
+    parametros.update({clave: valor for clave, valor in ajustes.items() if valor is not None})
+    for clave, valor in parametros.items():
+        if valor < (0 if clave == 'documentos' else 1):
+            raise ValueError(f"{clave} debe ser al menos {0 if clave == 'documentos' else 1}")
+    return parametros
+
+
+class _Valores:
+    """Pools de valores por campo, generados una vez para que rellenar millones de filas sea barato"""
+
+    def __init__(self, rng, referencia):
+        self.rng = rng
+        personas = [f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}' for _ in range(500)]
+        ruts = [rut(rng) for _ in range(500)]
+        domicilios = [f'{rng.choice(CALLES)} {rng.randint(100, 9999)}, {rng.choice(COMUNAS)}' for _ in range(200)]
+        fechas = [(referencia - timedelta(days=d)).isoformat() for d in range(0, 3 * DIAS_HISTORIAL, 3)]
+        self.pools = {}
+        for nombre, tipo in CAMPOS:
+            if tipo == 'fecha':
+                self.pools[nombre] = fechas
+            elif tipo == 'numero':
+                tope = {'plazo_meses': 60, 'porcentaje_multa': 30, 'numero_cuotas': 36}.get(nombre, 50_000_000)
+                self.pools[nombre] = [str(rng.randint(1, tope)) for _ in range(200)]
+            elif nombre.startswith('nombre_'):
+                self.pools[nombre] = personas
+            elif nombre.startswith('rut_'):
+                self.pools[nombre] = ruts
+            elif nombre.startswith('domicilio_'):
+                self.pools[nombre] = domicilios
+            elif nombre == 'tribunal':
+                self.pools[nombre] = list(TRIBUNALES)
+            elif nombre == 'rol_causa':
+                self.pools[nombre] = [f'C-{rng.randint(100, 99999)}-{rng.randint(2019, 2025)}' for _ in range(200)]
+            elif nombre in ('comuna', 'ciudad'):
+                self.pools[nombre] = list(COMUNAS)
+            else:
+                self.pools[nombre] = list(TEXTOS[nombre])
+
+    def datos(self, variables):
+        return {variable: self.rng.choice(self.pools[variable]) for variable in variables}
+
+
+def _html_plantilla(rng):
+    """HTML con marcadores {{variable}} y la lista de variables que usa, en orden de aparición"""
+    parrafos = rng.sample(PARRAFOS, rng.randint(3, 7))
+    html = ''.join(f'<p>{parrafo.replace("{", "{{").replace("}", "}}")}</p>' for parrafo in parrafos)
+    variables = list(dict.fromkeys(VARIABLE.findall(html)))
+    return html, variables
+
+
+def _renderizar(partes, datos):
+    """partes = VARIABLE.split(html): texto en posiciones pares, variables en impares"""
+    return ''.join(datos[parte] if i % 2 else parte for i, parte in enumerate(partes))
+
+
+def _insertar(modelo, campos, filas):
+    """Inserta tuplas de valores para `campos` con bulk_create (sin señales: los valores deben venir completos)"""
+    modelo.objects.bulk_create([modelo(**dict(zip(campos, fila))) for fila in filas], batch_size=TAMANO_LOTE)
+
+
+class Sembrador:
+    """
+    Genera un conjunto de datos completo. `informar` recibe mensajes de avance.
+    Uso: Sembrador(parametros, semilla=1).sembrar() → dict con los conteos creados.
+    """
+
+    def __init__(self, parametros, semilla=1, fecha_referencia=None, prefijo=None,
+                 password='escala123', informar=None):
+        self.p = parametros
+        self.rng = random.Random(semilla)
+        fecha_referencia = fecha_referencia or timezone.localdate()
+        self.referencia = timezone.make_aware(datetime.combine(fecha_referencia, time(18, 0)))
+        self.prefijo = prefijo or f's{semilla}'
+        self.password = password
+        self.informar = informar or (lambda mensaje: None)
+        self.valores = _Valores(self.rng, fecha_referencia)
+        self.conteos = {}
+
+    def _momento(self, dias=DIAS_HISTORIAL):
+        """Instante aleatorio en los `dias` previos a la fecha de referencia"""
+        return self.referencia - timedelta(seconds=self.rng.randrange(dias * 86400))
+
+    def _contar(self, nombre, cantidad):
+        self.conteos[nombre] = self.conteos.get(nombre, 0) + cantidad
+        self.informar(f"{nombre}: {self.conteos[nombre]}")
+
+    def sembrar(self):
+        if Usuarios.objects.filter(username__startswith=f'{self.prefijo}-').exists():
+            raise ValueError(f"Ya hay usuarios con el prefijo '{self.prefijo}-'; usa otra semilla o --prefijo")
+        with transaction.atomic():
+            self._catalogos()
+            self._empresas_y_usuarios()
+            self._plantillas()
+            self._compartidas_y_favoritas()
+            self._paquetes()
+            self._documentos_subidos()
+        # Fuera de la transacción: cada lote de documentos queda confirmado al insertarse
+        self._documentos_generados()
+        self._recalcular()
+        return self.conteos
+
+    # Catálogos y cuentas -----------------------------------------------------------------------
+
+    def _catalogos(self):
+        promedio_mensual = self.p['documentos'] / self.p['empresas'] / 12
+        self.planes = Planes.objects.bulk_create([
+            Planes(
+                tipo_plan=tipo, nombre=f'{nombre} ({self.prefijo})', precio=precio,
+                # Margen para los usuarios que crean las pruebas de carga
+                cantidad_users=max(usuarios, 2 * self.p['usuarios_por_empresa']),
+                cantidad_escritos=max(50, int(promedio_mensual * multiplo)),
+                cantidad_demandas=max(20, int(promedio_mensual * multiplo / 2)),
+                cantidad_contratos=max(20, int(promedio_mensual * multiplo / 2)),
+                cantidad_consultas=max(100, int(promedio_mensual * multiplo)),
+            )
+            for tipo, nombre, precio, usuarios, _, multiplo in PLANES
+        ])
+        self.pesos_planes = [peso for *_, peso, _ in PLANES]
+        self.tipos = [TipoPlantillaDocumento.objects.get_or_create(nombre=nombre)[0] for nombre in TIPOS]
+        self.categorias = [CategoriaPlantillaDocumento.objects.get_or_create(nombre=nombre)[0] for nombre in CATEGORIAS]
+        self.campos = {
+            nombre: CampoDisponible.objects.get_or_create(nombre=nombre, defaults={'tipo_dato': tipo})[0]
+            for nombre, tipo in CAMPOS
+        }
+        self.grupo_admin, _ = Group.objects.get_or_create(name='Admin')
+        self._contar('planes', len(self.planes))
+
+    def _empresas_y_usuarios(self):
+        empresas = []
+        for i in range(self.p['empresas']):
+            apellidos = ' & '.join(self.rng.sample(APELLIDOS, 2))
+            empresas.append(Empresas(
+                plan=self.rng.choices(self.planes, weights=self.pesos_planes)[0],
+                rut=rut(self.rng, 76_000_000, 77_999_999),
+                nombre=f'{self.rng.choice(PREFIJOS_EMPRESA)} {apellidos} {i + 1}',
+                correo=f'contacto{i + 1}@{self.prefijo}.example.cl',
+            ))
+        self.empresas = Empresas.objects.bulk_create(empresas, batch_size=TAMANO_LOTE)
+        self._contar('empresas', len(self.empresas))
+
+        clave = make_password(self.password)  # Un solo hash: PBKDF2 por usuario dominaría el tiempo total
+        usuarios = [Usuarios(
+            username=f'{self.prefijo}-admin', email=f'admin@{self.prefijo}.example.cl', password=clave,
+            first_name='Administrador', last_name='Plataforma', is_superuser=True, is_staff=True,
+            date_joined=self._momento(2 * DIAS_HISTORIAL),
+        )]
+        for e, empresa in enumerate(self.empresas):
+            for u in range(self.p['usuarios_por_empresa']):
+                usuarios.append(Usuarios(
+                    username=f'{self.prefijo}-{e + 1:04d}-{u + 1:03d}',
+                    email=f'usuario{u + 1}@empresa{e + 1}.{self.prefijo}.example.cl',
+                    password=clave, first_name=self.rng.choice(NOMBRES), last_name=self.rng.choice(APELLIDOS),
+                    empresa=empresa, is_active=self.rng.random() > 0.03,
+                    date_joined=self._momento(2 * DIAS_HISTORIAL),
+                ))
+        usuarios = Usuarios.objects.bulk_create(usuarios, batch_size=TAMANO_LOTE)
+        self.superusuario, self.usuarios = usuarios[0], usuarios[1:]
+        self.usuarios_por_empresa = {}
+        for usuario in self.usuarios:
+            self.usuarios_por_empresa.setdefault(usuario.empresa_id, []).append(usuario)
+        self._contar('usuarios', len(usuarios))
+
+        # El primer usuario de cada empresa la administra
+        Membresia = Usuarios.groups.through
+        Membresia.objects.bulk_create(
+            [Membresia(usuarios_id=miembros[0].pk, group_id=self.grupo_admin.pk) for miembros in self.usuarios_por_empresa.values()],
+            batch_size=TAMANO_LOTE,
+        )
+        Perfil.objects.bulk_create(
+            [
+                Perfil(
+                    usuario=usuario, descargar=self.rng.choice(('pdf', 'docx')),
+                    interlineado=self.rng.choice((1.0, 1.5, 2.0)),
+                    footer=f'{usuario.first_name} {usuario.last_name} · Abogado',
+                    abogado_uno=f'{usuario.first_name} {usuario.last_name}', rut_uno=rut(self.rng),
+                )
+                for usuario in usuarios
+            ],
+            batch_size=TAMANO_LOTE,
+        )
+        self._contar('perfiles', len(usuarios))
+
+    # Plantillas --------------------------------------------------------------------------------
+
+    def _nueva_plantilla(self, usuario, indice, clasificacion=None):
+        html, variables = _html_plantilla(self.rng)
+        tipo = self.rng.choice(self.tipos)
+        return PlantillaDocumento(
+            nombre=f'{tipo.nombre} {self.rng.choice(CATEGORIAS).lower()} {indice}',
+            descripcion=f'Plantilla de {tipo.nombre.lower()} con {len(variables)} campos',
+            html_con_campos=html, usuario=usuario, tipo=tipo, categoria=self.rng.choice(self.categorias),
+            clasificacion=clasificacion, fecha_creacion=self._momento(2 * DIAS_HISTORIAL),
+        )
+
+    def _plantillas(self):
+        self.clasificaciones = ClasificacionPlantillaGeneral.objects.bulk_create([
+            ClasificacionPlantillaGeneral(nombre=f'{nombre} ({self.prefijo})', creado_por=self.superusuario)
+            for nombre in CLASIFICACIONES
+        ])
+        plantillas = [
+            self._nueva_plantilla(self.superusuario, i + 1, self.rng.choice(self.clasificaciones))
+            for i in range(self.p['paquetes'] * 4)
+        ]
+        for usuario in self.usuarios:
+            # Cantidad variable por usuario: algunos no tienen plantillas propias
+            for i in range(self.rng.randint(0, 2 * self.p['plantillas_por_usuario'])):
+                plantillas.append(self._nueva_plantilla(usuario, i + 1))
+        self.plantillas = PlantillaDocumento.objects.bulk_create(plantillas, batch_size=TAMANO_LOTE)
+        self.oficiales = [p for p in self.plantillas if p.usuario_id == self.superusuario.pk]
+        self.partes = {p.pk: VARIABLE.split(p.html_con_campos) for p in self.plantillas}
+        self.variables = {p.pk: self.partes[p.pk][1::2] for p in self.plantillas}
+        self._contar('plantillas', len(self.plantillas))
+
+        _insertar(CampoPlantilla, ('plantilla_id', 'campo_id', 'nombre_variable'), [
+            (p.pk, self.campos[variable].pk, variable)
+            for p in self.plantillas for variable in dict.fromkeys(self.variables[p.pk])
+        ])
+        AccesoPlantilla.sincronizar_propias(self.plantillas)
+
+        # Plantillas que cada usuario puede usar para generar documentos
+        self.disponibles = {usuario.pk: [] for usuario in self.usuarios}
+        for plantilla in self.plantillas:
+            if plantilla.usuario_id in self.disponibles:
+                self.disponibles[plantilla.usuario_id].append(plantilla.pk)
+
+    def _compartidas_y_favoritas(self):
+        propias = {}
+        for plantilla in self.plantillas:
+            propias.setdefault(plantilla.usuario_id, []).append(plantilla)
+        compartidas = []
+        for miembros in self.usuarios_por_empresa.values():
+            for usuario in miembros:
+                if len(miembros) < 2 or self.rng.random() > 0.3:
+                    continue
+                colegas = [m for m in miembros if m.pk != usuario.pk]
+                for plantilla in self.rng.sample(propias.get(usuario.pk, []), min(2, len(propias.get(usuario.pk, [])))):
+                    for colega in self.rng.sample(colegas, min(len(colegas), self.rng.randint(1, 3))):
+                        compartidas.append(PlantillaCompartida(
+                            plantilla=plantilla, usuario=colega,
+                            permisos='edicion' if self.rng.random() < 0.2 else 'lectura',
+                        ))
+                        self.disponibles[colega.pk].append(plantilla.pk)
+        compartidas = PlantillaCompartida.objects.bulk_create(compartidas, batch_size=TAMANO_LOTE)
+        AccesoPlantilla.sincronizar_compartidas(compartidas)
+        self._contar('compartidas', len(compartidas))
+
+        favoritas = [
+            PlantillaFavorita(usuario_id=usuario_id, plantilla_id=plantilla_id, fecha_agregado=self._momento())
+            for usuario_id, disponibles in self.disponibles.items()
+            for plantilla_id in self.rng.sample(disponibles, min(len(disponibles), self.rng.randint(0, 3)))
+        ]
+        PlantillaFavorita.objects.bulk_create(favoritas, batch_size=TAMANO_LOTE, ignore_conflicts=True)
+        self._contar('favoritas', len(favoritas))
+
+    def _paquetes(self):
+        paquetes = PlantillaGeneral.objects.bulk_create([
+            PlantillaGeneral(
+                clasificacion=self.rng.choice(self.clasificaciones), nombre=f'Paquete {i + 1} ({self.prefijo})',
+                descripcion='Paquete de plantillas generado por seed_scale', creado_por_admin=self.superusuario,
+                activo=self.rng.random() > 0.05, es_paquete_premium=self.rng.random() < 0.2,
+            )
+            for i in range(self.p['paquetes'])
+        ])
+        Inclusion = PlantillaGeneral.plantillas_incluidas.through
+        contenido = {
+            paquete.pk: self.rng.sample(self.oficiales, min(len(self.oficiales), self.rng.randint(4, 10)))
+            for paquete in paquetes
+        }
+        Inclusion.objects.bulk_create(
+            [
+                Inclusion(plantillageneral_id=paquete_id, plantilladocumento_id=plantilla.pk)
+                for paquete_id, plantillas in contenido.items() for plantilla in plantillas
+            ],
+            batch_size=TAMANO_LOTE,
+        )
+        self._contar('paquetes', len(paquetes))
+
+        # Cada empresa recibe de 1 a 3 paquetes para todos sus usuarios; algunas asignaciones
+        # expiran (las ya vencidas quedan activas para que las procese el barrido)
+        vigentes = {paquete.pk for paquete in paquetes if paquete.activo}
+        asignaciones = []
+        for miembros in self.usuarios_por_empresa.values():
+            elegidos = self.rng.sample(paquetes, min(len(paquetes), self.rng.randint(1, 3)))
+            for paquete in elegidos:
+                expiracion = None
+                if self.rng.random() < 0.2:
+                    expiracion = self.referencia + timedelta(days=self.rng.randint(-30, 180))
+                for usuario in miembros:
+                    asignaciones.append(PlantillaGeneralCompartida(
+                        plantilla_general=paquete, usuario=usuario, asignado_por=self.superusuario,
+                        fecha_expiracion=expiracion, notas='Asignación de seed_scale',
+                    ))
+                    if paquete.pk in vigentes:
+                        self.disponibles[usuario.pk].extend(p.pk for p in contenido[paquete.pk])
+        PlantillaGeneralCompartida.objects.bulk_create(asignaciones, batch_size=TAMANO_LOTE)
+        AccesoPlantilla.sincronizar_paquetes([paquete.pk for paquete in paquetes])
+        self._contar('asignaciones', len(asignaciones))
+
+    # Documentos --------------------------------------------------------------------------------
+
+    def _documentos_subidos(self):
+        tipos = (('pdf', 'pdf'), ('word', 'docx'), ('imagen', 'png'), ('texto', 'txt'))
+        filas = []
+        for usuario in self.usuarios:
+            for i in range(self.rng.randint(0, 5)):
+                tipo, extension = self.rng.choice(tipos)
+                momento = self._momento()
+                filas.append((
+                    usuario.pk, f'documento_{i + 1}.{extension}', tipo,
+                    f'documentos_subidos/{self.prefijo}/{usuario.pk}/documento_{i + 1}.{extension}',
+                    f'<p>{self.rng.choice(PARRAFOS)}</p>', momento, 1, momento,
+                ))
+        _insertar(DocumentoSubido, (
+            'usuario_id', 'nombre_original', 'tipo', 'archivo_url', 'html', 'fecha_subida', 'revision', 'fecha_actualizacion',
+        ), filas)
+        self._contar('documentos_subidos', len(filas))
+
+    def _documentos_generados(self):
+        # Actividad desigual entre usuarios, como en producción: unos pocos generan la mayoría
+        autores = [usuario for usuario in self.usuarios if self.disponibles[usuario.pk]]
+        if not autores:
+            return
+        pesos = [1 / (i + 1) for i in range(len(autores))]
+        self.rng.shuffle(autores)
+        campos = (
+            'nombre', 'plantilla_id', 'usuario_id', 'datos_rellenados', 'html_resultante',
+            'fecha_generacion', 'revision', 'fecha_actualizacion',
+        )
+        restantes = self.p['documentos']
+        while restantes > 0:
+            cantidad = min(TAMANO_LOTE_DOCUMENTOS, restantes)
+            filas = []
+            for usuario in self.rng.choices(autores, weights=pesos, k=cantidad):
+                plantilla_id = self.rng.choice(self.disponibles[usuario.pk])
+                datos = self.valores.datos(self.variables[plantilla_id])
+                momento = self._momento()
+                filas.append((
+                    f'{usuario.username}_documento_{momento:%Y%m%d%H%M%S}.html', plantilla_id, usuario.pk, datos,
+                    _renderizar(self.partes[plantilla_id], datos), momento, 1, momento,
+                ))
+            with transaction.atomic():
+                _insertar(DocumentoGenerado, campos, filas)
+            restantes -= cantidad
+            self._contar('documentos_generados', cantidad)
+
+    def _recalcular(self):
+        """
+        Lo que mantienen las señales y bulk_create no disparó: analítica, rankings y consumo. Solo de
+        las empresas sembradas, por empresa o por lotes de empresas, sin recorrer el resto de la base.
+        """
+        self.informar("Recalculando analítica, usos de plantillas y consumo de planes...")
+        empresa_ids = [empresa.pk for empresa in self.empresas]
+        analitica.reconstruir_empresas(empresa_ids)
+        call_command('reconstruir_usos_plantillas', empresas=empresa_ids, stdout=io.StringIO())
+        cuotas.reconciliar(empresa_ids=empresa_ids)
+        for catalogo in (cache_catalogos.PLANES, cache_catalogos.TIPOS_PLANTILLA, cache_catalogos.CATEGORIAS_PLANTILLA,
+                         cache_catalogos.CLASIFICACIONES_PLANTILLA, cache_catalogos.CAMPOS_DISPONIBLES):
+            cache_catalogos.invalidar_catalogo(catalogo)
@@ -0,0 +1,30 @@
+from rest_framework.renderers import JSONRenderer
+
+from core.cache import obtener_fragmentos, obtener_versiones_catalogos, TIPOS_PLANTILLA, CAMPOS_DISPONIBLES
+from .models import PlantillaDocumento
+
+
+def resumenes_serializados(revisiones):
+    """
+    Retorna {plantilla_id: bytes} con el JSON de `get_resumen()` de cada plantilla.
+    `revisiones` es {plantilla_id: revision}; la clave incluye la revisión y las versiones
+    de los catálogos anidados (tipo y campos), por lo que no hace falta invalidar.
+    """
+    versiones = obtener_versiones_catalogos([TIPOS_PLANTILLA, CAMPOS_DISPONIBLES])
+    sufijo = f'{versiones[TIPOS_PLANTILLA]}:{versiones[CAMPOS_DISPONIBLES]}'
+    claves = {
+        plantilla_id: f'plantilla:resumen:{plantilla_id}:{revision}:{sufijo}'
+        for plantilla_id, revision in revisiones.items()
+    }
+
+    def construir(ids):
+        renderer = JSONRenderer()
+        plantillas = PlantillaDocumento.objects.filter(id__in=ids).select_related('tipo').prefetch_related('campos_asociados__campo')
+        return {plantilla.id: renderer.render(plantilla.get_resumen()) for plantilla in plantillas}
+
+    return obtener_fragmentos(claves, construir)
+
+
+def con_es_favorito(fragmento, es_favorito):
+    """Agrega el campo por usuario `es_favorito` al final del objeto JSON cacheado"""
+    return fragmento[:-1] + (b',"es_favorito":true}' if es_favorito else b',"es_favorito":false}')
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from documents import analitica
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrega los eventos pendientes de documentos generados y subidos a los resúmenes diarios. "
+        "Con --continuo queda corriendo como agregador en segundo plano."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help="Eventos por transacción (por defecto 5000)")
+        parser.add_argument('--continuo', action='store_true', help="Repetir cada --intervalo segundos")
+        parser.add_argument('--intervalo', type=int, default=30, help="Segundos entre pasadas con --continuo")
+        parser.add_argument('--reconstruir', action='store_true', help="Recalcular todos los resúmenes desde el historial")
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            total = analitica.reconstruir()
+            self.stdout.write(self.style.SUCCESS(f"{total} resúmenes diarios reconstruidos"))
+            return
+
+        while True:
+            total = analitica.agregar_eventos(tamano_lote=options['lote'])
+            self.stdout.write(f"{total} eventos agregados")
+            if not options['continuo']:
+                return
+            # Sin conexión abierta mientras espera
+            connection.close()
+            time.sleep(options['intervalo'])
@@ -0,0 +1,69 @@
+import json
+import sys
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from documents import rendimiento
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide conversión de documentos, render de plantillas, listados por rol, compartir y asignar "
+        "paquetes sobre la base de datos configurada (con datos sembrados) y compara con la base guardada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=30, help="Iteraciones medidas por escenario (por defecto 30)")
+        parser.add_argument('--calentamiento', type=int, default=3, help="Iteraciones previas sin medir (por defecto 3)")
+        parser.add_argument('--escenarios', help="Prefijos de escenarios separados por coma (p. ej. conversion,listado_plantillas)")
+        parser.add_argument('--muestras', help="Directorio con un .docx, .pdf y .png reales en vez de los generados")
+        parser.add_argument('--base', default=str(Path(settings.BASE_DIR) / 'bench' / 'base.json'),
+                            help="Archivo de la base de comparación (por defecto bench/base.json)")
+        parser.add_argument('--guardar-base', action='store_true', help="Guardar este resultado como nueva base")
+        parser.add_argument('--umbral', type=float, default=0.2,
+                            help="Empeoramiento tolerado antes de marcar regresión, como fracción (por defecto 0.2)")
+        parser.add_argument('--salida', help="Escribir el informe JSON en este archivo además de mostrarlo")
+
+    def handle(self, *args, **options):
+        if options['iteraciones'] < 1:
+            raise CommandError("--iteraciones debe ser al menos 1")
+        filtro = [prefijo.strip() for prefijo in options['escenarios'].split(',')] if options['escenarios'] else None
+
+        # Sin temporizador de escritura diferida: lo pendiente se revierte con cada iteración.
+        # Sin cuotas: las iteraciones de render no deben agotar el plan de la empresa sembrada.
+        # Los print de las vistas van a stderr para que stdout sea solo el JSON.
+        with override_settings(ESCRITURA_DIFERIDA_INTERVALO=0, CUOTAS_ACTIVAS=False), redirect_stdout(sys.stderr):
+            try:
+                informe = rendimiento.ejecutar_bench(
+                    iteraciones=options['iteraciones'],
+                    calentamiento=options['calentamiento'],
+                    filtro=filtro,
+                    muestras=rendimiento.cargar_muestras(options['muestras']),
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        base = Path(options['base'])
+        regresiones = []
+        if base.exists() and not options['guardar_base']:
+            informe['base'] = str(base)
+            informe['umbral'] = options['umbral']
+            informe['comparacion'], regresiones = rendimiento.comparar(
+                informe, json.loads(base.read_text()), options['umbral']
+            )
+            informe['regresiones'] = regresiones
+
+        salida = json.dumps(informe, indent=2, ensure_ascii=False)
+        self.stdout.write(salida)
+        if options['salida']:
+            Path(options['salida']).write_text(salida)
+        if options['guardar_base']:
+            base.parent.mkdir(parents=True, exist_ok=True)
+            base.write_text(salida)
+            self.stderr.write(self.style.SUCCESS(f"Base guardada en {base}"))
+        if regresiones:
+            raise CommandError(f"{len(regresiones)} regresiones respecto de {base}: {', '.join(regresiones)}")
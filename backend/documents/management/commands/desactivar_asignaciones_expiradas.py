@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from documents.models import PlantillaGeneralCompartida
+
+
+class Command(BaseCommand):
+    help = (
+        "Desactiva las asignaciones de paquetes de plantillas cuya fecha de expiración ya pasó "
+        "y actualiza el índice de acceso. Pensado para ejecutarse periódicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Asignaciones por transacción (por defecto 1000)")
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa cuántas asignaciones se desactivarían")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            pendientes = PlantillaGeneralCompartida.objects.expiradas().count()
+            self.stdout.write(f"{pendientes} asignaciones expiradas pendientes de desactivar")
+            return
+
+        total = PlantillaGeneralCompartida.desactivar_expiradas(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{total} asignaciones expiradas desactivadas"))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.models import RegistroCambio
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina del registro de cambios de la sincronización los registros más antiguos que "
+        "SINCRONIZACION_RETENCION_DIAS. Pensado para ejecutarse periódicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help="Días de retención (por defecto SINCRONIZACION_RETENCION_DIAS)")
+        parser.add_argument('--lote', type=int, default=5000, help="Registros por DELETE (por defecto 5000)")
+
+    def handle(self, *args, **options):
+        dias = settings.SINCRONIZACION_RETENCION_DIAS if options['dias'] is None else options['dias']
+        total = RegistroCambio.podar(dias=dias, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{total} registros de cambios anteriores a {dias} días eliminados"))
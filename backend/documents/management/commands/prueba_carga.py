@@ -0,0 +1,75 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents import carga, rendimiento
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga contra un servidor en marcha: recorridos del frontend (login, bootstrap, "
+        "plantillas, generar, subir DOCX, compartir y administrar usuarios) con concurrencia y tasa "
+        "de llegada configurables. Informa percentiles y errores por paso y el punto de saturación."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="URL base del servidor (por defecto http://127.0.0.1:8000)")
+        parser.add_argument('--prefijo', help="Solo usuarios cuyo nombre empiece con este prefijo (p. ej. s1- de seed_scale)")
+        parser.add_argument('--password', default='escala123', help="Contraseña de los usuarios (por defecto la de seed_scale)")
+        parser.add_argument('--concurrencia', type=int, default=10, help="Recorridos simultáneos como máximo (por defecto 10)")
+        parser.add_argument('--tasas', default='0',
+                            help="Recorridos por segundo de cada etapa, separados por coma (p. ej. 1,2,4,8). "
+                                 "0 = cada worker encadena recorridos sin esperar (por defecto)")
+        parser.add_argument('--duracion', type=float, default=60, help="Segundos de cada etapa (por defecto 60)")
+        parser.add_argument('--pausa', type=float, default=0,
+                            help="Pausa media entre pasos en segundos, como el tiempo de lectura de un usuario (por defecto 0)")
+        parser.add_argument('--mezcla', help="Pesos de los recorridos (p. ej. navegar=50,generar=25,subir=10,compartir=10,administrar=5)")
+        parser.add_argument('--semilla', type=int, default=1, help="Semilla de la elección de recorridos y usuarios")
+        parser.add_argument('--timeout', type=float, default=30, help="Segundos de espera por respuesta (por defecto 30)")
+        parser.add_argument('--umbral-errores', type=float, default=0.01,
+                            help="Tasa de error que marca la saturación, como fracción (por defecto 0.01)")
+        parser.add_argument('--muestras', help="Directorio con un .docx real para el recorrido de subida")
+        parser.add_argument('--salida', help="Escribir el informe JSON en este archivo además de mostrarlo")
+
+    def handle(self, *args, **options):
+        try:
+            tasas = [float(tasa) for tasa in options['tasas'].split(',')]
+        except ValueError:
+            raise CommandError("--tasas debe ser una lista de números separados por coma")
+        if options['concurrencia'] < 1 or options['duracion'] <= 0 or any(tasa < 0 for tasa in tasas):
+            raise CommandError("--concurrencia y --duracion deben ser positivas y las tasas no negativas")
+
+        try:
+            generador = carga.Generador(
+                options['url'],
+                carga.usuarios_de_prueba(options['prefijo']),
+                options['password'],
+                mezcla=carga.leer_mezcla(options['mezcla']),
+                pausa=options['pausa'],
+                timeout=options['timeout'],
+                semilla=options['semilla'],
+                docx=rendimiento.cargar_muestras(options['muestras'])['docx'],
+            )
+            generador.verificar()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        etapas = []
+        for tasa in tasas:
+            self.stderr.write(f"Etapa: {tasa or 'carga cerrada'} recorridos/s, concurrencia {options['concurrencia']}...")
+            etapas.append(generador.etapa(tasa, options['concurrencia'], options['duracion']))
+        informe = {
+            'url': options['url'],
+            'mezcla': generador.mezcla,
+            'etapas': etapas,
+            'saturacion': carga.saturacion(etapas, options['umbral_errores']),
+        }
+
+        salida = json.dumps(informe, indent=2, ensure_ascii=False)
+        self.stdout.write(salida)
+        if options['salida']:
+            Path(options['salida']).write_text(salida)
+        self.stderr.write(self.style.SUCCESS(
+            f"{sum(etapa['recorridos'].get('completados', 0) for etapa in etapas)} recorridos completados en {len(etapas)} etapas"
+        ))
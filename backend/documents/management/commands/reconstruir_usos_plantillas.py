@@ -0,0 +1,69 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from documents.models import DocumentoGenerado, UsoPlantilla
+from users.models import Usuarios
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los contadores y puntajes de UsoPlantilla a partir del historial de "
+        "DocumentoGenerado. Necesario tras cambiar USO_PLANTILLAS_VIDA_MEDIA_DIAS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--empresas', nargs='+', type=int,
+            help="Solo los contadores de estas empresas y de sus usuarios (por defecto todos)",
+        )
+        parser.add_argument('--lote', type=int, default=50, help="Empresas por transacción con --empresas")
+
+    def handle(self, *args, **options):
+        empresa_ids = options['empresas']
+        if not empresa_ids:
+            total = self.reconstruir(DocumentoGenerado.objects.all(), UsoPlantilla.objects.all())
+        else:
+            total = 0
+            for inicio in range(0, len(empresa_ids), options['lote']):
+                lote = empresa_ids[inicio:inicio + options['lote']]
+                total += self.reconstruir(
+                    DocumentoGenerado.objects.filter(usuario__empresa_id__in=lote),
+                    UsoPlantilla.objects.filter(
+                        Q(ambito=UsoPlantilla.EMPRESA, referencia_id__in=lote)
+                        | Q(ambito=UsoPlantilla.USUARIO,
+                            referencia_id__in=Usuarios.objects.filter(empresa_id__in=lote).values('id'))
+                    ),
+                )
+        self.stdout.write(self.style.SUCCESS(f"{total} contadores de uso reconstruidos"))
+
+    def reconstruir(self, documentos, contadores):
+        """Reemplaza `contadores` por los calculados desde `documentos`; retorna cuántos quedaron"""
+        acumulado = defaultdict(lambda: {'usos': 0, 'puntaje': UsoPlantilla.PUNTAJE_VACIO, 'fecha_ultimo_uso': None})
+        historial = documentos.values_list(
+            'usuario_id', 'usuario__empresa_id', 'plantilla_id', 'fecha_generacion'
+        ).iterator(chunk_size=5000)
+        for usuario_id, empresa_id, plantilla_id, fecha in historial:
+            claves = [(UsoPlantilla.USUARIO, usuario_id, plantilla_id)]
+            if empresa_id:
+                claves.append((UsoPlantilla.EMPRESA, empresa_id, plantilla_id))
+            puntaje = UsoPlantilla.puntaje_uso(fecha)
+            for clave in claves:
+                valores = acumulado[clave]
+                valores['usos'] += 1
+                valores['puntaje'] = UsoPlantilla.sumar_puntajes(valores['puntaje'], puntaje)
+                if valores['fecha_ultimo_uso'] is None or fecha > valores['fecha_ultimo_uso']:
+                    valores['fecha_ultimo_uso'] = fecha
+
+        with transaction.atomic():
+            contadores.delete()
+            UsoPlantilla.objects.bulk_create(
+                [
+                    UsoPlantilla(ambito=ambito, referencia_id=referencia_id, plantilla_id=plantilla_id, **valores)
+                    for (ambito, referencia_id, plantilla_id), valores in acumulado.items()
+                ],
+                batch_size=1000,
+            )
+        return len(acumulado)
@@ -0,0 +1,49 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents import escala
+
+
+class Command(BaseCommand):
+    help = (
+        "Siembra datos sintéticos a escala (empresas, usuarios, plantillas, compartidas, paquetes y "
+        "documentos generados) de forma determinista a partir de una semilla."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamano', choices=list(escala.TAMANOS), default='chico',
+                            help="Escala de los datos (por defecto chico)")
+        parser.add_argument('--semilla', type=int, default=1, help="Semilla del generador (por defecto 1)")
+        parser.add_argument('--empresas', type=int, help="Reemplaza la cantidad de empresas del tamaño")
+        parser.add_argument('--usuarios-por-empresa', type=int, help="Reemplaza los usuarios por empresa del tamaño")
+        parser.add_argument('--documentos', type=int, help="Reemplaza la cantidad de documentos generados del tamaño")
+        parser.add_argument('--fecha-referencia', type=date.fromisoformat,
+                            help="Fecha (AAAA-MM-DD) hacia atrás de la cual se reparte el historial (por defecto hoy)")
+        parser.add_argument('--prefijo', help="Prefijo de los nombres de usuario (por defecto s<semilla>)")
+        parser.add_argument('--password', default='escala123', help="Contraseña de todos los usuarios sembrados")
+
+    def handle(self, *args, **options):
+        try:
+            parametros = escala.resolver_tamano(
+                options['tamano'],
+                empresas=options['empresas'],
+                usuarios_por_empresa=options['usuarios_por_empresa'],
+                documentos=options['documentos'],
+            )
+            sembrador = escala.Sembrador(
+                parametros,
+                semilla=options['semilla'],
+                fecha_referencia=options['fecha_referencia'],
+                prefijo=options['prefijo'],
+                password=options['password'],
+                informar=lambda mensaje: self.stderr.write(mensaje) if options['verbosity'] > 1 else None,
+            )
+            conteos = sembrador.sembrar()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        resumen = ', '.join(f"{cantidad} {nombre.replace('_', ' ')}" for nombre, cantidad in conteos.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos sembrados (superusuario {sembrador.superusuario.username}, prefijo {sembrador.prefijo}-): {resumen}"
+        ))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_revision_y_fecha_actualizacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroCambio',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('entidad', models.CharField(choices=[('plantilla', 'Plantilla'), ('favorito', 'Favorito'), ('compartida', 'Compartida')], max_length=20)),
+                ('objeto_id', models.PositiveIntegerField()),
+                ('operacion', models.CharField(choices=[('upsert', 'Creación o modificación'), ('eliminacion', 'Eliminación')], max_length=20)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registro_cambios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Registro de Cambios',
+                'db_table': 'registro_cambios',
+                'managed': True,
+                'indexes': [models.Index(fields=['usuario', 'id'], name='registro_ca_usuario_4f1f3c_idx')],
+            },
+        ),
+    ]
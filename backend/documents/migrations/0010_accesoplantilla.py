@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def poblar_accesos(apps, schema_editor):
+    """Construye el índice de acceso a partir de los datos existentes"""
+    AccesoPlantilla = apps.get_model('documents', 'AccesoPlantilla')
+    PlantillaDocumento = apps.get_model('documents', 'PlantillaDocumento')
+    PlantillaCompartida = apps.get_model('documents', 'PlantillaCompartida')
+    PlantillaGeneralCompartida = apps.get_model('documents', 'PlantillaGeneralCompartida')
+    PlantillaGeneral = apps.get_model('documents', 'PlantillaGeneral')
+
+    accesos = [
+        AccesoPlantilla(usuario_id=usuario_id, plantilla_id=plantilla_id, origen='propia', referencia_id=plantilla_id, permiso='edicion')
+        for plantilla_id, usuario_id in PlantillaDocumento.objects.values_list('id', 'usuario_id').iterator()
+    ]
+    accesos += [
+        AccesoPlantilla(usuario_id=usuario_id, plantilla_id=plantilla_id, origen='compartida', referencia_id=compartida_id, permiso=permisos)
+        for compartida_id, usuario_id, plantilla_id, permisos
+        in PlantillaCompartida.objects.values_list('id', 'usuario_id', 'plantilla_id', 'permisos').iterator()
+    ]
+    plantillas_por_paquete = {}
+    for paquete_id, plantilla_id in PlantillaGeneral.plantillas_incluidas.through.objects.values_list(
+        'plantillageneral_id', 'plantilladocumento_id'
+    ).iterator():
+        plantillas_por_paquete.setdefault(paquete_id, []).append(plantilla_id)
+    asignaciones = PlantillaGeneralCompartida.objects.filter(activo=True, plantilla_general__activo=True).values_list(
+        'id', 'usuario_id', 'plantilla_general_id', 'fecha_expiracion'
+    )
+    accesos += [
+        AccesoPlantilla(usuario_id=usuario_id, plantilla_id=plantilla_id, origen='paquete', referencia_id=asignacion_id,
+                        fecha_expiracion=fecha_expiracion)
+        for asignacion_id, usuario_id, paquete_id, fecha_expiracion in asignaciones.iterator()
+        for plantilla_id in plantillas_por_paquete.get(paquete_id, [])
+    ]
+    AccesoPlantilla.objects.bulk_create(accesos, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_registrocambio'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccesoPlantilla',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('origen', models.CharField(choices=[('propia', 'Propia'), ('compartida', 'Compartida'), ('paquete', 'Paquete')], max_length=20)),
+                ('referencia_id', models.PositiveIntegerField()),
+                ('permiso', models.CharField(choices=[('lectura', 'Solo lectura'), ('edicion', 'Lectura y edición')], default='lectura', max_length=20)),
+                ('fecha_expiracion', models.DateTimeField(blank=True, null=True)),
+                ('plantilla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accesos', to='documents.plantilladocumento')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accesos_plantillas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Accesos a Plantillas',
+                'db_table': 'accesos_plantillas',
+                'managed': True,
+                'indexes': [models.Index(fields=['usuario', 'origen', 'plantilla'], name='accesos_pla_usuario_d2dbbd_idx'), models.Index(fields=['origen', 'referencia_id'], name='accesos_pla_origen_614a08_idx')],
+                'unique_together': {('usuario', 'plantilla', 'origen', 'referencia_id')},
+            },
+        ),
+        migrations.RunPython(poblar_accesos, migrations.RunPython.noop),
+    ]
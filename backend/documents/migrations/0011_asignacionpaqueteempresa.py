@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0003_rename_cantidadconsultas_planes_cantidad_consultas_and_more'),
+        ('documents', '0010_accesoplantilla'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsignacionPaqueteEmpresa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_expiracion', models.DateTimeField(blank=True, null=True)),
+                ('notas', models.TextField(blank=True, null=True)),
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('asignado_por', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paquetes_empresa_asignados', to=settings.AUTH_USER_MODEL)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paquetes_plantillas_automaticos', to='companies.empresas')),
+                ('plantilla_general', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asignaciones_empresa', to='documents.plantillageneral')),
+            ],
+            options={
+                'verbose_name': 'Asignación Automática de Paquete a Empresa',
+                'verbose_name_plural': 'Asignaciones Automáticas de Paquetes a Empresas',
+                'db_table': 'plantillas_generales_empresas',
+                'managed': True,
+                'unique_together': {('plantilla_general', 'empresa')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_asignacionpaqueteempresa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plantillageneralcompartida',
+            index=models.Index(fields=['usuario', 'activo', 'fecha_expiracion'], name='plantillas__usuario_8db951_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plantillageneralcompartida',
+            index=models.Index(fields=['activo', 'fecha_expiracion'], name='plantillas__activo_b6d809_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_indices_vigencia_asignaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsoPlantilla',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('ambito', models.CharField(choices=[('usuario', 'Usuario'), ('empresa', 'Empresa')], max_length=10)),
+                ('referencia_id', models.PositiveIntegerField()),
+                ('usos', models.PositiveIntegerField(default=0)),
+                ('puntaje', models.FloatField(default=0)),
+                ('fecha_ultimo_uso', models.DateTimeField(blank=True, null=True)),
+                ('plantilla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usos', to='documents.plantilladocumento')),
+            ],
+            options={
+                'verbose_name_plural': 'Usos de Plantillas',
+                'db_table': 'usos_plantillas',
+                'managed': True,
+                'indexes': [models.Index(fields=['ambito', 'referencia_id', '-puntaje'], name='usos_planti_ambito_90462a_idx'), models.Index(fields=['ambito', 'referencia_id', '-fecha_ultimo_uso'], name='usos_planti_ambito_2a60e3_idx')],
+                'unique_together': {('ambito', 'referencia_id', 'plantilla')},
+            },
+        ),
+    ]
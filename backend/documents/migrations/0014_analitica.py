@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0013_usoplantilla'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoAnalitica',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('metrica', models.CharField(choices=[('generados', 'Documentos generados'), ('subidos', 'Documentos subidos')], max_length=10)),
+                ('fecha', models.DateField()),
+                ('empresa_id', models.PositiveIntegerField(default=0)),
+                ('usuario_id', models.PositiveIntegerField()),
+                ('dimension', models.CharField(blank=True, default='', max_length=50)),
+            ],
+            options={
+                'verbose_name_plural': 'Eventos de Analítica',
+                'db_table': 'eventos_analitica',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioDocumentos',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('empresa_id', models.PositiveIntegerField(default=0)),
+                ('usuario_id', models.PositiveIntegerField()),
+                ('metrica', models.CharField(choices=[('generados', 'Documentos generados'), ('subidos', 'Documentos subidos')], max_length=10)),
+                ('dimension', models.CharField(blank=True, default='', max_length=50)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Resúmenes Diarios de Documentos',
+                'db_table': 'resumenes_diarios_documentos',
+                'managed': True,
+                'indexes': [models.Index(fields=['empresa_id', 'metrica', 'fecha'], name='resumenes_d_empresa_337837_idx')],
+                'unique_together': {('fecha', 'empresa_id', 'usuario_id', 'metrica', 'dimension')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0015_perfiles_peticiones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registrocambio',
+            index=models.Index(fields=['fecha'], name='registro_ca_fecha_654d38_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:38
+
+from django.db import migrations, models
+from django.db.models.functions import Log, Power
+
+PUNTAJE_VACIO = -1e9
+
+
+def a_logaritmo(apps, schema_editor):
+    """El puntaje pasa de la suma de pesos 2^x a su log2"""
+    UsoPlantilla = apps.get_model('documents', 'UsoPlantilla')
+    UsoPlantilla.objects.filter(puntaje__lte=0).update(puntaje=PUNTAJE_VACIO)
+    UsoPlantilla.objects.filter(puntaje__gt=0).update(puntaje=Log(2, models.F('puntaje')))
+
+
+def a_lineal(apps, schema_editor):
+    UsoPlantilla = apps.get_model('documents', 'UsoPlantilla')
+    UsoPlantilla.objects.filter(puntaje__gt=PUNTAJE_VACIO).update(puntaje=Power(2, models.F('puntaje')))
+    UsoPlantilla.objects.filter(puntaje__lte=PUNTAJE_VACIO).update(puntaje=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0016_indice_fecha_registro_cambios'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usoplantilla',
+            name='puntaje',
+            field=models.FloatField(default=-1000000000.0),
+        ),
+        migrations.RunPython(a_logaritmo, a_lineal),
+    ]
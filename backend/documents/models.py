@@ -1,13 +1,40 @@
-from django.db import models
+from django.db import models, transaction
 from users.models import Usuarios
 from companies.models import Empresas
 from companies.models import Tribunales
 from django.utils import timezone
+from django.conf import settings
 from django.core.files.storage import default_storage
+from core.escritura_diferida import BufferEscritura, BufferContadores
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
+import math
 
 
-class DocumentoSubido(models.Model):
+class ModeloConRevision(models.Model):
+    """
+    Agrega un número de revisión y la fecha de actualización.
+    Se usan para los ETag de las respuestas y para detectar escrituras concurrentes (If-Match).
+    """
+    revision = models.PositiveIntegerField(default=1, editable=False)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        """Incrementa la revisión de forma atómica en cada actualización"""
+        if not self._state.adding and not kwargs.get('force_insert'):
+            self.revision = models.F('revision') + 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'revision', 'fecha_actualizacion'}
+        super().save(*args, **kwargs)
+        if isinstance(self.revision, models.expressions.Combinable):
+            self.refresh_from_db(fields=['revision'])
+
+
+class DocumentoSubido(ModeloConRevision):
     TIPO_CHOICES = [
         ('pdf', 'PDF'),
         ('imagen', 'Imagen'),
@@ -76,7 +103,27 @@ class TipoPlantillaDocumento(models.Model):
     def __str__(self):
         return self.nombre
 
-class PlantillaDocumento(models.Model):
+class PlantillaDocumentoQuerySet(models.QuerySet):
+    def accesibles_para(self, usuario):
+        """Plantillas propias o compartidas con el usuario"""
+        accesos = AccesoPlantilla.objects.filter(usuario=usuario, origen__in=AccesoPlantilla.ORIGENES_DIRECTOS)
+        return self.filter(id__in=accesos.values('plantilla_id'))
+
+    def disponibles_para(self, usuario):
+        """Plantillas propias, compartidas o de paquetes vigentes asignados al usuario"""
+        accesos = AccesoPlantilla.objects.filter(usuario=usuario).vigentes()
+        return self.filter(id__in=accesos.values('plantilla_id'))
+
+    def para_serializar(self):
+        """Carga de una vez lo que lee PlantillaDocumentoSerializer: tipo, categoría, campos y clasificación con conteos"""
+        clasificaciones = ClasificacionPlantillaGeneral.objects.select_related('creado_por').con_conteos()
+        return self.select_related('tipo', 'categoria').prefetch_related(
+            'campos_asociados__campo',
+            models.Prefetch('clasificacion', queryset=clasificaciones),
+        )
+
+
+class PlantillaDocumento(ModeloConRevision):
     id = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=255)
     descripcion = models.TextField(blank=True)
@@ -87,6 +134,8 @@ class PlantillaDocumento(models.Model):
     categoria = models.ForeignKey('CategoriaPlantillaDocumento', on_delete=models.SET_NULL, null=True, blank=True)
     fecha_creacion = models.DateTimeField(default=timezone.now)
 
+    objects = PlantillaDocumentoQuerySet.as_manager()
+
     class Meta:
         managed = True
         db_table = 'plantillas_documentos'
@@ -95,6 +144,33 @@ class PlantillaDocumento(models.Model):
     def __str__(self):
         return f"{self.nombre} - {self.usuario.username}"
 
+    def get_resumen(self):
+        """
+        Representación usada en el listado de plantillas y en el bootstrap.
+        Usar con select_related('tipo') y prefetch_related('campos_asociados__campo').
+        """
+        return {
+            'id': self.id,
+            'nombre': self.nombre,
+            'descripcion': self.descripcion,
+            'html_con_campos': self.html_con_campos,
+            'fecha_creacion': self.fecha_creacion,
+            'campos_asociados': [
+                {
+                    'id': campo_plantilla.id,
+                    'campo': campo_plantilla.campo.id,
+                    'nombre_variable': campo_plantilla.nombre_variable,
+                    'campo_nombre': campo_plantilla.campo.nombre,
+                    'campo_tipo': campo_plantilla.campo.tipo_dato
+                }
+                for campo_plantilla in self.campos_asociados.all()
+            ],
+            'tipo': {
+                'id': self.tipo.id,
+                'nombre': self.tipo.nombre
+            } if self.tipo else None
+        }
+
 class CampoPlantilla(models.Model):
     id = models.AutoField(primary_key=True)
     plantilla = models.ForeignKey(PlantillaDocumento, on_delete=models.CASCADE, related_name='campos_asociados')
@@ -109,7 +185,7 @@ class CampoPlantilla(models.Model):
     def __str__(self):
         return f"{self.nombre_variable} -> {self.campo.nombre}"
 
-class DocumentoGenerado(models.Model):
+class DocumentoGenerado(ModeloConRevision):
     id = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=255)
     plantilla = models.ForeignKey(PlantillaDocumento, on_delete=models.CASCADE)
@@ -146,6 +222,17 @@ class PlantillaFavorita(models.Model):
     def __str__(self):
         return f"{self.usuario.username} - {self.plantilla.nombre}"
 
+    def get_resumen(self):
+        """Representación usada en `mis_favoritos` y en el bootstrap. Usar con select_related('plantilla')"""
+        return {
+            'id': self.plantilla.id,
+            'nombre': self.plantilla.nombre,
+            'descripcion': self.plantilla.descripcion,
+            'fecha_creacion': self.plantilla.fecha_creacion,
+            'fecha_agregado_favorito': self.fecha_agregado,
+            'es_favorito': True
+        }
+
 class PlantillaCompartida(models.Model):
     plantilla = models.ForeignKey('PlantillaDocumento', on_delete=models.CASCADE, related_name='compartidas')
     usuario = models.ForeignKey(Usuarios, on_delete=models.CASCADE, related_name='plantillas_compartidas')
@@ -161,6 +248,56 @@ class PlantillaCompartida(models.Model):
     def __str__(self):
         return f"{self.plantilla.nombre} → {self.usuario.username} ({self.permisos})"
 
+    TAMANO_LOTE = 500
+
+    @classmethod
+    def compartir_con_usuarios(cls, plantilla, usuario_ids, permisos='lectura'):
+        """
+        Comparte la plantilla con varios usuarios en una sola transacción:
+        un INSERT ... ON CONFLICT DO UPDATE por lote y las filas de índice y registro de cambios en bloque.
+        Como bulk_create no emite señales, aquí se replica lo que hacen los receptores de post_save.
+        Retorna (compartidas, ids_creadas).
+        """
+        usuario_ids = sorted(set(usuario_ids))
+        with transaction.atomic():
+            # Bloquea la plantilla para que otro reparto concurrente no cambie las filas
+            # existentes entre esta lectura y el upsert (y así `creadas` sea exacto)
+            list(PlantillaDocumento.objects.select_for_update().filter(pk=plantilla.pk).values_list('pk', flat=True))
+            existentes = set(
+                cls.objects.filter(plantilla=plantilla, usuario_id__in=usuario_ids).values_list('usuario_id', flat=True)
+            )
+            cls.objects.bulk_create(
+                [cls(plantilla=plantilla, usuario_id=usuario_id, permisos=permisos) for usuario_id in usuario_ids],
+                update_conflicts=True,
+                unique_fields=['plantilla', 'usuario'],
+                update_fields=['permisos'],
+                batch_size=cls.TAMANO_LOTE,
+            )
+            # Se releen para tener los ids también de las filas que ya existían
+            compartidas = list(cls.objects.filter(plantilla=plantilla, usuario_id__in=usuario_ids).order_by('usuario_id'))
+            AccesoPlantilla.sincronizar_compartidas(compartidas)
+
+            cambios = []
+            for compartida in compartidas:
+                cambios.append((compartida.usuario_id, RegistroCambio.COMPARTIDA, compartida.pk))
+                cambios.append((compartida.usuario_id, RegistroCambio.PLANTILLA, plantilla.pk))
+                cambios.append((plantilla.usuario_id, RegistroCambio.COMPARTIDA, compartida.pk))
+            RegistroCambio.registrar_lote(cambios, RegistroCambio.UPSERT)
+
+        creadas = {compartida.pk for compartida in compartidas if compartida.usuario_id not in existentes}
+        return compartidas, creadas
+
+
+class ClasificacionPlantillaGeneralQuerySet(models.QuerySet):
+    def con_conteos(self):
+        """Anota los conteos de paquetes activos y plantillas para evitar consultas por fila"""
+        activos = models.Q(plantillageneral__activo=True)
+        return self.annotate(
+            paquetes_activos_count=models.Count('plantillageneral', filter=activos, distinct=True),
+            plantillas_en_categoria_count=models.Count('plantillageneral__plantillas_incluidas', filter=activos, distinct=True),
+        )
+
+
 class ClasificacionPlantillaGeneral(models.Model):
     """
     Categorías para organizar los paquetes de plantillas.
@@ -191,6 +328,8 @@ class ClasificacionPlantillaGeneral(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
+    objects = ClasificacionPlantillaGeneralQuerySet.as_manager()
+
     class Meta:
         managed = True
         db_table = 'clasificaciones_plantillas_generales'
@@ -281,7 +420,10 @@ class PlantillaGeneral(models.Model):
         from collections import defaultdict
         plantillas_por_tipo = defaultdict(list)
         
-        for plantilla in self.plantillas_incluidas.select_related('tipo'):
+        plantillas = self.plantillas_incluidas.all()
+        if 'plantillas_incluidas' not in getattr(self, '_prefetched_objects_cache', {}):
+            plantillas = plantillas.select_related('tipo')
+        for plantilla in plantillas:
             tipo_nombre = plantilla.tipo.nombre if plantilla.tipo else 'Sin tipo'
             plantilla_data = {
                 'id': plantilla.id,
@@ -357,6 +499,67 @@ class PlantillaGeneral(models.Model):
             
         return asignacion
     
+    def asignar_a_usuarios(self, usuarios, asignado_por, fecha_expiracion=None, notas=None):
+        """
+        Asigna este paquete a un conjunto de usuarios (queryset o lista de ids) con SQL por conjuntos:
+        un UPDATE para reactivar las asignaciones inactivas, un anti-join para calcular las que faltan
+        y un INSERT por lote para crearlas. Retorna (ids_creadas, ids_reactivadas).
+        """
+        if not self.activo:
+            return [], []
+        if not isinstance(usuarios, models.QuerySet):
+            usuarios = Usuarios.objects.filter(id__in=list(usuarios))
+        usuarios = usuarios.values('id')
+        existentes = PlantillaGeneralCompartida.objects.filter(plantilla_general=self, usuario_id=models.OuterRef('pk'))
+
+        with transaction.atomic():
+            inactivas = PlantillaGeneralCompartida.objects.filter(plantilla_general=self, usuario_id__in=usuarios, activo=False)
+            reactivadas = list(inactivas.values_list('id', flat=True))
+            PlantillaGeneralCompartida.objects.filter(id__in=reactivadas).update(
+                activo=True, asignado_por=asignado_por, fecha_expiracion=fecha_expiracion, notas=notas
+            )
+
+            faltantes = list(usuarios.filter(~models.Exists(existentes)).values_list('id', flat=True))
+            # ignore_conflicts cubre la carrera con otra asignación concurrente del mismo paquete
+            PlantillaGeneralCompartida.objects.bulk_create(
+                [
+                    PlantillaGeneralCompartida(
+                        plantilla_general=self, usuario_id=usuario_id, asignado_por=asignado_por,
+                        fecha_expiracion=fecha_expiracion, notas=notas, activo=True,
+                    )
+                    for usuario_id in faltantes
+                ],
+                ignore_conflicts=True,
+                batch_size=PlantillaCompartida.TAMANO_LOTE,
+            )
+            creadas = list(PlantillaGeneralCompartida.objects.filter(
+                plantilla_general=self, usuario_id__in=faltantes
+            ).values_list('id', flat=True))
+
+            # update() y bulk_create() no emiten señales: el índice de acceso se actualiza aquí
+            AccesoPlantilla.sincronizar_asignaciones(creadas + reactivadas)
+        return creadas, reactivadas
+
+    def asignar_a_empresa(self, empresa, asignado_por, fecha_expiracion=None, notas=None, automatica=False):
+        """
+        Asigna el paquete a todos los usuarios activos de la empresa.
+        Con automatica=True también se asignará a los usuarios que se creen después en ella.
+        """
+        if automatica:
+            AsignacionPaqueteEmpresa.objects.update_or_create(
+                plantilla_general=self,
+                empresa=empresa,
+                defaults={
+                    'asignado_por': asignado_por,
+                    'fecha_expiracion': fecha_expiracion,
+                    'notas': notas,
+                    'activo': True,
+                }
+            )
+        return self.asignar_a_usuarios(
+            Usuarios.objects.filter(empresa=empresa, is_active=True), asignado_por, fecha_expiracion, notas
+        )
+
     def get_usuarios_con_acceso(self):
         """Obtiene todos los usuarios que tienen acceso a este paquete"""
         return Usuarios.objects.filter(
@@ -365,6 +568,19 @@ class PlantillaGeneral(models.Model):
         ).distinct()
 
 
+class PlantillaGeneralCompartidaQuerySet(models.QuerySet):
+    def vigentes(self, momento=None):
+        """Equivalente en SQL de esta_vigente(): activas y sin expiración o con expiración futura"""
+        momento = momento or timezone.now()
+        return self.filter(activo=True).filter(
+            models.Q(fecha_expiracion__isnull=True) | models.Q(fecha_expiracion__gt=momento)
+        )
+
+    def expiradas(self, momento=None):
+        """Activas cuya fecha de expiración ya pasó (las que debe desactivar el barrido)"""
+        return self.filter(activo=True, fecha_expiracion__lte=momento or timezone.now())
+
+
 class PlantillaGeneralCompartida(models.Model):
     """
     Asignación de paquetes de plantillas a usuarios específicos.
@@ -404,6 +620,8 @@ class PlantillaGeneralCompartida(models.Model):
         null=True, blank=True,
         help_text="Última vez que el usuario accedió a plantillas de este paquete"
     )
+
+    objects = PlantillaGeneralCompartidaQuerySet.as_manager()
     
     class Meta:
         db_table = 'plantillas_generales_compartidas'
@@ -412,6 +630,9 @@ class PlantillaGeneralCompartida(models.Model):
             models.Index(fields=['plantilla_general', 'usuario', 'activo']),
             models.Index(fields=['fecha_expiracion']),
             models.Index(fields=['asignado_por']),
+            # vigentes() por usuario y expiradas() del barrido
+            models.Index(fields=['usuario', 'activo', 'fecha_expiracion']),
+            models.Index(fields=['activo', 'fecha_expiracion']),
         ]
         verbose_name = "Asignación de Paquete de Plantillas"
         verbose_name_plural = "Asignaciones de Paquetes de Plantillas"
@@ -419,6 +640,23 @@ class PlantillaGeneralCompartida(models.Model):
     def __str__(self):
         return f"Paquete '{self.plantilla_general.nombre}' → {self.usuario.get_full_name() or self.usuario.username}"
     
+    @classmethod
+    def desactivar_expiradas(cls, tamano_lote=1000, momento=None):
+        """
+        Desactiva en lotes acotados las asignaciones expiradas y retira sus filas del índice de acceso.
+        Cada lote es una transacción corta para no bloquear la tabla. Retorna el total desactivado.
+        """
+        momento = momento or timezone.now()
+        total = 0
+        while True:
+            ids = list(cls.objects.expiradas(momento).order_by('id').values_list('id', flat=True)[:tamano_lote])
+            if not ids:
+                return total
+            with transaction.atomic():
+                # Se vuelve a filtrar por si alguna se reactivó entre la lectura y el UPDATE
+                total += cls.objects.filter(id__in=ids).expiradas(momento).update(activo=False)
+                AccesoPlantilla.sincronizar_asignaciones(ids)
+
     def esta_vigente(self):
         """Verifica si la asignación está vigente"""
         if not self.activo:
@@ -428,9 +666,19 @@ class PlantillaGeneralCompartida(models.Model):
         return True
     
     def marcar_acceso(self):
-        """Marca que el usuario accedió recientemente a plantillas de este paquete"""
+        """
+        Marca que el usuario accedió recientemente a plantillas de este paquete.
+        La escritura es diferida: se agrupa con las demás en el próximo vaciado del buffer.
+        """
         self.fecha_ultimo_acceso = timezone.now()
-        self.save(update_fields=['fecha_ultimo_acceso'])
+        buffer_accesos_asignaciones.registrar(self.pk, self.fecha_ultimo_acceso)
+
+    @classmethod
+    def marcar_accesos(cls, asignacion_ids):
+        """Igual que marcar_acceso() pero a partir de ids, sin cargar las asignaciones"""
+        ahora = timezone.now()
+        for asignacion_id in asignacion_ids:
+            buffer_accesos_asignaciones.registrar(asignacion_id, ahora)
     
     def get_plantillas_disponibles(self):
         """Retorna las plantillas disponibles en este paquete"""
@@ -438,6 +686,47 @@ class PlantillaGeneralCompartida(models.Model):
             return PlantillaDocumento.objects.none()
         return self.plantilla_general.plantillas_incluidas.all()
 
+
+# fecha_ultimo_acceso se escribe con write-behind para no bloquear filas de paquetes muy usados
+buffer_accesos_asignaciones = BufferEscritura('documents.PlantillaGeneralCompartida', 'fecha_ultimo_acceso')
+
+
+class AsignacionPaqueteEmpresa(models.Model):
+    """
+    Asignación automática de un paquete a una empresa: los usuarios que se creen
+    después en la empresa reciben el paquete (ver signals.asignar_paquetes_de_empresa).
+    """
+    plantilla_general = models.ForeignKey(
+        PlantillaGeneral,
+        on_delete=models.CASCADE,
+        related_name='asignaciones_empresa'
+    )
+    empresa = models.ForeignKey(
+        Empresas,
+        on_delete=models.CASCADE,
+        related_name='paquetes_plantillas_automaticos'
+    )
+    asignado_por = models.ForeignKey(
+        Usuarios,
+        on_delete=models.CASCADE,
+        related_name='paquetes_empresa_asignados'
+    )
+    fecha_expiracion = models.DateTimeField(null=True, blank=True)
+    notas = models.TextField(blank=True, null=True)
+    activo = models.BooleanField(default=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        managed = True
+        db_table = 'plantillas_generales_empresas'
+        unique_together = ['plantilla_general', 'empresa']
+        verbose_name = "Asignación Automática de Paquete a Empresa"
+        verbose_name_plural = "Asignaciones Automáticas de Paquetes a Empresas"
+
+    def __str__(self):
+        return f"Paquete '{self.plantilla_general.nombre}' → {self.empresa.nombre}"
+
+
 class CategoriaPlantillaDocumento(models.Model):
     id = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=100, unique=True)
@@ -448,4 +737,450 @@ class CategoriaPlantillaDocumento(models.Model):
         verbose_name_plural = 'Categorias de Plantillas'
     
     def __str__(self):
-        return self.nombre
\ No newline at end of file
+        return self.nombre
+
+class RegistroCambio(models.Model):
+    """
+    Bitácora de cambios por usuario para la sincronización incremental del cliente.
+    El id es una secuencia monótona que el frontend usa como cursor. Los ids se asignan al
+    insertar y no al confirmar la transacción, por eso el cursor solo avanza sobre cambios
+    asentados (más antiguos que SINCRONIZACION_MARGEN_SEGUNDOS). Los registros más antiguos
+    que SINCRONIZACION_RETENCION_DIAS se podan (podar_registro_cambios).
+    """
+    PLANTILLA = 'plantilla'
+    FAVORITO = 'favorito'
+    COMPARTIDA = 'compartida'
+    ENTIDAD_CHOICES = [
+        (PLANTILLA, 'Plantilla'),
+        (FAVORITO, 'Favorito'),
+        (COMPARTIDA, 'Compartida'),
+    ]
+
+    UPSERT = 'upsert'
+    ELIMINACION = 'eliminacion'
+    OPERACION_CHOICES = [
+        (UPSERT, 'Creación o modificación'),
+        (ELIMINACION, 'Eliminación'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    usuario = models.ForeignKey(Usuarios, on_delete=models.CASCADE, related_name='registro_cambios')
+    entidad = models.CharField(max_length=20, choices=ENTIDAD_CHOICES)
+    objeto_id = models.PositiveIntegerField()
+    operacion = models.CharField(max_length=20, choices=OPERACION_CHOICES)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        managed = True
+        db_table = 'registro_cambios'
+        verbose_name_plural = 'Registro de Cambios'
+        indexes = [
+            models.Index(fields=['usuario', 'id']),
+            models.Index(fields=['fecha']),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.operacion} {self.entidad}:{self.objeto_id} → {self.usuario_id}"
+
+    @staticmethod
+    def limite_asentado(momento=None):
+        """Fecha desde la cual un cambio todavía puede tener una transacción anterior sin confirmar"""
+        return (momento or timezone.now()) - timedelta(seconds=settings.SINCRONIZACION_MARGEN_SEGUNDOS)
+
+    @classmethod
+    def registrar(cls, usuario_ids, entidad, objeto_id, operacion):
+        """Registra el mismo cambio para cada usuario afectado con un solo INSERT"""
+        cls.objects.bulk_create([
+            cls(usuario_id=usuario_id, entidad=entidad, objeto_id=objeto_id, operacion=operacion)
+            for usuario_id in set(usuario_ids) if usuario_id
+        ])
+
+    @classmethod
+    def registrar_lote(cls, cambios, operacion):
+        """Registra varios cambios (usuario_id, entidad, objeto_id) con la misma operación en un solo INSERT"""
+        cls.objects.bulk_create(
+            [
+                cls(usuario_id=usuario_id, entidad=entidad, objeto_id=objeto_id, operacion=operacion)
+                for usuario_id, entidad, objeto_id in dict.fromkeys(cambios) if usuario_id
+            ],
+            batch_size=1000,
+        )
+
+    @classmethod
+    def ultimo_cursor(cls, usuario):
+        """Retorna el id del último cambio registrado para el usuario (0 si no hay)"""
+        ultimo = cls.objects.filter(usuario=usuario).order_by('-id').values_list('id', flat=True).first()
+        return ultimo or 0
+
+    @classmethod
+    def cursor_asentado(cls, momento=None):
+        """
+        Id del último cambio asentado de cualquier usuario (0 si no hay). Todo lo que se confirme
+        después tendrá un id mayor, así que sirve de cursor para el estado completo.
+        """
+        ultimo = (
+            cls.objects.filter(fecha__lt=cls.limite_asentado(momento))
+            .order_by('-id').values_list('id', flat=True).first()
+        )
+        return ultimo or 0
+
+    @classmethod
+    def cursor_vigente(cls, cursor):
+        """Indica si los cambios posteriores al cursor siguen en el registro (no se podaron)"""
+        primero = cls.objects.order_by('id').values_list('id', flat=True).first()
+        return primero is None or cursor >= primero - 1
+
+    @classmethod
+    def podar(cls, dias=None, tamano_lote=5000, momento=None):
+        """
+        Elimina en lotes los cambios más antiguos que la retención. Siempre conserva el último
+        registro: su id marca hasta dónde se podó y así cursor_vigente detecta cursores vencidos.
+        Retorna el total eliminado.
+        """
+        dias = settings.SINCRONIZACION_RETENCION_DIAS if dias is None else dias
+        limite = (momento or timezone.now()) - timedelta(days=dias)
+        ultimo = cls.objects.order_by('-id').values_list('id', flat=True).first()
+        hasta = cls.objects.filter(fecha__lt=limite).order_by('-id').values_list('id', flat=True).first()
+        if ultimo is None or hasta is None:
+            return 0
+        hasta = min(hasta, ultimo - 1)
+        total = 0
+        while True:
+            ids = list(cls.objects.filter(id__lte=hasta).order_by('id').values_list('id', flat=True)[:tamano_lote])
+            if not ids:
+                return total
+            total += cls.objects.filter(id__in=ids).delete()[0]
+
+
+class AccesoPlantillaQuerySet(models.QuerySet):
+    def vigentes(self):
+        """Accesos sin expiración o con expiración futura"""
+        return self.filter(models.Q(fecha_expiracion__isnull=True) | models.Q(fecha_expiracion__gt=timezone.now()))
+
+
+class AccesoPlantilla(models.Model):
+    """
+    Índice materializado de acceso usuario → plantilla.
+    Lo mantienen las señales de plantillas, compartidas, paquetes y asignaciones (ver signals.py),
+    de modo que "plantillas que puedo usar" es una sola búsqueda indexada.
+    """
+    PROPIA = 'propia'
+    COMPARTIDA = 'compartida'
+    PAQUETE = 'paquete'
+    ORIGEN_CHOICES = [
+        (PROPIA, 'Propia'),
+        (COMPARTIDA, 'Compartida'),
+        (PAQUETE, 'Paquete'),
+    ]
+    # Orígenes que ya consideraban el listado y el detalle de plantillas antes del índice
+    ORIGENES_DIRECTOS = (PROPIA, COMPARTIDA)
+
+    PERMISO_CHOICES = [('lectura', 'Solo lectura'), ('edicion', 'Lectura y edición')]
+
+    id = models.BigAutoField(primary_key=True)
+    usuario = models.ForeignKey(Usuarios, on_delete=models.CASCADE, related_name='accesos_plantillas')
+    plantilla = models.ForeignKey(PlantillaDocumento, on_delete=models.CASCADE, related_name='accesos')
+    origen = models.CharField(max_length=20, choices=ORIGEN_CHOICES)
+    # Id de la PlantillaCompartida o PlantillaGeneralCompartida que otorga el acceso (la propia plantilla si es PROPIA)
+    referencia_id = models.PositiveIntegerField()
+    permiso = models.CharField(max_length=20, choices=PERMISO_CHOICES, default='lectura')
+    fecha_expiracion = models.DateTimeField(null=True, blank=True)
+
+    objects = AccesoPlantillaQuerySet.as_manager()
+
+    class Meta:
+        managed = True
+        db_table = 'accesos_plantillas'
+        verbose_name_plural = 'Accesos a Plantillas'
+        unique_together = ('usuario', 'plantilla', 'origen', 'referencia_id')
+        indexes = [
+            models.Index(fields=['usuario', 'origen', 'plantilla']),
+            models.Index(fields=['origen', 'referencia_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} → {self.plantilla_id} ({self.origen})"
+
+    @classmethod
+    def sincronizar_propia(cls, plantilla):
+        """Asegura la fila de acceso del dueño de la plantilla"""
+        actualizadas = cls.objects.filter(plantilla=plantilla, origen=cls.PROPIA).update(usuario_id=plantilla.usuario_id)
+        if not actualizadas:
+            cls.objects.create(
+                usuario_id=plantilla.usuario_id, plantilla=plantilla, origen=cls.PROPIA,
+                referencia_id=plantilla.pk, permiso='edicion'
+            )
+
+    @classmethod
+    def sincronizar_propias(cls, plantillas):
+        """Versión masiva de sincronizar_propia para plantillas recién creadas con bulk_create"""
+        cls.objects.bulk_create(
+            [
+                cls(usuario_id=p.usuario_id, plantilla_id=p.pk, origen=cls.PROPIA, referencia_id=p.pk, permiso='edicion')
+                for p in plantillas
+            ],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+
+    @classmethod
+    def sincronizar_compartidas(cls, compartidas):
+        """Crea o actualiza las filas de las PlantillaCompartida indicadas"""
+        cls.objects.bulk_create(
+            [
+                cls(usuario_id=c.usuario_id, plantilla_id=c.plantilla_id, origen=cls.COMPARTIDA,
+                    referencia_id=c.pk, permiso=c.permisos)
+                for c in compartidas
+            ],
+            update_conflicts=True,
+            unique_fields=['usuario', 'plantilla', 'origen', 'referencia_id'],
+            update_fields=['permiso'],
+            batch_size=1000,
+        )
+
+    @classmethod
+    def sincronizar_asignaciones(cls, asignacion_ids):
+        """Reconstruye las filas de las asignaciones de paquetes indicadas"""
+        asignacion_ids = list(asignacion_ids)
+        cls.objects.filter(origen=cls.PAQUETE, referencia_id__in=asignacion_ids).delete()
+        asignaciones = PlantillaGeneralCompartida.objects.filter(
+            id__in=asignacion_ids, activo=True, plantilla_general__activo=True
+        ).values_list('id', 'usuario_id', 'plantilla_general_id', 'fecha_expiracion')
+        asignaciones = list(asignaciones)
+        if not asignaciones:
+            return
+        Inclusion = PlantillaGeneral.plantillas_incluidas.through
+        plantillas_por_paquete = {}
+        for paquete_id, plantilla_id in Inclusion.objects.filter(
+            plantillageneral_id__in={a[2] for a in asignaciones}
+        ).values_list('plantillageneral_id', 'plantilladocumento_id'):
+            plantillas_por_paquete.setdefault(paquete_id, []).append(plantilla_id)
+        cls.objects.bulk_create(
+            [
+                cls(usuario_id=usuario_id, plantilla_id=plantilla_id, origen=cls.PAQUETE,
+                    referencia_id=asignacion_id, fecha_expiracion=fecha_expiracion)
+                for asignacion_id, usuario_id, paquete_id, fecha_expiracion in asignaciones
+                for plantilla_id in plantillas_por_paquete.get(paquete_id, [])
+            ],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+
+    @classmethod
+    def sincronizar_paquetes(cls, paquete_ids):
+        """Reconstruye las filas de todas las asignaciones de los paquetes indicados"""
+        cls.sincronizar_asignaciones(
+            PlantillaGeneralCompartida.objects.filter(plantilla_general_id__in=paquete_ids).values_list('id', flat=True)
+        )
+
+
+class UsoPlantilla(models.Model):
+    """
+    Contadores de uso por (usuario, plantilla) y (empresa, plantilla) para los rankings de
+    "más usadas" y "usadas recientemente". Se actualizan con escritura diferida desde
+    generar_documento, sin agregar el historial de DocumentoGenerado en cada consulta.
+
+    `puntaje` es una popularidad con decaimiento exponencial (vida media USO_PLANTILLAS_VIDA_MEDIA_DIAS)
+    relativa a EPOCA_PUNTAJE: cada uso aporta 2^((t - época) / vida_media), así nunca hay que
+    reescribir las filas para envejecerlas. Se guarda en base 2 logarítmica (log2 de la suma), que
+    crece linealmente con el tiempo y no se desborda; ordenar por la columna sigue equivaliendo a
+    ordenar por el puntaje decaído. Si se cambia la vida media hay que ejecutar reconstruir_usos_plantillas.
+    """
+    USUARIO = 'usuario'
+    EMPRESA = 'empresa'
+    AMBITO_CHOICES = [
+        (USUARIO, 'Usuario'),
+        (EMPRESA, 'Empresa'),
+    ]
+    EPOCA_PUNTAJE = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    # Puntaje de una fila sin usos: 2^PUNTAJE_VACIO es 0 en la práctica
+    PUNTAJE_VACIO = -1e9
+
+    id = models.BigAutoField(primary_key=True)
+    ambito = models.CharField(max_length=10, choices=AMBITO_CHOICES)
+    # Id del usuario o de la empresa según el ámbito
+    referencia_id = models.PositiveIntegerField()
+    plantilla = models.ForeignKey(PlantillaDocumento, on_delete=models.CASCADE, related_name='usos')
+    usos = models.PositiveIntegerField(default=0)
+    puntaje = models.FloatField(default=PUNTAJE_VACIO)
+    fecha_ultimo_uso = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        managed = True
+        db_table = 'usos_plantillas'
+        verbose_name_plural = 'Usos de Plantillas'
+        unique_together = ('ambito', 'referencia_id', 'plantilla')
+        indexes = [
+            models.Index(fields=['ambito', 'referencia_id', '-puntaje']),
+            models.Index(fields=['ambito', 'referencia_id', '-fecha_ultimo_uso']),
+        ]
+
+    def __str__(self):
+        return f"{self.ambito} {self.referencia_id} → {self.plantilla_id} ({self.usos})"
+
+    @classmethod
+    def puntaje_uso(cls, momento):
+        """Puntaje (log2) de un uso en el momento indicado"""
+        vida_media = settings.USO_PLANTILLAS_VIDA_MEDIA_DIAS * 86400
+        return (momento - cls.EPOCA_PUNTAJE).total_seconds() / vida_media
+
+    @staticmethod
+    def sumar_puntajes(a, b):
+        """log2(2^a + 2^b) sin pasar por los valores lineales"""
+        mayor, menor = max(a, b), min(a, b)
+        return mayor + math.log2(1 + 2 ** (menor - mayor))
+
+    @classmethod
+    def puntaje_actual(cls, puntaje, momento=None):
+        """Convierte el puntaje guardado en la popularidad decaída a la fecha indicada"""
+        return 2 ** (puntaje - cls.puntaje_uso(momento or timezone.now()))
+
+    @classmethod
+    def registrar(cls, usuario, plantilla_id, momento=None):
+        """Anota un uso en el buffer; se escribe en el próximo vaciado"""
+        momento = momento or timezone.now()
+        valores = {'usos': 1, 'puntaje': cls.puntaje_uso(momento), 'fecha_ultimo_uso': momento}
+        buffer_usos_plantillas.registrar((cls.USUARIO, usuario.pk, plantilla_id), **valores)
+        if usuario.empresa_id:
+            buffer_usos_plantillas.registrar((cls.EMPRESA, usuario.empresa_id, plantilla_id), **valores)
+
+    @classmethod
+    def aplicar_incrementos(cls, pendientes):
+        """
+        Aplica {(ambito, referencia_id, plantilla_id): {usos, puntaje, fecha_ultimo_uso}} con un
+        INSERT para las filas nuevas y un UPDATE con CASE por lote. `usos` se incrementa con F();
+        el puntaje se suma en base logarítmica sobre el valor leído con las filas bloqueadas.
+        """
+        # La plantilla pudo eliminarse entre el uso y el vaciado
+        plantillas = set(PlantillaDocumento.objects.filter(
+            id__in={plantilla_id for _, _, plantilla_id in pendientes}
+        ).values_list('id', flat=True))
+        pendientes = {clave: valores for clave, valores in pendientes.items() if clave[2] in plantillas}
+        if not pendientes:
+            return
+        with transaction.atomic():
+            # Mismo orden en todos los workers para que los bloqueos no se crucen
+            claves = sorted(pendientes)
+            cls.objects.bulk_create(
+                [cls(ambito=ambito, referencia_id=referencia_id, plantilla_id=plantilla_id)
+                 for ambito, referencia_id, plantilla_id in claves],
+                ignore_conflicts=True,
+                batch_size=1000,
+            )
+            filas = {
+                (ambito, referencia_id, plantilla_id): (fila_id, puntaje)
+                for fila_id, ambito, referencia_id, plantilla_id, puntaje in cls.objects.select_for_update().filter(
+                    plantilla_id__in={clave[2] for clave in pendientes},
+                    referencia_id__in={clave[1] for clave in pendientes},
+                ).order_by('id').values_list('id', 'ambito', 'referencia_id', 'plantilla_id', 'puntaje')
+            }
+            for inicio in range(0, len(claves), 500):
+                lote = [
+                    (filas[clave][0], {**pendientes[clave], 'puntaje': cls.sumar_puntajes(filas[clave][1], pendientes[clave]['puntaje'])})
+                    for clave in claves[inicio:inicio + 500]
+                ]
+                cls.objects.filter(id__in=[fila_id for fila_id, _ in lote]).update(
+                    usos=models.F('usos') + models.Case(
+                        *[models.When(id=fila_id, then=models.Value(v['usos'])) for fila_id, v in lote],
+                        output_field=models.PositiveIntegerField(),
+                    ),
+                    puntaje=models.Case(
+                        *[models.When(id=fila_id, then=models.Value(v['puntaje'])) for fila_id, v in lote],
+                        output_field=models.FloatField(),
+                    ),
+                    fecha_ultimo_uso=models.Case(
+                        *[models.When(id=fila_id, then=models.Value(v['fecha_ultimo_uso'])) for fila_id, v in lote],
+                        output_field=models.DateTimeField(),
+                    ),
+                )
+
+
+buffer_usos_plantillas = BufferContadores(
+    UsoPlantilla.aplicar_incrementos, 'usos_plantillas', combinar={'puntaje': UsoPlantilla.sumar_puntajes}
+)
+
+
+class EventoAnalitica(models.Model):
+    """
+    Bitácora de documentos generados y subidos pendientes de agregar en ResumenDiarioDocumentos.
+    La escriben las señales en la misma transacción que el documento y la consume
+    analitica.agregar_eventos(), que borra cada evento al sumarlo.
+    """
+    GENERADOS = 'generados'
+    SUBIDOS = 'subidos'
+    METRICA_CHOICES = [
+        (GENERADOS, 'Documentos generados'),
+        (SUBIDOS, 'Documentos subidos'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    metrica = models.CharField(max_length=10, choices=METRICA_CHOICES)
+    fecha = models.DateField()
+    # Sin FK: los resúmenes son históricos y sobreviven a la eliminación de usuarios o empresas
+    empresa_id = models.PositiveIntegerField(default=0)
+    usuario_id = models.PositiveIntegerField()
+    # Id del tipo de plantilla (generados) o formato del archivo (subidos)
+    dimension = models.CharField(max_length=50, blank=True, default='')
+
+    class Meta:
+        managed = True
+        db_table = 'eventos_analitica'
+        verbose_name_plural = 'Eventos de Analítica'
+
+
+class ResumenDiarioDocumentos(models.Model):
+    """Conteo diario por empresa, usuario, métrica y dimensión (empresa_id 0 = sin empresa)"""
+    id = models.BigAutoField(primary_key=True)
+    fecha = models.DateField()
+    empresa_id = models.PositiveIntegerField(default=0)
+    usuario_id = models.PositiveIntegerField()
+    metrica = models.CharField(max_length=10, choices=EventoAnalitica.METRICA_CHOICES)
+    dimension = models.CharField(max_length=50, blank=True, default='')
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'resumenes_diarios_documentos'
+        verbose_name_plural = 'Resúmenes Diarios de Documentos'
+        unique_together = ('fecha', 'empresa_id', 'usuario_id', 'metrica', 'dimension')
+        indexes = [
+            models.Index(fields=['empresa_id', 'metrica', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.empresa_id}/{self.usuario_id} {self.metrica} {self.dimension}: {self.cantidad}"
+
+
+class PerfilPeticion(models.Model):
+    """
+    Perfil por muestreo de una petición pedida por staff con X-Perfilar o ?perfilar=1
+    (ver core/perfilador.py). Se conservan solo los últimos PERFILADOR_RETENCION.
+    """
+    id = models.BigAutoField(primary_key=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+    usuario = models.ForeignKey(Usuarios, on_delete=models.SET_NULL, null=True, blank=True)
+    metodo = models.CharField(max_length=10)
+    ruta = models.CharField(max_length=500)
+    endpoint = models.CharField(max_length=200, blank=True, default='')
+    status_code = models.PositiveSmallIntegerField()
+    duracion_ms = models.FloatField()
+    muestras = models.PositiveIntegerField()
+    intervalo_ms = models.FloatField()
+    # Formato folded: una línea "raíz;...;hoja cantidad" por pila
+    perfil = models.TextField()
+
+    class Meta:
+        managed = True
+        db_table = 'perfiles_peticiones'
+        verbose_name_plural = 'Perfiles de Peticiones'
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"{self.metodo} {self.ruta} ({self.duracion_ms:.0f} ms)"
+
+    @classmethod
+    def aplicar_retencion(cls):
+        """Elimina los perfiles más antiguos que exceden PERFILADOR_RETENCION"""
+        sobrantes = list(cls.objects.order_by('-fecha', '-id').values_list('id', flat=True)[settings.PERFILADOR_RETENCION:])
+        if sobrantes:
+            cls.objects.filter(id__in=sobrantes).delete()
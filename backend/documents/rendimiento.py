@@ -0,0 +1,350 @@
+"""
+Escenarios del comando `bench`: conversión de DOCX/PDF/OCR, render de plantillas, listados por
+rol, compartir plantillas y asignar paquetes, medidos sobre la base de datos configurada (que
+debe tener datos sembrados).
+
+Cada iteración corre dentro de un savepoint que se revierte al terminar, así todas parten del
+mismo estado y una corrida no modifica los datos de la siguiente. Por escenario se informa
+throughput, percentiles de latencia, consultas SQL y el pico de memoria de Python (tracemalloc)
+de una iteración aparte, para que la instrumentación no afecte los tiempos.
+"""
+import io
+import platform
+import resource
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+import docx
+import pytesseract
+from PIL import Image, ImageDraw
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import Usuarios
+from .models import PlantillaDocumento, PlantillaGeneral, buffer_accesos_asignaciones, buffer_usos_plantillas
+from .views import DocumentoSubidoViewSet
+
+
+ROLES = ('superusuario', 'admin', 'usuario')
+
+# Métricas comparadas contra la base: (clave, True si más alto es peor)
+METRICAS_COMPARADAS = (
+    ('latencia_p95_ms', True),
+    ('ops_por_segundo', False),
+    ('memoria_pico_kb', True),
+)
+
+
+class EscenarioOmitido(Exception):
+    """El escenario no se puede medir en este entorno (falta un binario o datos)"""
+
+
+def _percentil(ordenados, fraccion):
+    return ordenados[min(int(fraccion * len(ordenados)), len(ordenados) - 1)]
+
+
+# Documentos de muestra -------------------------------------------------------------------------
+
+def docx_sintetico(parrafos=60):
+    documento = docx.Document()
+    documento.add_heading('Contrato de arrendamiento', level=1)
+    for i in range(parrafos):
+        parrafo = documento.add_paragraph(style='List Bullet' if i % 10 == 9 else None)
+        parrafo.add_run(f'Cláusula {i + 1}. ').bold = True
+        parrafo.add_run('El arrendatario se obliga a pagar la renta pactada dentro de los primeros cinco días de cada mes. ' * 3)
+    tabla = documento.add_table(rows=6, cols=3)
+    for fila in tabla.rows:
+        for celda in fila.cells:
+            celda.text = 'Monto mensual'
+    salida = io.BytesIO()
+    documento.save(salida)
+    return salida.getvalue()
+
+
+def pdf_sintetico(paginas=5, lineas=40):
+    """PDF de texto mínimo escrito a mano (sin dependencias para generarlo)"""
+    objetos = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    paginas_ref = []
+    for pagina in range(paginas):
+        texto = '\n'.join(
+            f'BT /F1 10 Tf 50 {780 - 18 * i} Td (Clausula {pagina + 1}.{i + 1}: el arrendatario pagara la renta pactada) Tj ET'
+            for i in range(lineas)
+        )
+        objetos.append(f'<< /Length {len(texto)} >>\nstream\n{texto}\nendstream')
+        contenido = len(objetos)
+        objetos.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {contenido} 0 R >>'
+        )
+        paginas_ref.append(f'{len(objetos)} 0 R')
+    objetos[1] = f"<< /Type /Pages /Kids [{' '.join(paginas_ref)}] /Count {paginas} >>"
+
+    salida = bytearray(b'%PDF-1.4\n')
+    posiciones = []
+    for numero, objeto in enumerate(objetos, 1):
+        posiciones.append(len(salida))
+        salida += f'{numero} 0 obj\n{objeto}\nendobj\n'.encode('latin-1')
+    inicio_xref = len(salida)
+    salida += f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode()
+    salida += b''.join(f'{posicion:010d} 00000 n \n'.encode() for posicion in posiciones)
+    salida += f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n'.encode()
+    return bytes(salida)
+
+
+def imagen_sintetica(lineas=30):
+    imagen = Image.new('RGB', (1240, 1754), 'white')
+    dibujo = ImageDraw.Draw(imagen)
+    for i in range(lineas):
+        dibujo.text((80, 80 + 50 * i), f'Clausula {i + 1}: el arrendatario pagara la renta pactada', fill='black')
+    salida = io.BytesIO()
+    imagen.save(salida, format='PNG')
+    return salida.getvalue()
+
+
+def cargar_muestras(directorio=None):
+    """{formato: bytes}; con `directorio` usa el primer .docx, .pdf y .png/.jpg que encuentre"""
+    muestras = {'docx': docx_sintetico(), 'pdf': pdf_sintetico(), 'ocr': imagen_sintetica()}
+    if directorio:
+        extensiones = {'docx': ('.docx',), 'pdf': ('.pdf',), 'ocr': ('.png', '.jpg', '.jpeg')}
+        for formato, sufijos in extensiones.items():
+            archivo = next((ruta for ruta in sorted(Path(directorio).iterdir()) if ruta.suffix.lower() in sufijos), None)
+            if archivo is not None:
+                muestras[formato] = archivo.read_bytes()
+    return muestras
+
+
+# Datos y escenarios ----------------------------------------------------------------------------
+
+def datos_sembrados():
+    """Usuarios de cada rol y objetos sobre los que actúan los escenarios"""
+    activos = Usuarios.objects.filter(is_active=True)
+    usuarios = {
+        'superusuario': activos.filter(is_superuser=True).order_by('id').first(),
+        'admin': activos.filter(groups__name='Admin', empresa__isnull=False, is_superuser=False).order_by('id').first(),
+        'usuario': activos.filter(empresa__isnull=False, is_superuser=False, is_staff=False)
+        .exclude(groups__name='Admin').order_by('id').first(),
+    }
+    faltantes = [rol for rol, usuario in usuarios.items() if usuario is None]
+    if faltantes:
+        raise ValueError(f"No hay usuarios para los roles: {', '.join(faltantes)}. Carga datos antes de medir (python manage.py seed_scale).")
+
+    usuario = usuarios['usuario']
+    colegas = list(
+        activos.filter(empresa_id=usuario.empresa_id).exclude(id=usuario.id).order_by('id').values_list('id', flat=True)[:20]
+    )
+    plantilla = (
+        PlantillaDocumento.objects.filter(usuario=usuario)
+        .annotate(cantidad_campos=Count('campos_asociados'))
+        .order_by('-cantidad_campos', 'id').first()
+    )
+    return {
+        'usuarios': usuarios,
+        'colegas': colegas,
+        'plantilla': plantilla,
+        'paquete': PlantillaGeneral.objects.filter(activo=True).order_by('id').first(),
+    }
+
+
+def _host():
+    """Un host aceptado por ALLOWED_HOSTS para las peticiones del cliente de pruebas"""
+    for host in settings.ALLOWED_HOSTS:
+        if '*' not in host:
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def _cliente(usuario):
+    cliente = APIClient(HTTP_HOST=_host())
+    cliente.force_authenticate(user=usuario)
+    return cliente
+
+
+def _peticion(cliente, metodo, url, data=None):
+    def ejecutar():
+        response = getattr(cliente, metodo)(url, data, format='json') if data is not None else getattr(cliente, metodo)(url)
+        return response.status_code < 400
+    return ejecutar
+
+
+def _conversion(formato, contenido):
+    vista = DocumentoSubidoViewSet()
+    if formato == 'ocr':
+        try:
+            pytesseract.get_tesseract_version()
+        except pytesseract.TesseractNotFoundError:
+            raise EscenarioOmitido("tesseract no está instalado")
+
+    def ejecutar():
+        archivo = io.BytesIO(contenido)
+        if formato == 'docx':
+            documento = docx.Document(archivo)
+            html = vista._extraer_texto_docx(documento)
+            vista._contar_paginas_docx(documento)
+        elif formato == 'pdf':
+            html = vista._extraer_texto_pdf(archivo)
+        else:
+            html = vista._extraer_texto_imagen(archivo)
+        # Los extractores devuelven el error como texto en vez de lanzarlo
+        return not html.startswith('Error')
+    return ejecutar
+
+
+def escenarios(datos, muestras):
+    """{nombre: función que arma el escenario y retorna el callable de una iteración}"""
+    usuarios = datos['usuarios']
+    definidos = {f'conversion_{formato}': (lambda formato=formato: _conversion(formato, muestras[formato]))
+                 for formato in ('docx', 'pdf', 'ocr')}
+
+    def render_plantilla():
+        plantilla = datos['plantilla']
+        if plantilla is None:
+            raise EscenarioOmitido("el usuario del rol 'usuario' no tiene plantillas propias")
+        variables = plantilla.campos_asociados.values_list('nombre_variable', flat=True)
+        return _peticion(
+            _cliente(usuarios['usuario']), 'post',
+            f'/documents/v1/plantillas-documentos/{plantilla.pk}/generar_documento/',
+            {'plantilla_id': plantilla.pk, 'nombre': 'bench', 'datos': {variable: 'valor' for variable in variables}},
+        )
+    definidos['render_plantilla'] = render_plantilla
+
+    for rol in ROLES:
+        definidos[f'listado_plantillas:{rol}'] = (
+            lambda rol=rol: _peticion(_cliente(usuarios[rol]), 'get', '/documents/v1/plantillas-documentos/')
+        )
+        definidos[f'listado_documentos:{rol}'] = (
+            lambda rol=rol: _peticion(_cliente(usuarios[rol]), 'get', '/documents/v1/documentos-generados/')
+        )
+
+    def compartir_plantilla():
+        if datos['plantilla'] is None or not datos['colegas']:
+            raise EscenarioOmitido("faltan una plantilla propia o colegas de empresa del rol 'usuario'")
+        return _peticion(
+            _cliente(usuarios['usuario']), 'post', '/documents/v1/plantillas-compartidas/compartir/',
+            {'plantilla_id': datos['plantilla'].pk, 'usuario_ids': datos['colegas'][:5]},
+        )
+    definidos['compartir_plantilla'] = compartir_plantilla
+
+    def asignar_paquete():
+        if datos['paquete'] is None or not datos['colegas']:
+            raise EscenarioOmitido("no hay paquetes activos o colegas a quienes asignarlos")
+        return _peticion(
+            _cliente(usuarios['superusuario']), 'post', f"/documents/v1/plantilla-generales/{datos['paquete'].pk}/compartir/",
+            {'usuarios_ids': datos['colegas']},
+        )
+    definidos['asignar_paquete'] = asignar_paquete
+    return definidos
+
+
+# Medición --------------------------------------------------------------------------------------
+
+def _iteracion(ejecutar, consultas=None):
+    """Corre una iteración en un savepoint revertido. Retorna (ms, ok)"""
+    with transaction.atomic():
+        inicio = time.perf_counter()
+        if consultas is None:
+            ok = ejecutar()
+        else:
+            with consultas:
+                ok = ejecutar()
+        ms = (time.perf_counter() - inicio) * 1000
+        # Lo que dejó pendiente la escritura diferida también se revierte
+        buffer_usos_plantillas.vaciar()
+        buffer_accesos_asignaciones.vaciar()
+        transaction.set_rollback(True)
+    return ms, ok
+
+
+def medir(ejecutar, iteraciones, calentamiento):
+    for _ in range(calentamiento):
+        _iteracion(ejecutar)
+
+    duraciones, errores = [], 0
+    inicio = time.perf_counter()
+    for _ in range(iteraciones):
+        ms, ok = _iteracion(ejecutar)
+        duraciones.append(ms)
+        errores += not ok
+    total = time.perf_counter() - inicio
+
+    # Consultas y memoria en una iteración aparte: capturar SQL y tracemalloc hacen más lenta la ejecución
+    ya_trazando = tracemalloc.is_tracing()
+    if not ya_trazando:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    consultas = CaptureQueriesContext(connection)
+    _iteracion(ejecutar, consultas)
+    pico = tracemalloc.get_traced_memory()[1]
+    if not ya_trazando:
+        tracemalloc.stop()
+
+    ordenadas = sorted(duraciones)
+    return {
+        'iteraciones': iteraciones,
+        'errores': errores,
+        'ops_por_segundo': round(iteraciones / total, 2) if total else None,
+        'latencia_promedio_ms': round(sum(duraciones) / len(duraciones), 3),
+        'latencia_p50_ms': round(_percentil(ordenadas, 0.5), 3),
+        'latencia_p95_ms': round(_percentil(ordenadas, 0.95), 3),
+        'latencia_p99_ms': round(_percentil(ordenadas, 0.99), 3),
+        'latencia_max_ms': round(ordenadas[-1], 3),
+        'consultas': len(consultas),
+        'memoria_pico_kb': round(pico / 1024, 1),
+    }
+
+
+def ejecutar_bench(iteraciones=30, calentamiento=3, filtro=None, muestras=None):
+    """Corre los escenarios (los que empiezan con alguno de `filtro`) y retorna el informe"""
+    datos = datos_sembrados()
+    resultados = {}
+    for nombre, preparar in escenarios(datos, muestras or cargar_muestras()).items():
+        if filtro and not nombre.startswith(tuple(filtro)):
+            continue
+        try:
+            ejecutar = preparar()
+        except EscenarioOmitido as e:
+            resultados[nombre] = {'omitido': str(e)}
+            continue
+        resultados[nombre] = medir(ejecutar, iteraciones, calentamiento)
+    return {
+        'fecha': timezone.now().isoformat(),
+        'entorno': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base_datos': connection.vendor,
+            'maquina': platform.node(),
+            'rss_max_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        'escenarios': resultados,
+    }
+
+
+def comparar(informe, base, umbral):
+    """
+    Compara cada escenario con la base. Es regresión si una métrica empeora más que `umbral`
+    (fracción, 0.2 = 20%), si aumentan las consultas o si hay errores que la base no tenía.
+    """
+    comparacion, regresiones = {}, []
+    for nombre, actual in informe['escenarios'].items():
+        anterior = base.get('escenarios', {}).get(nombre)
+        if not anterior or 'omitido' in actual or 'omitido' in anterior:
+            continue
+        detalle = {}
+        for metrica, mas_alto_es_peor in METRICAS_COMPARADAS:
+            valor_base, valor = anterior.get(metrica), actual.get(metrica)
+            if not valor_base or valor is None:
+                continue
+            cambio = (valor - valor_base) / valor_base
+            empeora = cambio > umbral if mas_alto_es_peor else cambio < -umbral
+            detalle[metrica] = {'base': valor_base, 'actual': valor, 'cambio': round(cambio, 3), 'regresion': empeora}
+        for metrica in ('consultas', 'errores'):
+            valor_base, valor = anterior.get(metrica, 0), actual.get(metrica, 0)
+            detalle[metrica] = {'base': valor_base, 'actual': valor, 'regresion': valor > valor_base}
+        comparacion[nombre] = detalle
+        regresiones.extend(f"{nombre}.{metrica}" for metrica, valores in detalle.items() if valores['regresion'])
+    return comparacion, regresiones
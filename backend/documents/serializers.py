@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from core.serializers import CamposDinamicosSerializerMixin
 from .models import (
     DocumentoSubido, 
     CampoDisponible, 
@@ -15,28 +16,28 @@ from .models import (
 )
 
 
-class DocumentoSubidoSerializer(serializers.ModelSerializer):
+class DocumentoSubidoSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = DocumentoSubido
         fields = '__all__'
-        read_only_fields = ('id', 'fecha_subida')
+        read_only_fields = ('id', 'fecha_subida', 'revision', 'fecha_actualizacion')
 
-class CampoDisponibleSerializer(serializers.ModelSerializer):
+class CampoDisponibleSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CampoDisponible
         fields = '__all__'
 
-class TipoPlantillaDocumentoSerializer(serializers.ModelSerializer):
+class TipoPlantillaDocumentoSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = TipoPlantillaDocumento
         fields = '__all__'
 
-class CategoriaPlantillaDocumentoSerializer(serializers.ModelSerializer):
+class CategoriaPlantillaDocumentoSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CategoriaPlantillaDocumento
         fields = '__all__'
 
-class ClasificacionPlantillaGeneralSerializer(serializers.ModelSerializer):
+class ClasificacionPlantillaGeneralSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     total_paquetes = serializers.SerializerMethodField()
     paquetes_activos = serializers.SerializerMethodField()
     total_plantillas_en_categoria = serializers.SerializerMethodField()
@@ -49,17 +50,23 @@ class ClasificacionPlantillaGeneralSerializer(serializers.ModelSerializer):
     
     def get_total_paquetes(self, obj):
         """Retorna el total de paquetes en esta categoría"""
+        if hasattr(obj, 'paquetes_activos_count'):
+            return obj.paquetes_activos_count
         return obj.get_paquetes_count()
     
     def get_paquetes_activos(self, obj):
         """Retorna el número de paquetes activos en esta categoría"""
+        if hasattr(obj, 'paquetes_activos_count'):
+            return obj.paquetes_activos_count
         return obj.get_paquetes_activos().count()
     
     def get_total_plantillas_en_categoria(self, obj):
         """Retorna el total de plantillas en todos los paquetes de esta categoría"""
+        if hasattr(obj, 'plantillas_en_categoria_count'):
+            return obj.plantillas_en_categoria_count
         return obj.get_total_plantillas_en_categoria()
 
-class CampoPlantillaSerializer(serializers.ModelSerializer):
+class CampoPlantillaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     campo_nombre = serializers.CharField(source='campo.nombre', read_only=True)
     campo_tipo = serializers.CharField(source='campo.tipo_dato', read_only=True)
     
@@ -67,7 +74,7 @@ class CampoPlantillaSerializer(serializers.ModelSerializer):
         model = CampoPlantilla
         fields = ['id', 'campo', 'nombre_variable', 'campo_nombre', 'campo_tipo']
 
-class PlantillaDocumentoSerializer(serializers.ModelSerializer):
+class PlantillaDocumentoSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     campos_asociados = CampoPlantillaSerializer(many=True, read_only=True)
     tipo = TipoPlantillaDocumentoSerializer(read_only=True)
     clasificacion = ClasificacionPlantillaGeneralSerializer(read_only=True)
@@ -77,7 +84,13 @@ class PlantillaDocumentoSerializer(serializers.ModelSerializer):
     class Meta:
         model = PlantillaDocumento
         fields = '__all__'
-        read_only_fields = ('id', 'fecha_creacion')
+        read_only_fields = ('id', 'fecha_creacion', 'revision', 'fecha_actualizacion')
+        expandable_fields = {
+            'campos_asociados': ['campos_asociados__campo'],
+            'tipo': [],
+            'clasificacion': [],
+            'categoria': [],
+        }
     
     def get_tipo_info(self, obj):
         if obj.tipo:
@@ -87,14 +100,14 @@ class PlantillaDocumentoSerializer(serializers.ModelSerializer):
             }
         return None
 
-class DocumentoGeneradoSerializer(serializers.ModelSerializer):
+class DocumentoGeneradoSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     plantilla_nombre = serializers.CharField(source='plantilla.nombre', read_only=True)
     usuario_username = serializers.CharField(source='usuario.username', read_only=True)
     
     class Meta:
         model = DocumentoGenerado
         fields = '__all__'
-        read_only_fields = ('id', 'fecha_generacion', 'usuario')
+        read_only_fields = ('id', 'fecha_generacion', 'usuario', 'revision', 'fecha_actualizacion')
 
 class CrearPlantillaSerializer(serializers.Serializer):
     nombre = serializers.CharField(max_length=255)
@@ -112,7 +125,7 @@ class GenerarDocumentoSerializer(serializers.Serializer):
     plantilla_id = serializers.IntegerField()
     datos = serializers.DictField() 
 
-class PlantillaCompartidaSerializer(serializers.ModelSerializer):
+class PlantillaCompartidaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     plantilla_nombre = serializers.CharField(source='plantilla.nombre', read_only=True)
     usuario_username = serializers.CharField(source='usuario.username', read_only=True)
 
@@ -120,14 +133,17 @@ class PlantillaCompartidaSerializer(serializers.ModelSerializer):
         model = PlantillaCompartida
         fields = ['id', 'plantilla', 'plantilla_nombre', 'usuario', 'usuario_username', 'permisos', 'fecha_compartida']
 
-class PlantillaFavoritaSerializer(serializers.ModelSerializer):
+class PlantillaFavoritaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     plantilla = PlantillaDocumentoSerializer(read_only=True)
 
     class Meta:
         model = PlantillaFavorita
         fields = '__all__'
+        expandable_fields = {
+            'plantilla': ['plantilla__campos_asociados__campo', 'plantilla__tipo', 'plantilla__categoria', 'plantilla__clasificacion'],
+        }
 
-class PlantillaGeneralSerializer(serializers.ModelSerializer):
+class PlantillaGeneralSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     clasificacion = ClasificacionPlantillaGeneralSerializer(read_only=True)
     clasificacion_nombre = serializers.CharField(source='clasificacion.nombre', read_only=True)
     plantillas_incluidas = PlantillaDocumentoSerializer(many=True, read_only=True)
@@ -140,14 +156,28 @@ class PlantillaGeneralSerializer(serializers.ModelSerializer):
         model = PlantillaGeneral
         fields = '__all__'
         read_only_fields = ('id', 'fecha_creacion', 'fecha_actualizacion')
+        expandable_fields = {
+            'clasificacion': [],
+            'plantillas_incluidas': [
+                'plantillas_incluidas__campos_asociados__campo',
+                'plantillas_incluidas__tipo',
+                'plantillas_incluidas__categoria',
+                'plantillas_incluidas__clasificacion',
+            ],
+        }
     
     def get_total_plantillas(self, obj):
         """Retorna el total de plantillas incluidas en este paquete"""
+        if hasattr(obj, 'total_plantillas_count'):
+            return obj.total_plantillas_count
         return obj.get_total_plantillas()
     
     def get_usuarios_con_acceso(self, obj):
         """Retorna la lista de usuarios que tienen acceso a este paquete"""
-        usuarios = obj.get_usuarios_con_acceso()
+        if hasattr(obj, 'asignaciones_activas'):
+            usuarios = {asignacion.usuario_id: asignacion.usuario for asignacion in obj.asignaciones_activas}.values()
+        else:
+            usuarios = obj.get_usuarios_con_acceso()
         return [
             {
                 'id': usuario.id,
@@ -161,7 +191,7 @@ class PlantillaGeneralSerializer(serializers.ModelSerializer):
          """Retorna las plantillas agrupadas por categoría"""
          return obj.get_plantillas_por_categoria()
 
-class PlantillaGeneralCompartidaSerializer(serializers.ModelSerializer):
+class PlantillaGeneralCompartidaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     plantilla_general_nombre = serializers.CharField(source='plantilla_general.nombre', read_only=True)
     usuario_nombre = serializers.CharField(source='usuario.get_full_name', read_only=True)
     usuario_username = serializers.CharField(source='usuario.username', read_only=True)
@@ -0,0 +1,230 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.cache import (
+    invalidar_catalogo,
+    TIPOS_PLANTILLA,
+    CATEGORIAS_PLANTILLA,
+    CLASIFICACIONES_PLANTILLA,
+    CAMPOS_DISPONIBLES,
+)
+from users.models import Usuarios
+from .analitica import registrar_evento
+from .models import (
+    CampoDisponible,
+    TipoPlantillaDocumento,
+    CategoriaPlantillaDocumento,
+    ClasificacionPlantillaGeneral,
+    PlantillaGeneral,
+    PlantillaDocumento,
+    CampoPlantilla,
+    PlantillaFavorita,
+    PlantillaCompartida,
+    PlantillaGeneralCompartida,
+    RegistroCambio,
+    AccesoPlantilla,
+    AsignacionPaqueteEmpresa,
+    DocumentoGenerado,
+    DocumentoSubido,
+    EventoAnalitica,
+)
+
+
+@receiver([post_save, post_delete], sender=TipoPlantillaDocumento)
+def invalidar_tipos_plantilla(sender, **kwargs):
+    invalidar_catalogo(TIPOS_PLANTILLA)
+
+
+@receiver([post_save, post_delete], sender=CategoriaPlantillaDocumento)
+def invalidar_categorias_plantilla(sender, **kwargs):
+    invalidar_catalogo(CATEGORIAS_PLANTILLA)
+
+
+@receiver([post_save, post_delete], sender=CampoDisponible)
+def invalidar_campos_disponibles(sender, **kwargs):
+    invalidar_catalogo(CAMPOS_DISPONIBLES)
+
+
+@receiver([post_save, post_delete], sender=ClasificacionPlantillaGeneral)
+@receiver([post_save, post_delete], sender=PlantillaGeneral)
+@receiver(m2m_changed, sender=PlantillaGeneral.plantillas_incluidas.through)
+def invalidar_clasificaciones_plantilla(sender, **kwargs):
+    """Las clasificaciones incluyen conteos de paquetes y plantillas, por eso dependen de PlantillaGeneral"""
+    invalidar_catalogo(CLASIFICACIONES_PLANTILLA)
+
+
+@receiver([post_save, post_delete], sender=CampoPlantilla)
+def incrementar_revision_plantilla(sender, instance, **kwargs):
+    """Los campos asociados forman parte de la representación de la plantilla"""
+    PlantillaDocumento.objects.filter(pk=instance.plantilla_id).update(
+        revision=F('revision') + 1,
+        fecha_actualizacion=timezone.now()
+    )
+    registrar_cambio_plantilla(instance.plantilla_id, RegistroCambio.UPSERT)
+
+
+# Registro de cambios para la sincronización incremental (ver SincronizacionAPIView)
+
+def usuarios_con_acceso_plantilla(plantilla_id):
+    """Dueño de la plantilla más los usuarios con los que está compartida"""
+    usuario_ids = set(PlantillaCompartida.objects.filter(plantilla_id=plantilla_id).values_list('usuario_id', flat=True))
+    usuario_ids.update(PlantillaDocumento.objects.filter(pk=plantilla_id).values_list('usuario_id', flat=True))
+    return usuario_ids
+
+
+def registrar_cambio_plantilla(plantilla_id, operacion):
+    RegistroCambio.registrar(usuarios_con_acceso_plantilla(plantilla_id), RegistroCambio.PLANTILLA, plantilla_id, operacion)
+
+
+@receiver(post_save, sender=PlantillaDocumento)
+def registrar_plantilla_guardada(sender, instance, **kwargs):
+    registrar_cambio_plantilla(instance.pk, RegistroCambio.UPSERT)
+
+
+@receiver(post_delete, sender=PlantillaDocumento)
+def registrar_plantilla_eliminada(sender, instance, **kwargs):
+    # Las compartidas se eliminan antes en cascada y ya dejaron su propia lápida
+    RegistroCambio.registrar([instance.usuario_id], RegistroCambio.PLANTILLA, instance.pk, RegistroCambio.ELIMINACION)
+
+
+@receiver(post_save, sender=PlantillaFavorita)
+def registrar_favorito_guardado(sender, instance, **kwargs):
+    RegistroCambio.registrar([instance.usuario_id], RegistroCambio.FAVORITO, instance.pk, RegistroCambio.UPSERT)
+
+
+@receiver(post_delete, sender=PlantillaFavorita)
+def registrar_favorito_eliminado(sender, instance, **kwargs):
+    RegistroCambio.registrar([instance.usuario_id], RegistroCambio.FAVORITO, instance.pk, RegistroCambio.ELIMINACION)
+
+
+@receiver(post_save, sender=PlantillaCompartida)
+def registrar_compartida_guardada(sender, instance, **kwargs):
+    dueno_ids = list(PlantillaDocumento.objects.filter(pk=instance.plantilla_id).values_list('usuario_id', flat=True))
+    RegistroCambio.registrar([instance.usuario_id, *dueno_ids], RegistroCambio.COMPARTIDA, instance.pk, RegistroCambio.UPSERT)
+    # El destinatario gana acceso a la plantilla
+    RegistroCambio.registrar([instance.usuario_id], RegistroCambio.PLANTILLA, instance.plantilla_id, RegistroCambio.UPSERT)
+
+
+@receiver(post_delete, sender=PlantillaCompartida)
+def registrar_compartida_eliminada(sender, instance, **kwargs):
+    dueno_ids = list(PlantillaDocumento.objects.filter(pk=instance.plantilla_id).values_list('usuario_id', flat=True))
+    RegistroCambio.registrar([instance.usuario_id, *dueno_ids], RegistroCambio.COMPARTIDA, instance.pk, RegistroCambio.ELIMINACION)
+    # Revocar el acceso equivale a eliminar la plantilla del caché del destinatario
+    if instance.usuario_id not in dueno_ids:
+        RegistroCambio.registrar([instance.usuario_id], RegistroCambio.PLANTILLA, instance.plantilla_id, RegistroCambio.ELIMINACION)
+
+
+# Índice materializado de acceso (AccesoPlantilla)
+
+def _afecta(update_fields, campos):
+    """False si el guardado se limitó a campos que no influyen en el índice"""
+    return update_fields is None or bool(set(update_fields) & campos)
+
+
+@receiver(post_save, sender=PlantillaDocumento)
+def indexar_plantilla_propia(sender, instance, created, update_fields=None, **kwargs):
+    if created or _afecta(update_fields, {'usuario'}):
+        AccesoPlantilla.sincronizar_propia(instance)
+
+
+@receiver(post_save, sender=PlantillaCompartida)
+def indexar_compartida(sender, instance, created, **kwargs):
+    if not created:
+        # Si cambió el destinatario o la plantilla, la fila anterior ya no corresponde
+        AccesoPlantilla.objects.filter(origen=AccesoPlantilla.COMPARTIDA, referencia_id=instance.pk).exclude(
+            usuario_id=instance.usuario_id, plantilla_id=instance.plantilla_id
+        ).delete()
+    AccesoPlantilla.sincronizar_compartidas([instance])
+
+
+@receiver(post_delete, sender=PlantillaCompartida)
+def desindexar_compartida(sender, instance, **kwargs):
+    AccesoPlantilla.objects.filter(origen=AccesoPlantilla.COMPARTIDA, referencia_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=PlantillaGeneralCompartida)
+def indexar_asignacion(sender, instance, update_fields=None, **kwargs):
+    # Un guardado que solo toca fecha_ultimo_acceso no debe reconstruir nada
+    if _afecta(update_fields, {'activo', 'fecha_expiracion', 'usuario', 'plantilla_general'}):
+        AccesoPlantilla.sincronizar_asignaciones([instance.pk])
+
+
+@receiver(post_delete, sender=PlantillaGeneralCompartida)
+def desindexar_asignacion(sender, instance, **kwargs):
+    AccesoPlantilla.objects.filter(origen=AccesoPlantilla.PAQUETE, referencia_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=PlantillaGeneral)
+def indexar_paquete(sender, instance, created, update_fields=None, **kwargs):
+    if not created and _afecta(update_fields, {'activo'}):
+        AccesoPlantilla.sincronizar_paquetes([instance.pk])
+
+
+@receiver(m2m_changed, sender=PlantillaGeneral.plantillas_incluidas.through)
+def indexar_plantillas_de_paquete(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # Desde el lado de la plantilla, post_clear no informa qué paquetes la tenían
+        instance._paquetes_previos = list(instance.paquetes_que_la_incluyen.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        paquete_ids = [instance.pk]
+    elif action == 'post_clear':
+        paquete_ids = getattr(instance, '_paquetes_previos', [])
+    else:
+        paquete_ids = pk_set
+    AccesoPlantilla.sincronizar_paquetes(paquete_ids)
+
+
+# Asignación automática de paquetes por empresa
+
+NO_CONSULTADA = object()
+
+
+@receiver(pre_save, sender=Usuarios)
+def recordar_empresa_usuario(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Empresa a la que pertenecía el usuario activo antes de guardar (None si no pertenecía a ninguna)
+    instance._empresa_paquetes_anterior = NO_CONSULTADA
+    if raw or not instance.pk:
+        return
+    if not _afecta(update_fields, {'empresa', 'empresa_id', 'is_active'}):
+        return
+    anterior = Usuarios.objects.filter(pk=instance.pk).values_list('empresa_id', 'is_active').first()
+    if anterior is not None:
+        instance._empresa_paquetes_anterior = anterior[0] if anterior[1] else None
+
+
+@receiver(post_save, sender=Usuarios)
+def asignar_paquetes_de_empresa(sender, instance, created, raw=False, **kwargs):
+    """
+    Los usuarios que pasan a pertenecer a una empresa (al crearse, al cambiar de empresa o al
+    reactivarse) reciben los paquetes configurados como automáticos para ella. Los demás
+    guardados no reasignan nada, así se respetan las asignaciones que un administrador desactivó a mano.
+    """
+    if raw or not instance.empresa_id or not instance.is_active:
+        return
+    if not created and getattr(instance, '_empresa_paquetes_anterior', NO_CONSULTADA) in (NO_CONSULTADA, instance.empresa_id):
+        return
+    configuraciones = AsignacionPaqueteEmpresa.objects.filter(
+        empresa_id=instance.empresa_id, activo=True, plantilla_general__activo=True
+    ).select_related('plantilla_general', 'asignado_por')
+    for configuracion in configuraciones:
+        configuracion.plantilla_general.asignar_a_usuarios(
+            [instance.pk], configuracion.asignado_por, configuracion.fecha_expiracion, configuracion.notas
+        )
+
+
+# Bitácora de analítica (ver analitica.py)
+
+@receiver(post_save, sender=DocumentoGenerado)
+def registrar_documento_generado(sender, instance, created, **kwargs):
+    if created:
+        registrar_evento(EventoAnalitica.GENERADOS, instance.usuario, instance.fecha_generacion, instance.plantilla.tipo_id)
+
+
+@receiver(post_save, sender=DocumentoSubido)
+def registrar_documento_subido(sender, instance, created, **kwargs):
+    if created:
+        registrar_evento(EventoAnalitica.SUBIDOS, instance.usuario, instance.fecha_subida, instance.tipo)
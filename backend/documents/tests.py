@@ -1,305 +1,704 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import Group
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from companies.models import Empresas, Planes
 from users.models import Usuarios
+from core.testing import Sembrado
+from documents import analitica, carga
 from documents.models import (
-    TipoDocumento, Documentos, Favoritos, Compartir, Escritos, Demandas, Contratos,
-    Plantillas, Clasificacion
+    PlantillaDocumento, PlantillaCompartida, PlantillaFavorita, CampoDisponible, CampoPlantilla,
+    ClasificacionPlantillaGeneral, PlantillaGeneral, AccesoPlantilla, RegistroCambio,
+    PlantillaGeneralCompartida, AsignacionPaqueteEmpresa, buffer_accesos_asignaciones,
+    UsoPlantilla, buffer_usos_plantillas, DocumentoGenerado, DocumentoSubido, TipoPlantillaDocumento,
+    EventoAnalitica, ResumenDiarioDocumentos,
 )
 
-class DocumentsBaseTestCase(TestCase):
+@override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=0)
+class SincronizacionTestCase(TestCase):
     def setUp(self):
-        self.plan = Planes.objects.create(nombre="Plan Básico", tipoPlan="Básico", precio=0) # type: ignore
-        self.empresa1 = Empresas.objects.create(nombre="Empresa 1", rut="11111111-1", correo="e1@e.com", plan=self.plan) # type: ignore
-        self.empresa2 = Empresas.objects.create(nombre="Empresa 2", rut="22222222-2", correo="e2@e.com", plan=self.plan) # type: ignore
-        self.user1 = Usuarios.objects.create_user(username="user1", password="pass1", empresa=self.empresa1)
-        self.user2 = Usuarios.objects.create_user(username="user2", password="pass2", empresa=self.empresa2)
-        self.tipo_doc = TipoDocumento.objects.create(nombre="Tipo 1") # type: ignore
-        self.clasificacion = Clasificacion.objects.create(nombre="Clasif 1") # type: ignore
-        self.tribunal = None
-        if getattr(self, 'tribunal_required', False):
-            from documents.models import Tribunales
-            self.tribunal = Tribunales.objects.create(nombre="Tribunal 1") # type: ignore
+        self.owner = Usuarios.objects.create_user(username="owner", password="pass1")
+        self.other = Usuarios.objects.create_user(username="other", password="pass2")
         self.client = APIClient()
-
-class DocumentosTestCase(DocumentsBaseTestCase):
-    def test_user_can_only_create_document_for_own_company(self):
-        self.client.force_authenticate(user=self.user1)
-        response = self.client.post(
-            reverse('documentos-list'),
-            {
-                "nombre": "Doc Empresa 1",
-                "tipoDocumento": self.tipo_doc.id,
-                "descripcion": "Test",
-                "version": 1
-            },
-            format='json'
-        )
-        self.assertEqual(response.status_code, 201) # type: ignore
-        doc = Documentos.objects.get(nombre="Doc Empresa 1") # type: ignore
-        self.assertEqual(doc.created_by, self.user1)
-        self.assertEqual(doc.created_by.empresa, self.empresa1)
-
-    def test_user_cannot_see_documents_of_other_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Empresa 1",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        self.client.force_authenticate(user=self.user2)
-        response = self.client.get(reverse('documentos-list'))
-        self.assertNotIn(doc.nombre, [d['nombre'] for d in response.data['results']]) # type: ignore
-
-class ContratosTestCase(DocumentsBaseTestCase):
-    tribunal_required = True
-    def test_user_can_only_create_contrato_for_own_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Contrato",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        self.client.force_authenticate(user=self.user1)
-        data = {
-            "documento": doc.id,
-        }
-        if self.tribunal is not None:
-            data["tribunales"] = self.tribunal.id
-        response = self.client.post(
-            reverse('contratos-list'),
-            data,
-            format='json'
-        )
-        self.assertEqual(response.status_code, 201) # type: ignore
-        contrato = Contratos.objects.get(documento=doc) # type: ignore
-        self.assertEqual(contrato.created_by, self.user1)
-        self.assertEqual(contrato.created_by.empresa, self.empresa1)
-
-    def test_user_cannot_see_contratos_of_other_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Contrato",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        contrato = Contratos.objects.create( # type: ignore
-            documento=doc,
-            tribunales=self.tribunal,
-            created_by=self.user1
-        ) # type: ignore
-        self.client.force_authenticate(user=self.user2)
-        response = self.client.get(reverse('contratos-list'))
-        self.assertNotIn(contrato.id, [c['id'] for c in response.data['results']]) # type: ignore
-
-class FavoritosTestCase(DocumentsBaseTestCase):
-    def test_user_can_only_create_favorito_for_own_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Favorito",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        self.client.force_authenticate(user=self.user1)
-        response = self.client.post(
-            reverse('favoritos-list'),
-            {
-                "documento": doc.id
-            },
-            format='json'
+        self.client.force_authenticate(user=self.other)
+        self.plantilla = PlantillaDocumento.objects.create( # type: ignore
+            nombre="Plantilla 1", html_con_campos="<p></p>", usuario=self.owner
         )
-        self.assertEqual(response.status_code, 201) # type: ignore
-        favorito = Favoritos.objects.get(documento=doc) # type: ignore
-        self.assertEqual(favorito.usuario, self.user1)
-        self.assertEqual(favorito.usuario.empresa, self.empresa1)
-
-    def test_user_cannot_see_favoritos_of_other_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Favorito",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        favorito = Favoritos.objects.create( # type: ignore
-            documento=doc,
-            usuario=self.user1
-        ) # type: ignore
-        self.client.force_authenticate(user=self.user2)
-        response = self.client.get(reverse('favoritos-list'))
-        self.assertNotIn(favorito.id, [f['id'] for f in response.data['results']]) # type: ignore
-
-class CompartirTestCase(DocumentsBaseTestCase):
-    def test_user_can_only_create_compartir_for_own_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Compartir",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        self.client.force_authenticate(user=self.user1)
-        response = self.client.post(
-            reverse('compartir-list'),
-            {
-                "documento": doc.id,
-                "usuarios": [self.user1.id],
-                "empresas": [self.empresa1.id]
-            },
-            format='json'
-        )
-        self.assertEqual(response.status_code, 201) # type: ignore
-        compartir = Compartir.objects.get(documento=doc) # type: ignore
-        self.assertEqual(compartir.usuario, self.user1)
-        self.assertIn(self.empresa1, compartir.empresas.all())
-
-    def test_user_cannot_see_compartir_of_other_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Compartir",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        compartir = Compartir.objects.create( # type: ignore
-            documento=doc,
-            usuario=self.user1
-        )
-        compartir.empresas.add(self.empresa1)
-        self.client.force_authenticate(user=self.user2)
-        response = self.client.get(reverse('compartir-list'))
-        self.assertNotIn(compartir.id, [c['id'] for c in response.data['results']]) # type: ignore
-
-class EscritosTestCase(DocumentsBaseTestCase):
-    tribunal_required = True
-    def test_user_can_only_create_escrito_for_own_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Escrito",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        self.client.force_authenticate(user=self.user1)
-        data = {
-            "documento": doc.id,
-            "rol": "R1"
-        }
-        if self.tribunal is not None:
-            data["tribunales"] = self.tribunal.id
-        response = self.client.post(
-            reverse('escritos-list'),
-            data,
-            format='json'
+
+    def sync(self, cursor=None):
+        params = {'cursor': cursor} if cursor is not None else {}
+        response = self.client.get(reverse('sincronizacion'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_full_state_without_cursor(self):
+        PlantillaCompartida.objects.create(plantilla=self.plantilla, usuario=self.other) # type: ignore
+        data = self.sync()
+        self.assertTrue(data['completo'])
+        self.assertEqual([p['id'] for p in data['plantillas']], [self.plantilla.id])
+        self.assertEqual(len(data['compartidas']), 1)
+
+    def test_only_changes_after_cursor(self):
+        cursor = self.sync()['cursor']
+        self.assertEqual(self.sync(cursor)['plantillas'], [])
+        PlantillaCompartida.objects.create(plantilla=self.plantilla, usuario=self.other) # type: ignore
+        data = self.sync(cursor)
+        self.assertEqual([p['id'] for p in data['plantillas']], [self.plantilla.id])
+        self.assertGreater(data['cursor'], cursor)
+        self.assertEqual(self.sync(data['cursor'])['plantillas'], [])
+
+    def test_revocation_and_deletion_leave_tombstones(self):
+        compartida = PlantillaCompartida.objects.create(plantilla=self.plantilla, usuario=self.other) # type: ignore
+        favorito = PlantillaFavorita.objects.create(plantilla=self.plantilla, usuario=self.other) # type: ignore
+        compartida_id, favorito_id = compartida.id, favorito.id
+        cursor = self.sync()['cursor']
+        compartida.delete()
+        favorito.delete()
+        eliminados = self.sync(cursor)['eliminados']
+        self.assertEqual(eliminados['plantillas'], [self.plantilla.id])
+        self.assertEqual(eliminados['compartidas'], [compartida_id])
+        self.assertEqual(eliminados['favoritos'], [favorito_id])
+
+    def test_cursor_does_not_pass_recent_changes(self):
+        cursor = self.sync()['cursor']
+        PlantillaCompartida.objects.create(plantilla=self.plantilla, usuario=self.other) # type: ignore
+        with override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=60):
+            # Un cambio reciente se envía pero el cursor no lo pasa: podría haber otro con id menor sin confirmar
+            data = self.sync(cursor)
+            self.assertEqual([p['id'] for p in data['plantillas']], [self.plantilla.id])
+            self.assertEqual(data['cursor'], cursor)
+            self.assertLess(self.sync()['cursor'], RegistroCambio.objects.latest('id').id)
+        RegistroCambio.objects.update(fecha=timezone.now() - timedelta(minutes=5))
+        with override_settings(SINCRONIZACION_MARGEN_SEGUNDOS=60):
+            data = self.sync(cursor)
+        self.assertEqual(data['cursor'], RegistroCambio.objects.latest('id').id)
+        self.assertEqual(self.sync(data['cursor'])['plantillas'], [])
+
+    def test_pruned_cursor_gets_full_state(self):
+        cursor = self.sync()['cursor']
+        PlantillaCompartida.objects.create(plantilla=self.plantilla, usuario=self.other) # type: ignore
+        PlantillaFavorita.objects.create(plantilla=self.plantilla, usuario=self.other) # type: ignore
+        ultimo = RegistroCambio.objects.latest('id').id
+        RegistroCambio.objects.update(fecha=timezone.now() - timedelta(days=60))
+
+        call_command('podar_registro_cambios', dias=30, stdout=io.StringIO())
+        # Se conserva el último registro como marca de lo podado
+        self.assertEqual(list(RegistroCambio.objects.values_list('id', flat=True)), [ultimo])
+        data = self.sync(cursor)
+        self.assertTrue(data['completo'])
+        self.assertEqual([p['id'] for p in data['plantillas']], [self.plantilla.id])
+        self.assertEqual(len(data['favoritos']), 1)
+        self.assertFalse(self.sync(data['cursor'])['completo'])
+
+
+class ResumenesPlantillaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Usuarios.objects.create_user(username="user1", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.campo = CampoDisponible.objects.create(nombre="RUT", tipo_dato="texto") # type: ignore
+        self.plantillas = []
+        for i in range(3):
+            plantilla = PlantillaDocumento.objects.create( # type: ignore
+                nombre=f"Plantilla {i}", html_con_campos="<p>{{rut}}</p>", usuario=self.user
+            )
+            CampoPlantilla.objects.create(plantilla=plantilla, campo=self.campo, nombre_variable="rut") # type: ignore
+            self.plantillas.append(plantilla)
+        PlantillaFavorita.objects.create(usuario=self.user, plantilla=self.plantillas[0]) # type: ignore
+
+    def listar(self, url_name='plantilladocumento-list', **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['data']
+
+    def test_list_splices_per_user_fields(self):
+        data = {p['id']: p for p in self.listar()}
+        self.assertTrue(data[self.plantillas[0].id]['es_favorito'])
+        self.assertFalse(data[self.plantillas[1].id]['es_favorito'])
+        self.assertEqual(data[self.plantillas[1].id]['campos_asociados'][0]['campo_nombre'], "RUT")
+
+    def test_warm_list_does_not_serialize_again(self):
+        self.listar()
+        with CaptureQueriesContext(connection) as consultas:
+            self.listar()
+        self.assertFalse(any('campos_plantillas' in consulta['sql'] for consulta in consultas))
+
+    def test_revision_change_refreshes_fragment(self):
+        self.listar()
+        plantilla = self.plantillas[1]
+        plantilla.nombre = "Renombrada"
+        plantilla.save()
+        nombres = {p['id']: p['nombre'] for p in self.listar()}
+        self.assertEqual(nombres[plantilla.id], "Renombrada")
+
+    def test_list_and_available_accept_fields(self):
+        for url_name in ('plantilladocumento-list', 'plantilladocumento-disponibles'):
+            data = {p['id']: p for p in self.listar(url_name, fields='id,nombre,es_favorito')}
+            self.assertEqual(set(data[self.plantillas[0].id]), {'id', 'nombre', 'es_favorito'})
+            self.assertTrue(data[self.plantillas[0].id]['es_favorito'])
+            self.assertFalse(data[self.plantillas[1].id]['es_favorito'])
+
+            data = self.listar(url_name, fields='id,campos_asociados', expand='campos_asociados')
+            self.assertEqual(set(data[0]), {'id', 'campos_asociados'})
+            self.assertEqual(data[0]['campos_asociados'][0]['campo_nombre'], "RUT")
+
+            data = self.listar(url_name, exclude='html_con_campos,es_favorito')
+            self.assertNotIn('html_con_campos', data[0])
+            self.assertNotIn('es_favorito', data[0])
+            self.assertIn('nombre', data[0])
+
+
+@override_settings(ESCRITURA_DIFERIDA_INTERVALO=0)
+class AccesoPlantillaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = Usuarios.objects.create_user(username="admin", password="pass0", is_staff=True)
+        self.owner = Usuarios.objects.create_user(username="owner", password="pass1")
+        self.user = Usuarios.objects.create_user(username="user", password="pass2")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.propia = PlantillaDocumento.objects.create(nombre="Propia", html_con_campos="", usuario=self.user) # type: ignore
+        self.compartida = PlantillaDocumento.objects.create(nombre="Compartida", html_con_campos="", usuario=self.owner) # type: ignore
+        self.de_paquete = PlantillaDocumento.objects.create(nombre="Paquete", html_con_campos="", usuario=self.admin) # type: ignore
+        self.share = PlantillaCompartida.objects.create(plantilla=self.compartida, usuario=self.user) # type: ignore
+        clasificacion = ClasificacionPlantillaGeneral.objects.create(nombre="Laboral", creado_por=self.admin) # type: ignore
+        self.paquete = PlantillaGeneral.objects.create( # type: ignore
+            nombre="Paquete 1", clasificacion=clasificacion, creado_por_admin=self.admin
         )
-        self.assertEqual(response.status_code, 201) # type: ignore
-        escrito = Escritos.objects.get(documento=doc) # type: ignore
-        self.assertEqual(escrito.created_by, self.user1)
-        self.assertEqual(escrito.created_by.empresa, self.empresa1)
-
-    def test_user_cannot_see_escritos_of_other_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Escrito",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        escrito = Escritos.objects.create( # type: ignore
-            documento=doc,
-            tribunales=self.tribunal,
-            rol="R1",
-            created_by=self.user1
+        self.paquete.plantillas_incluidas.add(self.de_paquete)
+        self.asignacion = self.paquete.asignar_a_usuario(self.user, self.admin)
+
+    def ids(self, url_name):
+        response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return {p['id'] for p in json.loads(response.content)['data']}
+
+    def test_list_keeps_own_and_shared_templates(self):
+        self.assertEqual(self.ids('plantilladocumento-list'), {self.propia.id, self.compartida.id})
+
+    def test_available_includes_package_templates(self):
+        self.assertEqual(self.ids('plantilladocumento-disponibles'), {self.propia.id, self.compartida.id, self.de_paquete.id})
+        response = self.client.get(reverse('plantilladocumento-detail', args=[self.de_paquete.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_expired_assignment_and_removed_template_lose_access(self):
+        self.asignacion.fecha_expiracion = timezone.now() - timedelta(days=1)
+        self.asignacion.save()
+        self.assertNotIn(self.de_paquete.id, self.ids('plantilladocumento-disponibles'))
+        self.asignacion.fecha_expiracion = None
+        self.asignacion.save()
+        self.paquete.plantillas_incluidas.remove(self.de_paquete)
+        self.assertNotIn(self.de_paquete.id, self.ids('plantilladocumento-disponibles'))
+
+    def test_package_access_is_buffered(self):
+        buffer_accesos_asignaciones.vaciar()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('plantilladocumento-detail', args=[self.de_paquete.id]))
+            self.client.get(reverse('plantilladocumento-detail', args=[self.de_paquete.id]))
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+        self.assertEqual(list(buffer_accesos_asignaciones.pendientes()), [self.asignacion.pk])
+        buffer_accesos_asignaciones.vaciar()
+        self.asignacion.refresh_from_db()
+        self.assertIsNotNone(self.asignacion.fecha_ultimo_acceso)
+
+    def test_revoked_share_loses_access(self):
+        self.share.delete()
+        self.assertEqual(self.ids('plantilladocumento-list'), {self.propia.id})
+
+
+class CompartirPlantillaMasivoTestCase(TestCase):
+    def setUp(self):
+        self.owner = Usuarios.objects.create_user(username="owner", password="pass1")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner)
+        self.plantilla = PlantillaDocumento.objects.create(nombre="P", html_con_campos="", usuario=self.owner) # type: ignore
+        self.url = reverse('plantillacompartida-compartir')
+
+    def crear_usuarios(self, cantidad):
+        Usuarios.objects.bulk_create([Usuarios(username=f"dest{i}") for i in range(cantidad)])
+        return list(Usuarios.objects.filter(username__startswith="dest").values_list('id', flat=True))
+
+    def test_upsert_updates_existing_and_reports_invalid(self):
+        ids = self.crear_usuarios(3)
+        PlantillaCompartida.objects.create(plantilla=self.plantilla, usuario_id=ids[0], permisos='lectura') # type: ignore
+        response = self.client.post(self.url, {
+            'plantilla_id': self.plantilla.id, 'usuario_ids': ids + [999999], 'permisos': 'edicion'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)['data']
+        self.assertEqual(data['usuarios_invalidos'], [999999])
+        self.assertEqual({c['usuario_id']: c['creada'] for c in data['compartidas']}, {ids[0]: False, ids[1]: True, ids[2]: True})
+        self.assertEqual(PlantillaCompartida.objects.filter(plantilla=self.plantilla, permisos='edicion').count(), 3) # type: ignore
+        self.assertEqual(AccesoPlantilla.objects.filter(origen=AccesoPlantilla.COMPARTIDA, plantilla=self.plantilla).count(), 3) # type: ignore
+        self.assertTrue(RegistroCambio.objects.filter(usuario_id=ids[2], entidad=RegistroCambio.PLANTILLA, objeto_id=self.plantilla.id).exists()) # type: ignore
+
+    def test_share_with_1000_users_uses_constant_queries(self):
+        ids = self.crear_usuarios(1000)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'plantilla_id': self.plantilla.id, 'usuario_ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['data']['compartidas']), 1000)
+        self.assertEqual(PlantillaCompartida.objects.filter(plantilla=self.plantilla).count(), 1000) # type: ignore
+        # Validación, lotes de INSERT, relectura, índice y registro: no crece con cada destinatario
+        self.assertLess(len(ctx.captured_queries), 50)
+
+    def test_existing_shares_are_read_inside_the_transaction(self):
+        ids = self.crear_usuarios(2)
+        PlantillaCompartida.objects.create(plantilla=self.plantilla, usuario_id=ids[0]) # type: ignore
+        with CaptureQueriesContext(connection) as ctx:
+            _, creadas = PlantillaCompartida.compartir_con_usuarios(self.plantilla, ids)
+        sqls = [consulta['sql'] for consulta in ctx.captured_queries]
+        inicio = next(i for i, sql in enumerate(sqls) if sql.startswith('SAVEPOINT'))
+        lectura = next(i for i, sql in enumerate(sqls) if sql.startswith('SELECT') and 'plantillas_compartidas' in sql)
+        # La lectura de las filas existentes debe compartir la transacción del upsert
+        self.assertLess(inicio, lectura)
+        self.assertEqual(creadas, set(PlantillaCompartida.objects.filter(usuario_id=ids[1]).values_list('id', flat=True))) # type: ignore
+
+
+class AsignacionPaqueteEmpresaTestCase(TestCase):
+    def setUp(self):
+        self.admin = Usuarios.objects.create_user(username="admin", password="pass0", is_staff=True)
+        plan = Planes.objects.create(tipo_plan="mensual", nombre="Plan", precio=1)
+        self.empresa = Empresas.objects.create(plan=plan, rut="1-9", nombre="Empresa", correo="e@e.cl")
+        Usuarios.objects.bulk_create([Usuarios(username=f"emp{i}", empresa=self.empresa) for i in range(200)])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.plantilla = PlantillaDocumento.objects.create(nombre="P", html_con_campos="", usuario=self.admin) # type: ignore
+        clasificacion = ClasificacionPlantillaGeneral.objects.create(nombre="Laboral", creado_por=self.admin) # type: ignore
+        self.paquete = PlantillaGeneral.objects.create( # type: ignore
+            nombre="Paquete", clasificacion=clasificacion, creado_por_admin=self.admin
         )
-        self.client.force_authenticate(user=self.user2)
-        response = self.client.get(reverse('escritos-list'))
-        self.assertNotIn(escrito.id, [e['id'] for e in response.data['results']]) # type: ignore
-
-class DemandasTestCase(DocumentsBaseTestCase):
-    tribunal_required = True
-    def test_user_can_only_create_demanda_for_own_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Demanda",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        self.client.force_authenticate(user=self.user1)
-        data = {
-            "documento": doc.id,
-            "operacion": "Op1"
-        }
-        if self.tribunal is not None:
-            data["tribunales"] = self.tribunal.id
-        response = self.client.post(
-            reverse('demandas-list'),
-            data,
-            format='json'
+        self.paquete.plantillas_incluidas.add(self.plantilla)
+        self.url = reverse('plantillageneral-asignar-empresa', args=[self.paquete.id])
+
+    def test_assigns_whole_company_with_constant_queries(self):
+        inactiva = self.paquete.asignar_a_usuario(Usuarios.objects.get(username="emp0"), self.admin)
+        PlantillaGeneralCompartida.objects.filter(pk=inactiva.pk).update(activo=False) # type: ignore
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'empresa_id': self.empresa.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)['data']
+        self.assertEqual((data['asignaciones_creadas'], data['asignaciones_reactivadas']), (199, 1))
+        self.assertLess(len(ctx.captured_queries), 30)
+        self.assertEqual(AccesoPlantilla.objects.filter(origen=AccesoPlantilla.PAQUETE, plantilla=self.plantilla).count(), 200) # type: ignore
+        # Repetir no crea ni reactiva nada
+        data = json.loads(self.client.post(self.url, {'empresa_id': self.empresa.id}, format='json').content)['data']
+        self.assertEqual((data['asignaciones_creadas'], data['asignaciones_reactivadas']), (0, 0))
+
+    def test_automatic_assignment_for_new_users(self):
+        self.client.post(self.url, {'empresa_id': self.empresa.id, 'automatica': True}, format='json')
+        self.assertTrue(AsignacionPaqueteEmpresa.objects.filter(empresa=self.empresa, plantilla_general=self.paquete).exists()) # type: ignore
+        nuevo = Usuarios.objects.create_user(username="nuevo", password="x", empresa=self.empresa)
+        self.assertTrue(PlantillaGeneralCompartida.objects.filter(usuario=nuevo, plantilla_general=self.paquete, activo=True).exists()) # type: ignore
+
+    def test_automatic_assignment_for_users_moved_or_reactivated(self):
+        self.client.post(self.url, {'empresa_id': self.empresa.id, 'automatica': True}, format='json')
+        Planes.objects.filter(pk=self.empresa.plan_id).update(cantidad_users=1000)
+        cache.clear()
+        otra = Empresas.objects.create(plan=self.empresa.plan, rut="2-7", nombre="Otra", correo="o@o.cl")
+        movido = Usuarios.objects.create_user(username="movido", email="movido@o.cl", password="x", empresa=otra)
+        asignaciones = PlantillaGeneralCompartida.objects.filter(plantilla_general=self.paquete) # type: ignore
+
+        self.client.force_authenticate(user=Usuarios.objects.create_superuser(username="super", password="x"))
+        response = self.client.put(f'/users/v1/usuarios/{movido.id}/', {
+            'username': 'movido', 'email': 'movido@o.cl', 'empresa': self.empresa.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(asignaciones.filter(usuario=movido, activo=True).exists())
+
+        # Guardar sin cambiar de empresa respeta la asignación desactivada a mano
+        asignaciones.filter(usuario=movido).update(activo=False)
+        response = self.client.put(f'/users/v1/usuarios/{movido.id}/', {
+            'username': 'movido', 'email': 'movido@o.cl', 'first_name': 'Movido', 'empresa': self.empresa.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(asignaciones.filter(usuario=movido, activo=True).exists())
+
+        inactivo = Usuarios.objects.get(username="emp1")
+        Usuarios.objects.filter(pk=inactivo.pk).update(is_active=False)
+        inactivo.refresh_from_db()
+        inactivo.is_active = True
+        inactivo.save()
+        self.assertTrue(asignaciones.filter(usuario=inactivo, activo=True).exists())
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(user=Usuarios.objects.get(username="emp1"))
+        response = self.client.post(self.url, {'empresa_id': self.empresa.id}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_compartir_assigns_selected_users(self):
+        ids = list(Usuarios.objects.filter(empresa=self.empresa).values_list('id', flat=True)[:5])
+        response = self.client.post(reverse('plantillageneral-compartir', args=[self.paquete.id]), {'usuarios_ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['data']['compartidas_creadas'], 5)
+
+
+class ExpiracionAsignacionesTestCase(TestCase):
+    def setUp(self):
+        self.admin = Usuarios.objects.create_user(username="admin", password="pass0", is_staff=True)
+        Usuarios.objects.bulk_create([Usuarios(username=f"u{i}") for i in range(5)])
+        self.usuarios = list(Usuarios.objects.filter(username__startswith="u"))
+        self.plantilla = PlantillaDocumento.objects.create(nombre="P", html_con_campos="", usuario=self.admin) # type: ignore
+        clasificacion = ClasificacionPlantillaGeneral.objects.create(nombre="Laboral", creado_por=self.admin) # type: ignore
+        self.paquete = PlantillaGeneral.objects.create( # type: ignore
+            nombre="Paquete", clasificacion=clasificacion, creado_por_admin=self.admin
         )
-        self.assertEqual(response.status_code, 201) # type: ignore
-        demanda = Demandas.objects.get(documento=doc) # type: ignore
-        self.assertEqual(demanda.created_by, self.user1)
-        self.assertEqual(demanda.created_by.empresa, self.empresa1)
-
-    def test_user_cannot_see_demandas_of_other_company(self):
-        doc = Documentos.objects.create( # type: ignore
-            nombre="Doc Demanda",
-            tipoDocumento=self.tipo_doc,
-            descripcion="Test",
-            version=1,
-            created_by=self.user1
-        ) # type: ignore
-        demanda = Demandas.objects.create( # type: ignore
-            documento=doc,
-            tribunales=self.tribunal,
-            operacion="Op1",
-            created_by=self.user1
+        self.paquete.plantillas_incluidas.add(self.plantilla)
+        ayer = timezone.now() - timedelta(days=1)
+        self.paquete.asignar_a_usuarios([u.id for u in self.usuarios[:4]], self.admin, fecha_expiracion=ayer)
+        self.paquete.asignar_a_usuarios([self.usuarios[4].id], self.admin)
+
+    def test_vigentes_filters_in_sql(self):
+        self.assertEqual(PlantillaGeneralCompartida.objects.vigentes().count(), 1) # type: ignore
+        self.assertEqual(PlantillaGeneralCompartida.objects.expiradas().count(), 4) # type: ignore
+        client = APIClient()
+        client.force_authenticate(user=self.usuarios[0])
+        response = client.get(reverse('plantillageneralcompartida-plantillas-vigentes'))
+        self.assertEqual(json.loads(response.content)['data'], [])
+
+    def test_sweeper_deactivates_in_batches_and_updates_index(self):
+        call_command('desactivar_asignaciones_expiradas', lote=3, stdout=io.StringIO())
+        self.assertEqual(PlantillaGeneralCompartida.objects.filter(activo=True).count(), 1) # type: ignore
+        self.assertEqual(
+            list(AccesoPlantilla.objects.filter(origen=AccesoPlantilla.PAQUETE).values_list('usuario_id', flat=True)), # type: ignore
+            [self.usuarios[4].id]
         )
-        self.client.force_authenticate(user=self.user2)
-        response = self.client.get(reverse('demandas-list'))
-        self.assertNotIn(demanda.id, [d['id'] for d in response.data['results']]) # type: ignore
-
-class PlantillasTestCase(DocumentsBaseTestCase):
-    def test_create_and_list_plantillas(self):
-        self.client.force_authenticate(user=self.user1)
-        response = self.client.post(
-            reverse('plantillas-list'),
-            {
-                "clasificacion": self.clasificacion.id,
-                "nombre": "Plantilla 1"
-            },
-            format='json'
+
+
+@override_settings(ESCRITURA_DIFERIDA_INTERVALO=0)
+class UsoPlantillaTestCase(TestCase):
+    def setUp(self):
+        buffer_usos_plantillas.vaciar()
+        plan = Planes.objects.create(tipo_plan="mensual", nombre="Plan", precio=1, cantidad_escritos=100)
+        self.empresa = Empresas.objects.create(plan=plan, rut="1-9", nombre="Empresa", correo="e@e.cl")
+        self.user = Usuarios.objects.create_user(username="user", password="pass1", empresa=self.empresa)
+        self.colega = Usuarios.objects.create_user(username="colega", password="pass2", empresa=self.empresa)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.a = PlantillaDocumento.objects.create(nombre="A", html_con_campos="", usuario=self.user) # type: ignore
+        self.b = PlantillaDocumento.objects.create(nombre="B", html_con_campos="", usuario=self.user) # type: ignore
+
+    def generar(self, plantilla):
+        url = reverse('plantilladocumento-generar-documento', args=[plantilla.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'plantilla_id': plantilla.id, 'datos': {}, 'nombre': 'doc'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def ranking(self, **params):
+        response = self.client.get(reverse('plantilladocumento-mas-usadas'), params)
+        self.assertEqual(response.status_code, 200)
+        return [(fila['plantilla_id'], fila['usos']) for fila in json.loads(response.content)['data']]
+
+    def test_generar_documento_is_buffered_and_ranked(self):
+        self.generar(self.a)
+        self.generar(self.a)
+        self.generar(self.b)
+        self.assertFalse(UsoPlantilla.objects.exists()) # type: ignore
+        UsoPlantilla.registrar(self.colega, self.b.id)
+        with CaptureQueriesContext(connection) as ctx:
+            buffer_usos_plantillas.vaciar()
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+        self.assertEqual(self.ranking(), [(self.a.id, 2), (self.b.id, 1)])
+        self.assertEqual(sorted(self.ranking(ambito='empresa')), [(self.a.id, 2), (self.b.id, 2)])
+
+    def test_old_usage_decays(self):
+        hace_dos_meses = timezone.now() - timedelta(days=60)
+        for _ in range(3):
+            UsoPlantilla.registrar(self.user, self.a.id, hace_dos_meses)
+        UsoPlantilla.registrar(self.user, self.b.id)
+        buffer_usos_plantillas.vaciar()
+        # A tiene más usos, pero B es más reciente y su puntaje decaído es mayor
+        self.assertEqual(self.ranking(), [(self.b.id, 1), (self.a.id, 3)])
+        self.assertEqual(self.ranking(orden='reciente', limite=1), [(self.b.id, 1)])
+
+    def test_flush_increments_existing_rows(self):
+        UsoPlantilla.registrar(self.user, self.a.id)
+        buffer_usos_plantillas.vaciar()
+        UsoPlantilla.registrar(self.user, self.a.id)
+        buffer_usos_plantillas.vaciar()
+        self.assertEqual(UsoPlantilla.objects.get(ambito=UsoPlantilla.USUARIO, plantilla=self.a).usos, 2) # type: ignore
+
+    def test_rolled_back_generation_is_not_counted(self):
+        url = reverse('plantilladocumento-generar-documento', args=[self.a.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('batch'), {
+                "atomico": True,
+                "operaciones": [
+                    {"method": "POST", "path": url, "body": {'plantilla_id': self.a.id, 'datos': {}, 'nombre': 'doc'}},
+                    {"method": "GET", "path": reverse('plantilladocumento-detail', args=[0])},
+                ]
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DocumentoGenerado.objects.exists()) # type: ignore
+        self.assertEqual(buffer_usos_plantillas.pendientes(), {})
+
+    @override_settings(USO_PLANTILLAS_VIDA_MEDIA_DIAS=1)
+    def test_score_does_not_overflow_with_short_half_life(self):
+        # Con vida media de 1 día el peso lineal 2^(días desde la época) se desbordaría en ~3 años
+        dentro_de_diez_anos = timezone.now() + timedelta(days=3650)
+        UsoPlantilla.registrar(self.user, self.a.id, dentro_de_diez_anos)
+        UsoPlantilla.registrar(self.user, self.a.id, dentro_de_diez_anos)
+        buffer_usos_plantillas.vaciar()
+        UsoPlantilla.registrar(self.user, self.a.id, dentro_de_diez_anos)
+        buffer_usos_plantillas.vaciar()
+        uso = UsoPlantilla.objects.get(ambito=UsoPlantilla.USUARIO, plantilla=self.a) # type: ignore
+        self.assertEqual(uso.usos, 3)
+        self.assertAlmostEqual(UsoPlantilla.puntaje_actual(uso.puntaje, dentro_de_diez_anos), 3)
+        self.assertAlmostEqual(UsoPlantilla.puntaje_actual(uso.puntaje, dentro_de_diez_anos + timedelta(days=1)), 1.5)
+
+    def test_rebuild_command_matches_history(self):
+        self.generar(self.a)
+        buffer_usos_plantillas.vaciar()
+        puntaje = UsoPlantilla.objects.get(ambito=UsoPlantilla.USUARIO, plantilla=self.a).puntaje # type: ignore
+        call_command('reconstruir_usos_plantillas', stdout=io.StringIO())
+        uso = UsoPlantilla.objects.get(ambito=UsoPlantilla.USUARIO, plantilla=self.a) # type: ignore
+        self.assertEqual(uso.usos, 1)
+        self.assertAlmostEqual(uso.puntaje, puntaje)
+
+
+class AnaliticaTestCase(TestCase):
+    def setUp(self):
+        plan = Planes.objects.create(tipo_plan="mensual", nombre="Plan", precio=1)
+        self.empresa = Empresas.objects.create(plan=plan, rut="1-9", nombre="Empresa", correo="e@e.cl")
+        self.admin = Usuarios.objects.create_user(username="jefe", password="pass1", empresa=self.empresa)
+        self.admin.groups.add(Group.objects.create(name='Admin'))
+        self.user = Usuarios.objects.create_user(username="user", password="pass2", empresa=self.empresa)
+        self.tipo = TipoPlantillaDocumento.objects.create(nombre="Demanda") # type: ignore
+        self.plantilla = PlantillaDocumento.objects.create( # type: ignore
+            nombre="P", html_con_campos="", usuario=self.admin, tipo=self.tipo
         )
-        self.assertEqual(response.status_code, 201) # type: ignore
-        response = self.client.get(reverse('plantillas-list'))
-        self.assertTrue(any(p['nombre'] == "Plantilla 1" for p in response.data['results'])) # type: ignore
-
-class ClasificacionTestCase(DocumentsBaseTestCase):
-    def test_create_and_list_clasificacion(self):
-        self.client.force_authenticate(user=self.user1)
-        response = self.client.post(
-            reverse('clasificacion-list'),
-            {"nombre": "Clasif Test"},
-            format='json'
+        for usuario in (self.admin, self.user, self.user):
+            DocumentoGenerado.objects.create( # type: ignore
+                plantilla=self.plantilla, usuario=usuario, datos_rellenados={}, html_resultante="", nombre="d"
+            )
+        DocumentoSubido.objects.create(usuario=self.user, nombre_original="a.pdf", tipo='pdf', archivo_url="x") # type: ignore
+        self.client = APIClient()
+        self.client.force_authenticate(user=Usuarios.objects.get(pk=self.admin.pk))
+
+    def test_aggregator_consumes_log_once(self):
+        self.assertEqual(EventoAnalitica.objects.count(), 4) # type: ignore
+        call_command('agregar_analitica', lote=2, stdout=io.StringIO())
+        self.assertFalse(EventoAnalitica.objects.exists()) # type: ignore
+        self.assertEqual(ResumenDiarioDocumentos.objects.get(usuario_id=self.user.id, metrica='generados').cantidad, 2) # type: ignore
+        call_command('agregar_analitica', stdout=io.StringIO())
+        self.assertEqual(ResumenDiarioDocumentos.objects.get(usuario_id=self.user.id, metrica='generados').cantidad, 2) # type: ignore
+
+    def test_dashboard_reads_only_rollups(self):
+        call_command('agregar_analitica', stdout=io.StringIO())
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('analitica'))
+        self.assertEqual(response.status_code, 200)
+        consultas = [q['sql'] for q in ctx.captured_queries]
+        self.assertFalse([sql for sql in consultas if 'documentos_generados' in sql or 'documentos_subidos' in sql])
+        self.assertLessEqual(len(consultas), 7)
+        data = json.loads(response.content)['data']
+        self.assertEqual(data['generados_por_dia'][0]['cantidad'], 3)
+        self.assertEqual(data['generados_por_tipo'], [{'tipo_id': self.tipo.id, 'tipo': 'Demanda', 'cantidad': 3}])
+        self.assertEqual(data['generados_por_usuario'][0], {'usuario_id': self.user.id, 'username': 'user', 'cantidad': 2})
+        self.assertEqual(data['subidos_por_formato'], [{'formato': 'pdf', 'cantidad': 1}])
+
+    def test_window_covers_exact_calendar_months(self):
+        def meses_cubiertos(hasta, meses):
+            desde = analitica.inicio_ventana(hasta, meses)
+            self.assertEqual(desde.day, 1)
+            return (hasta.year - desde.year) * 12 + hasta.month - desde.month + 1
+
+        self.assertEqual(analitica.inicio_ventana(date(2026, 10, 19), 12), date(2025, 11, 1))
+        for hasta in (date(2026, 10, 19), date(2026, 8, 31), date(2026, 1, 1), date(2024, 3, 31)):
+            for meses in (1, 2, 12, 24):
+                self.assertEqual(meses_cubiertos(hasta, meses), meses)
+        desde, hasta, *_ = analitica.tablero(self.empresa.id, meses=12, hasta=date(2026, 10, 19))
+        self.assertEqual((desde, hasta), (date(2025, 11, 1), date(2026, 10, 19)))
+
+    def test_rebuild_matches_incremental(self):
+        call_command('agregar_analitica', stdout=io.StringIO())
+        incremental = set(ResumenDiarioDocumentos.objects.values_list('fecha', 'usuario_id', 'metrica', 'dimension', 'cantidad')) # type: ignore
+        call_command('agregar_analitica', reconstruir=True, stdout=io.StringIO())
+        self.assertEqual(set(ResumenDiarioDocumentos.objects.values_list('fecha', 'usuario_id', 'metrica', 'dimension', 'cantidad')), incremental) # type: ignore
+
+    def test_requires_company_admin(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('analitica')).status_code, 403)
+
+
+@override_settings(ESCRITURA_DIFERIDA_INTERVALO=0)
+class BenchTestCase(TestCase):
+    def setUp(self):
+        Sembrado(2, 'bench').sembrar()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.base = Path(directorio.name) / 'base.json'
+
+    def bench(self, **opciones):
+        salida = io.StringIO()
+        call_command('bench', iteraciones=2, calentamiento=0, base=str(self.base), stdout=salida, stderr=io.StringIO(), **opciones)
+        return json.loads(salida.getvalue())
+
+    def test_reports_every_scenario_and_rolls_back_its_writes(self):
+        antes = (DocumentoGenerado.objects.count(), PlantillaCompartida.objects.count(), PlantillaGeneralCompartida.objects.count()) # type: ignore
+        informe = self.bench(guardar_base=True)
+
+        escenarios = informe['escenarios']
+        for nombre in ('conversion_docx', 'conversion_pdf', 'render_plantilla', 'listado_plantillas:superusuario',
+                       'listado_plantillas:admin', 'listado_documentos:usuario', 'compartir_plantilla', 'asignar_paquete'):
+            self.assertEqual(escenarios[nombre]['errores'], 0, nombre)
+            self.assertGreater(escenarios[nombre]['ops_por_segundo'], 0, nombre)
+            self.assertLessEqual(escenarios[nombre]['latencia_p50_ms'], escenarios[nombre]['latencia_max_ms'])
+        self.assertGreater(escenarios['render_plantilla']['consultas'], 0)
+        self.assertEqual(escenarios['conversion_pdf']['consultas'], 0)
+        self.assertIn('conversion_ocr', escenarios)
+        self.assertTrue(self.base.exists())
+        self.assertEqual(
+            (DocumentoGenerado.objects.count(), PlantillaCompartida.objects.count(), PlantillaGeneralCompartida.objects.count()), antes # type: ignore
         )
-        self.assertEqual(response.status_code, 201) # type: ignore
-        response = self.client.get(reverse('clasificacion-list'))
-        self.assertTrue(any(c['nombre'] == "Clasif Test" for c in response.data['results'])) # type: ignore
-
-class TipoDocumentoTestCase(DocumentsBaseTestCase):
-    def test_create_and_list_tipodocumento(self):
-        self.client.force_authenticate(user=self.user1)
-        response = self.client.post(
-            reverse('tipodocumento-list'),
-            {"nombre": "Tipo Test"},
-            format='json'
+
+    def test_regression_against_baseline_fails(self):
+        informe = self.bench(escenarios='listado_plantillas', guardar_base=True)
+        self.assertEqual(set(informe['escenarios']), {'listado_plantillas:superusuario', 'listado_plantillas:admin', 'listado_plantillas:usuario'})
+        self.assertEqual(self.bench(escenarios='listado_plantillas', umbral=1000)['regresiones'], [])
+
+        # Una base imposible de igualar: más rápida y sin consultas
+        for resultado in informe['escenarios'].values():
+            resultado['latencia_p95_ms'] /= 1000
+            resultado['consultas'] = 0
+        self.base.write_text(json.dumps(informe))
+        with self.assertRaises(CommandError) as error:
+            self.bench(escenarios='listado_plantillas')
+        self.assertIn('listado_plantillas:admin.consultas', str(error.exception))
+        self.assertIn('listado_plantillas:admin.latencia_p95_ms', str(error.exception))
+
+
+class SeedScaleTestCase(TestCase):
+    def sembrar(self, **opciones):
+        opciones = {'empresas': 2, 'usuarios_por_empresa': 3, 'documentos': 40, 'fecha_referencia': timezone.localdate(), **opciones}
+        call_command('seed_scale', stdout=io.StringIO(), stderr=io.StringIO(), **opciones)
+
+    def test_seeds_consistent_data_without_signals(self):
+        self.sembrar(prefijo='escala')
+
+        usuarios = Usuarios.objects.filter(username__startswith='escala-')
+        self.assertEqual(usuarios.count(), 7)
+        self.assertTrue(usuarios.get(username='escala-admin').is_superuser)
+        self.assertTrue(usuarios.get(username='escala-0001-001').check_password('escala123'))
+        self.assertEqual(Group.objects.get(name='Admin').user_set.count(), 2)
+        self.assertEqual(DocumentoGenerado.objects.count(), 40) # type: ignore
+
+        # Lo que mantienen las señales queda igual que si los datos se hubieran creado uno a uno
+        for plantilla in PlantillaDocumento.objects.all(): # type: ignore
+            self.assertTrue(AccesoPlantilla.objects.filter(plantilla=plantilla, usuario_id=plantilla.usuario_id, origen=AccesoPlantilla.PROPIA).exists())
+            variables = set(plantilla.campos_asociados.values_list('nombre_variable', flat=True))
+            self.assertEqual({f'{{{{{v}}}}}' in plantilla.html_con_campos for v in variables}, {True})
+        for compartida in PlantillaCompartida.objects.all(): # type: ignore
+            self.assertTrue(AccesoPlantilla.objects.filter(referencia_id=compartida.pk, origen=AccesoPlantilla.COMPARTIDA).exists())
+        for documento in DocumentoGenerado.objects.all(): # type: ignore
+            self.assertNotIn('{{', documento.html_resultante)
+            self.assertTrue(AccesoPlantilla.objects.filter(usuario_id=documento.usuario_id, plantilla_id=documento.plantilla_id).exists())
+        self.assertEqual(sum(ResumenDiarioDocumentos.objects.filter(metrica=EventoAnalitica.GENERADOS).values_list('cantidad', flat=True)), 40) # type: ignore
+        self.assertEqual(sum(UsoPlantilla.objects.filter(ambito=UsoPlantilla.USUARIO).values_list('usos', flat=True)), 40) # type: ignore
+
+        with self.assertRaises(CommandError):
+            self.sembrar(prefijo='escala')
+
+    def test_same_seed_produces_same_content(self):
+        self.sembrar(prefijo='a', semilla=7)
+        self.sembrar(prefijo='b', semilla=7)
+        contenido = [
+            list(DocumentoGenerado.objects.filter(usuario__username__startswith=f'{prefijo}-').order_by('id') # type: ignore
+                 .values_list('datos_rellenados', 'html_resultante', 'fecha_generacion'))
+            for prefijo in ('a', 'b')
+        ]
+        self.assertEqual(contenido[0], contenido[1])
+
+    def test_recalculates_only_seeded_companies(self):
+        ajeno = ResumenDiarioDocumentos.objects.create( # type: ignore
+            fecha=timezone.localdate(), empresa_id=999999, usuario_id=999999,
+            metrica=EventoAnalitica.GENERADOS, dimension='x', cantidad=5,
         )
-        self.assertEqual(response.status_code, 201) # type: ignore
-        response = self.client.get(reverse('tipodocumento-list'))
-        self.assertTrue(any(t['nombre'] == "Tipo Test" for t in response.data['results'])) # type: ignore
\ No newline at end of file
+        self.sembrar(prefijo='a')
+        self.sembrar(prefijo='b', semilla=2)
+
+        self.assertTrue(ResumenDiarioDocumentos.objects.filter(pk=ajeno.pk, cantidad=5).exists()) # type: ignore
+        self.assertEqual(sum(ResumenDiarioDocumentos.objects.filter(metrica=EventoAnalitica.GENERADOS).values_list('cantidad', flat=True)), 85) # type: ignore
+        self.assertEqual(sum(UsoPlantilla.objects.filter(ambito=UsoPlantilla.USUARIO).values_list('usos', flat=True)), 80) # type: ignore
+        self.assertEqual(sum(UsoPlantilla.objects.filter(ambito=UsoPlantilla.EMPRESA).values_list('usos', flat=True)), 80) # type: ignore
+
+
+# Sin temporizador de escritura diferida: su hilo compite por la base en memoria con el servidor de pruebas
+@override_settings(ESCRITURA_DIFERIDA_INTERVALO=0)
+class PruebaCargaTestCase(LiveServerTestCase):
+    def setUp(self):
+        call_command('seed_scale', empresas=1, usuarios_por_empresa=3, documentos=5, prefijo='carga',
+                     fecha_referencia=timezone.localdate(), stdout=io.StringIO(), stderr=io.StringIO())
+
+    def prueba_carga(self, **opciones):
+        salida = io.StringIO()
+        call_command('prueba_carga', url=self.live_server_url, prefijo='carga-', concurrencia=1,
+                     stdout=salida, stderr=io.StringIO(), **opciones)
+        return json.loads(salida.getvalue())
+
+    def test_replays_every_journey_without_errors(self):
+        for viaje in carga.VIAJES:
+            informe = self.prueba_carga(tasas='0', duracion=0.1, mezcla=f'{viaje}=1')
+            etapa = informe['etapas'][0]
+            self.assertGreaterEqual(etapa['recorridos'].get(f'{viaje}:completados', 0), 1, viaje)
+            self.assertEqual(etapa['tasa_error'], 0, (viaje, etapa['pasos']))
+            self.assertIn('login', etapa['pasos'])
+            self.assertIn('bootstrap', etapa['pasos'])
+        # El recorrido de administración elimina los usuarios que crea
+        self.assertFalse(Usuarios.objects.filter(last_name='Temporal').exists())
+
+    def test_open_load_stages_and_saturation(self):
+        informe = self.prueba_carga(tasas='0.5,1000', duracion=1, mezcla='navegar=1')
+        self.assertEqual([etapa['tasa_ofrecida'] for etapa in informe['etapas']], [0.5, 1000])
+        self.assertGreater(informe['etapas'][1]['recorridos']['descartados'], 0)
+        self.assertIn(informe['saturacion']['tasa'], (0.5, 1000))
+
+    def test_unreachable_server_or_bad_password_fail_fast(self):
+        with self.assertRaises(CommandError):
+            self.prueba_carga(password='incorrecta', duracion=0.1)
+        with self.assertRaises(CommandError):
+            call_command('prueba_carga', url='http://127.0.0.1:9', prefijo='carga-', duracion=0.1, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            self.prueba_carga(mezcla='inexistente=1', duracion=0.1)
+
+
+class GeneradorCargaTestCase(SimpleTestCase):
+    def generador(self):
+        usuario = {'username': 'u', 'email': 'u@example.cl', 'id': 1, 'empresa_id': 1, 'admin': False,
+                   'plantillas': [], 'colegas': []}
+        return carga.Generador('http://127.0.0.1:9', [usuario], 'x', mezcla={'navegar': 1})
+
+    def test_saturation_is_first_stage_below_offered_rate_or_over_error_threshold(self):
+        def etapa(tasa, por_segundo, tasa_error=0.0):
+            return {'tasa_ofrecida': tasa, 'recorridos_por_segundo': por_segundo, 'tasa_error': tasa_error,
+                    'recorridos': {'descartados': 0}}
+        self.assertEqual(carga.saturacion([etapa(1, 1), etapa(2, 1.95), etapa(4, 3.1), etapa(8, 3.2)])['tasa'], 4)
+        self.assertEqual(carga.saturacion([etapa(1, 1), etapa(2, 1.95), etapa(4, 3.1)])['ultima_estable'], 2)
+        self.assertEqual(carga.saturacion([etapa(1, 1), etapa(2, 2, tasa_error=0.05)])['tasa'], 2)
+        self.assertIsNone(carga.saturacion([etapa(None, 5)])['tasa'])
+
+    def test_connection_errors_abort_journeys_and_harness_errors_propagate(self):
+        with mock.patch.object(carga.Recorrido, 'navegar', side_effect=ConnectionResetError):
+            etapa = self.generador().etapa(tasa=0, concurrencia=1, duracion=0.05)
+        self.assertGreater(etapa['recorridos']['abortados'], 0)
+        self.assertNotIn('completados', etapa['recorridos'])
+
+        with mock.patch.object(carga.Recorrido, 'navegar', side_effect=KeyError('id')):
+            with self.assertRaises(KeyError):
+                self.generador().etapa(tasa=0, concurrencia=1, duracion=0.05)
+            with self.assertRaises(KeyError):
+                self.generador().etapa(tasa=100, concurrencia=1, duracion=0.05)
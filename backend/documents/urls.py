@@ -14,6 +14,8 @@ from .views import (
     ClasificacionPlantillaGeneralListAPIView,
     PlantillaGeneralCompartidaViewSet,
     UsuariosViewSet,
+    SincronizacionAPIView,
+    AnaliticaAPIView,
 )
 
 router = DefaultRouter()
@@ -34,4 +36,6 @@ urlpatterns = [
     path('tipos-plantilla/', TipoPlantillaDocumentoListAPIView.as_view(), name='tipos-plantilla-list'),
     path('clasificacion-plantillas-generales/', ClasificacionPlantillaGeneralListAPIView.as_view(), name='clasificacion-plantillas-generales-list'),
     path('categorias-plantilla/', CategoriaPlantillaDocumentoListAPIView.as_view(), name='categorias-plantilla-list'),
+    path('sincronizacion/', SincronizacionAPIView.as_view(), name='sincronizacion'),
+    path('analitica/', AnaliticaAPIView.as_view(), name='analitica'),
 ]
\ No newline at end of file
@@ -3,8 +3,9 @@ import pdfplumber
 import pytesseract
 from PIL import Image
 from django.core.files.base import ContentFile
+from django.conf import settings
 from django.core.files.storage import default_storage
-from django.db import models
+from django.db import models, transaction
 from rest_framework import generics, viewsets, status, filters
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
@@ -21,8 +22,16 @@ from docx.table import Table
 from docx.text.paragraph import Paragraph
 from rest_framework.views import APIView
 
-from core.mixins import StandardResponseMixin
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from core.mixins import StandardResponseMixin, CatalogoCacheMixin, PeticionCondicionalMixin
+from core.serializers import seleccion_campos
+from core.metricas import medir_conversion, medir_render_plantilla, observar_paginas
+from core.cache import TIPOS_PLANTILLA, CATEGORIAS_PLANTILLA, CLASIFICACIONES_PLANTILLA, CAMPOS_DISPONIBLES, obtener_versiones_catalogos
 from users.models import Usuarios
+from companies.models import Empresas
+from companies.cuotas import CuotaExcedida, consumir, recurso_documento
 from users.serializers import UsuariosSerializer
 
 from .models import (
@@ -38,7 +47,13 @@ from .models import (
     ClasificacionPlantillaGeneral,
     PlantillaGeneral,
     PlantillaGeneralCompartida,
+    RegistroCambio,
+    AccesoPlantilla,
+    UsoPlantilla,
+    EventoAnalitica,
 )
+from .fragmentos import resumenes_serializados, con_es_favorito
+from . import analitica
 from .serializers import (
     DocumentoSubidoSerializer,
     CampoDisponibleSerializer,
@@ -57,7 +72,7 @@ from .serializers import (
 )
 
 
-class DocumentoSubidoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
+class DocumentoSubidoViewSet(PeticionCondicionalMixin, StandardResponseMixin, viewsets.ModelViewSet):
     queryset = DocumentoSubido.objects.all()
     serializer_class = DocumentoSubidoSerializer
     parser_classes = (MultiPartParser, FormParser)
@@ -86,7 +101,7 @@ class DocumentoSubidoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 queryset = DocumentoSubido.objects.filter(usuario=user)
             
             # Ordenar por fecha de subida descendente
-            queryset = queryset.order_by('-fecha_subida')
+            queryset = self.optimizar_campos_queryset(queryset.order_by('-fecha_subida'))
             
             serializer = self.get_serializer(queryset, many=True)
             return self.success_response(
@@ -174,18 +189,21 @@ class DocumentoSubidoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
 
             # Extraer texto según el tipo
             texto_extraido = ""
-            if tipo == 'pdf':
-                texto_extraido = self._extraer_texto_pdf(archivo)
-            elif tipo == 'imagen':
-                texto_extraido = self._extraer_texto_imagen(archivo)
-            elif tipo == 'word':
-                # Guardar archivo temporalmente para python-docx
-                archivo.seek(0)
-                doc = docx.Document(archivo)
-                texto_extraido = self._extraer_texto_docx(doc)
-            else:
-                archivo.seek(0)
-                texto_extraido = archivo.read().decode('utf-8')
+            with medir_conversion(tipo):
+                if tipo == 'pdf':
+                    texto_extraido = self._extraer_texto_pdf(archivo)
+                elif tipo == 'imagen':
+                    texto_extraido = self._extraer_texto_imagen(archivo)
+                    observar_paginas(tipo, 1)
+                elif tipo == 'word':
+                    # Guardar archivo temporalmente para python-docx
+                    archivo.seek(0)
+                    doc = docx.Document(archivo)
+                    texto_extraido = self._extraer_texto_docx(doc)
+                    observar_paginas(tipo, self._contar_paginas_docx(doc))
+                else:
+                    archivo.seek(0)
+                    texto_extraido = archivo.read().decode('utf-8')
                 
             #print("texto extraido: ", texto_extraido)
 
@@ -237,6 +255,7 @@ class DocumentoSubidoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         """Extraer texto de PDF usando pdfplumber"""
         try:
             pdf = pdfplumber.open(archivo)
+            observar_paginas('pdf', len(pdf.pages))
             html = ""
             
             for page in pdf.pages:
@@ -495,6 +514,12 @@ class DocumentoSubidoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
             
             
 
+    def _contar_paginas_docx(self, doc):
+        """Páginas aproximadas: saltos que Word dejó marcados al guardar (o saltos manuales), más uno"""
+        cuerpo = doc.element.body
+        saltos = max(len(cuerpo.xpath('.//w:lastRenderedPageBreak')), len(cuerpo.xpath('.//w:br[@w:type="page"]')))
+        return saltos + 1
+
     def _extraer_texto_docx(self, doc):
         """Extrae texto de un documento DOCX y lo convierte a HTML manteniendo el formato"""
         html = self._get_base_css_styles()
@@ -776,13 +801,16 @@ class DocumentoSubidoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         """Obtener documento subido específico con formato estándar"""
         try:
             instance = self.get_object()
+            no_modificado = self.respuesta_no_modificada(request, instance)
+            if no_modificado:
+                return no_modificado
             serializer = self.get_serializer(instance)
-            return self.success_response(
+            return self.agregar_cabeceras_validacion(self.success_response(
                 data=serializer.data,
                 message="Documento subido obtenido exitosamente",
                 code="available_field_retrieved",
                 http_status=200
-            )
+            ), instance)
         except Exception as e:
             return self.error_response(
                 errors=str(e),
@@ -794,17 +822,21 @@ class DocumentoSubidoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         """Actualizar documento subido con formato estándar"""
         try:
-            instance = self.get_object()
-            serializer = self.get_serializer(instance, data=request.data)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                instance = self.get_object()
+                fallida = self.precondicion_fallida(request, instance)
+                if fallida:
+                    return fallida
+                serializer = self.get_serializer(instance, data=request.data)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
             
-            return self.success_response(
+            return self.agregar_cabeceras_validacion(self.success_response(
                 data=serializer.data,
                 message="Documento subido actualizado exitosamente",
                 code="available_field_updated",
                 http_status=200
-            )
+            ), instance)
         except Exception as e:
             return self.error_response(
                 errors=str(e),
@@ -816,17 +848,21 @@ class DocumentoSubidoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     def partial_update(self, request, *args, **kwargs):
         """Actualizar parcialmente documento subido con formato estándar"""
         try:
-            instance = self.get_object()
-            serializer = self.get_serializer(instance, data=request.data, partial=True)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                instance = self.get_object()
+                fallida = self.precondicion_fallida(request, instance)
+                if fallida:
+                    return fallida
+                serializer = self.get_serializer(instance, data=request.data, partial=True)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
             
-            return self.success_response(
+            return self.agregar_cabeceras_validacion(self.success_response(
                 data=serializer.data,
                 message="Documento subido actualizado exitosamente",
                 code="available_field_partial_updated",
                 http_status=200
-            )
+            ), instance)
         except Exception as e:
             return self.error_response(
                 errors=str(e),
@@ -884,13 +920,14 @@ class DocumentoSubidoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 http_status=500
             )
 
-class CampoDisponibleViewSet(StandardResponseMixin, viewsets.ModelViewSet):
+class CampoDisponibleViewSet(CatalogoCacheMixin, StandardResponseMixin, viewsets.ModelViewSet):
     queryset = CampoDisponible.objects.all()
     serializer_class = CampoDisponibleSerializer
+    catalogo = CAMPOS_DISPONIBLES
 
     def list(self, request, *args, **kwargs):
         """Listar campos disponibles con formato estándar"""
-        return self.paginated_list_response(
+        return self.catalogo_response(request, lambda: self.paginated_list_response(
             request=request,
             queryset=self.get_queryset(),
             serializer_class=self.serializer_class,
@@ -898,7 +935,7 @@ class CampoDisponibleViewSet(StandardResponseMixin, viewsets.ModelViewSet):
             unpaginated_message="Campos disponibles obtenidos exitosamente",
             code="available_fields_retrieved",
             error_code="available_fields_error"
-        )
+        ))
     
     def create(self, request, *args, **kwargs):
         """Crear campo disponible con formato estándar"""
@@ -1092,13 +1129,14 @@ class TipoPlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet
                 http_status=500
             )
 
-class TipoPlantillaDocumentoListAPIView(StandardResponseMixin, generics.ListAPIView):
+class TipoPlantillaDocumentoListAPIView(CatalogoCacheMixin, StandardResponseMixin, generics.ListAPIView):
     queryset = TipoPlantillaDocumento.objects.all()
     serializer_class = TipoPlantillaDocumentoSerializer
+    catalogo = TIPOS_PLANTILLA
 
     def list(self, request, *args, **kwargs):
         """Listar tipos de plantilla de documento con formato estándar"""
-        return self.paginated_list_response(
+        return self.catalogo_response(request, lambda: self.paginated_list_response(
             request=request,
             queryset=self.get_queryset(),
             serializer_class=self.serializer_class,
@@ -1106,15 +1144,16 @@ class TipoPlantillaDocumentoListAPIView(StandardResponseMixin, generics.ListAPIV
             unpaginated_message="Tipos de plantilla de documento obtenidos exitosamente",
             code="tipo_plantilla_retrieved",
             error_code="tipo_plantilla_error"
-        )
+        ))
 
-class CategoriaPlantillaDocumentoListAPIView(StandardResponseMixin, generics.ListAPIView):
+class CategoriaPlantillaDocumentoListAPIView(CatalogoCacheMixin, StandardResponseMixin, generics.ListAPIView):
     queryset = CategoriaPlantillaDocumento.objects.all()
     serializer_class = CategoriaPlantillaDocumentoSerializer
+    catalogo = CATEGORIAS_PLANTILLA
 
     def list(self, request, *args, **kwargs):
         """Listar categorias de plantilla de documento con formato estándar"""
-        return self.paginated_list_response(
+        return self.catalogo_response(request, lambda: self.paginated_list_response(
             request=request,
             queryset=self.get_queryset(),
             serializer_class=self.serializer_class,
@@ -1122,21 +1161,26 @@ class CategoriaPlantillaDocumentoListAPIView(StandardResponseMixin, generics.Lis
             unpaginated_message="Categorias de plantilla de documento obtenidos exitosamente",
             code="categoria_plantilla_retrieved",
             error_code="categoria_plantilla_error"
-        )
+        ))
 
-class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
+class PlantillaDocumentoViewSet(PeticionCondicionalMixin, StandardResponseMixin, viewsets.ModelViewSet):
     queryset = PlantillaDocumento.objects.none()
     serializer_class = PlantillaDocumentoSerializer
 
     def get_queryset(self):
         if not self.request.user.is_authenticated:
             return PlantillaDocumento.objects.none()
-        user = self.request.user
+        if self.action in ('retrieve', 'generar_documento', 'disponibles'):
+            # Para ver y usar una plantilla también cuentan los paquetes vigentes asignados
+            return PlantillaDocumento.objects.disponibles_para(self.request.user)
         # Plantillas propias o compartidas conmigo
-        compartidas_ids = PlantillaCompartida.objects.filter(usuario=user).values_list('plantilla_id', flat=True)
-        return PlantillaDocumento.objects.filter(
-            models.Q(usuario=user) | models.Q(id__in=compartidas_ids)
-        ).distinct()
+        return PlantillaDocumento.objects.accesibles_para(self.request.user)
+
+    def get_etag(self, instance):
+        """El detalle anida tipo, categoría y clasificación, por eso incluye sus versiones de catálogo"""
+        versiones = obtener_versiones_catalogos([TIPOS_PLANTILLA, CATEGORIAS_PLANTILLA, CLASIFICACIONES_PLANTILLA])
+        sufijo = '.'.join(str(versiones[catalogo]) for catalogo in sorted(versiones))
+        return quote_etag(f'plantilladocumento-{instance.pk}-{instance.revision}-{sufijo}')
     
     def list(self, request, *args, **kwargs):
         #print("list: ", request.user)
@@ -1149,43 +1193,8 @@ class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                     code="authentication_required",
                     http_status=401
                 )
-            usuario = request.user
-            plantillas = self.get_queryset()  # Solo las del usuario
-            
-            # Obtener favoritos del usuario
-            favoritos_usuario = PlantillaFavorita.objects.filter(usuario=usuario).values_list('plantilla_id', flat=True)
-            
-            plantillas_con_favoritos = []
-            for plantilla in plantillas:
-                # Obtener campos asociados
-                campos_asociados = []
-                for campo_plantilla in plantilla.campos_asociados.all():
-                    campos_asociados.append({
-                        'id': campo_plantilla.id,
-                        'campo': campo_plantilla.campo.id,
-                        'nombre_variable': campo_plantilla.nombre_variable,
-                        'campo_nombre': campo_plantilla.campo.nombre,
-                        'campo_tipo': campo_plantilla.campo.tipo_dato
-                    })
-                
-                plantilla_data = {
-                    'id': plantilla.id,
-                    'nombre': plantilla.nombre,
-                    'descripcion': plantilla.descripcion,
-                    'html_con_campos': plantilla.html_con_campos,
-                    'fecha_creacion': plantilla.fecha_creacion,
-                    'campos_asociados': campos_asociados,
-                    'es_favorito': plantilla.id in favoritos_usuario,
-                    'tipo': {
-                        'id': plantilla.tipo.id,
-                        'nombre': plantilla.tipo.nombre
-                    } if plantilla.tipo else None
-                }
-                plantillas_con_favoritos.append(plantilla_data)
-            
-            # Usar success_response directamente en lugar de paginated_list_response
-            return self.success_response(
-                data=plantillas_con_favoritos,
+            return self._listado_resumenes(
+                request,
                 message="Plantillas de documentos obtenidas exitosamente",
                 code="plantillas_retrieved"
             )
@@ -1195,6 +1204,104 @@ class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 code="plantillas_retrieval_error"
             )
 
+    def _listado_resumenes(self, request, message, code):
+        favoritos_usuario = set(PlantillaFavorita.objects.filter(usuario=request.user).values_list('plantilla_id', flat=True))
+
+        seleccion = seleccion_campos(request)
+        if seleccion is not None:
+            # Los fragmentos guardan el resumen completo; ?fields= / ?exclude= / ?expand= pasan por el serializer
+            queryset = self.optimizar_campos_queryset(self.get_queryset())
+            datos = self.get_serializer(queryset, many=True).data
+            con_favorito = ((seleccion['fields'] is None or 'es_favorito' in seleccion['fields'])
+                            and 'es_favorito' not in seleccion['exclude'])
+            if con_favorito:
+                for plantilla, fila in zip(queryset, datos):
+                    fila['es_favorito'] = plantilla.pk in favoritos_usuario
+            return self.success_response(data=datos, message=message, code=code)
+
+        # Solo ids y revisiones: el resumen de cada plantilla sale de la caché de fragmentos
+        revisiones = dict(self.get_queryset().values_list('id', 'revision'))
+        fragmentos = resumenes_serializados(revisiones)
+        return self.fragmentos_response(
+            [con_es_favorito(fragmentos[plantilla_id], plantilla_id in favoritos_usuario)
+             for plantilla_id in revisiones if plantilla_id in fragmentos],
+            message=message,
+            code=code
+        )
+
+    @action(detail=False, methods=['get'])
+    def disponibles(self, request):
+        """Listar las plantillas que el usuario puede usar, incluidas las de paquetes vigentes"""
+        try:
+            return self._listado_resumenes(
+                request,
+                message="Plantillas disponibles obtenidas exitosamente",
+                code="plantillas_disponibles_retrieved"
+            )
+        except Exception as e:
+            return self.error_response(
+                message=f"Error al obtener plantillas disponibles: {str(e)}",
+                code="plantillas_disponibles_error"
+            )
+
+    @action(detail=False, methods=['get'])
+    def mas_usadas(self, request):
+        """
+        Ranking de plantillas del usuario (o de su empresa con ?ambito=empresa).
+        ?orden=popular (puntaje con decaimiento, por defecto) o ?orden=reciente; ?limite= hasta 50.
+        Solo incluye plantillas a las que el usuario sigue teniendo acceso.
+        """
+        try:
+            ambito = request.query_params.get('ambito', UsoPlantilla.USUARIO)
+            if ambito == UsoPlantilla.EMPRESA:
+                if not request.user.empresa_id:
+                    return self.error_response(
+                        message="El usuario no pertenece a una empresa",
+                        code="empresa_required"
+                    )
+                referencia_id = request.user.empresa_id
+            elif ambito == UsoPlantilla.USUARIO:
+                referencia_id = request.user.id
+            else:
+                return self.error_response(
+                    message="ambito debe ser 'usuario' o 'empresa'",
+                    code="invalid_ambito"
+                )
+            orden = '-fecha_ultimo_uso' if request.query_params.get('orden') == 'reciente' else '-puntaje'
+            try:
+                limite = min(max(int(request.query_params.get('limite', 10)), 1), 50)
+            except ValueError:
+                limite = 10
+
+            accesibles = AccesoPlantilla.objects.vigentes().filter(usuario=request.user).values('plantilla_id')
+            usos = UsoPlantilla.objects.filter(
+                ambito=ambito, referencia_id=referencia_id, plantilla_id__in=accesibles
+            ).select_related('plantilla').only(
+                'plantilla__id', 'plantilla__nombre', 'usos', 'puntaje', 'fecha_ultimo_uso'
+            ).order_by(orden)[:limite]
+
+            ahora = timezone.now()
+            data = [
+                {
+                    'plantilla_id': uso.plantilla_id,
+                    'nombre': uso.plantilla.nombre,
+                    'usos': uso.usos,
+                    'puntaje': round(UsoPlantilla.puntaje_actual(uso.puntaje, ahora), 4),
+                    'fecha_ultimo_uso': uso.fecha_ultimo_uso,
+                }
+                for uso in usos
+            ]
+            return self.success_response(
+                data=data,
+                message="Plantillas más usadas obtenidas exitosamente",
+                code="plantillas_mas_usadas_retrieved"
+            )
+        except Exception as e:
+            return self.error_response(
+                message=f"Error al obtener plantillas más usadas: {str(e)}",
+                code="plantillas_mas_usadas_error"
+            )
+
     def create(self, request, *args, **kwargs):
         """Crear plantilla de documento"""
         try:
@@ -1226,16 +1333,29 @@ class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 code="plantilla_creation_error"
             )
 
+    def _registrar_acceso_paquete(self, request, plantilla):
+        """Si la plantilla llega por un paquete asignado, marca el acceso a la asignación (escritura diferida)"""
+        if plantilla.usuario_id == request.user.id:
+            return
+        asignacion_ids = AccesoPlantilla.objects.vigentes().filter(
+            usuario=request.user, plantilla=plantilla, origen=AccesoPlantilla.PAQUETE
+        ).values_list('referencia_id', flat=True)
+        PlantillaGeneralCompartida.marcar_accesos(asignacion_ids)
+
     def retrieve(self, request, *args, **kwargs):
         """Obtener plantilla de documento específica"""
         try:
             instance = self.get_object()
+            self._registrar_acceso_paquete(request, instance)
+            no_modificado = self.respuesta_no_modificada(request, instance)
+            if no_modificado:
+                return no_modificado
             serializer = self.get_serializer(instance)
-            return self.success_response(
+            return self.agregar_cabeceras_validacion(self.success_response(
                 data=serializer.data,
                 message="Plantilla de documento obtenida exitosamente",
                 code="plantilla_retrieved"
-            )
+            ), instance)
         except Exception as e:
             return self.error_response(
                 message=f"Error al obtener plantilla de documento: {str(e)}",
@@ -1245,21 +1365,25 @@ class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         """Actualizar plantilla de documento completa"""
         try:
-            instance = self.get_object()
-            serializer = self.get_serializer(instance, data=request.data)
-            if serializer.is_valid():
-                serializer.save()
-                return self.success_response(
-                    data=serializer.data,
-                    message="Plantilla de documento actualizada exitosamente",
-                    code="plantilla_updated"
-                )
-            else:
-                return self.error_response(
-                    message="Datos inválidos para actualizar plantilla de documento",
-                    code="plantilla_update_error",
-                    errors=serializer.errors
-                )
+            with transaction.atomic():
+                instance = self.get_object()
+                fallida = self.precondicion_fallida(request, instance)
+                if fallida:
+                    return fallida
+                serializer = self.get_serializer(instance, data=request.data)
+                if serializer.is_valid():
+                    serializer.save()
+                    return self.agregar_cabeceras_validacion(self.success_response(
+                        data=serializer.data,
+                        message="Plantilla de documento actualizada exitosamente",
+                        code="plantilla_updated"
+                    ), instance)
+                else:
+                    return self.error_response(
+                        message="Datos inválidos para actualizar plantilla de documento",
+                        code="plantilla_update_error",
+                        errors=serializer.errors
+                    )
         except Exception as e:
             return self.error_response(
                 message=f"Error al actualizar plantilla de documento: {str(e)}",
@@ -1347,6 +1471,7 @@ class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         """Generar documento a partir de plantilla y datos"""
         try:
             plantilla = self.get_object()
+            self._registrar_acceso_paquete(request, plantilla)
             serializer = GenerarDocumentoSerializer(data=request.data)
             
             if serializer.is_valid():
@@ -1354,10 +1479,11 @@ class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 
                 # Reemplazar campos en el HTML
                 html_resultante = plantilla.html_con_campos
-                for campo_plantilla in plantilla.campos_asociados.all():
-                    variable = f"{{{{{campo_plantilla.nombre_variable}}}}}"
-                    valor = datos.get(campo_plantilla.nombre_variable, '')
-                    html_resultante = html_resultante.replace(variable, str(valor))
+                with medir_render_plantilla():
+                    for campo_plantilla in plantilla.campos_asociados.all():
+                        variable = f"{{{{{campo_plantilla.nombre_variable}}}}}"
+                        valor = datos.get(campo_plantilla.nombre_variable, '')
+                        html_resultante = html_resultante.replace(variable, str(valor))
 
                 # Verificar autenticación
                 if not request.user.is_authenticated:
@@ -1368,14 +1494,28 @@ class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                         http_status=401
                     )
 
-                # Crear documento generado
-                documento = DocumentoGenerado.objects.create(
-                    plantilla=plantilla,
-                    usuario=request.user,
-                    datos_rellenados=datos,
-                    html_resultante=html_resultante,
-                    nombre=request.user.username + "_" + request.data['nombre'] + ".html"
-                )
+                # Crear documento generado y descontarlo del plan en la misma transacción
+                try:
+                    with transaction.atomic():
+                        documento = DocumentoGenerado.objects.create(
+                            plantilla=plantilla,
+                            usuario=request.user,
+                            datos_rellenados=datos,
+                            html_resultante=html_resultante,
+                            nombre=request.user.username + "_" + request.data['nombre'] + ".html"
+                        )
+                        if request.user.empresa_id:
+                            nombre_tipo = plantilla.tipo.nombre if plantilla.tipo_id else None
+                            consumir(request.user.empresa_id, recurso_documento(nombre_tipo))
+                except CuotaExcedida as e:
+                    return self.error_response(
+                        message=str(e),
+                        code="plan_quota_exceeded",
+                        http_status=status.HTTP_403_FORBIDDEN
+                    )
+                # Solo si el documento queda confirmado (p. ej. un /batch/ atómico puede revertirlo)
+                usuario = request.user
+                transaction.on_commit(lambda: UsoPlantilla.registrar(usuario, plantilla.id, documento.fecha_generacion))
 
                 return self.success_response(
                     data={
@@ -1399,67 +1539,71 @@ class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
 
     def partial_update(self, request, *args, **kwargs):
         try:
-            instance = self.get_object()
-            data = request.data
-
-            # Quitar campo asociado (flujo rápido)
-            if 'quitar_campo_id' in data:
-                campo_plantilla_id = data['quitar_campo_id']
-                from .models import CampoPlantilla
-                CampoPlantilla.objects.filter(id=campo_plantilla_id, plantilla=instance).delete()
-                return self.success_response(
-                    message="Campo asociado eliminado exitosamente",
-                    code="campo_asociado_removed"
-                )
-
-            # Manejar tipo de plantilla
-            if 'tipo' in data:
-                tipo = None
-                if data['tipo']:
-                    try:
-                        tipo = TipoPlantillaDocumento.objects.get(id=data['tipo'])
-                    except TipoPlantillaDocumento.DoesNotExist:
-                        pass
-                instance.tipo = tipo
-                instance.save()
-
-            # Sincronizar campos asociados si se envía 'campos'
-            if 'campos' in data:
-                from .models import CampoPlantilla
-                nuevos = data['campos']
-                nuevos_set = set((c['campo_id'], c['nombre_variable']) for c in nuevos)
-                actuales = list(instance.campos_asociados.all())
-                actuales_set = set((c.campo_id, c.nombre_variable) for c in actuales)
-
-                # Eliminar los que ya no están
-                for c in actuales:
-                    if (c.campo_id, c.nombre_variable) not in nuevos_set:
-                        c.delete()
-
-                # Agregar los nuevos que no existen
-                for c in nuevos:
-                    if (c['campo_id'], c['nombre_variable']) not in actuales_set:
-                        CampoPlantilla.objects.create(
-                            plantilla=instance,
-                            campo_id=c['campo_id'],
-                            nombre_variable=c['nombre_variable']
-                        )
+            with transaction.atomic():
+                instance = self.get_object()
+                fallida = self.precondicion_fallida(request, instance)
+                if fallida:
+                    return fallida
+                data = request.data
+
+                # Quitar campo asociado (flujo rápido)
+                if 'quitar_campo_id' in data:
+                    campo_plantilla_id = data['quitar_campo_id']
+                    from .models import CampoPlantilla
+                    CampoPlantilla.objects.filter(id=campo_plantilla_id, plantilla=instance).delete()
+                    return self.success_response(
+                        message="Campo asociado eliminado exitosamente",
+                        code="campo_asociado_removed"
+                    )
 
-            # Resto del update normal
-            serializer = self.get_serializer(instance, data=request.data, partial=True)
-            if serializer.is_valid():
-                serializer.save()
-                return self.success_response(
-                    data=serializer.data,
-                    message="Plantilla de documento actualizada exitosamente",
-                    code="plantilla_updated"
-                )
-            else:
-                return self.error_response(
-                    message="Datos inválidos para actualizar plantilla de documento",
-                    code="plantilla_update_error",
-                    errors=serializer.errors
-                )
+                # Manejar tipo de plantilla
+                if 'tipo' in data:
+                    tipo = None
+                    if data['tipo']:
+                        try:
+                            tipo = TipoPlantillaDocumento.objects.get(id=data['tipo'])
+                        except TipoPlantillaDocumento.DoesNotExist:
+                            pass
+                    instance.tipo = tipo
+                    instance.save()
+
+                # Sincronizar campos asociados si se envía 'campos'
+                if 'campos' in data:
+                    from .models import CampoPlantilla
+                    nuevos = data['campos']
+                    nuevos_set = set((c['campo_id'], c['nombre_variable']) for c in nuevos)
+                    actuales = list(instance.campos_asociados.all())
+                    actuales_set = set((c.campo_id, c.nombre_variable) for c in actuales)
+
+                    # Eliminar los que ya no están
+                    for c in actuales:
+                        if (c.campo_id, c.nombre_variable) not in nuevos_set:
+                            c.delete()
+
+                    # Agregar los nuevos que no existen
+                    for c in nuevos:
+                        if (c['campo_id'], c['nombre_variable']) not in actuales_set:
+                            CampoPlantilla.objects.create(
+                                plantilla=instance,
+                                campo_id=c['campo_id'],
+                                nombre_variable=c['nombre_variable']
+                            )
+
+                # Resto del update normal
+                serializer = self.get_serializer(instance, data=request.data, partial=True)
+                if serializer.is_valid():
+                    serializer.save()
+                    return self.agregar_cabeceras_validacion(self.success_response(
+                        data=serializer.data,
+                        message="Plantilla de documento actualizada exitosamente",
+                        code="plantilla_updated"
+                    ), instance)
+                else:
+                    return self.error_response(
+                        message="Datos inválidos para actualizar plantilla de documento",
+                        code="plantilla_update_error",
+                        errors=serializer.errors
+                    )
         except Exception as e:
             return self.error_response(
                 message=f"Error al actualizar plantilla de documento: {str(e)}",
@@ -1480,14 +1624,14 @@ class PlantillaDocumentoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 code="plantilla_deletion_error"
             )
 
-class DocumentoGeneradoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
+class DocumentoGeneradoViewSet(PeticionCondicionalMixin, StandardResponseMixin, viewsets.ModelViewSet):
     queryset = DocumentoGenerado.objects.none()
     serializer_class = DocumentoGeneradoSerializer
 
     def get_queryset(self):
         if not self.request.user.is_authenticated:
             return DocumentoGenerado.objects.none()
-        return DocumentoGenerado.objects.filter(usuario=self.request.user)
+        return DocumentoGenerado.objects.filter(usuario=self.request.user).select_related('plantilla', 'usuario')
 
     def perform_create(self, serializer):
         """Asignar automáticamente el usuario logueado al crear un documento generado"""
@@ -1521,13 +1665,16 @@ class DocumentoGeneradoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         """Obtener documento generado específico con formato estándar"""
         try:
             instance = self.get_object()
+            no_modificado = self.respuesta_no_modificada(request, instance)
+            if no_modificado:
+                return no_modificado
             serializer = self.get_serializer(instance)
-            return self.success_response(
+            return self.agregar_cabeceras_validacion(self.success_response(
                 data=serializer.data,
                 message="Documento generado obtenido exitosamente",
                 code="documento_generated_retrieved",
                 http_status=200
-            )
+            ), instance)
         except Exception as e:
             return self.error_response(
                 errors=str(e),
@@ -1539,13 +1686,20 @@ class DocumentoGeneradoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         """Actualizar documento generado con formato estándar"""
         try:
-            response = super().update(request, *args, **kwargs)
-            return self.success_response(
-                data=response.data,
+            with transaction.atomic():
+                instance = self.get_object()
+                fallida = self.precondicion_fallida(request, instance)
+                if fallida:
+                    return fallida
+                serializer = self.get_serializer(instance, data=request.data)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+            return self.agregar_cabeceras_validacion(self.success_response(
+                data=serializer.data,
                 message="Documento generado actualizado exitosamente",
                 code="documento_generated_updated",
                 http_status=200
-            )
+            ), instance)
         except Exception as e:
             return self.error_response(
                 errors=str(e),
@@ -1557,13 +1711,20 @@ class DocumentoGeneradoViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     def partial_update(self, request, *args, **kwargs):
         """Actualizar parcialmente documento generado con formato estándar"""
         try:
-            response = super().partial_update(request, *args, **kwargs)
-            return self.success_response(
-                data=response.data,
+            with transaction.atomic():
+                instance = self.get_object()
+                fallida = self.precondicion_fallida(request, instance)
+                if fallida:
+                    return fallida
+                serializer = self.get_serializer(instance, data=request.data, partial=True)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+            return self.agregar_cabeceras_validacion(self.success_response(
+                data=serializer.data,
                 message="Documento generado actualizado exitosamente",
                 code="documento_generated_updated",
                 http_status=200
-            )
+            ), instance)
         except Exception as e:
             return self.error_response(
                 errors=str(e),
@@ -1751,17 +1912,7 @@ class PlantillaFavoritaViewSet(StandardResponseMixin, viewsets.GenericViewSet):
             usuario = request.user
             favoritos = PlantillaFavorita.objects.filter(usuario=usuario).select_related('plantilla')
             
-            plantillas_favoritas = []
-            for favorito in favoritos:
-                plantilla = favorito.plantilla
-                plantillas_favoritas.append({
-                    'id': plantilla.id,
-                    'nombre': plantilla.nombre,
-                    'descripcion': plantilla.descripcion,
-                    'fecha_creacion': plantilla.fecha_creacion,
-                    'fecha_agregado_favorito': favorito.fecha_agregado,
-                    'es_favorito': True
-                })
+            plantillas_favoritas = [favorito.get_resumen() for favorito in favoritos]
             
             return self.success_response(
                 data=plantillas_favoritas,
@@ -1787,7 +1938,10 @@ class PlantillaCompartidaViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         if not self.request.user.is_authenticated:
             return PlantillaCompartida.objects.none()
         user = self.request.user
-        return PlantillaCompartida.objects.filter(models.Q(usuario=user) | models.Q(plantilla__usuario=user)).distinct()
+        propias = AccesoPlantilla.objects.filter(usuario=user, origen=AccesoPlantilla.PROPIA).values('plantilla_id')
+        return PlantillaCompartida.objects.filter(
+            models.Q(usuario=user) | models.Q(plantilla_id__in=propias)
+        ).select_related('plantilla', 'usuario')
 
     def list(self, request, *args, **kwargs):
         """Listar plantillas compartidas con formato estándar"""
@@ -1901,7 +2055,7 @@ class PlantillaCompartidaViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                     code="authentication_required"
                 )
             
-            compartidas = PlantillaCompartida.objects.filter(usuario=user)
+            compartidas = PlantillaCompartida.objects.filter(usuario=user).select_related('plantilla', 'usuario')
             serializer = self.get_serializer(compartidas, many=True)
             return self.success_response(
                 data=serializer.data,
@@ -1934,21 +2088,46 @@ class PlantillaCompartidaViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 ids = usuario_ids if isinstance(usuario_ids, list) else [usuario_ids]
             elif usuario_id:
                 ids = [usuario_id]
-            
-            compartidas = []
-            for uid in ids:
-                compartida, created = PlantillaCompartida.objects.get_or_create(
-                    plantilla_id=plantilla_id,
-                    usuario_id=uid,
-                    defaults={'permisos': permisos}
+
+            if permisos not in dict(PlantillaCompartida._meta.get_field('permisos').choices):
+                return self.error_response(
+                    message="permisos debe ser 'lectura' o 'edicion'",
+                    code="invalid_permisos"
                 )
-                if not created:
-                    compartida.permisos = permisos
-                    compartida.save()
-                compartidas.append({'id': compartida.id, 'usuario_id': uid})
-            
+
+            plantilla = PlantillaDocumento.objects.filter(pk=plantilla_id).only('id', 'usuario_id').first()
+            if plantilla is None:
+                return self.error_response(
+                    message="Plantilla no encontrada",
+                    code="plantilla_not_found",
+                    http_status=status.HTTP_404_NOT_FOUND
+                )
+
+            # Una sola consulta para validar todos los destinatarios
+            try:
+                solicitados = {int(uid) for uid in ids}
+            except (TypeError, ValueError):
+                return self.error_response(
+                    message="usuario_ids debe contener ids numéricos",
+                    code="invalid_usuario_ids"
+                )
+            validos = set(Usuarios.objects.filter(id__in=solicitados, is_active=True).values_list('id', flat=True))
+            invalidos = sorted(solicitados - validos)
+            if not validos:
+                return self.error_response(
+                    message="Ningún usuario válido para compartir",
+                    code="invalid_usuario_ids",
+                    errors={'usuarios_invalidos': invalidos}
+                )
+
+            filas, creadas = PlantillaCompartida.compartir_con_usuarios(plantilla, validos, permisos)
+            compartidas = [
+                {'id': c.id, 'usuario_id': c.usuario_id, 'permisos': c.permisos, 'creada': c.id in creadas}
+                for c in filas
+            ]
+
             return self.success_response(
-                data={'compartidas': compartidas},
+                data={'compartidas': compartidas, 'usuarios_invalidos': invalidos},
                 message="Plantilla compartida correctamente",
                 code="plantilla_compartida_successfully"
             )
@@ -2132,15 +2311,16 @@ class ClasificacionPlantillaGeneralViewSet(StandardResponseMixin, viewsets.Model
                 code="classification_deletion_error"
             )
 
-class ClasificacionPlantillaGeneralListAPIView(StandardResponseMixin, generics.ListAPIView):
-    queryset = ClasificacionPlantillaGeneral.objects.all()
+class ClasificacionPlantillaGeneralListAPIView(CatalogoCacheMixin, StandardResponseMixin, generics.ListAPIView):
+    queryset = ClasificacionPlantillaGeneral.objects.select_related('creado_por').con_conteos()
     serializer_class = ClasificacionPlantillaGeneralSerializer
+    catalogo = CLASIFICACIONES_PLANTILLA
 
     def list(self, request, *args, **kwargs):
         """Listar clasificaciones de plantilla general"""
         try:
             queryset = self.filter_queryset(self.get_queryset())
-            return self.paginated_list_response(
+            return self.catalogo_response(request, lambda: self.paginated_list_response(
                 request,
                 queryset,
                 self.get_serializer_class(),
@@ -2148,7 +2328,7 @@ class ClasificacionPlantillaGeneralListAPIView(StandardResponseMixin, generics.L
                 unpaginated_message="Listado de clasificaciones de plantilla general obtenido correctamente",
                 code="classification_list_retrieved",
                 error_code="classification_list_error"
-            )
+            ))
         except Exception as e:
             return self.error_response(
                 message=f"Error al obtener las clasificaciones de plantilla general: {str(e)}",
@@ -2159,6 +2339,21 @@ class PlantillaGeneralViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     queryset = PlantillaGeneral.objects.all()
     serializer_class = PlantillaGeneralSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        # Todo lo que anida PlantillaGeneralSerializer, para no consultar por paquete ni por plantilla
+        clasificaciones = ClasificacionPlantillaGeneral.objects.select_related('creado_por').con_conteos()
+        asignaciones = PlantillaGeneralCompartida.objects.filter(activo=True).select_related('usuario')
+        return queryset.select_related('creado_por_admin').annotate(
+            total_plantillas_count=models.Count('plantillas_incluidas', distinct=True)
+        ).prefetch_related(
+            models.Prefetch('clasificacion', queryset=clasificaciones),
+            models.Prefetch('plantillas_incluidas', queryset=PlantillaDocumento.objects.para_serializar()),
+            models.Prefetch('asignaciones', queryset=asignaciones, to_attr='asignaciones_activas'),
+        )
+
     def list(self, request, *args, **kwargs):
         """Listar plantillas generales"""
         try:
@@ -2289,44 +2484,53 @@ class PlantillaGeneralViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 code="plantilla_general_by_classification_error"
             )
 
+    def _leer_fecha_expiracion(self, request, campo):
+        """Retorna (fecha, respuesta_error); la fecha es None si no se envió"""
+        valor = request.data.get(campo)
+        if not valor:
+            return None, None
+        fecha = parse_datetime(str(valor))
+        if fecha is None:
+            return None, self.error_response(
+                message=f"{campo} debe ser una fecha ISO 8601",
+                code="invalid_fecha_expiracion"
+            )
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        return fecha, None
+
     @action(detail=True, methods=['post'])
     def compartir(self, request, pk=None):
         """Compartir plantilla general con usuarios específicos"""
         try:
             plantilla_general = self.get_object()
             usuarios_ids = request.data.get('usuarios_ids', [])
-            fecha_vencimiento = request.data.get('fecha_vencimiento')
-            
+            fecha_vencimiento, error = self._leer_fecha_expiracion(request, 'fecha_vencimiento')
+            if error:
+                return error
+
             if not usuarios_ids:
                 return self.error_response(
                     message="Debe especificar al menos un usuario",
                     code="no_users_specified"
                 )
-            
-            # Crear registros de compartición
-            compartidas_creadas = []
-            for usuario_id in usuarios_ids:
-                try:
-                    usuario = User.objects.get(id=usuario_id)
-                    compartida, created = PlantillaGeneralCompartida.objects.get_or_create(
-                        plantilla_general=plantilla_general,
-                        usuario_asignado=usuario,
-                        defaults={
-                            'usuario_que_comparte': request.user,
-                            'fecha_vencimiento': fecha_vencimiento
-                        }
-                    )
-                    if created:
-                        compartidas_creadas.append(compartida)
-                except Usuario.DoesNotExist:
-                    continue
-            
+            if not isinstance(usuarios_ids, list):
+                usuarios_ids = [usuarios_ids]
+
+            creadas, reactivadas = plantilla_general.asignar_a_usuarios(
+                Usuarios.objects.filter(id__in=usuarios_ids, is_active=True),
+                request.user,
+                fecha_expiracion=fecha_vencimiento,
+                notas=request.data.get('notas')
+            )
+
             return self.success_response(
                 data={
-                    'compartidas_creadas': len(compartidas_creadas),
+                    'compartidas_creadas': len(creadas),
+                    'compartidas_reactivadas': len(reactivadas),
                     'total_usuarios': len(usuarios_ids)
                 },
-                message=f"Plantilla compartida con {len(compartidas_creadas)} usuarios",
+                message=f"Plantilla compartida con {len(creadas) + len(reactivadas)} usuarios",
                 code="plantilla_general_shared"
             )
         except Exception as e:
@@ -2335,6 +2539,57 @@ class PlantillaGeneralViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 code="plantilla_general_sharing_error"
             )
 
+    @action(detail=True, methods=['post'])
+    def asignar_empresa(self, request, pk=None):
+        """
+        Asignar el paquete a todos los usuarios activos de una empresa.
+        Con automatica=true también se asigna a los usuarios que se unan después.
+        """
+        try:
+            if not (request.user.is_superuser or request.user.is_staff):
+                return self.error_response(
+                    message="No tienes permisos para acceder a esta funcionalidad",
+                    code="permission_denied",
+                    http_status=status.HTTP_403_FORBIDDEN
+                )
+
+            plantilla_general = self.get_object()
+            empresa_id = request.data.get('empresa_id')
+            empresa = Empresas.objects.filter(pk=empresa_id).first() if empresa_id else None
+            if empresa is None:
+                return self.error_response(
+                    message="empresa_id es requerido y debe existir",
+                    code="empresa_not_found"
+                )
+            fecha_expiracion, error = self._leer_fecha_expiracion(request, 'fecha_expiracion')
+            if error:
+                return error
+
+            automatica = str(request.data.get('automatica', '')).lower() in ('1', 'true')
+            creadas, reactivadas = plantilla_general.asignar_a_empresa(
+                empresa,
+                request.user,
+                fecha_expiracion=fecha_expiracion,
+                notas=request.data.get('notas'),
+                automatica=automatica
+            )
+
+            return self.success_response(
+                data={
+                    'empresa_id': empresa.id,
+                    'asignaciones_creadas': len(creadas),
+                    'asignaciones_reactivadas': len(reactivadas),
+                    'automatica': automatica
+                },
+                message=f"Paquete asignado a {len(creadas) + len(reactivadas)} usuarios de la empresa",
+                code="plantilla_general_assigned_to_company"
+            )
+        except Exception as e:
+            return self.error_response(
+                message=f"Error al asignar el paquete a la empresa: {str(e)}",
+                code="plantilla_general_company_assignment_error"
+            )
+
     @action(detail=True, methods=['get'])
     def usuarios_con_acceso(self, request, pk=None):
         """Obtener usuarios que tienen acceso a esta plantilla general"""
@@ -2388,14 +2643,14 @@ class PlantillaGeneralCompartidaViewSet(StandardResponseMixin, viewsets.ModelVie
             # Los administradores pueden ver todas las plantillas compartidas
             return PlantillaGeneralCompartida.objects.all().select_related(
                 'plantilla_general', 'usuario', 'asignado_por'
-            )
+            ).prefetch_related('plantilla_general__plantillas_incluidas')
         else:
             # Los usuarios solo pueden ver las plantillas compartidas con ellos
             return PlantillaGeneralCompartida.objects.filter(
                 usuario=user
             ).select_related(
                 'plantilla_general', 'usuario', 'asignado_por'
-            )
+            ).prefetch_related('plantilla_general__plantillas_incluidas')
 
     @action(detail=False, methods=['get'])
     def mis_plantillas_compartidas(self, request):
@@ -2432,8 +2687,7 @@ class PlantillaGeneralCompartidaViewSet(StandardResponseMixin, viewsets.ModelVie
                     http_status=401
                 )
             
-            compartidas = self.get_queryset().filter(usuario=request.user)
-            vigentes = [c for c in compartidas if c.esta_vigente()]
+            vigentes = self.get_queryset().filter(usuario=request.user).vigentes()
             serializer = self.get_serializer(vigentes, many=True)
             return self.success_response(
                 data=serializer.data,
@@ -2479,7 +2733,7 @@ class UsuariosViewSet(StandardResponseMixin, viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         """Obtener todos los usuarios excepto el usuario actual"""
         if self.request.user.is_authenticated:
-            return Usuarios.objects.exclude(id=self.request.user.id)
+            return Usuarios.objects.exclude(id=self.request.user.id).select_related('empresa__plan').prefetch_related('groups')
         return Usuarios.objects.none()
     
     def list(self, request, *args, **kwargs):
@@ -2499,4 +2753,213 @@ class UsuariosViewSet(StandardResponseMixin, viewsets.ReadOnlyModelViewSet):
                 message="Error al obtener usuarios",
                 code="users_error",
                 http_status=500
-            )
\ No newline at end of file
+            )
+
+
+class SincronizacionAPIView(StandardResponseMixin, APIView):
+    """
+    Sincronización incremental del caché local del frontend.
+    Sin `cursor` entrega el estado completo; con `cursor` solo lo creado o modificado después
+    de esa posición del RegistroCambio, más las lápidas de lo eliminado o revocado. Si esa
+    posición ya se podó del registro entrega el estado completo (`completo: true`).
+    """
+    permission_classes = [IsAuthenticated]
+
+    # entidad del registro -> clave en la respuesta
+    CLAVES = {
+        RegistroCambio.PLANTILLA: 'plantillas',
+        RegistroCambio.FAVORITO: 'favoritos',
+        RegistroCambio.COMPARTIDA: 'compartidas',
+    }
+
+    def _queryset(self, entidad, user):
+        if entidad == RegistroCambio.PLANTILLA:
+            return PlantillaDocumento.objects.accesibles_para(user).para_serializar()
+        if entidad == RegistroCambio.FAVORITO:
+            return PlantillaFavorita.objects.filter(usuario=user).prefetch_related(
+                models.Prefetch('plantilla', queryset=PlantillaDocumento.objects.para_serializar())
+            )
+        return PlantillaCompartida.objects.filter(
+            models.Q(usuario=user) | models.Q(plantilla__usuario=user)
+        ).select_related('plantilla', 'usuario')
+
+    def _serializer_class(self, entidad):
+        return {
+            RegistroCambio.PLANTILLA: PlantillaDocumentoSerializer,
+            RegistroCambio.FAVORITO: PlantillaFavoritaSerializer,
+            RegistroCambio.COMPARTIDA: PlantillaCompartidaSerializer,
+        }[entidad]
+
+    def _serializar(self, entidad, queryset):
+        return self._serializer_class(entidad)(queryset, many=True, context={'request': self.request}).data
+
+    def _estado_completo(self, user):
+        # El cursor se toma antes de leer y solo cubre cambios asentados: lo que cambie mientras
+        # tanto, o siga en una transacción sin confirmar, se vuelve a enviar en la próxima llamada
+        cursor = RegistroCambio.cursor_asentado()
+        data = {
+            'cursor': cursor,
+            'completo': True,
+            'hay_mas': False,
+            'eliminados': {clave: [] for clave in self.CLAVES.values()},
+        }
+        for entidad, clave in self.CLAVES.items():
+            data[clave] = self._serializar(entidad, self._queryset(entidad, user))
+        return data
+
+    def _cambios_desde(self, user, cursor):
+        limite = settings.SINCRONIZACION_LIMITE
+        asentado = RegistroCambio.limite_asentado()
+        cambios = list(
+            RegistroCambio.objects.filter(usuario=user, id__gt=cursor)
+            .order_by('id')
+            .values_list('id', 'entidad', 'objeto_id', 'operacion', 'fecha')[:limite + 1]
+        )
+        hay_mas = len(cambios) > limite
+        cambios = cambios[:limite]
+
+        # Los ids se asignan al insertar: un cambio reciente puede tener delante otro con id menor
+        # aún sin confirmar. El cursor avanza solo hasta el último cambio asentado; los recientes
+        # se envían igual y se repiten en la próxima llamada (aplicarlos dos veces no cambia nada)
+        nuevo_cursor = cursor
+        recientes = False
+        for id_cambio, *_, fecha in cambios:
+            if fecha >= asentado:
+                recientes = True
+                break
+            nuevo_cursor = id_cambio
+        if not recientes and not hay_mas:
+            # Sin nada pendiente para el usuario, el cursor sigue al registro global para no quedar vencido
+            nuevo_cursor = max(nuevo_cursor, RegistroCambio.cursor_asentado())
+
+        # Solo importa la última operación de cada objeto dentro del lote
+        ultimas = {}
+        for _, entidad, objeto_id, operacion, _ in cambios:
+            ultimas[(entidad, objeto_id)] = operacion
+
+        data = {
+            'cursor': nuevo_cursor,
+            'completo': False,
+            'hay_mas': hay_mas and nuevo_cursor > cursor,
+            'eliminados': {},
+        }
+        for entidad, clave in self.CLAVES.items():
+            eliminados = {objeto_id for (e, objeto_id), op in ultimas.items() if e == entidad and op == RegistroCambio.ELIMINACION}
+            upserts = {objeto_id for (e, objeto_id), op in ultimas.items() if e == entidad and op == RegistroCambio.UPSERT}
+            objetos = list(self._queryset(entidad, user).filter(id__in=upserts)) if upserts else []
+            # Lo que ya no existe o dejó de ser accesible se informa como eliminado
+            eliminados |= upserts - {objeto.id for objeto in objetos}
+            data[clave] = self._serializar(entidad, objetos)
+            data['eliminados'][clave] = sorted(eliminados)
+        return data
+
+    def get(self, request, *args, **kwargs):
+        """Obtener los cambios posteriores al cursor indicado"""
+        try:
+            cursor = request.query_params.get('cursor')
+            if not cursor:
+                return self.success_response(
+                    data=self._estado_completo(request.user),
+                    message="Estado completo obtenido exitosamente",
+                    code="sync_full_retrieved"
+                )
+            try:
+                cursor = int(cursor)
+            except ValueError:
+                return self.error_response(
+                    errors="cursor debe ser un número entero",
+                    message="Cursor inválido",
+                    code="invalid_cursor"
+                )
+            if not RegistroCambio.cursor_vigente(cursor):
+                # Los cambios posteriores al cursor ya se podaron: el cliente debe reemplazar su caché
+                return self.success_response(
+                    data=self._estado_completo(request.user),
+                    message="Cursor vencido, se entrega el estado completo",
+                    code="sync_cursor_expired"
+                )
+            return self.success_response(
+                data=self._cambios_desde(request.user, cursor),
+                message="Cambios obtenidos exitosamente",
+                code="sync_changes_retrieved"
+            )
+        except Exception as e:
+            return self.error_response(
+                errors=str(e),
+                message="Error al obtener cambios",
+                code="sync_error",
+                http_status=500
+            )
+
+
+class AnaliticaAPIView(StandardResponseMixin, APIView):
+    """
+    Tablero de uso de la empresa (documentos generados por día, tipo y usuario; subidos por día y formato)
+    calculado solo desde los resúmenes diarios. Para staff o usuarios del grupo Admin de la empresa.
+    ?meses= (1 a 24, por defecto 12); staff puede indicar ?empresa_id=.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user = request.user
+            es_staff = user.is_staff or user.is_superuser
+            if not (es_staff or user.groups.filter(name='Admin').exists()):
+                return self.error_response(
+                    message="No tienes permisos para acceder a esta funcionalidad",
+                    code="permission_denied",
+                    http_status=status.HTTP_403_FORBIDDEN
+                )
+            empresa_id = user.empresa_id
+            if es_staff and request.query_params.get('empresa_id'):
+                empresa_id = int(request.query_params['empresa_id'])
+            if not empresa_id:
+                return self.error_response(
+                    message="El usuario no pertenece a una empresa",
+                    code="empresa_required"
+                )
+            try:
+                meses = min(max(int(request.query_params.get('meses', 12)), 1), 24)
+            except ValueError:
+                meses = 12
+
+            desde, hasta, por_dia, por_dimension, por_usuario = analitica.tablero(empresa_id, meses)
+            tipos = dict(TipoPlantillaDocumento.objects.filter(
+                id__in=[int(d) for d in por_dimension[EventoAnalitica.GENERADOS] if d]
+            ).values_list('id', 'nombre'))
+            usernames = dict(Usuarios.objects.filter(
+                id__in=[fila['usuario_id'] for fila in por_usuario]
+            ).values_list('id', 'username'))
+
+            data = {
+                'desde': desde,
+                'hasta': hasta,
+                'generados_por_dia': por_dia[EventoAnalitica.GENERADOS],
+                'generados_por_tipo': [
+                    {
+                        'tipo_id': int(dimension) if dimension else None,
+                        'tipo': tipos.get(int(dimension)) if dimension else None,
+                        'cantidad': cantidad,
+                    }
+                    for dimension, cantidad in por_dimension[EventoAnalitica.GENERADOS].items()
+                ],
+                'generados_por_usuario': [
+                    {'usuario_id': fila['usuario_id'], 'username': usernames.get(fila['usuario_id']), 'cantidad': fila['cantidad']}
+                    for fila in por_usuario
+                ],
+                'subidos_por_dia': por_dia[EventoAnalitica.SUBIDOS],
+                'subidos_por_formato': [
+                    {'formato': dimension, 'cantidad': cantidad}
+                    for dimension, cantidad in por_dimension[EventoAnalitica.SUBIDOS].items()
+                ],
+            }
+            return self.success_response(
+                data=data,
+                message="Analítica de uso obtenida correctamente",
+                code="analitica_retrieved"
+            )
+        except Exception as e:
+            return self.error_response(
+                message=f"Error al obtener la analítica de uso: {str(e)}",
+                code="analitica_error"
+            )
@@ -0,0 +1,41 @@
+"""
+Configuración de gunicorn: `gunicorn -c gunicorn.conf.py`
+
+Define PROMETHEUS_MULTIPROC_DIR antes de que los workers importen prometheus_client para que
+/metricas sume los valores de todos los workers (ver core/metricas.py); /instrumentacion/ usa
+un subdirectorio para lo mismo (core/instrumentacion.py). El directorio se vacía al arrancar y
+los archivos de cada worker que termina se marcan como muertos.
+
+post_request recicla el worker cuyo RSS supera MEMORIA_RECICLAR_MB (ver core/memoria.py): termina
+la petición en curso, sale de forma ordenada y el arbiter levanta otro en su lugar.
+"""
+import os
+import shutil
+
+wsgi_app = 'core.wsgi:application'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '3'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+directorio_metricas = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/ialegal-metricas')
+
+
+def on_starting(server):
+    shutil.rmtree(directorio_metricas, ignore_errors=True)
+    os.makedirs(directorio_metricas, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_request(worker, req, environ, resp):
+    from core.memoria import debe_reciclar
+    motivo = debe_reciclar()
+    if motivo:
+        worker.log.warning("Reciclando worker %s: %s", worker.pid, motivo)
+        worker.alive = False
@@ -11,6 +11,102 @@ class Usuarios(AbstractUser):
         db_table = 'usuarios'
         verbose_name_plural = 'Usuarios'
 
+    def get_porcentaje_perfil(self):
+        """Calcula el porcentaje de completitud del perfil"""
+        fields_to_check = [
+            bool(self.first_name),
+            bool(self.last_name),
+            bool(self.email),
+            bool(self.empresa_id)
+        ]
+        return round((sum(fields_to_check) / len(fields_to_check)) * 100, 2)
+
+    def get_informacion_completa(self):
+        """
+        Información completa del usuario (empresa, grupos y permisos) con un número fijo de consultas.
+        Es la respuesta de `usuarios/me` y la sección `me` del bootstrap.
+        """
+        empresa = self.empresa if self.empresa_id else None
+        plan = empresa.plan if empresa else None
+        empresa_info = None
+        if empresa:
+            empresa_info = {
+                'id': empresa.id,
+                'nombre': empresa.nombre,
+                'rut': empresa.rut,
+                'correo': empresa.correo,
+                'fecha_creacion': empresa.fecha_creacion,
+                'plan': {
+                    'id': plan.id,
+                    'tipo_plan': plan.tipo_plan,
+                    'nombre': plan.nombre,
+                    'precio': plan.precio,
+                    'cantidad_users': plan.cantidad_users,
+                    'cantidad_escritos': plan.cantidad_escritos,
+                    'cantidad_demandas': plan.cantidad_demandas,
+                    'cantidad_contratos': plan.cantidad_contratos,
+                    'cantidad_consultas': plan.cantidad_consultas,
+                    'fecha_creacion': plan.fecha_creacion
+                } if plan else None
+            }
+
+        groups_info = [
+            {'id': group.id, 'name': group.name, 'permissions_count': group.permissions_count}
+            for group in self.groups.annotate(permissions_count=models.Count('permissions'))
+        ]
+
+        direct_permissions = [
+            {
+                'id': perm.id,
+                'name': perm.name,
+                'codename': perm.codename,
+                'content_type': {
+                    'app_label': perm.content_type.app_label,
+                    'model': perm.content_type.model
+                }
+            }
+            for perm in self.user_permissions.select_related('content_type')
+        ]
+
+        all_permissions = list(self.get_all_permissions())
+
+        return {
+            'user_info': {
+                'id': self.id,
+                'username': self.username,
+                'email': self.email,
+                'first_name': self.first_name,
+                'last_name': self.last_name,
+                'full_name': f"{self.first_name} {self.last_name}".strip(),
+                'date_joined': self.date_joined,
+                'last_login': self.last_login,
+                'is_superuser': self.is_superuser,
+                'is_staff': self.is_staff,
+                'is_active': self.is_active
+            },
+            'empresa': empresa_info,
+            'groups': groups_info,
+            'permissions': {
+                'direct_permissions': direct_permissions,
+                'all_permissions': all_permissions,
+                'stats': {
+                    'total_groups': len(groups_info),
+                    'total_direct_permissions': len(direct_permissions),
+                    'total_all_permissions': len(all_permissions),
+                    'is_superuser': self.is_superuser,
+                    'is_staff': self.is_staff,
+                    'is_active': self.is_active
+                }
+            },
+            'profile_completion': {
+                'has_first_name': bool(self.first_name),
+                'has_last_name': bool(self.last_name),
+                'has_email': bool(self.email),
+                'has_empresa': bool(self.empresa_id),
+                'completion_percentage': self.get_porcentaje_perfil()
+            }
+        }
+
 class Perfil(models.Model):
     TIPO_CHOICES = [
         ('pdf', 'PDF'),
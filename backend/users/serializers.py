@@ -5,8 +5,9 @@ from django.utils.translation import gettext_lazy as _
 from dj_rest_auth.serializers import PasswordChangeSerializer
 from .models import Usuarios, Perfil
 from companies.serializers import EmpresasSerializer
+from core.serializers import CamposDinamicosSerializerMixin
 
-class UsuariosSerializer(serializers.ModelSerializer):
+class UsuariosSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     empresa = EmpresasSerializer(read_only=True)
     grupos = serializers.SerializerMethodField()
 
@@ -16,6 +17,7 @@ class UsuariosSerializer(serializers.ModelSerializer):
             "id", "username", "email", "first_name", "last_name", "empresa", "grupos"
         )
         read_only_fields = ["empresa", "grupos"]
+        expandable_fields = {'empresa': []}
 
     def get_grupos(self, obj):
         """Obtiene los grupos a los que pertenece el usuario"""
@@ -278,7 +280,7 @@ class UserPermissionsSerializer(serializers.ModelSerializer):
         return list(unique_permissions.values())
 
 
-class PerfilSerializer(serializers.ModelSerializer):
+class PerfilSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     """Serializer para el modelo Perfil"""
     usuario = serializers.PrimaryKeyRelatedField(queryset=Usuarios.objects.all())
     usuario_info = UsuariosSerializer(source='usuario', read_only=True)
@@ -291,6 +293,7 @@ class PerfilSerializer(serializers.ModelSerializer):
             'representante_banco', 'rut_representante', 'banco'
         )
         read_only_fields = ('id',)
+        expandable_fields = {'usuario_info': ['usuario__groups']}
     
     def validate_interlineado(self, value):
         """Validar que el interlineado esté en un rango válido"""
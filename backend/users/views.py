@@ -6,6 +6,9 @@ from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
 from dj_rest_auth.views import LoginView, LogoutView, PasswordChangeView
 from django.contrib.auth.models import Group
 from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from companies.cuotas import CuotaExcedida, consumir
+from companies.models import ConsumoPlan
 from core.mixins import StandardResponseMixin
 from .models import Usuarios, Perfil
 from .serializers import UsuariosSerializer, UsuariosCreateSerializer, UsuariosUpdateSerializer, CustomPasswordChangeSerializer, GroupSerializer, UserPermissionsSerializer, PerfilSerializer, PerfilCreateSerializer, PerfilUpdateSerializer
@@ -25,6 +28,10 @@ class UsuariosViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         return UsuariosSerializer
 
     def get_queryset(self):
+        # UsuariosSerializer anida la empresa con su plan y los grupos
+        return self._usuarios_visibles().select_related('empresa__plan').prefetch_related('groups')
+
+    def _usuarios_visibles(self):
         """
         Filtra los usuarios según el tipo de usuario:
         - Usuario con grupo Admin: Ve todos los usuarios de su empresa (excepto él mismo)
@@ -119,7 +126,19 @@ class UsuariosViewSet(StandardResponseMixin, viewsets.ModelViewSet):
             
             serializer = self.get_serializer(data=data)
             serializer.is_valid(raise_exception=True)
-            usuario = serializer.save()
+            try:
+                # El usuario se descuenta del plan de su empresa en la misma transacción
+                with transaction.atomic():
+                    usuario = serializer.save()
+                    if usuario.empresa_id:
+                        consumir(usuario.empresa_id, ConsumoPlan.USUARIOS)
+            except CuotaExcedida as e:
+                return self.error_response(
+                    errors=str(e),
+                    message="El plan de la empresa no permite más usuarios",
+                    code="plan_quota_exceeded",
+                    http_status=status.HTTP_403_FORBIDDEN
+                )
             
             return self.success_response(
                 data=serializer.data,
@@ -209,7 +228,17 @@ class UsuariosViewSet(StandardResponseMixin, viewsets.ModelViewSet):
             
             serializer = self.get_serializer(instance, data=data, partial=kwargs.get('partial', False))
             serializer.is_valid(raise_exception=True)
-            usuario = serializer.save()
+            try:
+                # Cambiar de empresa o reactivar ocupa un cupo del plan (señales de companies)
+                with transaction.atomic():
+                    usuario = serializer.save()
+            except CuotaExcedida as e:
+                return self.error_response(
+                    errors=str(e),
+                    message="El plan de la empresa no permite más usuarios",
+                    code="plan_quota_exceeded",
+                    http_status=status.HTTP_403_FORBIDDEN
+                )
             
             return self.success_response(
                 data=UsuariosSerializer(usuario).data,  # Usar el serializer de lectura para la respuesta
@@ -345,99 +374,7 @@ class UsuariosViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     def me(self, request):
         """Endpoint para obtener información completa del usuario actual"""
         try:
-            user = request.user
-            
-            # Información de la empresa
-            empresa_info = None
-            if hasattr(user, 'empresa') and user.empresa:
-                empresa_info = {
-                    'id': user.empresa.id,
-                    'nombre': user.empresa.nombre,
-                    'rut': user.empresa.rut,
-                    'correo': user.empresa.correo,
-                    'fecha_creacion': user.empresa.fecha_creacion,
-                    'plan': {
-                        'id': user.empresa.plan.id,
-                        'tipo_plan': user.empresa.plan.tipo_plan,
-                        'nombre': user.empresa.plan.nombre,
-                        'precio': user.empresa.plan.precio,
-                        'cantidad_users': user.empresa.plan.cantidad_users,
-                        'cantidad_escritos': user.empresa.plan.cantidad_escritos,
-                        'cantidad_demandas': user.empresa.plan.cantidad_demandas,
-                        'cantidad_contratos': user.empresa.plan.cantidad_contratos,
-                        'cantidad_consultas': user.empresa.plan.cantidad_consultas,
-                        'fecha_creacion': user.empresa.plan.fecha_creacion
-                    } if user.empresa.plan else None
-                }
-            
-            # Información de grupos
-            groups_info = []
-            for group in user.groups.all():
-                groups_info.append({
-                    'id': group.id,
-                    'name': group.name,
-                    'permissions_count': group.permissions.count()
-                })
-            
-            # Información de permisos directos
-            direct_permissions = []
-            for perm in user.user_permissions.all():
-                direct_permissions.append({
-                    'id': perm.id,
-                    'name': perm.name,
-                    'codename': perm.codename,
-                    'content_type': {
-                        'app_label': perm.content_type.app_label,
-                        'model': perm.content_type.model
-                    }
-                })
-            
-            # Todos los permisos (grupos + directos)
-            all_permissions = list(user.get_all_permissions())
-            
-            # Estadísticas de permisos
-            permissions_stats = {
-                'total_groups': user.groups.count(),
-                'total_direct_permissions': user.user_permissions.count(),
-                'total_all_permissions': len(all_permissions),
-                'is_superuser': user.is_superuser,
-                'is_staff': user.is_staff,
-                'is_active': user.is_active
-            }
-            
-            # Información general del usuario
-            user_info = {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'full_name': f"{user.first_name} {user.last_name}".strip(),
-                'date_joined': user.date_joined,
-                'last_login': user.last_login,
-                'is_superuser': user.is_superuser,
-                'is_staff': user.is_staff,
-                'is_active': user.is_active
-            }
-            
-            # Respuesta completa
-            response_data = {
-                'user_info': user_info,
-                'empresa': empresa_info,
-                'groups': groups_info,
-                'permissions': {
-                    'direct_permissions': direct_permissions,
-                    'all_permissions': all_permissions,
-                    'stats': permissions_stats
-                },
-                'profile_completion': {
-                    'has_first_name': bool(user.first_name),
-                    'has_last_name': bool(user.last_name),
-                    'has_email': bool(user.email),
-                    'has_empresa': bool(hasattr(user, 'empresa') and user.empresa),
-                    'completion_percentage': self._calculate_profile_completion(user)
-                }
-            }
+            response_data = request.user.get_informacion_completa()
             
             return self.success_response(
                 data=response_data,
@@ -453,18 +390,6 @@ class UsuariosViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 code="current_user_info_error",
                 http_status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-    
-    def _calculate_profile_completion(self, user):
-        """Calcula el porcentaje de completitud del perfil"""
-        fields_to_check = [
-            bool(user.first_name),
-            bool(user.last_name),
-            bool(user.email),
-            bool(hasattr(user, 'empresa') and user.empresa)
-        ]
-        completed_fields = sum(fields_to_check)
-        total_fields = len(fields_to_check)
-        return round((completed_fields / total_fields) * 100, 2)
 
 class CustomLoginView(StandardResponseMixin, LoginView):
     def post(self, request, *args, **kwargs):
@@ -734,6 +659,10 @@ class PerfilViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         return PerfilSerializer
 
     def get_queryset(self):
+        # PerfilSerializer anida el usuario con su empresa, plan y grupos
+        return self._perfiles_visibles().select_related('usuario__empresa__plan').prefetch_related('usuario__groups')
+
+    def _perfiles_visibles(self):
         """
         Filtra los perfiles según el tipo de usuario:
         - Usuario con grupo Admin: Ve todos los perfiles de su empresa